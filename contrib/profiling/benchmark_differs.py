@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+
+"""
+benchmark_differs.py [-n iterations] [-s seed] [/path/to/file ...]
+
+Compares the PatienceDiffer against the MyersDiffer and SMDiffer.
+
+Each file (defaulting to the Python files in reviewboard/diffviewer) is
+diffed against copies of itself with scattered edits, and against a large
+file built by concatenating all of them. The changed line counts for each
+differ are checked for parity, and the time spent by each is reported.
+"""
+
+from __future__ import print_function, unicode_literals
+
+import getopt
+import glob
+import os
+import random
+import sys
+import time
+
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..',
+                                        '..'))
+sys.path.insert(0, ROOT_DIR)
+
+from reviewboard.diffviewer.myersdiff import MyersDiffer
+from reviewboard.diffviewer.patiencediff import PatienceDiffer
+from reviewboard.diffviewer.smdiff import SMDiffer
+
+
+DEFAULT_FILES_GLOB = os.path.join(ROOT_DIR, 'reviewboard', 'diffviewer',
+                                  '*.py')
+
+DIFFERS = [
+    ('patience', PatienceDiffer),
+    ('myers', MyersDiffer),
+    ('smdiff', SMDiffer),
+]
+
+
+def mutate(lines, num_edits, rnd):
+    """Return a copy of the lines with some random edits applied."""
+    lines = list(lines)
+
+    for i in range(num_edits):
+        pos = rnd.randint(0, len(lines))
+        op = rnd.random()
+
+        if op < 0.4:
+            del lines[pos:pos + rnd.randint(1, 5)]
+        elif op < 0.8:
+            lines[pos:pos] = [
+                'new line %d\n' % rnd.randint(0, 1000000)
+                for j in range(rnd.randint(1, 5))
+            ]
+        elif lines:
+            pos = min(pos, len(lines) - 1)
+            lines[pos] = lines[pos].rstrip('\n') + ' # changed\n'
+
+    return lines
+
+
+def count_changed_lines(opcodes):
+    """Return the number of lines that aren't equal in a set of opcodes."""
+    return sum(
+        max(i2 - i1, j2 - j1)
+        for tag, i1, i2, j1, j2 in opcodes
+        if tag != 'equal'
+    )
+
+
+def load_cases(paths, rnd):
+    """Load all the (name, old lines, new lines) cases from the files."""
+    cases = []
+    all_lines = []
+
+    for path in paths:
+        with open(path, 'r') as f:
+            lines = f.readlines()
+
+        all_lines += lines
+
+        for num_edits in (5, len(lines) // 20):
+            cases.append(('%s (%d edits)' % (os.path.basename(path),
+                                             num_edits),
+                          lines, mutate(lines, num_edits, rnd)))
+
+    cases.append(('all files (%d edits)' % (len(all_lines) // 20),
+                  all_lines, mutate(all_lines, len(all_lines) // 20, rnd)))
+
+    return cases
+
+
+def benchmark(cases, iterations):
+    totals = dict((name, 0.0) for name, differ_cls in DIFFERS)
+    mismatches = dict((name, 0) for name, differ_cls in DIFFERS)
+
+    for case_name, old_lines, new_lines in cases:
+        results = []
+
+        for name, differ_cls in DIFFERS:
+            start = time.time()
+
+            for i in range(iterations):
+                opcodes = list(differ_cls(old_lines, new_lines).get_opcodes())
+
+            secs = time.time() - start
+            totals[name] += secs
+            results.append((name, count_changed_lines(opcodes), secs))
+
+        base_changed = results[0][1]
+
+        for name, changed, secs in results[1:]:
+            if changed != base_changed:
+                mismatches[name] += 1
+
+        print('%-40s %s' % (
+            case_name,
+            '  '.join(
+                '%s: %5d lines %8.3fms' % (name, changed,
+                                           secs * 1000 / iterations)
+                for name, changed, secs in results
+            )))
+
+    print()
+    print('%d cases, %d iterations each' % (len(cases), iterations))
+
+    for name, differ_cls in DIFFERS:
+        print('%-10s %8.3fs total' % (name, totals[name]), end='')
+
+        if name != DIFFERS[0][0]:
+            print(', %d changed line count mismatches' % mismatches[name],
+                  end='')
+
+        print()
+
+
+def main():
+    iterations = 5
+    seed = 0
+
+    opts, args = getopt.getopt(sys.argv[1:], 'hn:s:')
+
+    for opt, arg in opts:
+        if opt == '-n':
+            iterations = int(arg)
+        elif opt == '-s':
+            seed = int(arg)
+        else:
+            print(__doc__.strip())
+            sys.exit(1)
+
+    paths = args or sorted(glob.glob(DEFAULT_FILES_GLOB))
+    benchmark(load_cases(paths, random.Random(seed)), iterations)
+
+
+if __name__ == '__main__':
+    main()
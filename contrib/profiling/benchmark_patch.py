@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+
+"""
+benchmark_patch.py [-n iterations] [/path/to/diffs ...]
+
+Compares the in-process patcher against the ``patch`` tool.
+
+Each file in the given diffs (defaulting to the diffs in
+reviewboard/scmtools/testdata) has an original file synthesized from its
+hunks, which is then patched by both engines. The results are checked for
+parity, and the time spent by each engine is reported.
+"""
+
+from __future__ import print_function, unicode_literals
+
+import getopt
+import glob
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..',
+                                        '..'))
+sys.path.insert(0, ROOT_DIR)
+
+from reviewboard.diffviewer.errors import PatchRejectedError
+from reviewboard.diffviewer.patcher import apply_patch, parse_hunks
+
+
+DEFAULT_DIFFS_GLOB = os.path.join(ROOT_DIR, 'reviewboard', 'scmtools',
+                                  'testdata', '*.diff')
+
+
+def split_file_diffs(data):
+    """Split a diff into the diffs for each file."""
+    lines = data.split(b'\n')
+    file_diffs = []
+    start = 0
+    has_header = False
+
+    for i, line in enumerate(lines):
+        if line.startswith(b'diff ') or line.startswith(b'Index: '):
+            is_new_file = True
+        elif (line.startswith(b'--- ') and i + 1 < len(lines) and
+              lines[i + 1].startswith(b'+++ ')):
+            is_new_file = has_header
+            has_header = True
+        else:
+            is_new_file = False
+
+        if is_new_file:
+            if i > start:
+                file_diffs.append(b'\n'.join(lines[start:i]) + b'\n')
+
+            start = i
+            has_header = line.startswith(b'--- ')
+
+    file_diffs.append(b'\n'.join(lines[start:]))
+
+    return file_diffs
+
+
+def synthesize_original(hunks):
+    """Build an original file that a diff's hunks will apply to."""
+    lines = []
+
+    for hunk in hunks:
+        while len(lines) < hunk.first_guess:
+            lines.append(b'filler line %d' % len(lines))
+
+        lines += hunk.old_lines
+
+    if not lines or hunks[-1].old_no_newline:
+        return b'\n'.join(lines)
+
+    return b'\n'.join(lines) + b'\n'
+
+
+def run_patch_tool(diff, data):
+    """Apply a diff to a file the same way diffutils does with ``patch``."""
+    tempdir = tempfile.mkdtemp(prefix='reviewboard.')
+
+    try:
+        oldfile = os.path.join(tempdir, 'old')
+        newfile = os.path.join(tempdir, 'new')
+
+        with open(oldfile, 'wb') as f:
+            f.write(data)
+
+        p = subprocess.Popen(['patch', '-o', newfile, oldfile],
+                             stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                             stderr=subprocess.PIPE, cwd=tempdir)
+        p.communicate(diff)
+
+        if p.returncode:
+            return None
+
+        with open(newfile, 'rb') as f:
+            return f.read()
+    finally:
+        shutil.rmtree(tempdir)
+
+
+def load_cases(paths):
+    """Load all the (name, diff, original) cases from the diff files."""
+    cases = []
+
+    for path in paths:
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        for i, diff in enumerate(split_file_diffs(data)):
+            try:
+                hunks = parse_hunks(diff)
+            except PatchRejectedError:
+                # Binary files, mode changes, and so on.
+                continue
+
+            cases.append(('%s[%d]' % (os.path.basename(path), i), diff,
+                          synthesize_original(hunks)))
+
+    return cases
+
+
+def benchmark(cases, iterations):
+    in_process_secs = 0.0
+    patch_tool_secs = 0.0
+    mismatches = 0
+    rejected = 0
+
+    for name, diff, original in cases:
+        expected = run_patch_tool(diff, original)
+
+        try:
+            result = apply_patch(diff, original)
+        except PatchRejectedError as e:
+            print('%s: rejected in-process (%s)' % (name, e))
+            rejected += 1
+            continue
+
+        if expected is None:
+            # Newer versions of patch refuse some diffs that Review Board
+            # relies upon, such as git diffs creating new files.
+            print('%s: patch failed, but the in-process patcher applied it'
+                  % name)
+        elif result != expected:
+            print('%s: results differ from patch' % name)
+            mismatches += 1
+
+        start = time.time()
+
+        for i in range(iterations):
+            apply_patch(diff, original)
+
+        in_process_secs += time.time() - start
+
+        start = time.time()
+
+        for i in range(iterations):
+            run_patch_tool(diff, original)
+
+        patch_tool_secs += time.time() - start
+
+    num_patched = len(cases) - rejected
+
+    print()
+    print('%d file diffs, %d iterations each' % (len(cases), iterations))
+    print('Rejected by the in-process patcher: %d' % rejected)
+    print('Mismatched results: %d' % mismatches)
+
+    if num_patched:
+        total = num_patched * iterations
+
+        print('In-process: %8.3fs total, %8.3fms per file'
+              % (in_process_secs, in_process_secs * 1000 / total))
+        print('patch:      %8.3fs total, %8.3fms per file'
+              % (patch_tool_secs, patch_tool_secs * 1000 / total))
+
+        if in_process_secs:
+            print('Speedup:    %8.1fx' % (patch_tool_secs / in_process_secs))
+
+
+def main():
+    iterations = 20
+
+    opts, args = getopt.getopt(sys.argv[1:], 'hn:')
+
+    for opt, arg in opts:
+        if opt == '-n':
+            iterations = int(arg)
+        else:
+            print(__doc__.strip())
+            sys.exit(1)
+
+    paths = args or sorted(glob.glob(DEFAULT_DIFFS_GLOB))
+    benchmark(load_cases(paths), iterations)
+
+
+if __name__ == '__main__':
+    main()
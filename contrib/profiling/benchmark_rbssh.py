@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+
+"""
+benchmark_rbssh.py [-m megabytes] [-n commands]
+
+Benchmarks the data transfer and connection reuse in rbssh.
+
+A local SSH server is started that runs two commands: ``cat``, which echoes
+its input back, and ``true``, which exits immediately.
+
+First, the given number of megabytes are sent through ``cat`` by rbssh's
+PosixHandler, once reading and writing in 4KB blocks (as rbssh used to),
+and once in blocks of BUFFER_SIZE.
+
+Then, ``true`` is run the given number of times, once with a new
+connection for each command (as rbssh does by default), and once with
+each command run through a ControlMaster sharing one connection.
+"""
+
+from __future__ import print_function, unicode_literals
+
+import getopt
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..',
+                                        '..'))
+sys.path.insert(0, ROOT_DIR)
+
+import paramiko
+
+from reviewboard.cmdline import rbssh
+from reviewboard.ssh.multiplex import (BUFFER_SIZE, ControlMaster,
+                                       get_control_path, run_session)
+
+
+class BenchmarkServer(paramiko.ServerInterface):
+    """An SSH server that accepts anyone and runs cat and true."""
+
+    def get_allowed_auths(self, username):
+        return 'none'
+
+    def check_auth_none(self, username):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_SUCCEEDED
+
+    def check_channel_exec_request(self, channel, command):
+        if command not in (b'cat', b'true'):
+            return False
+
+        thread = threading.Thread(target=self._run_command,
+                                  args=(channel, command))
+        thread.daemon = True
+        thread.start()
+
+        return True
+
+    def _run_command(self, channel, command):
+        if command == b'cat':
+            while True:
+                data = channel.recv(BUFFER_SIZE)
+
+                if not data:
+                    break
+
+                channel.sendall(data)
+
+        channel.send_exit_status(0)
+        channel.close()
+
+
+def start_server(host_key):
+    """Start the SSH server in a thread, and return its port."""
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(16)
+
+    def serve():
+        while True:
+            conn, addr = listener.accept()
+            transport = paramiko.Transport(conn)
+            transport.add_server_key(host_key)
+            transport.start_server(server=BenchmarkServer())
+
+    thread = threading.Thread(target=serve)
+    thread.daemon = True
+    thread.start()
+
+    return listener.getsockname()[1]
+
+
+def connect(port):
+    """Return a new authenticated transport to the SSH server."""
+    transport = paramiko.Transport(('127.0.0.1', port))
+    transport.connect()
+    transport.auth_none('benchmark')
+
+    return transport
+
+
+def feed(fd, data):
+    """Write the data to a pipe and close it."""
+    rbssh.write_fd(fd, data)
+    os.close(fd)
+
+
+def drain(fd, result):
+    """Read from a pipe until it's closed, and store the byte count."""
+    total = 0
+
+    while True:
+        data = os.read(fd, BUFFER_SIZE)
+
+        if not data:
+            break
+
+        total += len(data)
+
+    os.close(fd)
+    result.append(total)
+
+
+def benchmark_transfer(port, megabytes):
+    data = b'x' * (megabytes * 1024 * 1024)
+    transport = connect(port)
+
+    print('Sending %dMB through cat' % megabytes)
+
+    for buffer_size in (4096, BUFFER_SIZE):
+        stdin_r, stdin_w = os.pipe()
+        stdout_r, stdout_w = os.pipe()
+        result = []
+        threads = [
+            threading.Thread(target=feed, args=(stdin_w, data)),
+            threading.Thread(target=drain, args=(stdout_r, result)),
+        ]
+
+        channel = transport.open_session()
+        channel.exec_command('cat')
+        handler = rbssh.PosixHandler(channel, stdin_fd=stdin_r,
+                                     stdout_fd=stdout_w)
+
+        # PlatformHandler reads in blocks of the module's BUFFER_SIZE.
+        rbssh.BUFFER_SIZE = buffer_size
+        start = time.time()
+
+        for thread in threads:
+            thread.start()
+
+        handler.transfer()
+        os.close(stdout_w)
+
+        for thread in threads:
+            thread.join()
+
+        secs = time.time() - start
+        channel.close()
+        os.close(stdin_r)
+        rbssh.BUFFER_SIZE = BUFFER_SIZE
+
+        assert result == [len(data)]
+        print('  %6d byte blocks: %8.3fs (%.1fMB/s)'
+              % (buffer_size, secs, megabytes / secs))
+
+    transport.close()
+
+
+def benchmark_commands(port, num_commands):
+    print('Running true %d times' % num_commands)
+
+    start = time.time()
+
+    for i in range(num_commands):
+        transport = connect(port)
+        channel = transport.open_session()
+        channel.exec_command('true')
+        assert channel.recv_exit_status() == 0
+        transport.close()
+
+    print('  new connections:   %8.3fs' % (time.time() - start))
+
+    control_dir = tempfile.mkdtemp(prefix='rbssh-benchmark-')
+    control_path = get_control_path(control_dir, 'benchmark', '127.0.0.1',
+                                    port)
+    devnull = os.open(os.devnull, os.O_RDONLY)
+
+    try:
+        start = time.time()
+        master = ControlMaster(connect(port), control_path)
+        master.listen()
+
+        thread = threading.Thread(target=master.serve)
+        thread.daemon = True
+        thread.start()
+
+        for i in range(num_commands):
+            assert run_session(control_path, command='true',
+                               stdin_fd=devnull) == 0
+
+        print('  shared connection: %8.3fs' % (time.time() - start))
+
+        master.transport.close()
+        thread.join()
+    finally:
+        os.close(devnull)
+        shutil.rmtree(control_dir)
+
+
+def main():
+    megabytes = 64
+    num_commands = 50
+
+    opts, args = getopt.getopt(sys.argv[1:], 'hm:n:')
+
+    for opt, arg in opts:
+        if opt == '-m':
+            megabytes = int(arg)
+        elif opt == '-n':
+            num_commands = int(arg)
+        else:
+            print(__doc__.strip())
+            sys.exit(1)
+
+    port = start_server(paramiko.RSAKey.generate(2048))
+    benchmark_transfer(port, megabytes)
+    print()
+    benchmark_commands(port, num_commands)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+
+"""
+benchmark_webapi_fields.py [-n review-requests] [-i iterations]
+
+Benchmarks ?only-fields= and ?only-links= on the review request and review
+list resources.
+
+A test database is populated with review requests (half of them closed,
+each on a repository and with a few reviews), and the lists are fetched
+through the test client with all fields, with a handful of fields, and
+with a handful of fields and no links. The number of SQL queries and the
+average time for each request are reported.
+"""
+
+from __future__ import print_function, unicode_literals
+
+import getopt
+import os
+import sys
+import time
+
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..',
+                                        '..'))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, 'contrib', 'internal', 'conf'))
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'reviewboard.settings')
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.client import Client
+from django.test.utils import CaptureQueriesContext
+
+from reviewboard import initialize
+from reviewboard.diffviewer.models import DiffSetHistory
+from reviewboard.reviews.models import Review, ReviewRequest
+from reviewboard.scmtools.models import Repository, Tool
+from reviewboard.test import RBTestRunner
+
+
+CASES = [
+    ('all fields', {}),
+    ('4 fields', {
+        'only-fields': 'id,summary,status,last_updated',
+    }),
+    ('4 fields, no links', {
+        'only-fields': 'id,summary,status,last_updated',
+        'only-links': '',
+    }),
+]
+
+
+def populate(num_review_requests):
+    """Create the users, repository, review requests and reviews."""
+    user = User.objects.create_user('admin', 'admin@example.com', 'admin')
+    user.is_superuser = True
+    user.save()
+
+    reviewers = [
+        User.objects.create_user('reviewer%d' % i,
+                                 'reviewer%d@example.com' % i)
+        for i in range(3)
+    ]
+
+    tool, is_new = Tool.objects.get_or_create(
+        name='Git',
+        class_name='reviewboard.scmtools.git.GitTool')
+    repository = Repository.objects.create(name='Test', path='/test.git',
+                                           tool=tool)
+
+    for i in range(num_review_requests):
+        review_request = ReviewRequest(
+            summary='Review request %d' % i,
+            description='This is **review request** %d.' % i,
+            description_rich_text=True,
+            testing_done='Ran the tests.',
+            submitter=user,
+            repository=repository,
+            diffset_history=DiffSetHistory.objects.create(),
+            status=ReviewRequest.PENDING_REVIEW)
+        review_request.save()
+        review_request.publish(user)
+
+        for reviewer in reviewers:
+            Review.objects.create(review_request=review_request,
+                                  user=reviewer,
+                                  body_top='Looks good.',
+                                  ship_it=True,
+                                  public=True)
+
+        if i % 2:
+            review_request.close(ReviewRequest.SUBMITTED, user,
+                                 description='Submitted as r%d.' % i)
+
+    return ReviewRequest.objects.order_by('pk')[0]
+
+
+def benchmark(client, url, num_iterations):
+    print(url)
+
+    for name, query in CASES:
+        query = dict(query, **{
+            'max-results': 200,
+            'status': 'all',
+        })
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url, query)
+
+        assert response.status_code == 200, response.content
+
+        # Later requests reset connection.queries, so count them now.
+        num_queries = len(queries)
+
+        start = time.time()
+
+        for i in range(num_iterations):
+            client.get(url, query)
+
+        secs = (time.time() - start) / num_iterations
+
+        print('  %-20s %5d queries %8.1fms (%d bytes)'
+              % (name, num_queries, secs * 1000, len(response.content)))
+
+
+def main():
+    num_review_requests = 100
+    num_iterations = 10
+
+    opts, args = getopt.getopt(sys.argv[1:], 'hn:i:')
+
+    for opt, arg in opts:
+        if opt == '-n':
+            num_review_requests = int(arg)
+        elif opt == '-i':
+            num_iterations = int(arg)
+        else:
+            print(__doc__.strip())
+            sys.exit(1)
+
+    runner = RBTestRunner(verbosity=0)
+    runner.setup_test_environment()
+    old_config = runner.setup_databases()
+
+    try:
+        initialize()
+
+        review_request = populate(num_review_requests)
+
+        client = Client()
+        assert client.login(username='admin', password='admin')
+
+        benchmark(client, '/api/review-requests/', num_iterations)
+        print()
+        benchmark(client,
+                  '/api/review-requests/%s/reviews/'
+                  % review_request.display_id,
+                  num_iterations)
+    finally:
+        runner.teardown_databases(old_config)
+        runner.teardown_test_environment()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,13 @@
+from __future__ import unicode_literals
+
+from reviewboard.signals import initializing
+
+
+def _connect_signals(**kwargs):
+    """Connects the accounts signal handlers once Django is loaded."""
+    from reviewboard.accounts import auth_cache
+
+    auth_cache.connect_signals()
+
+
+initializing.connect(_connect_signals)
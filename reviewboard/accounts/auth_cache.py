@@ -0,0 +1,157 @@
+"""Caches the data needed to authenticate users and check permissions.
+
+API clients such as CI bots can make thousands of requests a minute, and
+each one needs the same data about the user: their API token and its
+policy, and their permissions on the LocalSite they're accessing. This
+keeps that data in the shared cache, so that all processes can use it
+without querying the database, and in a process-local cache to save the
+round-trip and unpickling when possible.
+
+Each user's data is versioned by a generation stored in the shared cache.
+Whenever a user, their LocalSite profiles or their API tokens change, the
+generation is replaced with a new random value, and data cached for the
+old generation is no longer used, in any process.
+"""
+
+from __future__ import unicode_literals
+
+import threading
+import uuid
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.utils import six
+from djblets.cache.backend import make_cache_key
+
+
+#: How long, in seconds, to keep data in the shared cache.
+AUTH_CACHE_EXPIRATION = 24 * 60 * 60
+
+#: The number of entries after which the process-local cache is emptied.
+MAX_LOCAL_ENTRIES = 10000
+
+_local_cache = {}
+_local_cache_lock = threading.Lock()
+
+
+def get_user_auth_generation(user_id):
+    """Returns the current generation of a user's cached data.
+
+    A new generation is created if there isn't one in the cache. It's
+    random rather than a counter, so that if it's evicted, data cached in
+    processes for the old generation won't be mistaken for current.
+    """
+    key = _make_generation_cache_key(user_id)
+    generation = cache.get(key)
+
+    if generation is None:
+        cache.add(key, uuid.uuid4().hex, AUTH_CACHE_EXPIRATION)
+        generation = cache.get(key)
+
+    return generation
+
+
+def invalidate_user_auth_cache(user_id):
+    """Invalidates all cached authentication data for a user."""
+    cache.set(_make_generation_cache_key(user_id), uuid.uuid4().hex,
+              AUTH_CACHE_EXPIRATION)
+
+
+def get_cached_user_auth_data(user_id, name, load_func):
+    """Returns cached authentication data for a user.
+
+    If there's data cached under ``name`` for the user's current
+    generation, it's returned. Otherwise, ``load_func`` is called, and its
+    result is cached and returned.
+
+    The same object may be returned to multiple callers (and threads), so
+    callers must not modify it.
+
+    If the shared cache isn't storing data (there's no generation), the
+    data is always loaded, since there's no way to tell whether any cached
+    data is still current.
+    """
+    # The generation is fetched before loading, so that if the data
+    # changes while it's being loaded, it will be stored under a
+    # generation that's already out of date.
+    generation = get_user_auth_generation(user_id)
+
+    if generation is None:
+        return load_func()
+
+    local_key = (user_id, name)
+
+    with _local_cache_lock:
+        cached = _local_cache.get(local_key)
+
+    if cached is not None and cached[0] == generation:
+        return cached[1]
+
+    shared_key = make_cache_key('user-auth-data-%s-%s' % (user_id, name))
+    cached = cache.get(shared_key)
+
+    if cached is None or cached[0] != generation:
+        cached = (generation, load_func())
+        cache.set(shared_key, cached, AUTH_CACHE_EXPIRATION)
+
+    with _local_cache_lock:
+        if len(_local_cache) >= MAX_LOCAL_ENTRIES:
+            _local_cache.clear()
+
+        _local_cache[local_key] = cached
+
+    return cached[1]
+
+
+def get_local_site_permissions(user, local_site):
+    """Returns the permissions a user has been granted on a LocalSite.
+
+    This is a frozenset of permission names, from the user's
+    LocalSiteProfile for the LocalSite.
+    """
+    def _load_permissions():
+        from reviewboard.accounts.models import LocalSiteProfile
+
+        try:
+            site_profile = user.get_site_profile(local_site)
+        except LocalSiteProfile.DoesNotExist:
+            return frozenset()
+
+        return frozenset(
+            key
+            for key, value in six.iteritems(site_profile.permissions or {})
+            if value
+        )
+
+    return get_cached_user_auth_data(
+        user.pk, 'local-site-perms-%s' % local_site.pk, _load_permissions)
+
+
+def _on_user_changed(sender, instance, update_fields=None, **kwargs):
+    """Invalidates a user's cached data when the user changes.
+
+    Saves that only update the last login time are ignored. They happen on
+    every API request authenticated with a token.
+    """
+    if not update_fields or set(update_fields) != set(['last_login']):
+        invalidate_user_auth_cache(instance.pk)
+
+
+def _on_site_profile_changed(sender, instance, **kwargs):
+    """Invalidates a user's cached data when a LocalSiteProfile changes."""
+    invalidate_user_auth_cache(instance.user_id)
+
+
+def connect_signals():
+    from reviewboard.accounts.models import LocalSiteProfile
+
+    post_save.connect(_on_user_changed, sender=User)
+    post_delete.connect(_on_user_changed, sender=User)
+    post_save.connect(_on_site_profile_changed, sender=LocalSiteProfile)
+    post_delete.connect(_on_site_profile_changed, sender=LocalSiteProfile)
+
+
+def _make_generation_cache_key(user_id):
+    """Returns the cache key for a user's generation."""
+    return make_cache_key('user-auth-generation-%s' % user_id)
@@ -22,13 +22,13 @@ try:
 except ImportError:
     pass
 
+from reviewboard.accounts.auth_cache import get_local_site_permissions
 from reviewboard.accounts.forms.auth import (ActiveDirectorySettingsForm,
                                              LDAPSettingsForm,
                                              NISSettingsForm,
                                              StandardAuthSettingsForm,
                                              X509SettingsForm,
                                              HTTPBasicSettingsForm)
-from reviewboard.accounts.models import LocalSiteProfile
 from reviewboard.site.models import LocalSite
 
 
@@ -239,22 +239,8 @@ class StandardAuthBackend(AuthBackend, ModelBackend):
                 user._local_site_perm_cache = {}
 
             if obj.pk not in user._local_site_perm_cache:
-                perm_cache = set()
-
-                try:
-                    site_profile = user.get_site_profile(obj)
-                    site_perms = site_profile.permissions or {}
-
-                    if site_perms:
-                        perm_cache = set([
-                            key
-                            for key, value in six.iteritems(site_perms)
-                            if value
-                        ])
-                except LocalSiteProfile.DoesNotExist:
-                    pass
-
-                user._local_site_perm_cache[obj.pk] = perm_cache
+                user._local_site_perm_cache[obj.pk] = \
+                    get_local_site_permissions(user, obj)
 
             permissions = permissions.copy()
             permissions.update(user._local_site_perm_cache[obj.pk])
@@ -9,6 +9,7 @@ from django.test.client import RequestFactory
 from djblets.testing.decorators import add_fixtures
 from kgb import SpyAgency
 
+from reviewboard.accounts.auth_cache import get_local_site_permissions
 from reviewboard.accounts.backends import (AuthBackend,
                                            get_enabled_auth_backends,
                                            INVALID_USERNAME_CHAR_REGEX)
@@ -23,6 +24,7 @@ from reviewboard.accounts.pages import (AccountPage, get_page_classes,
                                         register_account_page_class,
                                         unregister_account_page_class,
                                         _clear_page_defaults)
+from reviewboard.site.models import LocalSite
 from reviewboard.testing import TestCase
 
 
@@ -247,6 +249,68 @@ class AccountPageTests(TestCase):
         self.assertEqual(MyPage.form_classes, [])
 
 
+class AuthCacheTests(TestCase):
+    """Testing the caching of authentication data."""
+    fixtures = ['test_users', 'test_site']
+
+    def setUp(self):
+        super(AuthCacheTests, self).setUp()
+
+        self.user = User.objects.get(username='doc')
+        self.local_site = LocalSite.objects.get(name=self.local_site_name)
+        self.site_profile = LocalSiteProfile.objects.create(
+            user=self.user,
+            profile=self.user.get_profile(),
+            local_site=self.local_site)
+        self.site_profile.permissions['reviews.can_change_status'] = True
+        self.site_profile.permissions['reviews.delete_file'] = False
+        self.site_profile.save()
+
+    def test_get_local_site_permissions(self):
+        """Testing get_local_site_permissions"""
+        self.assertEqual(
+            get_local_site_permissions(self.user, self.local_site),
+            set(['reviews.can_change_status']))
+
+        user = User.objects.get(pk=self.user.pk)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                get_local_site_permissions(user, self.local_site),
+                set(['reviews.can_change_status']))
+
+    def test_get_local_site_permissions_without_profile(self):
+        """Testing get_local_site_permissions without a LocalSiteProfile"""
+        user = User.objects.get(username='grumpy')
+
+        self.assertEqual(get_local_site_permissions(user, self.local_site),
+                         set())
+
+    def test_get_local_site_permissions_after_change(self):
+        """Testing get_local_site_permissions after the profile changes"""
+        get_local_site_permissions(self.user, self.local_site)
+
+        self.site_profile.permissions['reviews.delete_file'] = True
+        self.site_profile.save()
+
+        user = User.objects.get(pk=self.user.pk)
+        self.assertEqual(
+            get_local_site_permissions(user, self.local_site),
+            set(['reviews.can_change_status', 'reviews.delete_file']))
+
+    def test_get_all_permissions(self):
+        """Testing StandardAuthBackend.get_all_permissions with cached
+        LocalSite permissions
+        """
+        get_local_site_permissions(self.user, self.local_site)
+
+        user = User.objects.get(pk=self.user.pk)
+        self.assertTrue(user.has_perm('reviews.can_change_status',
+                                      self.local_site))
+        self.assertFalse(user.has_perm('reviews.delete_file',
+                                       self.local_site))
+
+
 class UsernameTests(TestCase):
     """Unit tests for username rules."""
 
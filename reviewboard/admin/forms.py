@@ -50,6 +50,8 @@ from reviewboard.admin.checks import (get_can_use_amazon_s3,
                                       get_can_use_couchdb)
 from reviewboard.admin.siteconfig import load_site_config
 from reviewboard.admin.support import get_install_key
+from reviewboard.diffviewer.compression import (get_compression_codec_by_name,
+                                                get_compression_codecs)
 from reviewboard.ssh.client import SSHClient
 
 
@@ -632,12 +634,119 @@ class DiffSettingsForm(SiteSettingsForm):
                     'to disable size restrictions.'),
         widget=forms.TextInput(attrs={'size': '15'}))
 
+    diffviewer_store_file_contents = forms.BooleanField(
+        label=_('Store original and patched files'),
+        help_text=_('Store the original and patched versions of files in '
+                    'the database, so they don\'t need to be fetched from '
+                    'the repository and patched again when rendering diffs.'),
+        required=False)
+
+    diffviewer_patience_anchors = forms.BooleanField(
+        label=_('Faster diffs for large files'),
+        help_text=_('Generate new diffs by first matching up lines that are '
+                    'unique to both versions of a file. This is much faster '
+                    'for large files with many changes, but may show some '
+                    'changes differently. Existing diffs are not affected.'),
+        required=False)
+
+    diffviewer_chunk_generator_threads = forms.IntegerField(
+        label=_('Diff generation threads'),
+        help_text=_('The number of files to generate diffs for at once when '
+                    'showing several files. Enter 0 to generate diffs one '
+                    'file at a time.'),
+        min_value=0,
+        initial=0,
+        widget=forms.TextInput(attrs={'size': '5'}))
+
+    diffviewer_precompute_threads = forms.IntegerField(
+        label=_('Diff precompute threads'),
+        help_text=_('The number of background threads used to generate '
+                    'diffs for new diffs and published revisions ahead of '
+                    'time, so that reviewers don\'t have to wait for them. '
+                    'Enter 0 to only generate diffs when they\'re viewed.'),
+        min_value=0,
+        initial=2,
+        widget=forms.TextInput(attrs={'size': '5'}))
+
+    diffviewer_chunk_generator_timeout = forms.IntegerField(
+        label=_('Diff generation time limit (seconds)'),
+        help_text=_('The maximum time to spend generating diffs for '
+                    'several files at once. Any files not finished by then '
+                    'will be generated one at a time.'),
+        min_value=1,
+        initial=30,
+        widget=forms.TextInput(attrs={'size': '5'}))
+
+    diffviewer_diff_compression = forms.ChoiceField(
+        label=_('Diff compression'),
+        help_text=_('The compression used when storing new diffs. Existing '
+                    'diffs can be converted with the recompressdiffs '
+                    'management command.'),
+        required=True)
+
+    diffviewer_diff_compression_level = forms.IntegerField(
+        label=_('Diff compression level'),
+        help_text=_('The compression level to use. This is 1-9 for bzip2, '
+                    'and 0-9 for zlib and LZMA, where higher levels compress '
+                    'more but take longer. Leave blank to use the default '
+                    'level for the chosen compression.'),
+        min_value=0,
+        required=False,
+        widget=forms.TextInput(attrs={'size': '5'}))
+
+    diffviewer_diff_compression_min_size = forms.IntegerField(
+        label=_('Minimum size to compress (bytes)'),
+        help_text=_('Diffs smaller than this will be stored uncompressed.'),
+        min_value=0,
+        initial=0,
+        widget=forms.TextInput(attrs={'size': '15'}))
+
     def load(self):
         """Load the form."""
+        self.fields['diffviewer_diff_compression'].choices = [
+            (codec.name, codec.label)
+            for codec in get_compression_codecs()
+            if codec.is_available()
+        ]
+
         super(DiffSettingsForm, self).load()
         self.fields['include_space_patterns'].initial = \
             ', '.join(self.siteconfig.get('diffviewer_include_space_patterns'))
 
+    def clean(self):
+        """Clean the form.
+
+        This checks that the compression level is valid for the chosen
+        compression.
+        """
+        cleaned_data = super(DiffSettingsForm, self).clean()
+        level = cleaned_data.get('diffviewer_diff_compression_level')
+        codec = get_compression_codec_by_name(
+            cleaned_data.get('diffviewer_diff_compression'))
+
+        if level is not None and codec is not None:
+            if codec.min_level is None:
+                error = (_('%s compression does not support levels.')
+                         % codec.name)
+            elif not codec.is_valid_level(level):
+                error = (
+                    _('The compression level for %(name)s must be between '
+                      '%(min_level)s and %(max_level)s.')
+                    % {
+                        'name': codec.name,
+                        'min_level': codec.min_level,
+                        'max_level': codec.max_level,
+                    })
+            else:
+                error = None
+
+            if error:
+                self._errors['diffviewer_diff_compression_level'] = \
+                    self.error_class([error])
+                del cleaned_data['diffviewer_diff_compression_level']
+
+        return cleaned_data
+
     def save(self):
         """Save the form."""
         self.siteconfig.set(
@@ -668,7 +777,15 @@ class DiffSettingsForm(SiteSettingsForm):
                 'fields': ('diffviewer_max_diff_size',
                            'diffviewer_context_num_lines',
                            'diffviewer_paginate_by',
-                           'diffviewer_paginate_orphans')
+                           'diffviewer_paginate_orphans',
+                           'diffviewer_store_file_contents',
+                           'diffviewer_patience_anchors',
+                           'diffviewer_chunk_generator_threads',
+                           'diffviewer_chunk_generator_timeout',
+                           'diffviewer_precompute_threads',
+                           'diffviewer_diff_compression',
+                           'diffviewer_diff_compression_level',
+                           'diffviewer_diff_compression_min_size')
             }
         )
 
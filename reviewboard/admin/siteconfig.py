@@ -133,14 +133,22 @@ defaults.update({
     'auth_x509_autocreate_users':          False,
     'company':                             '',
     'default_use_rich_text':               True,
+    'diffviewer_chunk_generator_threads':  0,
+    'diffviewer_chunk_generator_timeout':  30,
     'diffviewer_context_num_lines':        5,
+    'diffviewer_diff_compression':         'bzip2',
+    'diffviewer_diff_compression_level':   None,
+    'diffviewer_diff_compression_min_size': 0,
     'diffviewer_include_space_patterns':   [],
     'diffviewer_max_diff_size':            0,
     'diffviewer_paginate_by':              20,
     'diffviewer_paginate_orphans':         10,
+    'diffviewer_patience_anchors':         False,
+    'diffviewer_precompute_threads':       2,
     'diffviewer_syntax_highlighting':      True,
     'diffviewer_syntax_highlighting_threshold': 0,
     'diffviewer_show_trailing_whitespace': True,
+    'diffviewer_store_file_contents':      True,
     'integration_gravatars':               True,
     'mail_send_review_mail':               False,
     'mail_send_new_user_mail':             False,
@@ -148,6 +156,11 @@ defaults.update({
     'search_enable':                       False,
     'send_support_usage_stats':            True,
     'site_domain_method':                  'http',
+    'webhook_delivery_retention_days':     30,
+    'webhook_delivery_threads':            2,
+    'webhook_max_attempts':                8,
+    'webhook_max_concurrent_per_target':   2,
+    'webhook_timeout':                     10,
 
     # TODO: Allow relative paths for the index file later on.
     'search_index_file': os.path.join(settings.SITE_DATA_DIR,
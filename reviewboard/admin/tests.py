@@ -9,6 +9,7 @@ from django.forms import ValidationError
 from djblets.siteconfig.models import SiteConfiguration
 
 from reviewboard.admin import checks
+from reviewboard.admin.forms import DiffSettingsForm
 from reviewboard.ssh.client import SSHClient
 from reviewboard.admin.validation import validate_bug_tracker
 from reviewboard.site.urlresolvers import local_site_reverse
@@ -168,3 +169,55 @@ class SSHSettingsFormTestCase(TestCase):
 
         # Check whether the key has been deleted.
         self.assertEqual(self.ssh_client.get_user_key(), None)
+
+
+class DiffSettingsFormTests(TestCase):
+    """Unit tests for DiffSettingsForm."""
+
+    def setUp(self):
+        super(DiffSettingsFormTests, self).setUp()
+
+        self.siteconfig = SiteConfiguration.objects.get_current()
+
+    def test_compression_level(self):
+        """Testing DiffSettingsForm with a valid compression level"""
+        form = self._create_form('zlib', 0)
+
+        self.assertTrue(form.is_valid())
+        self.assertEqual(
+            form.cleaned_data['diffviewer_diff_compression_level'], 0)
+
+    def test_compression_level_too_low(self):
+        """Testing DiffSettingsForm with a compression level below the
+        codec's range
+        """
+        form = self._create_form('bzip2', 0)
+
+        self.assertFalse(form.is_valid())
+        self.assertIn('diffviewer_diff_compression_level', form.errors)
+
+    def test_compression_level_too_high(self):
+        """Testing DiffSettingsForm with a compression level above the
+        codec's range
+        """
+        form = self._create_form('zlib', 10)
+
+        self.assertFalse(form.is_valid())
+        self.assertIn('diffviewer_diff_compression_level', form.errors)
+
+    def _create_form(self, compression, level):
+        form = DiffSettingsForm(self.siteconfig, data={
+            'diffviewer_context_num_lines': 5,
+            'diffviewer_paginate_by': 20,
+            'diffviewer_paginate_orphans': 10,
+            'diffviewer_max_diff_size': 0,
+            'diffviewer_chunk_generator_threads': 0,
+            'diffviewer_precompute_threads': 0,
+            'diffviewer_chunk_generator_timeout': 30,
+            'diffviewer_diff_compression': compression,
+            'diffviewer_diff_compression_level': level,
+            'diffviewer_diff_compression_min_size': 0,
+        })
+        form.load()
+
+        return form
@@ -11,8 +11,7 @@ from djblets.cache.backend import cache_memoize
 from djblets.util.templatetags.djblets_images import thumbnail
 from pipeline.storage import default_storage
 from pygments import highlight
-from pygments.lexers import (ClassNotFound, guess_lexer_for_filename,
-                             TextLexer)
+from pygments.lexers import ClassNotFound, TextLexer
 import docutils.core
 import markdown
 import mimeparse
@@ -244,8 +243,8 @@ class TextMimetype(MimetypeHandler):
 
     def _generate_preview_html(self, data):
         """Return the first few truncated lines of the text file."""
-        from reviewboard.diffviewer.chunk_generator import \
-            NoWrapperHtmlFormatter
+        from reviewboard.diffviewer.syntax_highlighting import (
+            get_html_formatter, guess_lexer_for_filename)
 
         charset = self.mimetype[2].get('charset', 'ascii')
         try:
@@ -261,7 +260,7 @@ class TextMimetype(MimetypeHandler):
         except ClassNotFound:
             lexer = TextLexer()
 
-        lines = highlight(text, lexer, NoWrapperHtmlFormatter()).splitlines()
+        lines = highlight(text, lexer, get_html_formatter()).splitlines()
 
         return ''.join([
             '<pre>%s</pre>' % line
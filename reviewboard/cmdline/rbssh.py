@@ -48,6 +48,10 @@ import paramiko
 from reviewboard import get_version_string
 from reviewboard.scmtools.core import SCMTool
 from reviewboard.ssh.client import SSHClient
+from reviewboard.ssh.multiplex import (BUFFER_SIZE, DEFAULT_PERSIST_SECS,
+                                       ControlMaster, ensure_control_dir,
+                                       get_control_path, run_session,
+                                       write_fd)
 
 
 DEBUG = os.getenv('DEBUG_RBSSH')
@@ -62,12 +66,32 @@ class PlatformHandler(object):
     """A generic base class for wrapping platform-specific operations.
 
     This should be subclassed for each major platform.
+
+    Data is read and written in blocks of up to :py:data:`BUFFER_SIZE`
+    bytes, so that large transfers don't spend their time in this loop.
     """
 
-    def __init__(self, channel):
-        """Initialize the handler."""
+    def __init__(self, channel, stdin_fd=None, stdout_fd=None,
+                 stderr_fd=None):
+        """Initialize the handler.
+
+        The standard file descriptors are used unless others are provided.
+        """
         self.channel = channel
 
+        if stdin_fd is None:
+            stdin_fd = sys.stdin.fileno()
+
+        if stdout_fd is None:
+            stdout_fd = sys.stdout.fileno()
+
+        if stderr_fd is None:
+            stderr_fd = sys.stderr.fileno()
+
+        self.stdin_fd = stdin_fd
+        self.stdout_fd = stdout_fd
+        self.stderr_fd = stderr_fd
+
     def shell(self):
         """Open a shell."""
         raise NotImplementedError
@@ -83,26 +107,28 @@ class PlatformHandler(object):
 
         logging.debug('!! process_channel\n')
         if channel.recv_ready():
-            data = channel.recv(4096)
+            data = channel.recv(BUFFER_SIZE)
 
             if not data:
                 logging.debug('!! stdout empty\n')
                 return False
 
-            sys.stdout.write(data)
-            sys.stdout.flush()
+            write_fd(self.stdout_fd, data)
 
         if channel.recv_stderr_ready():
-            data = channel.recv_stderr(4096)
+            data = channel.recv_stderr(BUFFER_SIZE)
 
             if not data:
                 logging.debug('!! stderr empty\n')
                 return False
 
-            sys.stderr.write(data)
-            sys.stderr.flush()
+            write_fd(self.stderr_fd, data)
 
-        if channel.exit_status_ready():
+        # Any output that arrived before the exit status still needs to be
+        # written.
+        if (channel.exit_status_ready() and
+            not channel.recv_ready() and
+            not channel.recv_stderr_ready()):
             logging.debug('!!! exit_status_ready\n')
             return False
 
@@ -113,7 +139,7 @@ class PlatformHandler(object):
         logging.debug('!! process_stdin\n')
 
         try:
-            buf = os.read(sys.stdin.fileno(), 1)
+            buf = os.read(self.stdin_fd, BUFFER_SIZE)
         except OSError:
             buf = None
 
@@ -121,7 +147,7 @@ class PlatformHandler(object):
             logging.debug('!! stdin empty\n')
             return False
 
-        channel.send(buf)
+        channel.sendall(buf)
 
         return True
 
@@ -148,25 +174,31 @@ class PosixHandler(PlatformHandler):
         """Transfer data over the channel."""
         import fcntl
 
-        fd = sys.stdin.fileno()
+        fd = self.stdin_fd
         fl = fcntl.fcntl(fd, fcntl.F_GETFL)
         fcntl.fcntl(fd, fcntl.F_SETFL, fl | os.O_NONBLOCK)
 
         self.handle_communications()
 
     def handle_communications(self):
-        """Handle any pending data over the channel or stdin."""
+        """Handle any pending data over the channel or stdin.
+
+        Once stdin is closed, output from the channel is still written
+        until the remote end is done.
+        """
+        read_fds = [self.channel, self.stdin_fd]
+
         while True:
-            rl, wl, el = select.select([self.channel, sys.stdin], [], [])
+            rl, wl, el = select.select(read_fds, [], [])
 
             if self.channel in rl:
                 if not self.process_channel(self.channel):
                     break
 
-            if sys.stdin in rl:
+            if self.stdin_fd in rl:
                 if not self.process_stdin(self.channel):
                     self.channel.shutdown_write()
-                    break
+                    read_fds.remove(self.stdin_fd)
 
 
 class WindowsHandler(PlatformHandler):
@@ -248,6 +280,18 @@ def parse_options(args):
                       default=os.getenv('RB_LOCAL_SITE'),
                       help='the local site name containing the SSH keys to '
                            'use')
+    parser.add_option('--rb-control-dir',
+                      dest='control_dir', metavar='DIR',
+                      default=os.getenv('RBSSH_CONTROL_DIR'),
+                      help='share one connection to each server between '
+                           'invocations, using control sockets in this '
+                           'directory')
+    parser.add_option('--rb-control-persist',
+                      type='int', dest='control_persist', metavar='SECS',
+                      default=int(os.getenv('RBSSH_CONTROL_PERSIST',
+                                            DEFAULT_PERSIST_SECS)),
+                      help='the number of seconds to keep a shared '
+                           'connection open after its last use')
 
     (options, args) = parser.parse_args(args)
 
@@ -275,6 +319,122 @@ def parse_options(args):
     return hostname, port, args
 
 
+def connect(hostname, port, username):
+    """Connect and authenticate to the server.
+
+    This will prompt for a password if needed and possible. If the
+    connection fails, this exits.
+    """
+    client = SSHClient(namespace=options.local_site_name)
+    client.set_missing_host_key_policy(paramiko.WarningPolicy())
+
+    attempts = 0
+    password = None
+
+    key = client.get_user_key()
+
+    while True:
+        try:
+            client.connect(hostname, port, username=username,
+                           password=password, pkey=key,
+                           allow_agent=options.allow_agent)
+            break
+        except paramiko.AuthenticationException as e:
+            if attempts == 3 or not sys.stdin.isatty():
+                logging.error('Too many authentication failures for %s' %
+                              username)
+                sys.exit(1)
+
+            attempts += 1
+            password = getpass.getpass("%s@%s's password: " %
+                                       (username, hostname))
+        except paramiko.SSHException as e:
+            logging.error('Error connecting to server: %s' % e)
+            sys.exit(1)
+        except Exception as e:
+            logging.error('Unknown exception during connect: %s (%s)' %
+                          (e, type(e)))
+            sys.exit(1)
+
+    return client
+
+
+def run_multiplexed(hostname, port, username, command):
+    """Run the command or subsystem through a shared connection.
+
+    If there's no control master for the server, one is started in the
+    background. This returns the exit status, or None if the command
+    should be run over a new connection instead.
+    """
+    control_path = get_control_path(options.control_dir, username, hostname,
+                                    port, options.local_site_name)
+
+    if options.subsystem:
+        session_kwargs = {
+            'subsystem': options.subsystem,
+        }
+    else:
+        session_kwargs = {
+            'command': ' '.join(command),
+        }
+
+    status = run_session(control_path, **session_kwargs)
+
+    if (status is None and
+        start_control_master(control_path, hostname, port, username)):
+        status = run_session(control_path, **session_kwargs)
+
+    return status
+
+
+def start_control_master(control_path, hostname, port, username):
+    """Start a control master for the server in the background.
+
+    The master is fully detached from this process, so that it doesn't
+    hold onto the caller's standard file descriptors. It can't prompt for
+    a password, so it only works with keys or an SSH agent.
+
+    This returns whether the master is ready for sessions.
+    """
+    if not ensure_control_dir(options.control_dir):
+        return False
+
+    ready_r, ready_w = os.pipe()
+    pid = os.fork()
+
+    if pid == 0:
+        try:
+            os.close(ready_r)
+            os.setsid()
+
+            devnull = os.open(os.devnull, os.O_RDWR)
+
+            for fd in (0, 1, 2):
+                os.dup2(devnull, fd)
+
+            if os.fork() == 0:
+                client = connect(hostname, port, username)
+                master = ControlMaster(client.get_transport(), control_path,
+                                       options.control_persist)
+
+                if master.listen():
+                    os.write(ready_w, b'1')
+                    os.close(ready_w)
+                    master.serve()
+        except BaseException as e:
+            logging.debug('!!! Control master exited: %s', e)
+        finally:
+            os._exit(0)
+
+    os.close(ready_w)
+    os.waitpid(pid, 0)
+
+    try:
+        return os.read(ready_r, 1) == b'1'
+    finally:
+        os.close(ready_r)
+
+
 def main():
     """Run the application."""
     if DEBUG:
@@ -314,36 +474,15 @@ def main():
 
     logging.debug('!!! %s, %s, %s' % (hostname, username, command))
 
-    client = SSHClient(namespace=options.local_site_name)
-    client.set_missing_host_key_policy(paramiko.WarningPolicy())
+    if (options.control_dir and (options.subsystem or command) and
+        sys.platform not in ('cygwin', 'win32')):
+        status = run_multiplexed(hostname, port, username, command)
 
-    attempts = 0
-    password = None
+        if status is not None:
+            logging.debug('!!! Done')
+            return status
 
-    key = client.get_user_key()
-
-    while True:
-        try:
-            client.connect(hostname, port, username=username,
-                           password=password, pkey=key,
-                           allow_agent=options.allow_agent)
-            break
-        except paramiko.AuthenticationException as e:
-            if attempts == 3 or not sys.stdin.isatty():
-                logging.error('Too many authentication failures for %s' %
-                              username)
-                sys.exit(1)
-
-            attempts += 1
-            password = getpass.getpass("%s@%s's password: " %
-                                       (username, hostname))
-        except paramiko.SSHException as e:
-            logging.error('Error connecting to server: %s' % e)
-            sys.exit(1)
-        except Exception as e:
-            logging.error('Unknown exception during connect: %s (%s)' %
-                          (e, type(e)))
-            sys.exit(1)
+    client = connect(hostname, port, username)
 
     transport = client.get_transport()
     channel = transport.open_session()
@@ -764,7 +764,7 @@ class DiffSizeColumn(Column):
         except ObjectDoesNotExist:
             return ''
 
-        counts = diffset.get_total_line_counts()
+        counts = diffset.get_total_raw_line_counts()
         insert_count = counts['raw_insert_count']
         delete_count = counts['raw_delete_count']
         result = []
@@ -0,0 +1,13 @@
+from __future__ import unicode_literals
+
+from reviewboard.signals import initializing
+
+
+def _connect_signals(**kwargs):
+    """Connects the diffviewer's signal handlers once Django is loaded."""
+    from reviewboard.diffviewer import precompute
+
+    precompute.connect_signals()
+
+
+initializing.connect(_connect_signals)
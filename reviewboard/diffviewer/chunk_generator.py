@@ -2,7 +2,6 @@ from __future__ import unicode_literals
 
 import fnmatch
 import functools
-import hashlib
 import re
 
 from django.utils import six
@@ -14,35 +13,23 @@ from djblets.log import log_timed
 from djblets.cache.backend import cache_memoize
 from djblets.siteconfig.models import SiteConfiguration
 from pygments import highlight
-from pygments.lexers import get_lexer_for_filename
-from pygments.formatters import HtmlFormatter
 
+from reviewboard.diffviewer.chunk_serializer import SerializedChunks
 from reviewboard.diffviewer.differ import DiffCompatVersion, get_differ
+from reviewboard.diffviewer.errors import ChunkGenerationCancelledError
 from reviewboard.diffviewer.diffutils import (get_line_changed_regions,
+                                              get_line_markup_text,
+                                              get_interdiff_files,
                                               get_original_file,
                                               get_patched_file,
                                               convert_to_unicode,
                                               split_line_endings)
 from reviewboard.diffviewer.opcode_generator import (DiffOpcodeGenerator,
                                                      get_diff_opcode_generator)
-
-
-class NoWrapperHtmlFormatter(HtmlFormatter):
-    """An HTML Formatter for Pygments that doesn't wrap items in a div."""
-    def __init__(self, *args, **kwargs):
-        super(NoWrapperHtmlFormatter, self).__init__(*args, **kwargs)
-
-    def _wrap_div(self, inner):
-        """Removes the div wrapper from formatted code.
-
-        This is called by the formatter to wrap the contents of inner.
-        Inner is a list of tuples containing formatted code. If the first item
-        in the tuple is zero, then it's the div wrapper, so we should ignore
-        it.
-        """
-        for tup in inner:
-            if tup[0]:
-                yield tup
+from reviewboard.diffviewer.processors import get_interdiff_ranges
+from reviewboard.diffviewer.syntax_highlighting import (
+    HIGHLIGHTING_RESYNC_LINES, NoWrapperHtmlFormatter, get_html_formatter,
+    get_lexer_for_filename, highlight_line_ranges)
 
 
 class RawDiffChunkGenerator(object):
@@ -65,9 +52,20 @@ class RawDiffChunkGenerator(object):
     STYLED_MAX_LINE_LEN = 1000
     STYLED_MAX_LIMIT_BYTES = 200000  # 200KB
 
+    # Files with more lines than this only have the lines shown by default
+    # highlighted. Lines in collapsed chunks are highlighted when the chunks
+    # are expanded. See highlight_chunk_lines().
+    PARTIAL_HIGHLIGHTING_MIN_LINES = 2000
+
     # Default tab size used in browsers.
     TAB_SIZE = DiffOpcodeGenerator.TAB_SIZE
 
+    # Whether to leave computing the changed regions within replaced lines
+    # until the chunks are rendered. This is ignored for subclasses that
+    # override get_line_changed_regions(), since the deferred regions are
+    # computed without the generator.
+    DEFER_LINE_CHANGED_REGIONS = False
+
     def __init__(self, old, new, orig_filename, modified_filename,
                  enable_syntax_highlighting=True, encoding_list=None,
                  diff_compat=DiffCompatVersion.DEFAULT):
@@ -80,10 +78,28 @@ class RawDiffChunkGenerator(object):
         self.diff_compat = diff_compat
         self.differ = None
 
+        self._defer_line_changed_regions = (
+            self.DEFER_LINE_CHANGED_REGIONS and
+            (six.get_unbound_function(type(self).get_line_changed_regions) is
+             six.get_unbound_function(
+                 RawDiffChunkGenerator.get_line_changed_regions)))
+
         # Chunk processing state.
         self._last_header = [None, None]
         self._last_header_index = [0, 0]
         self._chunk_index = 0
+        self._deferred_highlighting = None
+        self._deferred_highlighting_lines = None
+        self._cancelled = False
+
+    def cancel(self):
+        """Cancel generating chunks in another thread.
+
+        Chunk generation will stop with a ChunkGenerationCancelledError at
+        the next chunk, or before the chunks are finished, so that the chunks
+        aren't cached or used.
+        """
+        self._cancelled = True
 
     def get_opcode_generator(self):
         """Return the DiffOpcodeGenerator used to generate diff opcodes."""
@@ -97,15 +113,85 @@ class RawDiffChunkGenerator(object):
         stored in cache (given a cache key), and yielded.
         """
         if cache_key:
-            chunks = cache_memoize(cache_key,
-                                   lambda: list(self.get_chunks_uncached()),
-                                   large_data=True)
+            chunks = self.get_serialized_chunks(cache_key)
         else:
             chunks = self.get_chunks_uncached()
 
         for chunk in chunks:
             yield chunk
 
+    def get_serialized_chunks(self, cache_key):
+        """Return the chunks for the given diff information, using the cache.
+
+        The chunks are returned as a
+        :py:class:`~reviewboard.diffviewer.chunk_serializer.SerializedChunks`,
+        which is what's stored in the cache. Each chunk is only decoded when
+        it's accessed.
+
+        If the cache has chunks stored in an older format, they'll be
+        regenerated.
+        """
+        def _make_serialized_chunks():
+            return SerializedChunks(list(self.get_chunks_uncached()))
+
+        chunks = cache_memoize(cache_key, _make_serialized_chunks,
+                               large_data=True)
+
+        if not isinstance(chunks, SerializedChunks) or not chunks.is_current():
+            chunks = cache_memoize(cache_key, _make_serialized_chunks,
+                                   large_data=True, force_overwrite=True)
+
+        return chunks
+
+    def get_serialized_chunk(self, cache_key, index):
+        """Return a single chunk for the given diff information.
+
+        Each chunk is also cached on its own, keyed by its index, and the
+        summaries of all the chunks are cached once for the file. Looking up
+        a chunk this way only needs to load those two entries, regardless of
+        the size of the file. The first lookup will load them from the
+        cached chunks for the whole file (generating them if needed).
+
+        This returns a tuple of the chunk and the summaries of all the chunks
+        (see :py:meth:`SerializedChunks.get_summaries`). The chunk will be
+        ``None`` if the index is out of range.
+        """
+        loaded_chunks = []
+
+        def _get_chunks():
+            if not loaded_chunks:
+                loaded_chunks.append(self.get_serialized_chunks(cache_key))
+
+            return loaded_chunks[0]
+
+        summaries = cache_memoize(
+            '%s-chunk-summaries-v%d' % (cache_key, SerializedChunks.VERSION),
+            lambda: _get_chunks().get_summaries(),
+            large_data=True)
+
+        if not 0 <= index < len(summaries):
+            return None, summaries
+
+        def _get_payload():
+            payload = _get_chunks().payloads[index]
+            chunk = SerializedChunks.decode_payload(payload)
+
+            if chunk['meta'].get('deferred_highlighting'):
+                # This is a collapsed chunk being expanded. Highlight it
+                # now, so that the highlighted lines are what's cached.
+                highlight_chunk_lines(chunk)
+                payload = SerializedChunks.encode_chunk(chunk)
+
+            return payload
+
+        payload = cache_memoize(
+            '%s-chunk-payload-%d-v%d'
+            % (cache_key, index, SerializedChunks.VERSION),
+            _get_payload,
+            large_data=True)
+
+        return SerializedChunks.decode_payload(payload), summaries
+
     def get_chunks_uncached(self):
         """Yield the list of chunks, bypassing the cache."""
         for chunk in self.generate_chunks(self.old, self.new):
@@ -143,6 +229,25 @@ class RawDiffChunkGenerator(object):
         a_num_lines = len(a)
         b_num_lines = len(b)
 
+        siteconfig = SiteConfiguration.objects.get_current()
+        ignore_space = True
+
+        for pattern in siteconfig.get('diffviewer_include_space_patterns'):
+            if fnmatch.fnmatch(self.orig_filename, pattern):
+                ignore_space = False
+                break
+
+        self.differ = get_differ(a, b, ignore_space=ignore_space,
+                                 compat_version=self.diff_compat)
+        self.differ.add_interesting_lines_for_headers(self.orig_filename)
+
+        context_num_lines = siteconfig.get("diffviewer_context_num_lines")
+        collapse_threshold = 2 * context_num_lines + 3
+
+        # The opcodes are needed up-front, so that we know which lines to
+        # highlight.
+        opcodes = list(self.get_opcode_generator())
+
         if is_lists:
             markup_a = a
             markup_b = b
@@ -155,38 +260,31 @@ class RawDiffChunkGenerator(object):
                     self.normalize_path_for_display(self.orig_filename)
                 dest_file = \
                     self.normalize_path_for_display(self.modified_filename)
+                a_ranges, b_ranges = self._get_highlighted_line_ranges(
+                    opcodes, a_num_lines, b_num_lines, context_num_lines,
+                    collapse_threshold)
 
                 try:
-                    # TODO: Try to figure out the right lexer for these files
-                    #       once instead of twice.
-                    markup_a = self._apply_pygments(old or '', source_file)
-                    markup_b = self._apply_pygments(new or '', dest_file)
+                    markup_a = self._apply_pygments(old or '', source_file,
+                                                    a, a_ranges)
+                    markup_b = self._apply_pygments(new or '', dest_file,
+                                                    b, b_ranges)
                 except:
                     pass
 
+                if a_ranges is not None and markup_a and markup_b:
+                    # The collapsed chunks will be highlighted if they're
+                    # ever expanded.
+                    self._deferred_highlighting = [source_file, dest_file]
+                    self._deferred_highlighting_lines = (a, b)
+
             if not markup_a:
                 markup_a = self.NEWLINES_RE.split(escape(old))
 
             if not markup_b:
                 markup_b = self.NEWLINES_RE.split(escape(new))
 
-        siteconfig = SiteConfiguration.objects.get_current()
-        ignore_space = True
-
-        for pattern in siteconfig.get('diffviewer_include_space_patterns'):
-            if fnmatch.fnmatch(self.orig_filename, pattern):
-                ignore_space = False
-                break
-
-        self.differ = get_differ(a, b, ignore_space=ignore_space,
-                                 compat_version=self.diff_compat)
-        self.differ.add_interesting_lines_for_headers(self.orig_filename)
-
-        context_num_lines = siteconfig.get("diffviewer_context_num_lines")
-        collapse_threshold = 2 * context_num_lines + 3
-
         line_num = 1
-        opcodes_generator = self.get_opcode_generator()
 
         counts = {
             'equal': 0,
@@ -195,7 +293,9 @@ class RawDiffChunkGenerator(object):
             'delete': 0,
         }
 
-        for tag, i1, i2, j1, j2, meta in opcodes_generator:
+        for tag, i1, i2, j1, j2, meta in opcodes:
+            self._check_cancelled()
+
             old_lines = markup_a[i1:i2]
             new_lines = markup_b[j1:j2]
             num_lines = max(len(old_lines), len(new_lines))
@@ -229,6 +329,7 @@ class RawDiffChunkGenerator(object):
 
             line_num += num_lines
 
+        self._check_cancelled()
         self.counts = counts
 
     def normalize_source_string(self, s):
@@ -354,11 +455,17 @@ class RawDiffChunkGenerator(object):
             len(old_line) <= self.STYLED_MAX_LINE_LEN and
             len(new_line) <= self.STYLED_MAX_LINE_LEN and
             old_line != new_line):
-            # Generate information on the regions that changed between the
-            # two lines.
-            old_region, new_region = \
-                self.get_line_changed_regions(old_line_num, old_line,
-                                              new_line_num, new_line)
+            if self._defer_line_changed_regions:
+                # These will be computed from the markup when the chunk is
+                # needed. See compute_chunk_line_changed_regions().
+                old_region = new_region = None
+                meta['line_changed_regions_deferred'] = True
+            else:
+                # Generate information on the regions that changed between
+                # the two lines.
+                old_region, new_region = \
+                    self.get_line_changed_regions(old_line_num, old_line,
+                                                  new_line_num, new_line)
         else:
             old_region = new_region = []
 
@@ -536,6 +643,11 @@ class RawDiffChunkGenerator(object):
 
         return s, chars[j + 1:]
 
+    def _check_cancelled(self):
+        """Raise an error if generating chunks has been cancelled."""
+        if self._cancelled:
+            raise ChunkGenerationCancelledError
+
     def _new_chunk(self, all_lines, start, end, collapsable=False,
                    tag='equal', meta=None):
         """Creates a chunk.
@@ -566,6 +678,20 @@ class RawDiffChunkGenerator(object):
                 (self._last_header[0] or self._last_header[1])):
             meta['headers'] = list(self._last_header)
 
+        if collapsable and self._deferred_highlighting:
+            meta['deferred_highlighting'] = list(self._deferred_highlighting)
+
+            # The lines leading up to the chunk are needed to get the lexer
+            # into the right state (for instance, inside a multi-line string
+            # or comment) when the chunk is highlighted on its own.
+            a, b = self._deferred_highlighting_lines
+            old_start = lines[0][1] - 1
+            new_start = lines[0][4] - 1
+            meta['deferred_highlighting_context'] = [
+                a[max(0, old_start - HIGHLIGHTING_RESYNC_LINES):old_start],
+                b[max(0, new_start - HIGHLIGHTING_RESYNC_LINES):new_start],
+            ]
+
         chunk = {
             'index': self._chunk_index,
             'lines': lines,
@@ -618,18 +744,79 @@ class RawDiffChunkGenerator(object):
         else:
             self._last_header_index[0] = last_index
 
-    def _apply_pygments(self, data, filename):
+    def _apply_pygments(self, data, filename, lines=None, line_ranges=None):
         """Applies Pygments syntax-highlighting to a file's contents.
 
         The resulting HTML will be returned as a list of lines.
+
+        If ``line_ranges`` is provided, only those ranges of the file's
+        ``lines`` will be highlighted, and all other lines will be escaped.
+        """
+        lexer = _get_highlighting_lexer(filename)
+
+        if line_ranges is None:
+            return split_line_endings(
+                highlight(data, lexer, get_html_formatter()))
+
+        return [
+            markup if markup is not None else escape(line)
+            for line, markup in zip(
+                lines, highlight_line_ranges(lines, lexer, line_ranges))
+        ]
+
+    def _get_highlighted_line_ranges(self, opcodes, a_num_lines,
+                                     b_num_lines, context_num_lines,
+                                     collapse_threshold):
+        """Returns the ranges of lines to highlight in each file.
+
+        For files with more than :py:attr:`PARTIAL_HIGHLIGHTING_MIN_LINES`
+        lines, only the lines that will be shown before expanding any
+        collapsed chunks (the changed lines and the context around them)
+        are highlighted. This returns a tuple of lists of ``(start, end)``
+        line index ranges for the original and modified files.
+
+        If the whole file should be highlighted, or most of the file would
+        be shown anyway, this returns ``(None, None)``.
         """
-        lexer = get_lexer_for_filename(filename,
-                                       stripnl=False,
-                                       encoding='utf-8')
-        lexer.add_filter('codetagify')
+        if (max(a_num_lines, b_num_lines) <=
+                self.PARTIAL_HIGHLIGHTING_MIN_LINES):
+            return None, None
+
+        a_ranges = []
+        b_ranges = []
+        num_shown_lines = 0
+
+        for i, (tag, i1, i2, j1, j2, meta) in enumerate(opcodes):
+            num_lines = max(i2 - i1, j2 - j1)
+
+            if tag == 'equal' and num_lines > collapse_threshold:
+                # This matches how the collapsed chunks are built in
+                # generate_chunks().
+                if i == 0:
+                    shown = [(num_lines - context_num_lines, num_lines)]
+                elif i2 == a_num_lines and j2 == b_num_lines:
+                    shown = [(0, context_num_lines)]
+                else:
+                    shown = [(0, context_num_lines),
+                             (num_lines - context_num_lines, num_lines)]
+
+                for start, end in shown:
+                    a_ranges.append((i1 + start, i1 + end))
+                    b_ranges.append((j1 + start, j1 + end))
+                    num_shown_lines += end - start
+            else:
+                if i2 > i1:
+                    a_ranges.append((i1, i2))
+
+                if j2 > j1:
+                    b_ranges.append((j1, j2))
 
-        return split_line_endings(
-            highlight(data, lexer, NoWrapperHtmlFormatter()))
+                num_shown_lines += num_lines
+
+        if num_shown_lines * 2 > max(a_num_lines, b_num_lines):
+            return None, None
+
+        return a_ranges, b_ranges
 
 
 class DiffChunkGenerator(RawDiffChunkGenerator):
@@ -671,6 +858,8 @@ class DiffChunkGenerator(RawDiffChunkGenerator):
        grab a patched file for the interdiff version.
     """
 
+    DEFER_LINE_CHANGED_REGIONS = True
+
     def __init__(self, request, filediff, interfilediff=None,
                  force_interdiff=False, enable_syntax_highlighting=True):
         assert filediff
@@ -716,11 +905,20 @@ class DiffChunkGenerator(RawDiffChunkGenerator):
         diff = self.filediff.diff
 
         if self.interfilediff:
-            interdiff = self.interfilediff.diff
+            opcode_generator = get_diff_opcode_generator(
+                self.differ, diff, self.interfilediff.diff)
+
+            # These are set after construction, rather than passed in, so
+            # that custom opcode generator classes taking only
+            # (differ, diff, interdiff) still work.
+            opcode_generator.diff_ranges = \
+                self._get_interdiff_ranges(self.filediff)
+            opcode_generator.interdiff_ranges = \
+                self._get_interdiff_ranges(self.interfilediff)
+
+            return opcode_generator
         else:
-            interdiff = None
-
-        return get_diff_opcode_generator(self.differ, diff, interdiff)
+            return get_diff_opcode_generator(self.differ, diff)
 
     def get_chunks(self):
         """Return the chunks for the given diff information.
@@ -733,51 +931,46 @@ class DiffChunkGenerator(RawDiffChunkGenerator):
         yielded. Otherwise, new chunks will be generated, stored in cache,
         and yielded.
         """
-        counts = self.filediff.get_line_counts()
+        for chunk in self.get_cached_chunks():
+            yield chunk
 
-        if (self.filediff.binary or
-            self.filediff.source_revision == '' or
-            ((self.filediff.is_new or self.filediff.deleted or
-              self.filediff.moved or self.filediff.copied) and
-             counts['raw_insert_count'] == 0 and
-             counts['raw_delete_count'] == 0)):
-            raise StopIteration
+    def get_cached_chunks(self):
+        """Return a sequence of the chunks for the given diff information.
+
+        This works like :py:meth:`get_chunks`, but returns the chunks from
+        :py:meth:`get_serialized_chunks`, rather than yielding each one. This
+        allows callers to access only the chunks they need, without decoding
+        the rest.
+        """
+        if not self._has_chunks():
+            return []
 
-        cache_key = self.make_cache_key()
+        return self.get_serialized_chunks(self.make_cache_key())
 
-        for chunk in super(DiffChunkGenerator, self).get_chunks(cache_key):
-            yield chunk
+    def get_cached_chunk(self, index):
+        """Return a single chunk for the given diff information.
 
-    def get_chunks_uncached(self):
-        """Yield the list of chunks, bypassing the cache."""
-        old = get_original_file(self.filediff, self.request,
-                                self.encoding_list)
-        new = get_patched_file(old, self.filediff, self.request)
+        This returns a tuple of the chunk and the summaries of all the
+        chunks, as described in :py:meth:`get_serialized_chunk`.
+        """
+        if not self._has_chunks():
+            return None, []
 
-        if self.filediff.orig_sha1 is None:
-            self.filediff.extra_data.update({
-                'orig_sha1': self._get_checksum(old),
-                'patched_sha1': self._get_checksum(new),
-            })
-            self.filediff.save(update_fields=['extra_data'])
+        return self.get_serialized_chunk(self.make_cache_key(), index)
 
+    def get_chunks_uncached(self):
+        """Yield the list of chunks, bypassing the cache."""
         if self.interfilediff:
-            old = new
-            interdiff_orig = get_original_file(self.interfilediff,
-                                               self.request,
-                                               self.encoding_list)
-            new = get_patched_file(interdiff_orig, self.interfilediff,
-                                   self.request)
-
-            if self.interfilediff.orig_sha1 is None:
-                self.interfilediff.extra_data.update({
-                    'orig_sha1': self._get_checksum(interdiff_orig),
-                    'patched_sha1': self._get_checksum(new),
-                })
-                self.interfilediff.save(update_fields=['extra_data'])
-        elif self.force_interdiff:
-            # Basically, revert the change.
-            old, new = new, old
+            old, new = get_interdiff_files(self.filediff, self.interfilediff,
+                                           self.request, self.encoding_list)
+        else:
+            old = get_original_file(self.filediff, self.request,
+                                    self.encoding_list)
+            new = get_patched_file(old, self.filediff, self.request)
+
+            if self.force_interdiff:
+                # Basically, revert the change.
+                old, new = new, old
 
         if self.interfilediff:
             log_timer = log_timed(
@@ -813,10 +1006,37 @@ class DiffChunkGenerator(RawDiffChunkGenerator):
     def normalize_path_for_display(self, filename):
         return self.tool.normalize_path_for_display(filename)
 
-    def _get_checksum(self, content):
-        hasher = hashlib.sha1()
-        hasher.update(content)
-        return hasher.hexdigest()
+    def _get_interdiff_ranges(self, filediff):
+        """Returns the ranges of changed lines in a FileDiff's diff.
+
+        These are the ranges used to filter interdiffs, as returned by
+        :py:func:`~reviewboard.diffviewer.processors.get_interdiff_ranges`.
+        A diff is compared against each of the other revisions of the file
+        in turn, so the ranges are cached by the diff's hash rather than
+        being computed again for every interdiff.
+        """
+        if not filediff.diff_hash_id:
+            return get_interdiff_ranges(filediff.diff)
+
+        return cache_memoize(
+            'diff-interdiff-ranges-%s' % filediff.diff_hash_id,
+            lambda: get_interdiff_ranges(filediff.diff))
+
+    def _has_chunks(self):
+        """Returns whether there are any chunks to show for the file.
+
+        Binary files, added or deleted 0-length files, and files that have
+        moved with no additional changes have no chunks.
+        """
+        counts = self.filediff.get_line_counts()
+
+        return not (
+            self.filediff.binary or
+            self.filediff.source_revision == '' or
+            ((self.filediff.is_new or self.filediff.deleted or
+              self.filediff.moved or self.filediff.copied) and
+             counts['raw_insert_count'] == 0 and
+             counts['raw_delete_count'] == 0))
 
 
 def compute_chunk_last_header(lines, numlines, meta, last_header=None):
@@ -851,6 +1071,63 @@ def compute_chunk_last_header(lines, numlines, meta, last_header=None):
 _generator = DiffChunkGenerator
 
 
+def highlight_chunk_lines(chunk):
+    """Highlights the lines of a chunk that was left unhighlighted.
+
+    For large files, lines in collapsed chunks aren't syntax-highlighted
+    when the chunks are generated. Those chunks have
+    ``deferred_highlighting`` set in their metadata to the filenames used
+    to find the lexers for each side, and are highlighted by this when
+    they're expanded. The lines leading up to the chunk, stored in
+    ``deferred_highlighting_context``, are lexed first, the same way as
+    when the other chunks were highlighted.
+
+    The lines are updated in place, so this can safely be called more than
+    once for a chunk. Any lines that can't be highlighted keep their
+    escaped text.
+    """
+    meta = chunk.get('meta', {})
+    filenames = meta.pop('deferred_highlighting', None)
+    contexts = meta.pop('deferred_highlighting_context', None) or [[], []]
+
+    if not filenames:
+        return
+
+    lines = chunk['lines']
+
+    for markup_index, filename, context in ((2, filenames[0], contexts[0]),
+                                            (5, filenames[1], contexts[1])):
+        num_context_lines = len(context)
+        text = list(context)
+        text.extend(
+            get_line_markup_text(line[markup_index])
+            for line in lines
+        )
+
+        try:
+            markup = highlight_line_ranges(
+                text,
+                _get_highlighting_lexer(filename),
+                [(num_context_lines, len(text))],
+                resync_lines=num_context_lines)
+        except:
+            continue
+
+        for line, line_markup in zip(lines, markup[num_context_lines:]):
+            if line_markup is not None:
+                line[markup_index] = mark_safe(line_markup)
+
+
+def _get_highlighting_lexer(filename):
+    """Returns the lexer used to highlight the lines of a file."""
+    lexer = get_lexer_for_filename(filename,
+                                   stripnl=False,
+                                   encoding='utf-8')
+    lexer.add_filter('codetagify')
+
+    return lexer
+
+
 def get_diff_chunk_generator_class():
     """Returns the DiffChunkGenerator class used for generating chunks."""
     return _generator
@@ -866,3 +1143,17 @@ def set_diff_chunk_generator_class(renderer):
 def get_diff_chunk_generator(*args, **kwargs):
     """Returns a DiffChunkGenerator instance used for generating chunks."""
     return _generator(*args, **kwargs)
+
+
+# NoWrapperHtmlFormatter used to live in this module, and is still exported
+# from here for any code that imports it from this module.
+__all__ = [
+    'DiffChunkGenerator',
+    'NoWrapperHtmlFormatter',
+    'RawDiffChunkGenerator',
+    'compute_chunk_last_header',
+    'get_diff_chunk_generator',
+    'get_diff_chunk_generator_class',
+    'highlight_chunk_lines',
+    'set_diff_chunk_generator_class',
+]
@@ -0,0 +1,198 @@
+"""A compact serialized form for lists of diff chunks.
+
+Chunks for large files can be big, and are stored in the cache. Pickling
+them as-is stores every line as a list of values, with the same markup
+often stored twice (for equal lines), and every cache hit has to unpickle
+every line of every chunk, even if only one chunk is going to be rendered.
+
+:py:class:`SerializedChunks` instead stores each chunk separately as a
+compressed, columnar payload, along with a small summary of each chunk.
+Chunks are only decoded when they're accessed.
+"""
+
+from __future__ import unicode_literals
+
+import zlib
+
+from django.utils import six
+from django.utils.safestring import mark_safe
+from django.utils.six.moves import cPickle as pickle
+from django.utils.six.moves import range
+
+
+class SerializedChunks(object):
+    """A compact, lazily-decoded list of diff chunks.
+
+    This can be used like a read-only list of chunks. Each chunk is decoded
+    the first time it's accessed, and the decoded chunk is then kept, so
+    that changes made to it will be seen by later accesses.
+
+    The serialized data is versioned. If the format changes, the
+    :py:attr:`VERSION` must be bumped, and any stored data in an older
+    format should be regenerated (see :py:meth:`is_current`).
+    """
+
+    #: The version of the serialized format.
+    VERSION = 2
+
+    def __init__(self, chunks):
+        self.version = self.VERSION
+        self.summaries = []
+        self.payloads = []
+        self._decoded = {}
+
+        for chunk in chunks:
+            meta = chunk.get('meta', {})
+
+            self.summaries.append({
+                'index': chunk['index'],
+                'change': chunk['change'],
+                'numlines': chunk['numlines'],
+                'meta': {
+                    'whitespace_chunk': meta.get('whitespace_chunk', False),
+                },
+            })
+            self.payloads.append(self.encode_chunk(chunk))
+
+    def is_current(self):
+        """Returns whether the data was serialized in the current format."""
+        return self.version == self.VERSION
+
+    def get_summaries(self):
+        """Returns a summary of each chunk, without decoding the chunks.
+
+        Each summary is a dictionary containing the ``index``, ``change``
+        and ``numlines`` of the chunk, and a ``meta`` dictionary containing
+        ``whitespace_chunk``.
+        """
+        return self.summaries
+
+    def __len__(self):
+        return len(self.payloads)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [
+                self[i]
+                for i in range(*index.indices(len(self)))
+            ]
+
+        if index < 0:
+            index += len(self)
+
+        if index < 0 or index >= len(self):
+            raise IndexError('chunk index out of range')
+
+        try:
+            return self._decoded[index]
+        except KeyError:
+            chunk = self.decode_payload(self.payloads[index])
+            self._decoded[index] = chunk
+
+            return chunk
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __getstate__(self):
+        return {
+            'version': self.version,
+            'summaries': self.summaries,
+            'payloads': self.payloads,
+        }
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._decoded = {}
+
+    @classmethod
+    def encode_chunk(cls, chunk):
+        """Encodes a chunk into a compressed payload.
+
+        The lines are stored as columns. The markup for both sides of every
+        line is stored once in a table of strings, with the columns holding
+        indexes into it.
+
+        The payload can be decoded with :py:meth:`decode_payload`.
+        """
+        strings = []
+        string_ids = {}
+
+        def _get_string_id(s):
+            s = six.text_type(s)
+
+            try:
+                return string_ids[s]
+            except KeyError:
+                string_id = len(strings)
+                string_ids[s] = string_id
+                strings.append(s)
+
+                return string_id
+
+        lines = chunk['lines']
+
+        columns = {
+            'first_line_num': lines[0][0] if lines else 0,
+            'old_line_nums': [line[1] for line in lines],
+            'old_markup': [_get_string_id(line[2]) for line in lines],
+            'old_regions': [line[3] for line in lines],
+            'new_line_nums': [line[4] for line in lines],
+            'new_markup': [_get_string_id(line[5]) for line in lines],
+            'new_regions': [line[6] for line in lines],
+            'whitespace_lines': [
+                i
+                for i, line in enumerate(lines)
+                if line[7]
+            ],
+            'moved': dict(
+                (i, line[8])
+                for i, line in enumerate(lines)
+                if len(line) > 8
+            ),
+        }
+
+        chunk_info = dict(
+            (key, value)
+            for key, value in six.iteritems(chunk)
+            if key != 'lines'
+        )
+
+        return zlib.compress(pickle.dumps((chunk_info, strings, columns),
+                                          pickle.HIGHEST_PROTOCOL))
+
+    @classmethod
+    def decode_payload(cls, payload):
+        """Decodes a chunk from one of the payloads in :py:attr:`payloads`.
+
+        This can be used to decode payloads stored on their own.
+        """
+        chunk, strings, columns = pickle.loads(zlib.decompress(payload))
+
+        strings = [mark_safe(s) for s in strings]
+        whitespace_lines = set(columns['whitespace_lines'])
+        moved = columns['moved']
+        line_num = columns['first_line_num']
+        lines = []
+
+        for i, (old_line_num, old_markup_id, old_region,
+                new_line_num, new_markup_id, new_region) in enumerate(zip(
+                    columns['old_line_nums'], columns['old_markup'],
+                    columns['old_regions'], columns['new_line_nums'],
+                    columns['new_markup'], columns['new_regions'])):
+            line = [
+                line_num + i,
+                old_line_num, strings[old_markup_id], old_region,
+                new_line_num, strings[new_markup_id], new_region,
+                i in whitespace_lines,
+            ]
+
+            if i in moved:
+                line.append(moved[i])
+
+            lines.append(line)
+
+        chunk['lines'] = lines
+
+        return chunk
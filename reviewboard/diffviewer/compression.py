@@ -0,0 +1,184 @@
+"""Compression codecs for stored diff data.
+
+Each codec is identified by a single-character code, which is what gets
+stored in :py:attr:`RawFileDiffData.compression`. Extensions can register
+additional codecs using :py:func:`register_compression_codec`.
+"""
+
+from __future__ import unicode_literals
+
+import bz2
+import zlib
+
+from django.utils.translation import ugettext_lazy as _
+
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
+
+class CompressionCodec(object):
+    """A codec used to compress and decompress stored diff data.
+
+    Subclasses must set :py:attr:`code`, :py:attr:`name` and
+    :py:attr:`label`, and implement :py:meth:`compress` and
+    :py:meth:`decompress`.
+    """
+
+    #: The single-character code stored in the database.
+    code = None
+
+    #: The name used to choose the codec in the site configuration.
+    name = None
+
+    #: The human-readable name of the codec.
+    label = None
+
+    #: The default compression level, if the codec supports levels.
+    default_level = None
+
+    #: The lowest compression level, if the codec supports levels.
+    min_level = None
+
+    #: The highest compression level, if the codec supports levels.
+    max_level = None
+
+    def is_available(self):
+        """Returns whether the codec can be used on this system."""
+        return True
+
+    def is_valid_level(self, level):
+        """Returns whether a compression level can be used with the codec."""
+        return (self.min_level is not None and
+                self.min_level <= level <= self.max_level)
+
+    def compress(self, data, level=None):
+        """Returns the compressed version of some data.
+
+        If ``level`` is None, :py:attr:`default_level` will be used.
+        """
+        raise NotImplementedError
+
+    def decompress(self, data):
+        """Returns the original version of some compressed data."""
+        raise NotImplementedError
+
+
+class BZip2CompressionCodec(CompressionCodec):
+    """Compresses data with bzip2."""
+
+    code = 'B'
+    name = 'bzip2'
+    label = _('BZip2-compressed')
+    default_level = 9
+    min_level = 1
+    max_level = 9
+
+    def compress(self, data, level=None):
+        if level is None:
+            level = self.default_level
+
+        return bz2.compress(data, level)
+
+    def decompress(self, data):
+        return bz2.decompress(data)
+
+
+class ZlibCompressionCodec(CompressionCodec):
+    """Compresses data with zlib.
+
+    This compresses less than bzip2, but is much faster to both compress
+    and decompress.
+    """
+
+    code = 'Z'
+    name = 'zlib'
+    label = _('Zlib-compressed')
+    default_level = 6
+    min_level = 0
+    max_level = 9
+
+    def compress(self, data, level=None):
+        if level is None:
+            level = self.default_level
+
+        return zlib.compress(data, level)
+
+    def decompress(self, data):
+        return zlib.decompress(bytes(data))
+
+
+class LZMACompressionCodec(CompressionCodec):
+    """Compresses data with LZMA (xz).
+
+    This requires the :py:mod:`lzma` module (or :py:mod:`backports.lzma`
+    on Python 2).
+    """
+
+    code = 'L'
+    name = 'lzma'
+    label = _('LZMA-compressed')
+    default_level = 6
+    min_level = 0
+    max_level = 9
+
+    def is_available(self):
+        return lzma is not None
+
+    def compress(self, data, level=None):
+        if level is None:
+            level = self.default_level
+
+        return lzma.compress(data, preset=level)
+
+    def decompress(self, data):
+        return lzma.decompress(bytes(data))
+
+
+_codecs = {}
+
+
+def register_compression_codec(codec):
+    """Registers a compression codec.
+
+    ``codec`` is a :py:class:`CompressionCodec` instance. Its code and name
+    must not already be registered.
+    """
+    assert codec.code and len(codec.code) == 1
+    assert codec.code not in _codecs
+    assert get_compression_codec_by_name(codec.name) is None
+
+    _codecs[codec.code] = codec
+
+
+def unregister_compression_codec(codec):
+    """Unregisters a previously registered compression codec."""
+    del _codecs[codec.code]
+
+
+def get_compression_codec(code):
+    """Returns the codec for a code stored in the database, or None."""
+    return _codecs.get(code)
+
+
+def get_compression_codec_by_name(name):
+    """Returns the codec with the given name, or None."""
+    for codec in _codecs.values():
+        if codec.name == name:
+            return codec
+
+    return None
+
+
+def get_compression_codecs():
+    """Returns a list of all registered codecs."""
+    return sorted(_codecs.values(), key=lambda codec: codec.code)
+
+
+for _codec_cls in (BZip2CompressionCodec, ZlibCompressionCodec,
+                   LZMACompressionCodec):
+    register_compression_codec(_codec_cls())
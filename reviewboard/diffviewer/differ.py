@@ -20,6 +20,11 @@ class DiffCompatVersion(object):
     # (prevents very long diff times for certain files)
     MYERS_SMS_COST_BAIL = 2
 
+    # Myers differ run between lines that are unique in both files
+    # (much faster for large files with many changes). This is opt-in,
+    # through the diffviewer_patience_anchors setting.
+    PATIENCE_ANCHORS = 3
+
     DEFAULT = MYERS_SMS_COST_BAIL
 
     MYERS_VERSIONS = (MYERS, MYERS_SMS_COST_BAIL)
@@ -97,6 +102,9 @@ def get_differ(a, b, ignore_space=False,
     if compat_version in DiffCompatVersion.MYERS_VERSIONS:
         from reviewboard.diffviewer.myersdiff import MyersDiffer
         cls = MyersDiffer
+    elif compat_version == DiffCompatVersion.PATIENCE_ANCHORS:
+        from reviewboard.diffviewer.patiencediff import PatienceDiffer
+        cls = PatienceDiffer
     elif compat_version == DiffCompatVersion.SMDIFFER:
         from reviewboard.diffviewer.smdiff import SMDiffer
         cls = SMDiffer
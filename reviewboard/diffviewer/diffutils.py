@@ -1,18 +1,32 @@
 from __future__ import unicode_literals
 
+import hashlib
+import logging
 import os
 import re
 import subprocess
 import tempfile
+import time
 from difflib import SequenceMatcher
+from multiprocessing import TimeoutError
+from multiprocessing.pool import ThreadPool
 
+from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import connection
 from django.utils import six
+from django.utils.html import strip_tags
+from django.utils.six.moves import html_parser
 from django.utils.translation import ugettext as _
+from djblets.cache.backend import make_cache_key
 from djblets.log import log_timed
 from djblets.siteconfig.models import SiteConfiguration
 from djblets.util.contextmanagers import controlled_subprocess
 
+from reviewboard.diffviewer.chunk_serializer import SerializedChunks
+from reviewboard.diffviewer.errors import (ChunkGenerationCancelledError,
+                                           PatchRejectedError)
+from reviewboard.diffviewer.patcher import apply_patch
 from reviewboard.scmtools.core import PRE_CREATION, HEAD
 
 
@@ -22,6 +36,12 @@ NEWLINE_RE = re.compile(r'(?:\n|\r(?:\r?\n)?)')
 ALPHANUM_RE = re.compile(r'\w')
 WHITESPACE_RE = re.compile(r'\s')
 
+EMPTY_CONTENT_SHA1 = hashlib.sha1(b'').hexdigest()
+
+# The portion of two lines that must match in order to show the regions
+# that changed between them.
+LINE_CHANGED_REGIONS_MIN_RATIO = 0.6
+
 
 def convert_to_unicode(s, encoding_list):
     """Returns the passed string as a unicode object.
@@ -117,9 +137,13 @@ def split_line_endings(data):
 
 
 def patch(diff, file, filename, request=None):
-    """Apply a diff to a file.  Delegates out to `patch` because noone
-       except Larry Wall knows how to patch."""
+    """Apply a diff to a file.
 
+    The diff is applied in-process first, which avoids temporary files and a
+    fork for every file. If the in-process patcher rejects the diff, this
+    delegates out to `patch`, because noone except Larry Wall knows how to
+    patch. Errors applying the diff are reported by `patch`.
+    """
     log_timer = log_timed("Patching file %s" % filename,
                           request=request)
 
@@ -127,16 +151,41 @@ def patch(diff, file, filename, request=None):
         # Someone uploaded an unchanged file. Return the one we're patching.
         return file
 
+    file = convert_line_endings(file)
+    diff = convert_line_endings(diff)
+
+    try:
+        data = apply_patch(diff, file)
+    except PatchRejectedError as e:
+        logging.debug('In-process patcher rejected the diff for %s '
+                      '(hunk %s): %s. Falling back to patch.',
+                      filename, e.hunk_num, e)
+
+        try:
+            data = _run_patch_tool(diff, file, filename)
+        finally:
+            log_timer.done()
+
+        return data
+
+    log_timer.done()
+
+    return data
+
+
+def _run_patch_tool(diff, file, filename):
+    """Apply a diff to a file using the `patch` tool.
+
+    The diff and file must already have had their line endings converted.
+    """
     # Prepare the temporary directory if none is available
     tempdir = tempfile.mkdtemp(prefix='reviewboard.')
 
     (fd, oldfile) = tempfile.mkstemp(dir=tempdir)
     f = os.fdopen(fd, "w+b")
-    f.write(convert_line_endings(file))
+    f.write(file)
     f.close()
 
-    diff = convert_line_endings(diff)
-
     newfile = '%s-new' % oldfile
 
     process = subprocess.Popen(['patch', '-o', newfile, oldfile],
@@ -152,8 +201,6 @@ def patch(diff, file, filename, request=None):
         with open("%s.diff" % absolute_path, 'w') as f:
             f.write(diff)
 
-        log_timer.done()
-
         # FIXME: This doesn't provide any useful error report on why the patch
         # failed to apply, which makes it hard to debug.  We might also want to
         # have it clean up if DEBUG=False
@@ -175,18 +222,24 @@ def patch(diff, file, filename, request=None):
     os.unlink(newfile)
     os.rmdir(tempdir)
 
-    log_timer.done()
-
     return data
 
 
 def get_original_file(filediff, request, encoding_list):
     """
-    Get a file either from the cache or the SCM, applying the parent diff if
-    it exists.
+    Get a file either from the file content store or the SCM, applying the
+    parent diff if it exists.
+
+    The resulting file is placed in the file content store, and its SHA1 is
+    recorded in the FileDiff as ``orig_sha1``.
 
     SCM exceptions are passed back to the caller.
     """
+    data = get_stored_file_content(filediff.orig_sha1)
+
+    if data is not None:
+        return data
+
     data = b""
 
     if not filediff.is_new:
@@ -203,13 +256,9 @@ def get_original_file(filediff, request, encoding_list):
         # Repository.get_file doesn't know or care about how we need line
         # endings to work. So, we'll just transform every time.
         #
-        # This is mostly only a problem if the diff chunks aren't in the
-        # cache, though if several people are working off the same file,
-        # we'll be doing extra work to convert those line endings for each
-        # of those instead of once.
-        #
-        # Only other option is to cache the resulting file, but then we're
-        # duplicating the cached contents.
+        # This is only a problem if the file isn't in the file content
+        # store yet. Once the result is stored, we won't have to fetch and
+        # convert it again.
         data = convert_line_endings(data)
 
         # Convert back to bytes using whichever encoding we used to decode.
@@ -220,14 +269,165 @@ def get_original_file(filediff, request, encoding_list):
         data = patch(filediff.parent_diff, data, filediff.source_file,
                      request)
 
+    _store_file_content(filediff, 'orig_sha1', data)
+
     return data
 
 
 def get_patched_file(buffer, filediff, request):
+    """Get the patched version of a file.
+
+    ``buffer`` must be the original file, as returned by
+    :py:func:`get_original_file`. If the patched file is already in the file
+    content store, it will be returned without applying the patch.
+
+    The resulting file is placed in the file content store, and its SHA1 is
+    recorded in the FileDiff as ``patched_sha1``.
+    """
+    data = get_stored_file_content(filediff.patched_sha1)
+
+    if data is not None:
+        return data
+
     tool = filediff.diffset.repository.get_scmtool()
     diff = tool.normalize_patch(filediff.diff, filediff.source_file,
                                 filediff.source_revision)
-    return patch(diff, buffer, filediff.dest_file, request)
+    data = patch(diff, buffer, filediff.dest_file, request)
+
+    _store_file_content(filediff, 'patched_sha1', data)
+
+    return data
+
+
+def get_interdiff_files(filediff, interfilediff, request, encoding_list):
+    """Get the two patched files to compare for an interdiff.
+
+    This returns a tuple of the patched versions of ``filediff`` and
+    ``interfilediff``.
+
+    Patched files that are already in the file content store are used
+    as-is, without needing the original files at all. When both FileDiffs
+    apply to the same original file, it's only loaded once (from the file
+    content store if possible, and otherwise from the repository), and both
+    diffs are applied to it. The original file's SHA1 is recorded on both
+    FileDiffs, so later interdiffs against either one can find it in the
+    store.
+    """
+    old = get_stored_file_content(filediff.patched_sha1)
+    new = get_stored_file_content(interfilediff.patched_sha1)
+
+    if old is not None and new is not None:
+        return old, new
+
+    if _filediffs_share_original(filediff, interfilediff):
+        orig = get_stored_file_content(interfilediff.orig_sha1)
+
+        if orig is None:
+            orig = get_original_file(filediff, request, encoding_list)
+
+        for cur_filediff in (filediff, interfilediff):
+            _record_file_checksum(cur_filediff, 'orig_sha1', orig)
+
+        if old is None:
+            old = get_patched_file(orig, filediff, request)
+
+        if new is None:
+            new = get_patched_file(orig, interfilediff, request)
+    else:
+        if old is None:
+            old = get_patched_file(
+                get_original_file(filediff, request, encoding_list),
+                filediff, request)
+
+        if new is None:
+            new = get_patched_file(
+                get_original_file(interfilediff, request, encoding_list),
+                interfilediff, request)
+
+    return old, new
+
+
+def _filediffs_share_original(filediff, interfilediff):
+    """Return whether two FileDiffs apply to the same original file.
+
+    If the SHA1s of both original files are known, they're compared.
+    Otherwise, the FileDiffs must refer to the same revision of the same
+    file in the same repository, and have the same parent diff.
+    """
+    if filediff.orig_sha1 and interfilediff.orig_sha1:
+        return filediff.orig_sha1 == interfilediff.orig_sha1
+
+    diffset = filediff.diffset
+    interdiffset = interfilediff.diffset
+
+    return (filediff.source_file == interfilediff.source_file and
+            filediff.source_revision == interfilediff.source_revision and
+            diffset.repository_id == interdiffset.repository_id and
+            diffset.base_commit_id == interdiffset.base_commit_id and
+            filediff.parent_diff == interfilediff.parent_diff)
+
+
+def get_stored_file_content(content_hash):
+    """Return file content from the file content store.
+
+    This returns the content with the given SHA1, or ``None`` if there's no
+    such content stored, or storing file content is disabled.
+    """
+    if not content_hash:
+        return None
+
+    if content_hash == EMPTY_CONTENT_SHA1:
+        return b''
+
+    siteconfig = SiteConfiguration.objects.get_current()
+
+    if not siteconfig.get('diffviewer_store_file_contents'):
+        return None
+
+    from reviewboard.diffviewer.models import RawFileContent
+
+    return RawFileContent.objects.get_content(content_hash)
+
+
+def _store_file_content(filediff, sha1_key, data):
+    """Store file content and record its SHA1 in the FileDiff.
+
+    The SHA1 is recorded in the FileDiff's ``extra_data`` under
+    ``sha1_key``, whether or not the file content store is enabled.
+    """
+    content_hash = _record_file_checksum(filediff, sha1_key, data)
+
+    siteconfig = SiteConfiguration.objects.get_current()
+
+    if (content_hash != EMPTY_CONTENT_SHA1 and
+        siteconfig.get('diffviewer_store_file_contents')):
+        from reviewboard.diffviewer.models import RawFileContent
+
+        RawFileContent.objects.get_or_create_from_data(data)
+
+
+def _record_file_checksum(filediff, sha1_key, data):
+    """Record the SHA1 of some file content in the FileDiff.
+
+    The SHA1 is stored in the FileDiff's ``extra_data`` under ``sha1_key``,
+    and returned.
+    """
+    content_hash = _get_checksum(data)
+
+    if filediff.extra_data.get(sha1_key) != content_hash:
+        filediff.extra_data[sha1_key] = content_hash
+
+        if filediff.pk:
+            filediff.save(update_fields=['extra_data'])
+
+    return content_hash
+
+
+def _get_checksum(content):
+    """Return the SHA1 of some content."""
+    hasher = hashlib.sha1()
+    hasher.update(content)
+    return hasher.hexdigest()
 
 
 def get_revision_str(revision):
@@ -239,41 +439,76 @@ def get_revision_str(revision):
         return _("Revision %s") % revision
 
 
-def get_diff_files(diffset, filediff=None, interdiffset=None, request=None):
-    """Generates a list of files that will be displayed in a diff.
+def get_diff_file_pairs(diffset, interdiffset=None, request=None):
+    """Returns the files that will be displayed in a diff, in order.
 
-    This will go through the given diffset/interdiffset, or a given filediff
-    within that diffset, and generate the list of files that will be
-    displayed. This file list will contain a bunch of metadata on the files,
-    such as the index, original/modified names, revisions, associated
-    filediffs/diffsets, and so on.
+    This matches up the files in the diffset with those in the interdiffset
+    (if any), and sorts them for display. Each entry in the resulting list
+    is a tuple of ``(index, filediff_id, interfilediff_id, force_interdiff,
+    is_new_file)``, where ``index`` is the file's index in the diff viewer
+    and ``interfilediff_id`` may be ``None``.
 
-    This can be used along with populate_diff_chunks to build a full list
-    containing all diff chunks used for rendering a side-by-side diff.
+    Working this out means looking at every file in both diffsets, so the
+    result is cached for each diffset (or pair of diffsets). Callers showing
+    only some of the files, such as a page of the diff viewer, can slice
+    this list and pass the entries they need to :py:func:`get_diff_files`.
+
+    Files in an interdiff are left out if their patched files are
+    identical, which can only be known once both files have been patched
+    and their SHA1s stored. Until then, the list isn't cached, so that it
+    doesn't depend on when it was first computed.
+    """
+    if interdiffset:
+        key = 'diff-file-pairs-%s-%s' % (diffset.pk, interdiffset.pk)
+    else:
+        key = 'diff-file-pairs-%s' % diffset.pk
+
+    key = make_cache_key(key)
+    pairs = cache.get(key)
+
+    if pairs is None:
+        pairs, cacheable = _compute_diff_file_pairs(diffset, interdiffset,
+                                                    request)
+
+        if cacheable:
+            cache.set(key, pairs)
+
+    return pairs
+
+
+def _compute_diff_file_pairs(diffset, interdiffset, request, filediff=None):
+    """Computes the list of files returned by get_diff_file_pairs.
+
+    If ``filediff`` is provided, only the entry for that file is computed,
+    and it's given an index of 0.
+
+    This returns a tuple of the list and whether it can be cached (meaning
+    that it doesn't depend on any patched file SHA1s that aren't known
+    yet).
     """
     if filediff:
         filediffs = [filediff]
 
         if interdiffset:
-            log_timer = log_timed("Generating diff file info for "
+            log_timer = log_timed("Generating diff file pairs for "
                                   "interdiffset ids %s-%s, filediff %s" %
                                   (diffset.id, interdiffset.id, filediff.id),
                                   request=request)
         else:
-            log_timer = log_timed("Generating diff file info for "
+            log_timer = log_timed("Generating diff file pairs for "
                                   "diffset id %s, filediff %s" %
                                   (diffset.id, filediff.id),
                                   request=request)
     else:
-        filediffs = diffset.files.select_related().all()
+        filediffs = diffset.files.all()
 
         if interdiffset:
-            log_timer = log_timed("Generating diff file info for "
+            log_timer = log_timed("Generating diff file pairs for "
                                   "interdiffset ids %s-%s" %
                                   (diffset.id, interdiffset.id),
                                   request=request)
         else:
-            log_timer = log_timed("Generating diff file info for "
+            log_timer = log_timed("Generating diff file pairs for "
                                   "diffset id %s" % diffset.id,
                                   request=request)
 
@@ -291,12 +526,20 @@ def get_diff_files(diffset, filediff=None, interdiffset=None, request=None):
         return parser.normalize_diff_filename(filename)
 
     if interdiffset:
-        for interfilediff in interdiffset.files.all():
-            interfilediff_source_file = _normfile(interfilediff.source_file)
+        if filediff and filediff.diffset_id == interdiffset.pk:
+            # This file only exists in the interdiffset, and is shown as
+            # a regular diff.
+            filediffs = []
+            interdiff_map[_normfile(filediff.source_file)] = filediff
+        else:
+            for interfilediff in interdiffset.files.all():
+                interfilediff_source_file = \
+                    _normfile(interfilediff.source_file)
 
-            if (not filediff or
-                _normfile(filediff.source_file) == interfilediff_source_file):
-                interdiff_map[interfilediff_source_file] = interfilediff
+                if (not filediff or
+                    (_normfile(filediff.source_file) ==
+                     interfilediff_source_file)):
+                    interdiff_map[interfilediff_source_file] = interfilediff
 
     # In order to support interdiffs properly, we need to display diffs
     # on every file in the union of both diffsets. Iterating over one diffset
@@ -330,26 +573,148 @@ def get_diff_files(diffset, filediff=None, interdiffset=None, request=None):
             for interdiff in six.itervalues(interdiff_map)
         ]
 
+    pairs = []
+    cacheable = True
+
+    for cur_filediff, interfilediff, force_interdiff in filediff_parts:
+        # If the diffs are identical, or the patched files are identical,
+        # or if the files were deleted in both cases, then we can be
+        # absolutely sure that there's nothing interesting to show to
+        # the user.
+        if interfilediff:
+            if (_filediffs_have_same_diff(cur_filediff, interfilediff) or
+                (cur_filediff.deleted and interfilediff.deleted)):
+                continue
+
+            patched_sha1 = cur_filediff.patched_sha1
+            interdiff_patched_sha1 = interfilediff.patched_sha1
+
+            if patched_sha1 is None or interdiff_patched_sha1 is None:
+                cacheable = False
+            elif patched_sha1 == interdiff_patched_sha1:
+                continue
+
+            interfilediff_id = interfilediff.pk
+        else:
+            interfilediff_id = None
+
+        pairs.append((
+            len(pairs),
+            cur_filediff,
+            interfilediff_id,
+            force_interdiff,
+            (cur_filediff.is_new and not interfilediff and
+             not cur_filediff.parent_diff),
+        ))
+
+    if len(pairs) > 1:
+        pairs = get_sorted_filediffs(pairs, key=lambda pair: pair[1])
+
+    log_timer.done()
+
+    return [
+        (pair[0], pair[1].pk) + pair[2:]
+        for pair in pairs
+    ], cacheable
+
+
+def _filediffs_have_same_diff(filediff, interfilediff):
+    """Returns whether two FileDiffs contain the same diff.
+
+    Diffs are stored by their hash, so this only needs to compare the
+    content of diffs that haven't been migrated to the new storage.
+    """
+    if filediff.diff_hash_id and interfilediff.diff_hash_id:
+        return filediff.diff_hash_id == interfilediff.diff_hash_id
+
+    return filediff.diff == interfilediff.diff
+
+
+def get_diff_files(diffset, filediff=None, interdiffset=None, request=None,
+                   file_pairs=None):
+    """Generates a list of files that will be displayed in a diff.
+
+    This will go through the given diffset/interdiffset, or a given filediff
+    within that diffset, and generate the list of files that will be
+    displayed. This file list will contain a bunch of metadata on the files,
+    such as the index, original/modified names, revisions, associated
+    filediffs/diffsets, and so on.
+
+    The files are looked up and sorted by :py:func:`get_diff_file_pairs`.
+    If only some of the files are needed, the entries for them from that
+    function can be passed as ``file_pairs``, and only those FileDiffs will
+    be loaded.
+
+    This can be used along with populate_diff_chunks to build a full list
+    containing all diff chunks used for rendering a side-by-side diff.
+    """
+    if file_pairs is None:
+        if filediff:
+            # Only the entry for this file is needed, so there's no need to
+            # look at (or cache) the others.
+            file_pairs = _compute_diff_file_pairs(diffset, interdiffset,
+                                                  request, filediff)[0]
+        else:
+            file_pairs = get_diff_file_pairs(diffset, interdiffset, request)
+
+    if not file_pairs:
+        return []
+
+    filediff_ids = set()
+    interfilediff_ids = set()
+
+    for index, filediff_id, interfilediff_id, force_interdiff, is_new_file \
+            in file_pairs:
+        filediff_ids.add(filediff_id)
+
+        if interfilediff_id is not None:
+            interfilediff_ids.add(interfilediff_id)
+
+    if filediff and filediff_ids == set([filediff.pk]):
+        filediffs = {
+            filediff.pk: filediff,
+        }
+    else:
+        filediffs = dict(
+            (temp_filediff.pk, temp_filediff)
+            for temp_filediff in diffset.files.select_related().filter(
+                pk__in=filediff_ids)
+        )
+
+    if interdiffset:
+        # Files that are only in the interdiffset are shown as regular
+        # diffs, so they're looked up along with the interfilediffs.
+        interfilediffs = dict(
+            (interfilediff.pk, interfilediff)
+            for interfilediff in interdiffset.files.filter(
+                pk__in=(interfilediff_ids |
+                        (filediff_ids - set(six.iterkeys(filediffs)))))
+        )
+    else:
+        interfilediffs = {}
+
+    tool = diffset.repository.get_scmtool()
     files = []
 
-    for parts in filediff_parts:
-        filediff, interfilediff, force_interdiff = parts
+    for index, filediff_id, interfilediff_id, force_interdiff, is_new_file \
+            in file_pairs:
+        cur_filediff = (filediffs.get(filediff_id) or
+                        interfilediffs.get(filediff_id))
 
-        newfile = filediff.is_new
+        if interfilediff_id is not None:
+            interfilediff = interfilediffs.get(interfilediff_id)
+        else:
+            interfilediff = None
 
-        if interdiffset:
-            # First, find out if we want to even process this one.
-            # If the diffs are identical, or the patched files are identical,
-            # or if the files were deleted in both cases, then we can be
-            # absolutely sure that there's nothing interesting to show to
-            # the user.
-            if (filediff and interfilediff and
-                (filediff.diff == interfilediff.diff or
-                 (filediff.deleted and interfilediff.deleted) or
-                 (filediff.patched_sha1 is not None and
-                  filediff.patched_sha1 == interfilediff.patched_sha1))):
-                continue
+        if cur_filediff is None or (interfilediff_id is not None and
+                                    interfilediff is None):
+            # The file list was cached before these FileDiffs were
+            # deleted.
+            continue
+
+        newfile = cur_filediff.is_new
 
+        if interdiffset:
             source_revision = _("Diff Revision %s") % diffset.revision
 
             if not interfilediff and force_interdiff:
@@ -358,34 +723,35 @@ def get_diff_files(diffset, filediff=None, interdiffset=None, request=None):
             else:
                 dest_revision = _("Diff Revision %s") % interdiffset.revision
         else:
-            source_revision = get_revision_str(filediff.source_revision)
+            source_revision = get_revision_str(cur_filediff.source_revision)
 
             if newfile:
                 dest_revision = _("New File")
             else:
                 dest_revision = _("New Change")
 
-        depot_filename = tool.normalize_path_for_display(filediff.source_file)
-        dest_filename = tool.normalize_path_for_display(filediff.dest_file)
+        depot_filename = tool.normalize_path_for_display(
+            cur_filediff.source_file)
+        dest_filename = tool.normalize_path_for_display(
+            cur_filediff.dest_file)
 
         f = {
             'depot_filename': depot_filename,
             'dest_filename': dest_filename or depot_filename,
             'revision': source_revision,
             'dest_revision': dest_revision,
-            'filediff': filediff,
+            'filediff': cur_filediff,
             'interfilediff': interfilediff,
             'force_interdiff': force_interdiff,
-            'binary': filediff.binary,
-            'deleted': filediff.deleted,
-            'moved': filediff.moved,
-            'copied': filediff.copied,
-            'moved_or_copied': filediff.moved or filediff.copied,
+            'binary': cur_filediff.binary,
+            'deleted': cur_filediff.deleted,
+            'moved': cur_filediff.moved,
+            'copied': cur_filediff.copied,
+            'moved_or_copied': cur_filediff.moved or cur_filediff.copied,
             'newfile': newfile,
-            'index': len(files),
+            'index': index,
             'chunks_loaded': False,
-            'is_new_file': (newfile and not interfilediff and
-                            not filediff.parent_diff),
+            'is_new_file': is_new_file,
         }
 
         if force_interdiff:
@@ -393,12 +759,7 @@ def get_diff_files(diffset, filediff=None, interdiffset=None, request=None):
 
         files.append(f)
 
-    log_timer.done()
-
-    if len(files) == 1:
-        return files
-    else:
-        return get_sorted_filediffs(files, key=lambda f: f['filediff'])
+    return files
 
 
 def populate_diff_chunks(files, enable_syntax_highlighting=True,
@@ -408,38 +769,313 @@ def populate_diff_chunks(files, enable_syntax_highlighting=True,
     This accepts a list of files (generated by get_diff_files) and generates
     diff chunk data for each file in the list. The chunk data is stored in
     the file state.
+
+    Before generating any chunks, the original files that will be needed
+    are fetched from the repository in batches, for repositories that can
+    fetch several files at once.
+
+    If the ``diffviewer_chunk_generator_threads`` setting is greater than 1,
+    chunks for several files are generated at once in a pool of threads.
+    Any files that aren't finished within the number of seconds in the
+    ``diffviewer_chunk_generator_timeout`` setting, or that fail, are then
+    generated one at a time, using new chunk generators. The files are always
+    populated in order.
     """
     from reviewboard.diffviewer.chunk_generator import get_diff_chunk_generator
 
-    for diff_file in files:
-        generator = get_diff_chunk_generator(request,
-                                             diff_file['filediff'],
-                                             diff_file['interfilediff'],
-                                             diff_file['force_interdiff'],
-                                             enable_syntax_highlighting)
-        chunks = list(generator.get_chunks())
+    def _get_generator(diff_file):
+        return get_diff_chunk_generator(request,
+                                        diff_file['filediff'],
+                                        diff_file['interfilediff'],
+                                        diff_file['force_interdiff'],
+                                        enable_syntax_highlighting)
+
+    generators = [
+        _get_generator(diff_file)
+        for diff_file in files
+    ]
+
+    prefetch_original_files(generators, request)
+
+    siteconfig = SiteConfiguration.objects.get_current()
+    num_threads = min(siteconfig.get('diffviewer_chunk_generator_threads'),
+                      len(files))
+
+    if num_threads > 1:
+        all_chunks = _get_chunks_in_pool(
+            generators, num_threads,
+            siteconfig.get('diffviewer_chunk_generator_timeout'))
+    else:
+        all_chunks = [None] * len(files)
+
+    for diff_file, generator, chunks in zip(files, generators, all_chunks):
+        if chunks is None:
+            if num_threads > 1:
+                # A worker thread that timed out may still be using the
+                # generator, so start over with a new one.
+                generator = _get_generator(diff_file)
+
+            chunks = _get_generator_chunks(generator)
+
+        if isinstance(chunks, SerializedChunks):
+            # Only look at the summaries of the chunks, so that we don't
+            # decode chunks that may never be rendered.
+            chunk_summaries = chunks.get_summaries()
+        else:
+            chunk_summaries = chunks
+
+            for j, chunk in enumerate(chunks):
+                chunk['index'] = j
+
+        _populate_chunk_summaries(diff_file, chunk_summaries)
 
         diff_file.update({
             'chunks': chunks,
-            'num_chunks': len(chunks),
-            'changed_chunk_indexes': [],
-            'whitespace_only': len(chunks) > 0,
+            'chunks_loaded': True,
         })
 
+
+def populate_diff_chunk(diff_file, chunk_index,
+                        enable_syntax_highlighting=True, request=None):
+    """Returns a single chunk of a diff file, without loading the others.
+
+    This is used when rendering a single chunk (such as when expanding
+    context in the diff viewer). Rather than populating every chunk for the
+    file, as :py:func:`populate_diff_chunks` does, only the requested chunk
+    is loaded and decoded, so the cost doesn't grow with the size of the
+    file.
+
+    The file state will be populated with the chunk counts and indexes
+    (``num_chunks``, ``changed_chunk_indexes``, ``whitespace_only`` and
+    ``num_changes``), but not with ``chunks``.
+
+    If the chunk index is out of range, this returns ``None``.
+    """
+    from reviewboard.diffviewer.chunk_generator import get_diff_chunk_generator
+
+    generator = get_diff_chunk_generator(request,
+                                         diff_file['filediff'],
+                                         diff_file['interfilediff'],
+                                         diff_file['force_interdiff'],
+                                         enable_syntax_highlighting)
+
+    get_cached_chunk = getattr(generator, 'get_cached_chunk', None)
+
+    if get_cached_chunk is None:
+        chunks = list(generator.get_chunks())
+
         for j, chunk in enumerate(chunks):
             chunk['index'] = j
 
-            if chunk['change'] != 'equal':
-                diff_file['changed_chunk_indexes'].append(j)
-                meta = chunk.get('meta', {})
+        chunk_summaries = chunks
+
+        if 0 <= chunk_index < len(chunks):
+            chunk = chunks[chunk_index]
+        else:
+            chunk = None
+    else:
+        chunk, chunk_summaries = get_cached_chunk(chunk_index)
 
-                if not meta.get('whitespace_chunk', False):
-                    diff_file['whitespace_only'] = False
+    _populate_chunk_summaries(diff_file, chunk_summaries)
 
-        diff_file.update({
-            'num_changes': len(diff_file['changed_chunk_indexes']),
-            'chunks_loaded': True,
-        })
+    return chunk
+
+
+def _populate_chunk_summaries(diff_file, chunk_summaries):
+    """Populates a diff file with the counts and indexes of its chunks.
+
+    The chunk summaries can be the chunks themselves, or the summaries
+    returned by :py:meth:`SerializedChunks.get_summaries`.
+    """
+    changed_chunk_indexes = []
+    whitespace_only = len(chunk_summaries) > 0
+
+    for j, chunk in enumerate(chunk_summaries):
+        if chunk['change'] != 'equal':
+            changed_chunk_indexes.append(j)
+            meta = chunk.get('meta', {})
+
+            if not meta.get('whitespace_chunk', False):
+                whitespace_only = False
+
+    diff_file.update({
+        'num_chunks': len(chunk_summaries),
+        'changed_chunk_indexes': changed_chunk_indexes,
+        'whitespace_only': whitespace_only,
+        'num_changes': len(changed_chunk_indexes),
+    })
+
+
+def prefetch_original_files(generators, request):
+    """Fetch the original files needed by a list of chunk generators.
+
+    This looks for the FileDiffs that will need their original files
+    fetched from the repository in order to generate chunks. That's any
+    FileDiff whose chunks aren't already cached, and whose original file
+    isn't in the file content store.
+
+    Those files are fetched using :py:meth:`Repository.prefetch_files`,
+    which fetches and caches them in batches, so that the later calls to
+    :py:func:`get_original_file` won't need to go to the repository. The
+    chunk caches of all the generators are checked in one cache request,
+    and files that are already cached aren't loaded.
+
+    Any errors are logged and ignored. They'll be reported when generating
+    chunks for the affected files.
+    """
+    generator_keys = []
+
+    for generator in generators:
+        make_chunks_cache_key = getattr(generator, 'make_cache_key', None)
+
+        if make_chunks_cache_key is not None:
+            generator_keys.append(
+                (generator, make_cache_key(make_chunks_cache_key())))
+
+    if not generator_keys:
+        return
+
+    cached_keys = cache.get_many([key for generator, key in generator_keys])
+    filediffs = []
+
+    for generator, key in generator_keys:
+        if key in cached_keys:
+            continue
+
+        for filediff in (generator.filediff,
+                         getattr(generator, 'interfilediff', None)):
+            if (filediff is not None and
+                not filediff.binary and
+                not filediff.is_new):
+                filediffs.append(filediff)
+
+    if not filediffs:
+        return
+
+    siteconfig = SiteConfiguration.objects.get_current()
+
+    if siteconfig.get('diffviewer_store_file_contents'):
+        from reviewboard.diffviewer.models import RawFileContent
+
+        stored_sha1s = set(
+            RawFileContent.objects
+            .filter(binary_hash__in=[
+                filediff.orig_sha1
+                for filediff in filediffs
+                if filediff.orig_sha1
+            ])
+            .values_list('binary_hash', flat=True))
+        stored_sha1s.add(EMPTY_CONTENT_SHA1)
+    else:
+        stored_sha1s = set()
+
+    # Group the files by repository, since each repository is fetched from
+    # separately.
+    files_to_fetch = {}
+
+    for filediff in filediffs:
+        if filediff.orig_sha1 in stored_sha1s:
+            continue
+
+        diffset = filediff.diffset
+        key = (diffset.repository_id, diffset.base_commit_id)
+
+        if key not in files_to_fetch:
+            files_to_fetch[key] = (diffset.repository, [])
+
+        path_and_revision = (filediff.source_file, filediff.source_revision)
+
+        if path_and_revision not in files_to_fetch[key][1]:
+            files_to_fetch[key][1].append(path_and_revision)
+
+    for (repository_id, base_commit_id), (repository, paths_and_revisions) \
+            in six.iteritems(files_to_fetch):
+        if len(paths_and_revisions) < 2:
+            # There's nothing to gain from fetching a single file early.
+            continue
+
+        try:
+            repository.prefetch_files(paths_and_revisions,
+                                      base_commit_id=base_commit_id,
+                                      request=request)
+        except Exception as e:
+            logging.warning('Unable to prefetch %d files from repository '
+                            '%s: %s',
+                            len(paths_and_revisions), repository_id, e)
+
+
+def _get_generator_chunks(generator):
+    """Return the chunks from a chunk generator as a sequence.
+
+    Generators that can return their cached chunks directly will do so,
+    letting the chunks be decoded only as they're needed.
+    """
+    get_cached_chunks = getattr(generator, 'get_cached_chunks', None)
+
+    if get_cached_chunks is None:
+        return list(generator.get_chunks())
+    else:
+        return get_cached_chunks()
+
+
+def _get_chunks_in_thread(generator):
+    """Return the list of chunks from a generator in a worker thread.
+
+    Errors are logged and ``None`` is returned, so that the file can be
+    generated again in the calling thread and the error reported there.
+    """
+    try:
+        return _get_generator_chunks(generator)
+    except ChunkGenerationCancelledError:
+        return None
+    except Exception as e:
+        logging.warning('Unable to generate diff chunks for FileDiff %s in '
+                        'a worker thread: %s',
+                        generator.filediff.pk, e)
+        return None
+    finally:
+        # Each thread has its own database connection, which would
+        # otherwise be left open once the thread is done.
+        connection.close()
+
+
+def _get_chunks_in_pool(generators, num_threads, timeout):
+    """Return the lists of chunks from generators, using a pool of threads.
+
+    This returns a list with the chunks from each generator, in the same
+    order as ``generators``. Generators that failed or didn't finish within
+    ``timeout`` seconds will have ``None`` in place of their chunks. The
+    generators that didn't finish are cancelled, so that the chunks they're
+    still generating aren't cached.
+    """
+    pool = ThreadPool(num_threads)
+
+    try:
+        results = [
+            pool.apply_async(_get_chunks_in_thread, (generator,))
+            for generator in generators
+        ]
+        pool.close()
+
+        deadline = time.time() + timeout
+        all_chunks = []
+
+        for generator, result in zip(generators, results):
+            try:
+                all_chunks.append(
+                    result.get(max(deadline - time.time(), 0)))
+            except TimeoutError:
+                logging.warning('Timed out generating diff chunks for '
+                                'FileDiff %s in a worker thread',
+                                generator.filediff.pk)
+                generator.cancel()
+                all_chunks.append(None)
+    finally:
+        # Any files that are still pending won't be started. Any still being
+        # generated were cancelled above, and will stop at their next chunk.
+        pool.terminate()
+
+    return all_chunks
 
 
 def get_file_from_filediff(context, filediff, interfilediff):
@@ -673,6 +1309,8 @@ def get_chunks_in_range(chunks, first_line, num_lines):
                 'meta': chunk.get('meta', {}),
             }
 
+            compute_chunk_line_changed_regions(new_chunk)
+
             yield new_chunk
 
             first_line += new_chunk['numlines']
@@ -703,24 +1341,63 @@ def get_line_changed_regions(oldline, newline):
     if oldline is None or newline is None:
         return None, None
 
-    # Use the SequenceMatcher directly. It seems to give us better results
-    # for this. We should investigate steps to move to the new differ.
-    differ = SequenceMatcher(None, oldline, newline)
+    # Most changes within a line are somewhere in the middle of it, so
+    # strip off anything in common at the start and end first. Only what's
+    # left in the middle needs to be compared character by character.
+    prefix_len = len(os.path.commonprefix([oldline, newline]))
+    suffix_len = len(os.path.commonprefix([oldline[prefix_len:][::-1],
+                                           newline[prefix_len:][::-1]]))
+    old_middle = oldline[prefix_len:len(oldline) - suffix_len]
+    new_middle = newline[prefix_len:len(newline) - suffix_len]
 
     # This thresholds our results -- we don't want to show inter-line diffs
     # if most of the line has changed, unless those lines are very short.
+    #
+    # We check the most that the lines could have in common before
+    # comparing the middles, so that we can bail out early on lines that
+    # have little in common.
 
     # FIXME: just a plain, linear threshold is pretty crummy here.  Short
     # changes in a short line get lost.  I haven't yet thought of a fancy
     # nonlinear test.
-    if differ.ratio() < 0.6:
+    min_matched_len = LINE_CHANGED_REGIONS_MIN_RATIO * (len(oldline) +
+                                                       len(newline)) / 2
+    common_len = prefix_len + suffix_len
+
+    if common_len + min(len(old_middle), len(new_middle)) < min_matched_len:
+        return None, None
+
+    # Use the SequenceMatcher directly. It seems to give us better results
+    # for this. We should investigate steps to move to the new differ.
+    differ = SequenceMatcher(None, old_middle, new_middle)
+
+    if (common_len +
+        differ.quick_ratio() * (len(old_middle) + len(new_middle)) / 2 <
+        min_matched_len):
+        return None, None
+
+    matched_len = common_len + sum(
+        size
+        for i, j, size in differ.get_matching_blocks()
+    )
+
+    if matched_len < min_matched_len:
         return None, None
 
+    opcodes = []
+
+    if prefix_len:
+        opcodes.append(('equal', 0, prefix_len, 0, prefix_len))
+
+    for tag, i1, i2, j1, j2 in differ.get_opcodes():
+        opcodes.append((tag, i1 + prefix_len, i2 + prefix_len,
+                        j1 + prefix_len, j2 + prefix_len))
+
     oldchanges = []
     newchanges = []
     back = (0, 0)
 
-    for tag, i1, i2, j1, j2 in differ.get_opcodes():
+    for tag, i1, i2, j1, j2 in opcodes:
         if tag == 'equal':
             if (i2 - i1 < 3) or (j2 - j1 < 3):
                 back = (j2 - j1, i2 - i1)
@@ -745,6 +1422,41 @@ def get_line_changed_regions(oldline, newline):
     return oldchanges, newchanges
 
 
+def compute_chunk_line_changed_regions(chunk):
+    """Computes any deferred changed regions for the lines in a chunk.
+
+    Chunk generators can leave computing the changed regions of replaced
+    lines until the chunk is actually needed. Those chunks have
+    ``line_changed_regions_deferred`` set in their metadata, and ``None``
+    in place of the regions for each line that still needs them.
+
+    The regions are computed from the HTML markup of each line, and the
+    lines are updated in place, so this can safely be called more than
+    once for a chunk.
+    """
+    if not chunk.get('meta', {}).get('line_changed_regions_deferred'):
+        return
+
+    for line in chunk['lines']:
+        if line[3] is None and line[6] is None:
+            old_region, new_region = get_line_changed_regions(
+                get_line_markup_text(line[2]),
+                get_line_markup_text(line[5]))
+
+            line[3] = old_region or []
+            line[6] = new_region or []
+
+
+def get_line_markup_text(markup):
+    """Returns the plain text for the HTML markup of a line in a chunk.
+
+    This matches the way :py:func:`highlightregion` counts characters in
+    the markup, so that regions computed from the text can be applied to
+    the markup.
+    """
+    return html_parser.HTMLParser().unescape(strip_tags(markup))
+
+
 def get_sorted_filediffs(filediffs, key=None):
     """Sorts a list of filediffs.
 
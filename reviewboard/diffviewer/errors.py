@@ -21,7 +21,19 @@ class EmptyDiffError(ValueError):
     pass
 
 
+class ChunkGenerationCancelledError(Exception):
+    """Generating diff chunks was cancelled from another thread."""
+    pass
+
+
 class DiffParserError(Exception):
     def __init__(self, msg, linenum=None):
         Exception.__init__(self, msg)
         self.linenum = linenum
+
+
+class PatchRejectedError(Exception):
+    """A diff could not be applied by the in-process patcher."""
+    def __init__(self, msg, hunk_num=None):
+        Exception.__init__(self, msg)
+        self.hunk_num = hunk_num
@@ -0,0 +1,79 @@
+from __future__ import unicode_literals
+
+from optparse import make_option
+
+from django.conf import settings
+from django.core.management.base import NoArgsCommand, CommandError
+from django.utils.translation import ugettext as _
+
+from reviewboard.diffviewer.models import DiffSet
+
+
+class Command(NoArgsCommand):
+    help = ('Stores the total line counts on diffsets that were created '
+            'before the totals were stored')
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--batch-size',
+                    type='int',
+                    default=100,
+                    dest='batch_size',
+                    help='The number of diffsets to process at a time.'),
+        make_option('--start-id',
+                    type='int',
+                    default=0,
+                    dest='start_id',
+                    help='Only process diffsets with an ID greater than '
+                         'this. This can be used to resume an interrupted '
+                         'run.'),
+    )
+
+    def handle_noargs(self, **options):
+        batch_size = options['batch_size']
+        last_id = options['start_id']
+
+        if batch_size < 1:
+            raise CommandError(_('--batch-size must be at least 1.'))
+
+        # Don't allow queries to be stored.
+        settings.DEBUG = False
+
+        processed_count = 0
+        updated_count = 0
+
+        while True:
+            batch = list(
+                DiffSet.objects
+                .filter(pk__gt=last_id)
+                .order_by('pk')[:batch_size])
+
+            if not batch:
+                break
+
+            diffsets = [
+                diffset
+                for diffset in batch
+                if ('raw_insert_count' not in (diffset.extra_data or {}) or
+                    'raw_delete_count' not in (diffset.extra_data or {}))
+            ]
+
+            if diffsets:
+                DiffSet.objects.update_raw_line_counts(diffsets)
+                updated_count += len(diffsets)
+
+            processed_count += len(batch)
+            last_id = batch[-1].pk
+
+            self.stdout.write(
+                _('Processed %(count)d diffsets (last ID: %(last_id)d)')
+                % {
+                    'count': processed_count,
+                    'last_id': last_id,
+                })
+
+        self.stdout.write(
+            _('Stored line counts for %(updated)d of %(count)d diffsets.')
+            % {
+                'updated': updated_count,
+                'count': processed_count,
+            })
@@ -0,0 +1,138 @@
+from __future__ import unicode_literals, division
+
+import time
+from optparse import make_option
+
+from django.conf import settings
+from django.contrib.humanize.templatetags.humanize import intcomma
+from django.core.management.base import NoArgsCommand, CommandError
+from django.utils.translation import ugettext as _
+
+from reviewboard.diffviewer.compression import get_compression_codec_by_name
+from reviewboard.diffviewer.models import RawFileDiffData
+
+
+class Command(NoArgsCommand):
+    help = ('Re-compresses the diffs stored in the database using the '
+            'configured diff compression')
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--batch-size',
+                    type='int',
+                    default=100,
+                    dest='batch_size',
+                    help='The number of diffs to process at a time.'),
+        make_option('--start-id',
+                    type='int',
+                    default=0,
+                    dest='start_id',
+                    help='Only process diffs with an ID greater than this. '
+                         'This can be used to resume an interrupted run.'),
+        make_option('--compression',
+                    default=None,
+                    dest='compression',
+                    help='The compression to use (bzip2, zlib or lzma). '
+                         'Defaults to the configured diff compression.'),
+        make_option('--level',
+                    type='int',
+                    default=None,
+                    dest='level',
+                    help='The compression level to use. Defaults to the '
+                         'configured level.'),
+    )
+
+    def handle_noargs(self, **options):
+        batch_size = options['batch_size']
+        last_id = options['start_id']
+        compression = options['compression']
+        level = options['level']
+
+        if batch_size < 1:
+            raise CommandError(_('--batch-size must be at least 1.'))
+
+        manager = RawFileDiffData.objects
+        codec, policy_level, min_size = manager.get_compression_policy()
+
+        if compression:
+            codec = get_compression_codec_by_name(compression)
+
+            if codec is None or not codec.is_available():
+                raise CommandError(_('%s compression is not available.')
+                                   % compression)
+
+        if level is None:
+            level = policy_level
+
+        # Don't allow queries to be stored.
+        settings.DEBUG = False
+
+        old_size = 0
+        new_size = 0
+        old_decode_time = 0
+        new_decode_time = 0
+        processed_count = 0
+        changed_count = 0
+
+        while True:
+            batch = list(
+                manager.filter(pk__gt=last_id).order_by('pk')[:batch_size])
+
+            if not batch:
+                break
+
+            for raw_diff in batch:
+                start = time.time()
+                data = raw_diff.content
+                old_decode_time += time.time() - start
+
+                if len(data) < min_size:
+                    binary, new_compression = data, None
+                else:
+                    binary, new_compression = manager.process_diff_data(
+                        data, codec=codec, level=level)
+
+                if new_compression is not None:
+                    start = time.time()
+                    codec.decompress(binary)
+                    new_decode_time += time.time() - start
+
+                old_size += len(raw_diff.binary)
+                new_size += len(binary)
+
+                if (new_compression != raw_diff.compression or
+                    bytes(binary) != bytes(raw_diff.binary)):
+                    manager.filter(pk=raw_diff.pk).update(
+                        binary=binary,
+                        compression=new_compression)
+                    changed_count += 1
+
+                processed_count += 1
+                last_id = raw_diff.pk
+
+            self.stdout.write(
+                _('Processed %(count)d diffs (last ID: %(last_id)d)')
+                % {
+                    'count': processed_count,
+                    'last_id': last_id,
+                })
+
+        if processed_count == 0:
+            self.stdout.write(_('There are no diffs to re-compress.'))
+            return
+
+        self.stdout.write(
+            _('\n'
+              'Re-compressed %(changed)d of %(count)d diffs using %(name)s.\n'
+              'Stored size went from %(old_size)s bytes to %(new_size)s '
+              'bytes.\n'
+              'Decoding time went from %(old_time)0.2fs to '
+              '%(new_time)0.2fs.')
+            % {
+                'changed': changed_count,
+                'count': processed_count,
+                'name': codec.name,
+                'old_size': intcomma(old_size),
+                'new_size': intcomma(new_size),
+                'old_time': old_decode_time,
+                'new_time': new_decode_time,
+            })
@@ -1,21 +1,26 @@
 from __future__ import unicode_literals
 
-import bz2
 import gc
 import hashlib
+import logging
 import os
+import zlib
 
 from django.db import DatabaseError, models, reset_queries, connection
 from django.db.models import Count, Q
 from django.db.utils import IntegrityError
 from django.utils.encoding import smart_unicode
 from django.utils.functional import cached_property
+from django.utils import six
 from django.utils.six.moves import range
 from django.utils.translation import ugettext as _
 from djblets.siteconfig.models import SiteConfiguration
 
+from reviewboard.diffviewer.compression import (BZip2CompressionCodec,
+                                                get_compression_codec_by_name)
 from reviewboard.diffviewer.differ import DiffCompatVersion
 from reviewboard.diffviewer.errors import DiffTooBigError, EmptyDiffError
+from reviewboard.diffviewer.parser import DiffParser
 from reviewboard.scmtools.core import PRE_CREATION, UNKNOWN, FileNotFoundError
 
 
@@ -320,17 +325,62 @@ class RawFileDiffDataManager(models.Manager):
     This provides conveniences for creating an entry based on a
     LegacyFileDiffData object.
     """
-    def process_diff_data(self, data):
+    def get_compression_policy(self):
+        """Returns the codec, level and minimum size used for new diff data.
+
+        These come from the ``diffviewer_diff_compression``,
+        ``diffviewer_diff_compression_level`` and
+        ``diffviewer_diff_compression_min_size`` site settings. If the
+        configured codec isn't known or isn't available, bzip2 is used. If
+        the level isn't valid for the codec, the codec's default is used.
+        """
+        siteconfig = SiteConfiguration.objects.get_current()
+        name = siteconfig.get('diffviewer_diff_compression')
+        codec = get_compression_codec_by_name(name)
+
+        if codec is None or not codec.is_available():
+            logging.warning('Diff compression codec "%s" is not available. '
+                            'Falling back to bzip2.',
+                            name)
+            codec = get_compression_codec_by_name(BZip2CompressionCodec.name)
+
+        level = siteconfig.get('diffviewer_diff_compression_level')
+        min_size = siteconfig.get('diffviewer_diff_compression_min_size')
+
+        if level is not None and not codec.is_valid_level(level):
+            # This can happen if the configured codec isn't available and
+            # bzip2 is used instead.
+            logging.warning('Diff compression level %s is not valid for '
+                            '%s. Using the default level.',
+                            level, codec.name)
+            level = None
+
+        return codec, level, min_size or 0
+
+    def process_diff_data(self, data, codec=None, level=None):
         """Processes a diff, returning the resulting content and compression.
 
         If the content would benefit from being compressed, this will
         return the compressed content and the value for the compression
         flag. Otherwise, it will return the raw content.
+
+        By default, the codec and level are chosen by the site
+        configuration. A :py:class:`CompressionCodec` and level can be
+        passed to override this.
         """
-        compressed_data = bz2.compress(data, 9)
+        if codec is None:
+            codec, policy_level, min_size = self.get_compression_policy()
+
+            if level is None:
+                level = policy_level
+
+            if len(data) < min_size:
+                return data, None
+
+        compressed_data = codec.compress(data, level)
 
         if len(compressed_data) < len(data):
-            return compressed_data, self.model.COMPRESSION_BZIP2
+            return compressed_data, codec.code
         else:
             return data, None
 
@@ -364,6 +414,59 @@ class RawFileDiffDataManager(models.Manager):
         return hasher.hexdigest()
 
 
+class RawFileContentManager(models.Manager):
+    """A custom manager for RawFileContent.
+
+    This provides conveniences for storing and looking up file content by
+    the SHA1 of the content.
+    """
+    #: The zlib compression level used for stored file content.
+    #:
+    #: This favors fast compression and decompression, since content is
+    #: stored and read back while rendering diffs.
+    COMPRESSION_LEVEL = 6
+
+    def get_content(self, binary_hash):
+        """Returns the stored content for a SHA1, or None if not stored."""
+        try:
+            return self.get(binary_hash=binary_hash).content
+        except self.model.DoesNotExist:
+            return None
+
+    def get_or_create_from_data(self, data):
+        """Stores file content, if it's not already stored.
+
+        This returns a tuple of the RawFileContent and whether it was
+        newly created.
+        """
+        binary_hash = self._hash_hexdigest(data)
+        compressed_data = zlib.compress(data, self.COMPRESSION_LEVEL)
+
+        if len(compressed_data) < len(data):
+            processed_data = compressed_data
+            compression = self.model.COMPRESSION_ZLIB
+        else:
+            processed_data = data
+            compression = None
+
+        try:
+            return self.get_or_create(
+                binary_hash=binary_hash,
+                defaults={
+                    'binary': processed_data,
+                    'compression': compression,
+                })
+        except IntegrityError:
+            # Another process stored the same content after we checked for
+            # it.
+            return self.get(binary_hash=binary_hash), False
+
+    def _hash_hexdigest(self, data):
+        hasher = hashlib.sha1()
+        hasher.update(data)
+        return hasher.hexdigest()
+
+
 class DiffSetManager(models.Manager):
     """A custom manager for DiffSet objects.
 
@@ -376,6 +479,9 @@ class DiffSetManager(models.Manager):
     HEADER_EXTENSIONS = ["h", "H", "hh", "hpp", "hxx", "h++"]
     IMPL_EXTENSIONS = ["c", "C", "cc", "cpp", "cxx", "c++", "m", "mm", "M"]
 
+    #: The number of FileDiffs to save at a time when creating a DiffSet.
+    FILEDIFF_BATCH_SIZE = 100
+
     def create_from_upload(self, repository, diff_file, parent_diff_file,
                            diffset_history, basedir, request,
                            base_commit_id=None, save=True):
@@ -424,6 +530,10 @@ class DiffSetManager(models.Manager):
 
         The diff_file_contents and parent_diff_file_contents parameters are
         strings with the actual diff contents.
+
+        The parsed files only refer to ranges of lines in the diffs. The
+        content of each file is copied out of the diff when its FileDiff is
+        built, and released once the FileDiff has its own copy.
         """
         from reviewboard.diffviewer.diffutils import convert_to_unicode
         from reviewboard.diffviewer.models import FileDiff
@@ -473,18 +583,30 @@ class DiffSetManager(models.Manager):
             # IDs.
             parent_commit_id = parent_parser.get_orig_commit_id()
 
+        siteconfig = SiteConfiguration.objects.get_current()
+
+        if siteconfig.get('diffviewer_patience_anchors'):
+            diffcompat = DiffCompatVersion.PATIENCE_ANCHORS
+        else:
+            diffcompat = DiffCompatVersion.DEFAULT
+
         diffset = self.model(
             name=diff_file_name, revision=0,
             basedir=basedir,
             history=diffset_history,
             repository=repository,
-            diffcompat=DiffCompatVersion.DEFAULT,
+            diffcompat=diffcompat,
             base_commit_id=base_commit_id)
+        diffset.extra_data = {
+            'raw_insert_count': sum(f.insert_count for f in files),
+            'raw_delete_count': sum(f.delete_count for f in files),
+        }
 
         if save:
             diffset.save()
 
         encoding_list = repository.get_encoding_list()
+        filediffs = []
 
         for f in files:
             if f.origFile in parent_files:
@@ -524,11 +646,142 @@ class DiffSetManager(models.Manager):
             filediff.set_line_counts(raw_insert_count=f.insert_count,
                                      raw_delete_count=f.delete_count)
 
+            # The diff content now lives in the RawFileDiffData, so there's
+            # no need to hold onto another copy while processing the rest of
+            # the files.
+            f.data = None
+
             if save:
-                filediff.save()
+                filediffs.append(filediff)
+
+                if len(filediffs) >= self.FILEDIFF_BATCH_SIZE:
+                    FileDiff.objects.bulk_create(filediffs)
+                    filediffs = []
+
+        if filediffs:
+            FileDiff.objects.bulk_create(filediffs)
+
+        if save:
+            from reviewboard.diffviewer.precompute import (
+                DiffSetPrecomputePool, queue_diffset_precompute)
+
+            queue_diffset_precompute(diffset,
+                                     DiffSetPrecomputePool.PRIORITY_UPLOADED)
 
         return diffset
 
+    def update_raw_line_counts(self, diffsets):
+        """Computes and stores the total raw line counts for DiffSets.
+
+        The totals of the ``raw_insert_count`` and ``raw_delete_count`` line
+        counts of each DiffSet's FileDiffs are stored in the DiffSet's
+        ``extra_data``, so that they can be shown without loading every
+        FileDiff.
+
+        The counts are read from the FileDiffs' ``extra_data``, or from the
+        :py:class:`RawFileDiffData` for FileDiffs that don't have them
+        stored, without loading any diff content. Only FileDiffs whose diffs
+        haven't been counted at all need their diffs migrated or re-parsed.
+        """
+        from reviewboard.diffviewer.models import FileDiff, RawFileDiffData
+
+        diffsets = dict(
+            (diffset.pk, diffset)
+            for diffset in diffsets
+        )
+        totals = dict(
+            (diffset_id, [0, 0])
+            for diffset_id in diffsets
+        )
+        filediffs_by_diff_hash = {}
+        uncounted_filediff_ids = []
+
+        def _add_counts(diffset_id, insert_count, delete_count):
+            diffset_totals = totals[diffset_id]
+            diffset_totals[0] += insert_count or 0
+            diffset_totals[1] += delete_count or 0
+
+        # Only the counts are needed, so the values are fetched directly
+        # rather than loading (or deferring) the diff contents. JSONFields
+        # aren't deserialized on deferred models, so extra_data is loaded
+        # here instead.
+        filediff_rows = (
+            FileDiff.objects
+            .filter(diffset__in=list(diffsets))
+            .values_list('pk', 'diffset', 'diff_hash', 'extra_data')
+        )
+        extra_data_field = FileDiff._meta.get_field('extra_data')
+
+        for row in filediff_rows:
+            filediff_id, diffset_id, diff_hash_id, extra_data = row
+
+            if extra_data:
+                extra_data = extra_data_field.loads(extra_data)
+            else:
+                extra_data = {}
+
+            if ('raw_insert_count' in extra_data and
+                'raw_delete_count' in extra_data):
+                _add_counts(diffset_id,
+                            extra_data['raw_insert_count'],
+                            extra_data['raw_delete_count'])
+            elif diff_hash_id:
+                filediffs_by_diff_hash.setdefault(diff_hash_id, []).append(
+                    (filediff_id, diffset_id))
+            else:
+                uncounted_filediff_ids.append(filediff_id)
+
+        if filediffs_by_diff_hash:
+            raw_diff_rows = (
+                RawFileDiffData.objects
+                .filter(pk__in=list(filediffs_by_diff_hash))
+                .values_list('pk', 'extra_data')
+            )
+            extra_data_field = RawFileDiffData._meta.get_field('extra_data')
+
+            for raw_diff_id, extra_data in raw_diff_rows:
+                if extra_data:
+                    extra_data = extra_data_field.loads(extra_data)
+                else:
+                    extra_data = {}
+
+                insert_count = extra_data.get('insert_count')
+                delete_count = extra_data.get('delete_count')
+
+                if insert_count is not None and delete_count is not None:
+                    counted = filediffs_by_diff_hash.pop(raw_diff_id)
+
+                    for filediff_id, diffset_id in counted:
+                        _add_counts(diffset_id, insert_count, delete_count)
+
+            for filediffs in six.itervalues(filediffs_by_diff_hash):
+                uncounted_filediff_ids += [
+                    filediff_id
+                    for filediff_id, diffset_id in filediffs
+                ]
+
+        if uncounted_filediff_ids:
+            for filediff in FileDiff.objects.filter(
+                    pk__in=uncounted_filediff_ids):
+                counts = filediff.get_line_counts()
+                _add_counts(filediff.diffset_id, counts['raw_insert_count'],
+                            counts['raw_delete_count'])
+
+        for diffset_id, (insert_count, delete_count) in six.iteritems(totals):
+            diffset = diffsets[diffset_id]
+
+            if diffset.extra_data is None:
+                diffset.extra_data = {}
+
+            diffset.extra_data.update({
+                'raw_insert_count': insert_count,
+                'raw_delete_count': delete_count,
+            })
+
+            # This avoids DiffSet.save(), which would update the
+            # DiffSetHistory's timestamp.
+            self.filter(pk=diffset_id).update(extra_data=diffset.extra_data)
+
     def _normalize_filename(self, filename, basedir):
         """Normalize a file name to be relative to the repository root."""
         if filename.startswith('/'):
@@ -539,8 +792,10 @@ class DiffSetManager(models.Manager):
     def _process_files(self, parser, basedir, repository, base_commit_id,
                        request, check_existence=False, limit_to=None):
         tool = repository.get_scmtool()
+        files = []
+        files_to_check = []
 
-        for f in parser.parse():
+        for f in self._iter_parsed_files(parser):
             dest_filename, dest_revision = tool.parse_diff_revision(
                 f.newFile,
                 f.newInfo,
@@ -563,26 +818,51 @@ class DiffSetManager(models.Manager):
                 continue
 
             # FIXME: this would be a good place to find permissions errors
-            if (source_revision != PRE_CREATION and
+            if (check_existence and
+                source_revision != PRE_CREATION and
                 source_revision != UNKNOWN and
                 not f.binary and
                 not f.deleted and
                 not f.moved and
-                not f.copied and
-                (check_existence and
-                 not repository.get_file_exists(source_filename,
-                                                source_revision,
-                                                base_commit_id=base_commit_id,
-                                                request=request))):
-                raise FileNotFoundError(source_filename, source_revision,
-                                        base_commit_id)
+                not f.copied):
+                files_to_check.append((source_filename, source_revision))
 
             f.origFile = source_filename
             f.origInfo = source_revision
             f.newFile = dest_filename
             f.newInfo = dest_revision
 
-            yield f
+            files.append(f)
+
+        if files_to_check:
+            # Check all the files at once, so that repositories that support
+            # it only need a single round trip.
+            files_exist = repository.get_files_exist(
+                files_to_check,
+                base_commit_id=base_commit_id,
+                request=request)
+
+            for (source_filename, source_revision), exists in \
+                    zip(files_to_check, files_exist):
+                if not exists:
+                    raise FileNotFoundError(source_filename, source_revision,
+                                            base_commit_id)
+
+        return files
+
+    def _iter_parsed_files(self, parser):
+        """Yield the files parsed from a diff, as they're parsed.
+
+        Parsers that override parse() rather than iter_files(), such as
+        those in older third-party SCMTools, are parsed all at once by
+        calling parse().
+        """
+        if (isinstance(parser, DiffParser) and
+            six.get_unbound_function(type(parser).parse) is
+            six.get_unbound_function(DiffParser.parse)):
+            return parser.iter_files()
+        else:
+            return parser.parse()
 
     def _compare_files(self, filename1, filename2):
         """
@@ -1,7 +1,7 @@
 from __future__ import unicode_literals
 
-import bz2
 import logging
+import zlib
 
 from django.db import models
 from django.db.models import Q
@@ -10,8 +10,13 @@ from django.utils.encoding import python_2_unicode_compatible
 from django.utils.translation import ugettext_lazy as _
 from djblets.db.fields import Base64Field, JSONField
 
+from reviewboard.diffviewer.compression import (BZip2CompressionCodec,
+                                                LZMACompressionCodec,
+                                                ZlibCompressionCodec,
+                                                get_compression_codec)
 from reviewboard.diffviewer.errors import DiffParserError
-from reviewboard.diffviewer.managers import (RawFileDiffDataManager,
+from reviewboard.diffviewer.managers import (RawFileContentManager,
+                                             RawFileDiffDataManager,
                                              FileDiffManager,
                                              DiffSetManager)
 from reviewboard.scmtools.core import PRE_CREATION
@@ -38,13 +43,21 @@ class RawFileDiffData(models.Model):
 
     This is the class used in Review Board 2.5+ to store diff content.
     Unlike in previous versions, the content is not base64-encoded. Instead,
-    it is stored either as bzip2-compressed data (if the resulting
-    compressed data is smaller than the raw data), or as the raw data itself.
+    it is stored either as compressed data (if the resulting compressed data
+    is smaller than the raw data), or as the raw data itself.
+
+    The compression used for new data is chosen by the
+    ``diffviewer_diff_compression`` site setting. The codecs are defined in
+    :py:mod:`reviewboard.diffviewer.compression`.
     """
-    COMPRESSION_BZIP2 = 'B'
+    COMPRESSION_BZIP2 = BZip2CompressionCodec.code
+    COMPRESSION_ZLIB = ZlibCompressionCodec.code
+    COMPRESSION_LZMA = LZMACompressionCodec.code
 
     COMPRESSION_CHOICES = (
-        (COMPRESSION_BZIP2, _('BZip2-compressed')),
+        (COMPRESSION_BZIP2, BZip2CompressionCodec.label),
+        (COMPRESSION_ZLIB, ZlibCompressionCodec.label),
+        (COMPRESSION_LZMA, LZMACompressionCodec.label),
     )
 
     binary_hash = models.CharField(_("hash"), max_length=40, unique=True)
@@ -62,15 +75,18 @@ class RawFileDiffData(models.Model):
         The content will be uncompressed (if necessary) and returned as the
         raw set of bytes originally uploaded.
         """
-        if self.compression == self.COMPRESSION_BZIP2:
-            return bz2.decompress(self.binary)
-        elif self.compression is None:
+        if self.compression is None:
             return bytes(self.binary)
-        else:
+
+        codec = get_compression_codec(self.compression)
+
+        if codec is None or not codec.is_available():
             raise NotImplementedError(
                 'Unsupported compression method %s for RawFileDiffData %s'
                 % (self.compression, self.pk))
 
+        return codec.decompress(self.binary)
+
     @property
     def insert_count(self):
         return self.extra_data.get('insert_count')
@@ -116,6 +132,48 @@ class RawFileDiffData(models.Model):
                 self.save(update_fields=['extra_data'])
 
 
+class RawFileContent(models.Model):
+    """Stores the content of an original or patched file.
+
+    Entries are keyed by the SHA1 of the content, which is what
+    :py:attr:`FileDiff.orig_sha1` and :py:attr:`FileDiff.patched_sha1`
+    record. Files that are identical across FileDiffs, diff revisions and
+    interdiffs are stored once, and can be served without going back to
+    the repository or re-applying any patches.
+
+    As with :py:class:`RawFileDiffData`, the content is stored compressed
+    if that makes it smaller.
+    """
+    COMPRESSION_ZLIB = 'Z'
+
+    COMPRESSION_CHOICES = (
+        (COMPRESSION_ZLIB, _('Zlib-compressed')),
+    )
+
+    binary_hash = models.CharField(_("hash"), max_length=40, unique=True)
+    binary = models.BinaryField()
+    compression = models.CharField(max_length=1, choices=COMPRESSION_CHOICES,
+                                   null=True, blank=True)
+
+    objects = RawFileContentManager()
+
+    @property
+    def content(self):
+        """Returns the content of the file.
+
+        The content will be uncompressed (if necessary) and returned as the
+        raw set of bytes originally stored.
+        """
+        if self.compression == self.COMPRESSION_ZLIB:
+            return zlib.decompress(self.binary)
+        elif self.compression is None:
+            return bytes(self.binary)
+        else:
+            raise NotImplementedError(
+                'Unsupported compression method %s for RawFileContent %s'
+                % (self.compression, self.pk))
+
+
 @python_2_unicode_compatible
 class FileDiff(models.Model):
     """
@@ -523,6 +581,27 @@ class DiffSet(models.Model):
 
         return counts
 
+    def get_total_raw_line_counts(self):
+        """Returns the total raw insert and delete counts for this diffset.
+
+        This returns a dictionary with the ``raw_insert_count`` and
+        ``raw_delete_count`` totals from :py:meth:`get_total_line_counts`.
+        These are stored on the diffset when it's created, so unlike
+        :py:meth:`get_total_line_counts`, this doesn't need to look at every
+        FileDiff. Diffsets created before the totals were stored will have
+        them computed and stored the first time they're needed.
+        """
+        extra_data = self.extra_data or {}
+
+        if ('raw_insert_count' not in extra_data or
+            'raw_delete_count' not in extra_data):
+            DiffSet.objects.update_raw_line_counts([self])
+
+        return {
+            'raw_insert_count': self.extra_data['raw_insert_count'],
+            'raw_delete_count': self.extra_data['raw_delete_count'],
+        }
+
     def save(self, **kwargs):
         """
         Saves this diffset.
@@ -159,11 +159,20 @@ class MyersDiffer(Differ):
         self.bdiag = [0] * vector_size
         self.downoff = self.upoff = self.b_data.undiscarded_lines + 1
 
+        self._find_changes()
+        self._shift_chunks(self.a_data, self.b_data)
+        self._shift_chunks(self.b_data, self.a_data)
+
+    def _find_changes(self):
+        """
+        Marks the modified lines in both sets of data.
+
+        This runs the LCS algorithm across all the lines that weren't
+        discarded. Subclasses can override this to split up the work.
+        """
         self._lcs(0, self.a_data.undiscarded_lines,
                   0, self.b_data.undiscarded_lines,
                   self.minimal_diff)
-        self._shift_chunks(self.a_data, self.b_data)
-        self._shift_chunks(self.b_data, self.a_data)
 
     def _gen_diff_codes(self, lines, is_modified_file):
         """
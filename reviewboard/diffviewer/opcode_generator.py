@@ -1,15 +1,21 @@
 from __future__ import unicode_literals
 
+import logging
 import os
 import re
+import time
+from bisect import bisect_right
 
-from django.utils import six
 from django.utils.six.moves import range
 
 from reviewboard.diffviewer.processors import (filter_interdiff_opcodes,
                                                post_process_filtered_equals)
 
 
+class _MoveTimeBudgetExceeded(Exception):
+    """Raised when move detection has run out of time."""
+
+
 class MoveRange(object):
     """Stores information on a move range.
 
@@ -40,12 +46,30 @@ class DiffOpcodeGenerator(object):
     MOVE_PREFERRED_MIN_LINES = 2
     MOVE_MIN_LINE_LENGTH = 20
 
+    # The number of consecutive removed lines hashed together when indexing
+    # them for move detection.
+    MOVE_INDEX_WINDOW_SIZE = MOVE_PREFERRED_MIN_LINES
+
+    # Runs of lines that were removed in more places than this are too
+    # common to be useful as moves, and are skipped.
+    MOVE_MAX_CANDIDATES = 32
+
+    # The maximum number of seconds to spend looking for moves in a file.
+    # If this is exceeded, the file is shown without any moves.
+    MOVE_TIME_BUDGET_SECS = 5
+
+    MOVE_HASH_BASE = 1000003
+    MOVE_HASH_MODULUS = (1 << 61) - 1
+
     TAB_SIZE = 8
 
-    def __init__(self, differ, diff=None, interdiff=None):
+    def __init__(self, differ, diff=None, interdiff=None, diff_ranges=None,
+                 interdiff_ranges=None):
         self.differ = differ
         self.diff = diff
         self.interdiff = interdiff
+        self.diff_ranges = diff_ranges
+        self.interdiff_ranges = interdiff_ranges
 
     def __iter__(self):
         """Returns opcodes from the differ with extra metadata.
@@ -77,8 +101,10 @@ class DiffOpcodeGenerator(object):
         if self.diff and self.interdiff:
             # Filter out any lines unrelated to these changes from the
             # interdiff. This will get rid of any merge information.
-            opcodes = filter_interdiff_opcodes(opcodes, self.diff,
-                                               self.interdiff)
+            opcodes = filter_interdiff_opcodes(
+                opcodes, self.diff, self.interdiff,
+                orig_ranges=self.diff_ranges,
+                new_ranges=self.interdiff_ranges)
 
         for opcode in opcodes:
             yield opcode
@@ -141,13 +167,13 @@ class DiffOpcodeGenerator(object):
         for group_index, group in enumerate(opcodes):
             self.groups.append(group)
 
-            # Store delete/insert ranges for later lookup. We will be building
-            # keys that in most cases will be unique for the particular block
-            # of text being inserted/deleted. There is a chance of collision,
-            # so we store a list of matching groups under that key.
+            # Store removed lines and insert groups for later lookup. Removed
+            # lines are keyed by their stripped text. The same line may be
+            # removed in more than one place, so we store a list of matching
+            # lines and groups under that key.
             #
-            # Later, we will loop through the keys and attempt to find insert
-            # keys/groups that match remove keys/groups.
+            # Later, we will use these to find inserted lines that match
+            # removed lines.
             tag = group[0]
 
             if tag in ('delete', 'replace'):
@@ -291,233 +317,278 @@ class DiffOpcodeGenerator(object):
         # consecutive groups of matching inserts/deletes that represent a
         # move block.
         #
-        # The algorithm will be documented as we go in the code.
+        # To keep this fast on large refactors, where many lines may match
+        # many removals, runs of removed lines are first hashed into an
+        # index. Each inserted line then only needs to look up the removed
+        # lines that start the same run of lines, and extend from there.
         #
-        # We start by looping through all the inserted groups.
-        for insert in self.inserts:
-            self._compute_move_for_insert(*insert)
+        # This is all bounded by a time budget. If we run out of time, we
+        # show no moves at all for the file, rather than a partial set.
+        if not self.inserts or not self.removes:
+            return
+
+        deadline = time.time() + self.MOVE_TIME_BUDGET_SECS
+        moves = []
+
+        try:
+            self._build_move_index(deadline)
+
+            for insert in self.inserts:
+                moves += self._compute_moves_for_insert(deadline, *insert)
+        except _MoveTimeBudgetExceeded:
+            logging.warning('Move detection took longer than %s seconds. '
+                            'Moved lines will not be shown for this file.',
+                            self.MOVE_TIME_BUDGET_SECS)
+            return
+
+        for imeta, i_start, r_move_range in moves:
+            # The ranges expected by the renderers are 1-based, whereas our
+            # calculations for this algorithm are 0-based, so we add 1 to
+            # the numbers.
+            i_range = range(i_start + 1,
+                            i_start + r_move_range.end - r_move_range.start +
+                            2)
+            r_range = range(r_move_range.start + 1, r_move_range.end + 2)
+
+            moved_to_ranges = dict(zip(r_range, i_range))
+
+            for group, group_index in r_move_range.groups:
+                rmeta = group[-1]
+                rmeta.setdefault('moved-to', {}).update(moved_to_ranges)
+
+            imeta.setdefault('moved-from', {}).update(
+                dict(zip(i_range, r_range)))
+
+    def _build_move_index(self, deadline):
+        """Builds the index of removed lines used to find moves.
+
+        Each run of consecutive removed lines is split into overlapping
+        windows of :py:attr:`MOVE_INDEX_WINDOW_SIZE` lines, which are
+        hashed using a rolling hash. The index maps each hash to the
+        positions of the windows starting with a non-blank line.
+        """
+        self._move_line_codes = {}
+        self._move_index = {}
+        self._removed_lines = {}
+        self._line_group_starts = []
+        self._line_groups = []
 
-    def _compute_move_for_insert(self, itag, ii1, ii2, ij1, ij2, imeta):
-        # Store some state on the range we'll be working with inside this
-        # insert group.
-        #
-        # i_move_cur is the current location inside the insert group
-        # (from ij1 through ij2).
-        #
-        # i_move_range is the current range of consecutive lines that
-        # we'll use for a move. Each line in this range has a
-        # corresponding consecutive delete line.
-        #
-        # r_move_ranges represents deleted move ranges. The key is a
-        # string in the form of "{i1}-{i2}-{j1}-{j2}", with those
-        # positions taken from the remove group for the line. The value
-        # is an instance of MoveRange. The values in MoveRange are used to
-        # quickly locate deleted lines we've found that match the inserted
-        # lines, so we can assemble ranges later.
-        i_move_cur = ij1
-        i_move_range = MoveRange(i_move_cur, i_move_cur)
-        r_move_ranges = {}  # key -> (start, end, group)
-        move_key = None
+        a = self.differ.a
+        runs = []
+
+        for group_index, group in enumerate(self.groups):
+            tag, i1, i2 = group[:3]
+
+            if i2 > i1:
+                self._line_group_starts.append(i1)
+                self._line_groups.append((group, group_index))
+
+            if tag in ('delete', 'replace'):
+                if runs and runs[-1][1] == i1:
+                    runs[-1][1] = i2
+                else:
+                    runs.append([i1, i2])
 
+        for i1, i2 in runs:
+            self._check_move_time_budget(deadline)
+
+            lines = [a[i].strip() for i in range(i1, i2)]
+            codes = [self._get_move_line_code(line) for line in lines]
+
+            for i, line in enumerate(lines):
+                self._removed_lines[i1 + i] = line
+
+            for offset, line_hash in self._hash_move_windows(codes):
+                if lines[offset]:
+                    self._move_index.setdefault(line_hash, []).append(
+                        i1 + offset)
+
+    def _compute_moves_for_insert(self, deadline, itag, ii1, ii2, ij1, ij2,
+                                  imeta):
+        """Returns the moves found for an inserted group.
+
+        This walks through the inserted lines, finding the longest block
+        of removed lines matching the lines starting at each point. Each
+        move is returned as a tuple of (insert meta, insert start, move
+        range).
+        """
+        b = self.differ.b
         is_replace = (itag == 'replace')
+        lines = [b[j].strip() for j in range(ij1, ij2)]
+        window_hashes = [
+            line_hash
+            for offset, line_hash in self._hash_move_windows([
+                self._move_line_codes.get(line, 0)
+                for line in lines
+            ])
+        ]
+        moves = []
+        offset = 0
+
+        while offset < len(lines):
+            self._check_move_time_budget(deadline)
+
+            line = lines[offset]
+            move_len = 0
 
-        # Loop through every location from ij1 through ij2 - 1 until we've
-        # reached the end.
-        while i_move_cur < ij2:
-            try:
-                iline = self.differ.b[i_move_cur].strip()
-            except IndexError:
-                iline = None
-
-            updated_range = False
-
-            if iline and iline in self.removes:
-                # The inserted line at this location has a corresponding
-                # removed line.
-                #
-                # If there's already some information on removed line ranges
-                # for this particular move block we're processing then we'll
-                # update the range.
-                #
-                # The way we do that is to find each removed line that matches
-                # this inserted line, and for each of those find out if there's
-                # an existing move range that the found removed line
-                # immediately follows. If there is, we update the existing
-                # range.
-                #
-                # If there isn't any move information for this line, we'll
-                # simply add it to the move ranges.
-                for ri, rgroup, rgroup_index in self.removes.get(iline, []):
-                    r_move_range = r_move_ranges.get(move_key)
-
-                    if not r_move_range or ri != r_move_range.end + 1:
-                        # We either didn't have a previous range, or this
-                        # group didn't immediately follow it, so we need
-                        # to start a new one.
-                        move_key = '%s-%s-%s-%s' % rgroup[1:5]
-                        r_move_range = r_move_ranges.get(move_key)
-
-                    if r_move_range:
-                        # If the remove information for the line is next in
-                        # the sequence for this calculated move range...
-                        if ri == r_move_range.end + 1:
-                            # This is part of the current range, so update
-                            # the end of the range to include it.
-                            r_move_range.end = ri
-                            r_move_range.add_group(rgroup, rgroup_index)
-                            updated_range = True
-                    else:
-                        # Check that this isn't a replace line that's just
-                        # "replacing" itself (which would happen if it's just
-                        # changing whitespace).
-                        if not is_replace or i_move_cur - ij1 != ri - ii1:
-                            # We don't have any move ranges yet, or we're done
-                            # with the existing range, so it's time to build
-                            # one based on any removed lines we find that
-                            # match the inserted line.
-                            r_move_ranges[move_key] = \
-                                MoveRange(ri, ri, [(rgroup, rgroup_index)])
-                            updated_range = True
-
-                if not updated_range and r_move_ranges:
-                    # We didn't find a move range that this line is a part
-                    # of, but we do have some existing move ranges stored.
-                    #
-                    # Given that updated_range is set, we'll be processing
-                    # the known move ranges below. We'll actually want to
-                    # re-check this line afterward, so that we can start a
-                    # new move range after we've finished processing the
-                    # current ones.
-                    #
-                    # To do that, just i_move_cur back by one. That negates
-                    # the increment below.
-                    i_move_cur -= 1
-                    move_key = None
-            elif iline == '' and move_key:
-                # This is a blank or whitespace-only line, which would not
-                # be in the list of removed lines above. We also have been
-                # working on a move range.
-                #
-                # At this point, the plan is to just attach this blank
-                # line onto the end of the last range being operated on.
-                #
-                # This blank line will help tie together adjacent move
-                # ranges. If it turns out to be a trailing line, it'll be
-                # stripped later in _determine_move_range.
-                r_move_range = r_move_ranges.get(move_key)
-
-                if r_move_range:
-                    new_end_i = r_move_range.end + 1
-
-                    if (new_end_i < len(self.differ.a) and
-                        self.differ.a[new_end_i].strip() == ''):
-                        # There was a matching blank line on the other end
-                        # of the range, so we should feel more confident about
-                        # adding the blank line here.
-                        r_move_range.end = new_end_i
-
-                        # It's possible that this blank line is actually an
-                        # "equal" line. Though technically it didn't move,
-                        # we're trying to create a logical, seamless move
-                        # range, so we need to try to find that group and
-                        # add it to the list of groups in the range, if it'
-                        # not already there.
-                        last_group, last_group_index = r_move_range.last_group
-
-                        if new_end_i >= last_group[2]:
-                            # This is in the next group, which hasn't been
-                            # added yet. So add it.
-                            cur_group_index = r_move_range.last_group[1] + 1
-                            r_move_range.add_group(
-                                self.groups[cur_group_index],
-                                cur_group_index)
-
-                        updated_range = True
-
-            i_move_cur += 1
-
-            if not updated_range or i_move_cur == ij2:
-                # We've reached the very end of the insert group. See if
-                # we have anything that looks like a move.
-                if r_move_ranges:
-                    r_move_range = self._find_longest_move_range(r_move_ranges)
-
-                    # If we have a move range, see if it's one we want to
-                    # include or filter out. Some moves are not impressive
-                    # enough to display. For example, a small portion of a
-                    # comment, or whitespace-only changes.
-                    r_move_range = self._determine_move_range(r_move_range)
-
-                    if r_move_range:
-                        # Rebuild the insert and remove ranges based on where
-                        # we are now and which range we won.
-                        #
-                        # The new ranges will be actual lists of positions,
-                        # rather than a beginning and end. These will be
-                        # provided to the renderer.
-                        #
-                        # The ranges expected by the renderers are 1-based,
-                        # whereas our calculations for this algorithm are
-                        # 0-based, so we add 1 to the numbers.
-                        #
-                        # The upper boundaries passed to the range() function
-                        # must actually be one higher than the value we want.
-                        # So, for r_move_range, we actually increment by 2.  We
-                        # only increment i_move_cur by one, because i_move_cur
-                        # already factored in the + 1 by being at the end of
-                        # the while loop.
-                        i_range = range(i_move_range.start + 1,
-                                        i_move_cur + 1)
-                        r_range = range(r_move_range.start + 1,
-                                        r_move_range.end + 2)
-
-                        moved_to_ranges = dict(zip(r_range, i_range))
-
-                        for group, group_index in r_move_range.groups:
-                            rmeta = group[-1]
-                            rmeta.setdefault('moved-to', {}).update(
-                                moved_to_ranges)
-
-                        imeta.setdefault('moved-from', {}).update(
-                            dict(zip(i_range, r_range)))
-
-                # Reset the state for the next range.
-                move_key = None
-                i_move_range = MoveRange(i_move_cur, i_move_cur)
-                r_move_ranges = {}
-
-    def _find_longest_move_range(self, r_move_ranges):
-        # Go through every range of lines we've found and find the longest.
-        #
-        # The longest move range wins. If we find two ranges that are equal,
-        # though, we'll ignore both. The idea is that if we have two identical
-        # moves, then it's probably common enough code that we don't want to
-        # show the move. An example might be some standard part of a comment
-        # block, with no real changes in content.
-        #
-        # Note that with the current approach, finding duplicate moves doesn't
-        # cause us to reset the winning range to the second-highest identical
-        # match. We may want to do that down the road, but it means additional
-        # state, and this is hopefully uncommon enough to not be a real
-        # problem.
-        r_move_range = None
-
-        for iter_move_range in six.itervalues(r_move_ranges):
-            if not r_move_range:
-                r_move_range = iter_move_range
-            else:
-                len1 = r_move_range.end - r_move_range.start
-                len2 = iter_move_range.end - iter_move_range.start
-
-                if len1 < len2:
-                    r_move_range = iter_move_range
-                elif len1 == len2:
-                    # If there are two that are the same, it may be common
-                    # code that we don't want to see moves for. Comments,
-                    # for example.
-                    r_move_range = None
-
-        return r_move_range
+            if line:
+                candidates = []
+
+                if offset < len(window_hashes):
+                    candidates = self._move_index.get(window_hashes[offset],
+                                                      [])
+
+                if (not candidates and
+                    len(line) >= self.MOVE_MIN_LINE_LENGTH):
+                    # Long enough lines can be moves on their own.
+                    candidates = [
+                        ri
+                        for ri, rgroup, rgroup_index in self.removes.get(
+                            line, [])
+                    ]
+
+                if 0 < len(candidates) <= self.MOVE_MAX_CANDIDATES:
+                    ri, move_len = self._find_longest_move(
+                        candidates, lines, offset,
+                        is_replace and (ii1, ii2))
+
+                    if ri is not None:
+                        r_move_range = self._determine_move_range(
+                            MoveRange(ri, ri + move_len - 1))
+
+                        if r_move_range:
+                            r_move_range.groups = self._get_move_groups(
+                                r_move_range.start, r_move_range.end)
+                            moves.append((imeta, ij1 + offset, r_move_range))
+
+            offset += max(move_len, 1)
+
+        return moves
+
+    def _find_longest_move(self, candidates, lines, offset, replace_range):
+        """Returns the longest removed block matching some inserted lines.
+
+        ``candidates`` is a list of removed line indexes to start from, and
+        ``lines`` and ``offset`` are the stripped inserted lines and the
+        position to match from.
+
+        The longest move wins. If we find two moves of the same length,
+        though, we'll ignore both. The idea is that if we have two identical
+        moves, then it's probably common enough code that we don't want to
+        show the move. An example might be some standard part of a comment
+        block, with no real changes in content.
+
+        This returns a tuple of (start index, length). The start index will
+        be None if there's no move, but the length may still be set, in
+        order to skip past ambiguous blocks of lines.
+        """
+        best_ri = None
+        best_len = 0
+        is_tied = False
+
+        for ri in candidates:
+            if (replace_range and
+                replace_range[0] <= ri < replace_range[1] and
+                ri - replace_range[0] == offset):
+                # This is a replace line that's just "replacing" itself
+                # (which would happen if it's just changing whitespace).
+                continue
+
+            move_len = self._get_move_length(ri, lines, offset)
+
+            if move_len > best_len:
+                best_ri = ri
+                best_len = move_len
+                is_tied = False
+            elif move_len == best_len:
+                is_tied = True
+
+        if is_tied:
+            best_ri = None
+
+        return best_ri, best_len
+
+    def _get_move_length(self, ri, lines, offset):
+        """Returns how many lines match starting at a removed line.
+
+        Blank lines that weren't removed are allowed to be part of the
+        match, in order to tie together adjacent blocks of removed lines.
+        If they turn out to be trailing lines, they'll be stripped later in
+        :py:meth:`_determine_move_range`.
+        """
+        a = self.differ.a
+        move_len = 0
+
+        while offset + move_len < len(lines) and ri + move_len < len(a):
+            i = ri + move_len
+            line = self._removed_lines.get(i)
+
+            if line is None and a[i].strip() == '':
+                line = ''
+
+            if line is None or line != lines[offset + move_len]:
+                break
+
+            move_len += 1
+
+        return move_len
+
+    def _get_move_groups(self, start, end):
+        """Returns the groups covering a range of original lines.
+
+        This returns a list of (group, group_index) tuples.
+        """
+        i = bisect_right(self._line_group_starts, start) - 1
+
+        groups = []
+
+        while (i < len(self._line_group_starts) and
+               self._line_group_starts[i] <= end):
+            groups.append(self._line_groups[i])
+            i += 1
+
+        return groups
+
+    def _get_move_line_code(self, line):
+        """Returns a number uniquely identifying a stripped line."""
+        try:
+            return self._move_line_codes[line]
+        except KeyError:
+            code = len(self._move_line_codes) + 1
+            self._move_line_codes[line] = code
+
+            return code
+
+    def _hash_move_windows(self, codes):
+        """Yields the rolling hash of each window in a list of line codes.
+
+        This yields a tuple of (offset, hash) for each full window.
+        """
+        window_size = self.MOVE_INDEX_WINDOW_SIZE
+
+        if len(codes) < window_size:
+            return
+
+        base = self.MOVE_HASH_BASE
+        modulus = self.MOVE_HASH_MODULUS
+        high_power = pow(base, window_size - 1, modulus)
+        line_hash = 0
+
+        for code in codes[:window_size]:
+            line_hash = (line_hash * base + code) % modulus
+
+        yield 0, line_hash
+
+        for offset in range(1, len(codes) - window_size + 1):
+            line_hash = ((line_hash - codes[offset - 1] * high_power) * base +
+                         codes[offset + window_size - 1]) % modulus
+
+            yield offset, line_hash
+
+    def _check_move_time_budget(self, deadline):
+        """Raises _MoveTimeBudgetExceeded if past the move deadline."""
+        if time.time() > deadline:
+            raise _MoveTimeBudgetExceeded
 
     def _determine_move_range(self, r_move_range):
         """Determines if a move range is valid and should be included.
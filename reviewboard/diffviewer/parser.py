@@ -1,7 +1,9 @@
 from __future__ import unicode_literals
 
 import logging
+import mmap
 import re
+from array import array
 
 from django.utils import six
 from django.utils.six.moves import range
@@ -9,6 +11,122 @@ from django.utils.six.moves import range
 from reviewboard.diffviewer.errors import DiffParserError
 
 
+class DiffLines(object):
+    """The lines in a diff, without their line endings.
+
+    Rather than splitting the diff into a list of strings, this stores the
+    offsets of each line in the diff, and only copies a line out of the diff
+    when it's accessed. Lines are split the same way as
+    :py:func:`~reviewboard.diffviewer.diffutils.split_line_endings`.
+    """
+
+    def __init__(self, data):
+        from reviewboard.diffviewer.diffutils import NEWLINE_RE
+
+        self.data = data
+
+        if len(data) < 2 ** 32 - 1:
+            typecode = b'I'
+        else:
+            typecode = b'L'
+
+        # If every line ends with a plain newline, each line ends right
+        # before the next one starts, and a range of lines can be sliced out
+        # of the diff as-is. Otherwise, the ends of the lines are stored
+        # separately.
+        self._newlines_only = (data.find(b'\r') == -1)
+
+        if self._newlines_only:
+            self._ends = None
+            self._starts = array(typecode, [0])
+            self._starts.extend(
+                m.end()
+                for m in re.finditer(b'\n', data)
+            )
+
+            if self._starts[-1] < len(data):
+                # The last line doesn't end with a newline. Pretend it does,
+                # so that it ends at the end of the diff.
+                self._starts.append(len(data) + 1)
+        else:
+            self._starts = array(typecode, [0])
+            self._ends = array(typecode)
+
+            for m in NEWLINE_RE.finditer(data):
+                self._starts.append(m.end())
+                self._ends.append(m.start())
+
+            if self._starts[-1] < len(data):
+                self._starts.append(len(data))
+                self._ends.append(len(data))
+
+        # The number of lines. The last entry in self._starts is where the
+        # line after the last line would start.
+        self._len = len(self._starts) - 1
+
+        # Parsers usually look at the same line several times in a row, so
+        # the last line accessed is kept.
+        self._last_linenum = None
+        self._last_line = None
+
+    def __len__(self):
+        return self._len
+
+    def __getitem__(self, linenum):
+        if linenum == self._last_linenum:
+            return self._last_line
+
+        if isinstance(linenum, slice):
+            return [
+                self[i]
+                for i in range(*linenum.indices(self._len))
+            ]
+
+        if linenum < 0:
+            linenum += self._len
+
+        if not 0 <= linenum < self._len:
+            raise IndexError('line number out of range')
+
+        if self._newlines_only:
+            line = self.data[self._starts[linenum]:
+                             self._starts[linenum + 1] - 1]
+        else:
+            line = self.data[self._starts[linenum]:self._ends[linenum]]
+
+        self._last_linenum = linenum
+        self._last_line = line
+
+        return line
+
+    def __iter__(self):
+        for i in range(self._len):
+            yield self[i]
+
+    def get_data(self, start, end):
+        """Returns the lines in a range, each ending with a newline.
+
+        This is equivalent to joining ``self[start:end]`` with newlines, but
+        copies the lines out of the diff with a single slice if possible.
+        """
+        if start >= end:
+            return b''
+
+        if self._newlines_only:
+            end_offset = self._starts[end]
+
+            if end_offset <= len(self.data):
+                return self.data[self._starts[start]:end_offset]
+            else:
+                # The diff doesn't end with a newline.
+                return self.data[self._starts[start]:end_offset - 1] + b'\n'
+
+        return b''.join(
+            self[i] + b'\n'
+            for i in range(start, end)
+        )
+
+
 class File(object):
     def __init__(self):
         self.origFile = None
@@ -16,7 +134,6 @@ class File(object):
         self.origInfo = None
         self.newInfo = None
         self.origChangesetId = None
-        self.data = None
         self.binary = False
         self.deleted = False
         self.moved = False
@@ -24,6 +141,94 @@ class File(object):
         self.insert_count = 0
         self.delete_count = 0
 
+        # The parts of the diff content, as strings or (start, end) ranges
+        # of lines in self._lines.
+        self._data_parts = None
+        self._lines = None
+
+    @property
+    def data(self):
+        """The diff content for the file.
+
+        Ranges of lines added with :py:meth:`append_data_lines` are copied
+        out of the diff the first time this is accessed.
+        """
+        parts = self._data_parts
+
+        if parts is None:
+            return None
+
+        if len(parts) != 1 or not isinstance(parts[0], six.binary_type):
+            parts[:] = [b''.join(
+                part
+                if isinstance(part, six.binary_type)
+                else self._lines.get_data(*part)
+                for part in parts
+            )]
+
+        return parts[0]
+
+    @data.setter
+    def data(self, data):
+        if data is None:
+            self._data_parts = None
+        else:
+            self._data_parts = [data]
+
+    def append_data(self, data):
+        """Appends a string to the file's diff content."""
+        if self._data_parts is None:
+            self._data_parts = []
+
+        self._data_parts.append(data)
+
+    def append_data_lines(self, lines, start, end):
+        """Appends a range of lines from a diff to the file's diff content.
+
+        Only the range is stored. The lines are copied out of ``lines`` (a
+        :py:class:`DiffLines`) when :py:attr:`data` is accessed.
+        """
+        if self._data_parts is None:
+            self._data_parts = []
+
+        parts = self._data_parts
+
+        if (parts and
+            isinstance(parts[-1], tuple) and
+            parts[-1][1] == start and
+            self._lines is lines):
+            parts[-1] = (parts[-1][0], end)
+        else:
+            self._add_lines(lines)
+            parts.append((start, end))
+
+    def prepend_data_lines(self, lines, start, end):
+        """Prepends a range of lines from a diff to the file's diff content.
+
+        This works like :py:meth:`append_data_lines`.
+        """
+        if self._data_parts is None:
+            self._data_parts = []
+
+        parts = self._data_parts
+
+        if (parts and
+            isinstance(parts[0], tuple) and
+            parts[0][0] == end and
+            self._lines is lines):
+            parts[0] = (start, parts[0][1])
+        else:
+            self._add_lines(lines)
+            parts.insert(0, (start, end))
+
+    def _add_lines(self, lines):
+        """Sets the diff that line ranges in the diff content refer to."""
+        if self._lines is None:
+            self._lines = lines
+        elif self._lines is not lines:
+            raise ValueError('Line ranges from another diff cannot be '
+                             'added to this file.')
+
 
 class DiffParser(object):
     """
@@ -34,23 +239,41 @@ class DiffParser(object):
     INDEX_SEP = b"=" * 67
 
     def __init__(self, data):
-        from reviewboard.diffviewer.diffutils import split_line_endings
+        """Initializes the parser.
 
+        ``data`` is the diff, as a string. It can also be a file-like object,
+        which will be memory-mapped if it's backed by a file, or otherwise
+        read, or a memoryview.
+        """
         self.base_commit_id = None
         self.new_commit_id = None
-        self.data = data
-        self.lines = split_line_endings(data)
+        self.data = self._get_diff_buffer(data)
+        self.lines = DiffLines(self.data)
 
     def parse(self):
         """
         Parses the diff, returning a list of File objects representing each
         file in the diff.
+
+        This is kept for compatibility. Parsers should implement
+        :py:meth:`iter_files` instead.
+        """
+        self.files = list(self.iter_files())
+
+        return self.files
+
+    def iter_files(self):
         """
-        logging.debug("DiffParser.parse: Beginning parse of diff, size = %s",
+        Parses the diff, yielding a File object for each file in the diff as
+        soon as it's been fully parsed.
+
+        The Files refer to ranges of lines in the diff, rather than holding
+        copies of their content, until their data is accessed.
+        """
+        logging.debug("DiffParser.iter_files: Beginning parse of diff, "
+                      "size = %s",
                       len(self.data))
 
-        preamble = b''
-        self.files = []
         file = None
         i = 0
 
@@ -59,22 +282,25 @@ class DiffParser(object):
             next_linenum, new_file = self.parse_change_header(i)
 
             if new_file:
-                # This line is the start of a new file diff.
+                # This line is the start of a new file diff, so the previous
+                # file is complete.
+                if file:
+                    yield file
+                elif i > 0:
+                    # Anything before the first file is part of its diff.
+                    new_file.prepend_data_lines(self.lines, 0, i)
+
                 file = new_file
-                file.data = preamble + file.data
-                preamble = b''
-                self.files.append(file)
                 i = next_linenum
+            elif file:
+                i = self.parse_diff_line(i, file)
             else:
-                if file:
-                    i = self.parse_diff_line(i, file)
-                else:
-                    preamble += self.lines[i] + b'\n'
-                    i += 1
+                i += 1
 
-        logging.debug("DiffParser.parse: Finished parsing diff.")
+        if file:
+            yield file
 
-        return self.files
+        logging.debug("DiffParser.iter_files: Finished parsing diff.")
 
     def parse_diff_line(self, linenum, info):
         line = self.lines[linenum]
@@ -85,7 +311,7 @@ class DiffParser(object):
             elif line.startswith(b'+'):
                 info.insert_count += 1
 
-        info.data += line + b'\n'
+        info.append_data_lines(self.lines, linenum, linenum + 1)
 
         return linenum + 1
 
@@ -138,9 +364,7 @@ class DiffParser(object):
 
             # The header is part of the diff, so make sure it gets in the
             # diff content.
-            file.data = b''.join([
-                self.lines[i] + b'\n' for i in range(start, linenum)
-            ])
+            file.append_data_lines(self.lines, start, linenum)
 
         return linenum, file
 
@@ -224,6 +448,20 @@ class DiffParser(object):
                               "found in the diff header",
                               linenum)
 
+    def _get_diff_buffer(self, data):
+        """Returns a buffer for the diff that lines can be sliced out of."""
+        if isinstance(data, memoryview):
+            # Regular expressions can't scan memoryviews on Python 2.
+            return data.tobytes()
+        elif hasattr(data, 'read'):
+            try:
+                return mmap.mmap(data.fileno(), 0, access=mmap.ACCESS_READ)
+            except Exception:
+                # This isn't backed by a (non-empty) file.
+                return data.read()
+
+        return data
+
     def raw_diff(self, diffset):
         """Returns a raw diff as a string.
 
@@ -0,0 +1,473 @@
+"""In-process application of unified diffs.
+
+This implements the subset of GNU patch's behavior that Review Board relies
+upon when building the original and patched versions of a file: unified
+hunks applied to an in-memory buffer, with the same offset search and fuzz
+rules that ``patch`` uses by default.
+
+Anything outside of that subset (context or ed-style diffs, multiple files,
+malformed hunks, mismatched newline markers, or hunks that can't be located)
+raises :py:class:`~reviewboard.diffviewer.errors.PatchRejectedError`. Callers
+are expected to fall back on the ``patch`` tool in that case, so that
+failure reporting stays exactly the same as before.
+
+Data passed in is expected to have already gone through
+:py:func:`reviewboard.diffviewer.diffutils.convert_line_endings`, meaning
+that ``\\n`` is the only line ending present.
+"""
+
+from __future__ import unicode_literals
+
+import re
+
+from reviewboard.diffviewer.errors import PatchRejectedError
+
+
+#: The maximum amount of fuzz to apply when locating a hunk.
+#:
+#: This matches the default used by GNU patch.
+DEFAULT_MAX_FUZZ = 2
+
+
+HUNK_HEADER_RE = re.compile(br'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+NO_NEWLINE_PREFIX = b'\\'
+
+# GNU patch treats an original file named /dev/null, or with a timestamp at
+# the epoch, as a file that doesn't exist yet.
+CREATION_HEADER_RE = re.compile(
+    br'^--- (?:/dev/null|[^\n]*\t19(?:70-01-01|69-12-31) )',
+    re.M)
+
+
+class Hunk(object):
+    """A parsed hunk from a unified diff.
+
+    ``lines`` contains a tuple of ``(op, content)`` for every line in the
+    hunk, where ``op`` is one of ``b' '``, ``b'-'`` or ``b'+'`` and
+    ``content`` has no line ending.
+
+    ``old_lines`` is the list of line contents that must be present in the
+    file in order for the hunk to apply.
+    """
+
+    def __init__(self, num, orig_start, orig_len, new_start, new_len):
+        self.num = num
+        self.orig_start = orig_start
+        self.orig_len = orig_len
+        self.new_start = new_start
+        self.new_len = new_len
+        self.lines = []
+        self.old_lines = []
+        self.old_no_newline = False
+        self.new_no_newline = False
+
+    @property
+    def first_guess(self):
+        """The 0-based index in the file where the hunk should start.
+
+        Like GNU patch, a hunk that doesn't remove or keep any lines refers
+        to the line *after* its starting line number.
+        """
+        if self.orig_len == 0:
+            return self.orig_start
+        else:
+            return self.orig_start - 1
+
+    def get_reversed(self):
+        """Return a copy of the hunk with its changes reversed."""
+        swapped_ops = {
+            b' ': b' ',
+            b'-': b'+',
+            b'+': b'-',
+        }
+
+        hunk = Hunk(num=self.num,
+                    orig_start=self.new_start,
+                    orig_len=self.new_len,
+                    new_start=self.orig_start,
+                    new_len=self.orig_len)
+        hunk.lines = [
+            (swapped_ops[op], content)
+            for op, content in self.lines
+        ]
+        hunk.old_lines = [
+            content
+            for op, content in self.lines
+            if op != b'-'
+        ]
+        hunk.old_no_newline = self.new_no_newline
+        hunk.new_no_newline = self.old_no_newline
+
+        return hunk
+
+    @property
+    def prefix_context(self):
+        """The number of context lines leading the hunk."""
+        count = 0
+
+        for op, content in self.lines:
+            if op != b' ':
+                break
+
+            count += 1
+
+        return count
+
+    @property
+    def suffix_context(self):
+        """The number of context lines trailing the hunk."""
+        count = 0
+
+        for op, content in reversed(self.lines):
+            if op != b' ':
+                break
+
+            count += 1
+
+        return count
+
+
+def split_lines(data):
+    """Split data into line contents, noting if it ends with a newline.
+
+    This returns a tuple of ``(lines, has_trailing_newline)``. Only ``\\n``
+    is treated as a line separator.
+    """
+    if not data:
+        return [], True
+
+    lines = data.split(b'\n')
+
+    if lines[-1]:
+        return lines, False
+    else:
+        return lines[:-1], True
+
+
+def parse_hunks(diff):
+    """Parse the hunks out of a single-file unified diff.
+
+    Any content outside of the hunks (headers, git extended headers,
+    Subversion property changes, and so on) is ignored, as GNU patch does.
+
+    Raises PatchRejectedError if the diff contains no unified hunks, covers
+    more than one file, or has a hunk that ends prematurely.
+    """
+    lines, has_trailing_newline = split_lines(diff)
+    num_lines = len(lines)
+    hunks = []
+    i = 0
+
+    while i < num_lines:
+        line = lines[i]
+
+        if (line.startswith(b'--- ') and i + 1 < num_lines and
+            lines[i + 1].startswith(b'+++ ') and hunks):
+            raise PatchRejectedError('The diff contains more than one file')
+
+        m = HUNK_HEADER_RE.match(line)
+
+        if not m:
+            i += 1
+            continue
+
+        hunk = Hunk(num=len(hunks) + 1,
+                    orig_start=int(m.group(1)),
+                    orig_len=int(m.group(2) or 1),
+                    new_start=int(m.group(3)),
+                    new_len=int(m.group(4) or 1))
+        orig_remaining = hunk.orig_len
+        new_remaining = hunk.new_len
+        i += 1
+
+        while orig_remaining > 0 or new_remaining > 0:
+            if i >= num_lines:
+                raise PatchRejectedError('Unexpected end of hunk',
+                                         hunk_num=hunk.num)
+
+            line = lines[i]
+            op = line[:1]
+
+            if op == b' ' or not line:
+                # GNU patch treats a completely empty line as a blank
+                # context line.
+                op = b' '
+                orig_remaining -= 1
+                new_remaining -= 1
+            elif op == b'-':
+                orig_remaining -= 1
+            elif op == b'+':
+                new_remaining -= 1
+            elif op == NO_NEWLINE_PREFIX and hunk.lines:
+                _mark_no_newline(hunk)
+                i += 1
+                continue
+            else:
+                raise PatchRejectedError('Malformed hunk line %d' % (i + 1),
+                                         hunk_num=hunk.num)
+
+            if orig_remaining < 0 or new_remaining < 0:
+                raise PatchRejectedError('Hunk line counts do not match',
+                                         hunk_num=hunk.num)
+
+            content = line[1:]
+            hunk.lines.append((op, content))
+
+            if op != b'+':
+                hunk.old_lines.append(content)
+
+            i += 1
+
+        if not hunk.lines:
+            raise PatchRejectedError('Empty hunk', hunk_num=hunk.num)
+
+        if i < num_lines and lines[i].startswith(NO_NEWLINE_PREFIX):
+            _mark_no_newline(hunk)
+            i += 1
+
+        hunks.append(hunk)
+
+    if not hunks:
+        raise PatchRejectedError('No unified diff hunks were found')
+
+    return hunks
+
+
+def _mark_no_newline(hunk):
+    """Apply a "No newline at end of file" marker to the last hunk line."""
+    op = hunk.lines[-1][0]
+
+    if op in (b' ', b'-'):
+        hunk.old_no_newline = True
+
+    if op in (b' ', b'+'):
+        hunk.new_no_newline = True
+
+
+def apply_patch(diff, data, max_fuzz=DEFAULT_MAX_FUZZ):
+    """Apply a single-file unified diff to a buffer.
+
+    This returns the patched buffer. If any hunk can't be applied the way
+    GNU patch would apply it, PatchRejectedError is raised.
+    """
+    hunks = parse_hunks(diff)
+
+    if data:
+        header_end = diff.find(b'\n@@ ')
+
+        if (header_end != -1 and
+            CREATION_HEADER_RE.search(diff, 0, header_end)):
+            # GNU patch would ask whether to reverse a patch creating a file
+            # that already exists, and then skip it.
+            raise PatchRejectedError('The diff creates a file that already '
+                                     'exists')
+
+    file_lines, file_has_newline = split_lines(data)
+    num_file_lines = len(file_lines)
+
+    result = []
+    result_has_newline = True
+
+    # The index of the first line in the file that hasn't been consumed by
+    # a previous hunk, and the accumulated offset from previous hunks.
+    # These are patch's "last_frozen_line" and "in_offset".
+    consumed = 0
+    offset = 0
+
+    for hunk in hunks:
+        first_guess = hunk.first_guess + offset
+        where = None
+
+        for fuzz in range(max_fuzz + 1):
+            where = _locate_hunk(hunk, file_lines, file_has_newline,
+                                 first_guess, consumed, fuzz)
+
+            if where is not None:
+                break
+
+            if hunk.num == 1:
+                reversed_hunk = hunk.get_reversed()
+
+                if _locate_hunk(reversed_hunk, file_lines, file_has_newline,
+                                reversed_hunk.first_guess, consumed,
+                                fuzz) is not None:
+                    # GNU patch would prompt to apply this in reverse, and
+                    # then skip it when run non-interactively.
+                    raise PatchRejectedError('Reversed (or previously '
+                                             'applied) patch detected',
+                                             hunk_num=hunk.num)
+
+        if where is None:
+            raise PatchRejectedError('Hunk #%d could not be located'
+                                     % hunk.num,
+                                     hunk_num=hunk.num)
+
+        offset = where - hunk.first_guess
+
+        if not result_has_newline:
+            raise PatchRejectedError('Content follows a missing newline',
+                                     hunk_num=hunk.num)
+
+        result.extend(file_lines[consumed:where])
+        pos = where
+
+        for op, content in hunk.lines:
+            if op == b' ':
+                # As with GNU patch, context lines are taken from the file,
+                # so fuzzed context is preserved as-is. Fuzzed context past
+                # the end of the file is dropped.
+                if pos < num_file_lines:
+                    result.append(file_lines[pos])
+
+                pos += 1
+            elif op == b'-':
+                pos += 1
+            else:
+                result.append(content)
+
+        consumed = min(pos, num_file_lines)
+
+        last_op = hunk.lines[-1][0]
+
+        if last_op == b' ':
+            # The trailing context came from the file, along with its
+            # newline (or lack thereof).
+            if consumed == num_file_lines:
+                result_has_newline = file_has_newline
+        elif last_op == b'+' and hunk.new_no_newline:
+            if consumed != num_file_lines:
+                raise PatchRejectedError('Missing newline before end of file',
+                                         hunk_num=hunk.num)
+
+            result_has_newline = False
+
+    if consumed < num_file_lines:
+        if not result_has_newline:
+            raise PatchRejectedError('Content follows a missing newline')
+
+        result.extend(file_lines[consumed:])
+        result_has_newline = file_has_newline
+
+    if not result:
+        return b''
+
+    patched = b'\n'.join(result)
+
+    if result_has_newline:
+        patched += b'\n'
+
+    return patched
+
+
+def _locate_hunk(hunk, file_lines, file_has_newline, first_guess, consumed,
+                 fuzz):
+    """Locate the position in the file where a hunk applies.
+
+    This follows GNU patch's locate_hunk(): the hunk's expected position is
+    tried first, followed by positions alternating after and before it. A
+    hunk may not apply before any lines consumed by a previous hunk.
+
+    With a non-zero fuzz, up to that many leading and trailing context lines
+    may be ignored. Hunks with less leading than trailing context (or vice
+    versa) are anchored to the start (or end) of the file until the fuzz
+    makes up for the difference.
+
+    Returns the 0-based index of the start of the hunk, or None.
+    """
+    pat_lines = len(hunk.old_lines)
+    num_file_lines = len(file_lines)
+    prefix_context = hunk.prefix_context
+    suffix_context = hunk.suffix_context
+    context = max(prefix_context, suffix_context)
+    prefix_fuzz = fuzz + prefix_context - context
+    suffix_fuzz = fuzz + suffix_context - context
+
+    max_neg_offset = first_guess - consumed
+
+    if pat_lines == 0:
+        # Nothing to match. Apply it wherever the diff said it applies,
+        # within reason.
+        if 0 <= max_neg_offset and first_guess <= num_file_lines:
+            return first_guess
+
+        return None
+
+    if prefix_fuzz < 0 and hunk.orig_start <= 1:
+        # This can only match the start of the file.
+        if suffix_fuzz < 0 and pat_lines != num_file_lines:
+            # It can only match the entire file.
+            return None
+
+        if (consumed <= prefix_context and
+            pat_lines <= num_file_lines and
+            _hunk_matches(hunk, file_lines, file_has_newline, 0, 0,
+                          max(suffix_fuzz, 0))):
+            return 0
+
+        return None
+
+    prefix_fuzz = max(prefix_fuzz, 0)
+
+    if suffix_fuzz < 0:
+        # This can only match the end of the file.
+        where = num_file_lines - pat_lines
+
+        if (first_guess - where <= max_neg_offset and
+            where >= consumed and
+            _hunk_matches(hunk, file_lines, file_has_newline, where,
+                          min(prefix_fuzz, prefix_context), 0)):
+            return where
+
+        return None
+
+    prefix_fuzz = min(prefix_fuzz, prefix_context)
+    suffix_fuzz = min(suffix_fuzz, suffix_context)
+
+    # Fuzzed trailing context is allowed to run past the end of the file.
+    max_pos_offset = num_file_lines - first_guess - (pat_lines - suffix_fuzz)
+
+    max_offset = max(max_pos_offset, max_neg_offset)
+
+    for cur_offset in range(max_offset + 1):
+        if cur_offset <= max_pos_offset:
+            where = first_guess + cur_offset
+
+            if _hunk_matches(hunk, file_lines, file_has_newline, where,
+                             prefix_fuzz, suffix_fuzz):
+                return where
+
+        if 0 < cur_offset <= max_neg_offset:
+            where = first_guess - cur_offset
+
+            if _hunk_matches(hunk, file_lines, file_has_newline, where,
+                             prefix_fuzz, suffix_fuzz):
+                return where
+
+    return None
+
+
+def _hunk_matches(hunk, file_lines, file_has_newline, where, prefix_fuzz,
+                  suffix_fuzz):
+    """Return whether the hunk's original lines match at a position."""
+    pat_lines = len(hunk.old_lines)
+    start = prefix_fuzz
+    stop = pat_lines - suffix_fuzz
+    end = where + pat_lines
+
+    if where < 0 or where + stop > len(file_lines):
+        return False
+
+    if (file_lines[where + start:where + stop] !=
+        hunk.old_lines[start:stop]):
+        return False
+
+    if suffix_fuzz == 0:
+        # Newline markers must agree with the file when the hunk's last
+        # line is compared.
+        at_eof_without_newline = (end == len(file_lines) and
+                                  not file_has_newline)
+
+        if hunk.old_no_newline != at_eof_without_newline:
+            return False
+
+    return True
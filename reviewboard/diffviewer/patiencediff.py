@@ -0,0 +1,114 @@
+from __future__ import unicode_literals
+
+from bisect import bisect_left
+
+from django.utils.six.moves import range
+
+from reviewboard.diffviewer.myersdiff import MyersDiffer
+
+
+class PatienceDiffer(MyersDiffer):
+    """A Myers differ that first anchors lines that are unique in both files.
+
+    Lines that appear exactly once in each file are matched up first, using
+    the longest run of them that appear in the same order in both files (as
+    in the Patience Diff algorithm). Those lines are treated as unchanged,
+    and the Myers algorithm is only run on the ranges between them.
+
+    The cost of the Myers algorithm grows with both the size of the range
+    being compared and the number of differences in it. Splitting large
+    files at their unique lines keeps each search small, which makes a big
+    difference for large generated or vendored files with many scattered
+    changes. It also tends to keep moved blocks of code from being
+    interleaved with unrelated lines.
+    """
+
+    def _find_changes(self):
+        """
+        Marks the modified lines in both sets of data.
+
+        The LCS algorithm is run separately on each range between the
+        anchored lines.
+        """
+        a_lower = b_lower = 0
+
+        for a_index, b_index in self._find_anchors():
+            self._lcs(a_lower, a_index, b_lower, b_index, self.minimal_diff)
+            a_lower = a_index + 1
+            b_lower = b_index + 1
+
+        self._lcs(a_lower, self.a_data.undiscarded_lines,
+                  b_lower, self.b_data.undiscarded_lines,
+                  self.minimal_diff)
+
+    def _find_anchors(self):
+        """
+        Returns the pairs of undiscarded line indexes to anchor.
+
+        These are the longest sequence of lines that are unique in both
+        files, and appear in the same order in both.
+        """
+        a_positions = self._get_unique_positions(
+            self.a_data.undiscarded, self.a_data.undiscarded_lines)
+        b_positions = self._get_unique_positions(
+            self.b_data.undiscarded, self.b_data.undiscarded_lines)
+
+        # Build the list of unique lines common to both files, in the order
+        # they appear in the original file.
+        candidates = sorted(
+            (a_index, b_positions[code])
+            for code, a_index in a_positions.items()
+            if a_index >= 0 and b_positions.get(code, -1) >= 0
+        )
+
+        # Find the longest increasing sequence of modified file indexes,
+        # using patience sorting. Each pile keeps the smallest index that
+        # can end a sequence of that length, along with a link to the
+        # previous entry in that sequence.
+        pile_tops = []
+        pile_top_candidates = []
+        prev_candidates = [None] * len(candidates)
+
+        for i, (a_index, b_index) in enumerate(candidates):
+            pile = bisect_left(pile_tops, b_index)
+
+            if pile > 0:
+                prev_candidates[i] = pile_top_candidates[pile - 1]
+
+            if pile == len(pile_tops):
+                pile_tops.append(b_index)
+                pile_top_candidates.append(i)
+            else:
+                pile_tops[pile] = b_index
+                pile_top_candidates[pile] = i
+
+        anchors = []
+
+        if pile_top_candidates:
+            i = pile_top_candidates[-1]
+
+            while i is not None:
+                anchors.append(candidates[i])
+                i = prev_candidates[i]
+
+            anchors.reverse()
+
+        return anchors
+
+    def _get_unique_positions(self, codes, length):
+        """
+        Returns a mapping of line codes to their positions.
+
+        Codes that appear more than once will map to -1.
+        """
+        positions = {}
+
+        for i in range(length):
+            code = codes[i]
+
+            if code in positions:
+                positions[code] = -1
+            else:
+                positions[code] = i
+
+        return positions
@@ -0,0 +1,323 @@
+"""Precomputes the diff data for new diffs in the background.
+
+Chunks are normally generated and cached the first time someone views a
+file in the diff viewer. For a large diff, that means the first reviewer
+to look at a new revision waits while each file is fetched from the
+repository, patched, diffed and highlighted.
+
+Instead, when a diff is uploaded or a new revision is published, a job is
+queued to do this work ahead of time. Jobs are run by a pool of background
+threads in the process that queued them. For each file in the diff, this
+fills the chunk cache and stores the line counts and the SHA1s of the
+original and patched files. When a new revision is published, the
+interdiff against the previous revision is generated as well.
+
+Jobs for published revisions run before jobs for uploaded draft diffs.
+When a newer revision is queued for a review request, any jobs still
+running or waiting for older revisions are cancelled.
+
+The progress of each job is stored in the cache, and is available through
+:py:func:`get_diffset_precompute_status` (which the Web API includes with
+each diff).
+"""
+
+from __future__ import unicode_literals
+
+import logging
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.utils.six.moves import queue
+from djblets.cache.backend import make_cache_key
+from djblets.siteconfig.models import SiteConfiguration
+
+from reviewboard.diffviewer.diffutils import (get_diff_files,
+                                              prefetch_original_files)
+from reviewboard.diffviewer.models import DiffSet
+
+
+class DiffSetPrecomputeJob(object):
+    """A queued job for precomputing the data for a diffset."""
+
+    STATE_QUEUED = 'queued'
+    STATE_RUNNING = 'running'
+    STATE_DONE = 'done'
+    STATE_CANCELLED = 'cancelled'
+    STATE_FAILED = 'failed'
+
+    def __init__(self, diffset, priority, interdiffset=None):
+        self.diffset_id = diffset.pk
+        self.history_id = diffset.history_id
+        self.priority = priority
+
+        if interdiffset:
+            self.interdiffset_id = interdiffset.pk
+        else:
+            self.interdiffset_id = None
+
+    def is_cancelled(self):
+        """Returns whether the job has been replaced by a newer one.
+
+        Only jobs for published diffsets (which have a DiffSetHistory) can
+        be cancelled.
+        """
+        if not self.history_id:
+            return False
+
+        latest_diffset_id = cache.get(
+            _make_history_cache_key(self.history_id))
+
+        return (latest_diffset_id is not None and
+                latest_diffset_id != self.diffset_id)
+
+    def set_status(self, state, total_files=0, completed_files=0,
+                   failed_files=0):
+        """Stores the progress of the job in the cache."""
+        cache.set(_make_status_cache_key(self.diffset_id), {
+            'state': state,
+            'total_files': total_files,
+            'completed_files': completed_files,
+            'failed_files': failed_files,
+        }, DiffSetPrecomputePool.STATUS_EXPIRATION)
+
+
+class DiffSetPrecomputePool(object):
+    """Runs queued diffset precompute jobs.
+
+    Jobs are run by a set of background threads, which are started the
+    first time a job is queued in a process. Jobs with a lower priority
+    value are run first, and jobs of equal priority run in the order they
+    were queued.
+    """
+
+    #: The priority for revisions that have just been published.
+    PRIORITY_PUBLISHED = 0
+
+    #: The priority for newly uploaded diffs.
+    PRIORITY_UPLOADED = 10
+
+    #: How long, in seconds, to keep the status of a job in the cache.
+    STATUS_EXPIRATION = 24 * 60 * 60
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queue = queue.PriorityQueue()
+        self._threads = []
+        self._sequence = 0
+
+    def start(self, num_threads):
+        """Starts the worker threads, if not already running."""
+        with self._lock:
+            self._threads = [
+                thread
+                for thread in self._threads
+                if thread.is_alive()
+            ]
+
+            while len(self._threads) < num_threads:
+                thread = threading.Thread(target=self._run_worker,
+                                          name='diffset-precompute')
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+
+    def queue(self, job):
+        """Queues a job to be run by the worker threads.
+
+        If the job is for a published diffset, any older jobs for the same
+        review request will be cancelled.
+        """
+        if job.history_id:
+            cache.set(_make_history_cache_key(job.history_id),
+                      job.diffset_id, self.STATUS_EXPIRATION)
+
+        job.set_status(job.STATE_QUEUED)
+
+        with self._lock:
+            self._sequence += 1
+            sequence = self._sequence
+
+        self._queue.put((job.priority, sequence, job))
+
+    def run_job(self, job):
+        """Runs a job in the calling thread.
+
+        Each file in the diffset (and the interdiff, if any) has its chunks
+        generated and cached. Files that fail are logged and skipped. The
+        job stops early if it's cancelled, or if the diffset no longer
+        exists.
+        """
+        if job.is_cancelled():
+            job.set_status(job.STATE_CANCELLED)
+            return
+
+        try:
+            diffset = DiffSet.objects.get(pk=job.diffset_id)
+        except DiffSet.DoesNotExist:
+            job.set_status(job.STATE_CANCELLED)
+            return
+
+        files = get_diff_files(diffset)
+
+        if job.interdiffset_id:
+            try:
+                interdiffset = DiffSet.objects.get(pk=job.interdiffset_id)
+            except DiffSet.DoesNotExist:
+                pass
+            else:
+                # Interdiffs are built from the older revision, like the
+                # diff viewer does.
+                files += get_diff_files(interdiffset, interdiffset=diffset)
+
+        siteconfig = SiteConfiguration.objects.get_current()
+        generators = [
+            self._get_chunk_generator(
+                diff_file,
+                siteconfig.get('diffviewer_syntax_highlighting'))
+            for diff_file in files
+        ]
+        total_files = len(generators)
+        completed_files = 0
+        failed_files = 0
+
+        job.set_status(job.STATE_RUNNING, total_files)
+        prefetch_original_files(generators, None)
+
+        for generator in generators:
+            if job.is_cancelled():
+                job.set_status(job.STATE_CANCELLED, total_files,
+                               completed_files, failed_files)
+                return
+
+            try:
+                generator.get_cached_chunks()
+                generator.filediff.get_line_counts()
+            except Exception as e:
+                logging.exception('Error precomputing chunks for FileDiff '
+                                  '%s: %s',
+                                  generator.filediff.pk, e)
+                failed_files += 1
+
+            completed_files += 1
+            job.set_status(job.STATE_RUNNING, total_files, completed_files,
+                           failed_files)
+
+        job.set_status(job.STATE_DONE, total_files, completed_files,
+                       failed_files)
+
+    def _get_chunk_generator(self, diff_file, enable_syntax_highlighting):
+        """Returns a chunk generator for a file in a job."""
+        from reviewboard.diffviewer.chunk_generator import \
+            get_diff_chunk_generator
+
+        return get_diff_chunk_generator(None,
+                                        diff_file['filediff'],
+                                        diff_file['interfilediff'],
+                                        diff_file['force_interdiff'],
+                                        enable_syntax_highlighting)
+
+    def _run_worker(self):
+        """Main loop for a worker thread."""
+        while True:
+            priority, sequence, job = self._queue.get()
+
+            try:
+                self.run_job(job)
+            except Exception as e:
+                logging.exception('Unexpected error precomputing DiffSet '
+                                  '%s: %s',
+                                  job.diffset_id, e)
+                job.set_status(job.STATE_FAILED)
+            finally:
+                # Each thread has its own database connection, which
+                # would otherwise be left open.
+                connection.close()
+
+
+_precompute_pool = DiffSetPrecomputePool()
+
+
+def queue_diffset_precompute(diffset, priority, interdiffset=None):
+    """Queues a diffset to have its diff data precomputed.
+
+    If ``interdiffset`` is provided, the interdiff between it (an older
+    revision) and ``diffset`` will be precomputed as well.
+
+    Nothing will be queued if the ``diffviewer_precompute_threads`` setting
+    is 0, or when running unit tests (which run inside transactions that
+    the background threads wouldn't see).
+    """
+    siteconfig = SiteConfiguration.objects.get_current()
+    num_threads = siteconfig.get('diffviewer_precompute_threads')
+
+    if num_threads > 0 and not getattr(settings, 'RUNNING_TEST', False):
+        _precompute_pool.queue(DiffSetPrecomputeJob(diffset, priority,
+                                                    interdiffset))
+        _precompute_pool.start(num_threads)
+
+
+def precompute_diffset(diffset, interdiffset=None):
+    """Precomputes the diff data for a diffset in the calling thread."""
+    job = DiffSetPrecomputeJob(diffset,
+                               DiffSetPrecomputePool.PRIORITY_PUBLISHED,
+                               interdiffset)
+    _precompute_pool.run_job(job)
+
+
+def get_diffset_precompute_status(diffset):
+    """Returns the status of the precompute job for a diffset.
+
+    This is a dictionary containing the ``state`` of the job (one of
+    ``queued``, ``running``, ``done``, ``cancelled`` or ``failed``), and the
+    ``total_files``, ``completed_files`` and ``failed_files`` counts.
+
+    If no job has been queued for the diffset (or its status has expired),
+    this returns ``None``.
+    """
+    return cache.get(_make_status_cache_key(diffset.pk))
+
+
+def review_request_published_cb(sender, user, review_request, changedesc,
+                                **kwargs):
+    """Queues the newly published diff revision for precomputing.
+
+    This only does anything if the diff was updated (or this is the first
+    publish). The interdiff against the previous revision is included.
+    """
+    if changedesc is not None and 'diff' not in changedesc.fields_changed:
+        return
+
+    diffsets = list(
+        DiffSet.objects
+        .filter(history=review_request.diffset_history_id)
+        .order_by('-revision')[:2])
+
+    if diffsets:
+        if len(diffsets) > 1:
+            interdiffset = diffsets[1]
+        else:
+            interdiffset = None
+
+        queue_diffset_precompute(diffsets[0],
+                                 DiffSetPrecomputePool.PRIORITY_PUBLISHED,
+                                 interdiffset)
+
+
+def connect_signals():
+    from reviewboard.reviews.models import ReviewRequest
+    from reviewboard.reviews.signals import review_request_published
+
+    review_request_published.connect(review_request_published_cb,
+                                     sender=ReviewRequest)
+
+
+def _make_status_cache_key(diffset_id):
+    """Returns the cache key for the status of a diffset's job."""
+    return make_cache_key('diffset-precompute-status-%s' % diffset_id)
+
+
+def _make_history_cache_key(history_id):
+    """Returns the cache key for the latest job for a DiffSetHistory."""
+    return make_cache_key('diffset-history-precompute-%s' % history_id)
@@ -11,7 +11,99 @@ CHUNK_RANGE_RE = re.compile(
     re.M)
 
 
-def filter_interdiff_opcodes(opcodes, filediff_data, interfilediff_data):
+def get_interdiff_ranges(diff):
+    """Returns the ranges of changed lines in a diff, for interdiffs.
+
+    This returns a list of ``(start, end)`` tuples, one for each chunk of
+    the diff that contains changes, covering the lines in the modified
+    file from the first change in the chunk to the last.
+
+    These are used by :py:func:`filter_interdiff_opcodes`. Since they only
+    depend on the content of the diff, callers that filter many interdiffs
+    against the same diff can compute them once and pass them in.
+    """
+    lines = split_line_endings(diff)
+    process_changes = False
+    process_trailing_context = False
+    ranges = []
+
+    chunk_start = None
+    chunk_len = 0
+    lines_of_context = 0
+
+    # Look through the chunks of the diff, trying to find the amount
+    # of context shown at the beginning of each chunk. Though this
+    # will usually be 3 lines, it may be fewer or more, depending
+    # on file length and diff generation settings.
+    for line in lines:
+        if process_changes:
+            if line.startswith((b'-', b'+')):
+                # We've found the first change in the chunk. We now
+                # know how many lines of context we have.
+                #
+                # We reduce the indexes by 1 because the chunk ranges
+                # in diffs start at 1, and we want a 0-based index.
+                start = chunk_start - 1 + lines_of_context
+                chunk_len -= lines_of_context
+
+                # We then reduce by 1 again, compensating for the
+                # additional line of context, if any. We must do this
+                # because the first line after a "@@" section is being
+                # counted in lines_of_context, but is also the line
+                # referred to in chunk_start.
+                if lines_of_context > 0:
+                    start -= 1
+
+                ranges.append((start, start + chunk_len))
+                process_changes = False
+                process_trailing_context = True
+                lines_of_context = 0
+                continue
+            else:
+                lines_of_context += 1
+        elif process_trailing_context:
+            if line.startswith(b' '):
+                # This may be a line of context after the modifications
+                # in this chunk. Bump up the counter.
+                lines_of_context += 1
+                continue
+            else:
+                # Reset the lines of trailing context, since we hit
+                # something other than an equal line.
+                lines_of_context = 0
+
+        # This was not a change within a chunk, or we weren't processing,
+        # so check to see if this is a chunk header instead.
+        m = CHUNK_RANGE_RE.match(line)
+
+        if m:
+            # It is a chunk header. Start by updating the previous range
+            # to factor in the lines of trailing context.
+            if process_trailing_context and lines_of_context > 0:
+                last_range = ranges[-1]
+                ranges[-1] = (last_range[0],
+                              last_range[1] - lines_of_context)
+
+            # Next, reset the state for the next range, and pull the line
+            # number and length from the header.
+            chunk_start = int(m.group('new_start'))
+            chunk_len = int(m.group('new_len') or '1')
+            process_changes = True
+            process_trailing_context = False
+            lines_of_context = 0
+
+    # We need to adjust the last range, if we're still processing
+    # trailing context.
+    if process_trailing_context and lines_of_context > 0:
+        last_range = ranges[-1]
+        ranges[-1] = (last_range[0],
+                      last_range[1] - lines_of_context)
+
+    return ranges
+
+
+def filter_interdiff_opcodes(opcodes, filediff_data, interfilediff_data,
+                             orig_ranges=None, new_ranges=None):
     """Filters the opcodes for an interdiff to remove unnecessary lines.
 
     An interdiff may contain lines of code that have changed as the result of
@@ -21,94 +113,21 @@ def filter_interdiff_opcodes(opcodes, filediff_data, interfilediff_data):
     This function will filter the opcodes to remove as much of this as
     possible. It will only output non-"equal" opcodes if it falls into the
     ranges of lines dictated in the uploaded diff files.
-    """
-    def _find_range_info(diff):
-        lines = split_line_endings(diff)
-        process_changes = False
-        process_trailing_context = False
-        ranges = []
-
-        chunk_start = None
-        chunk_len = 0
-        lines_of_context = 0
-
-        # Look through the chunks of the diff, trying to find the amount
-        # of context shown at the beginning of each chunk. Though this
-        # will usually be 3 lines, it may be fewer or more, depending
-        # on file length and diff generation settings.
-        for line in lines:
-            if process_changes:
-                if line.startswith((b'-', b'+')):
-                    # We've found the first change in the chunk. We now
-                    # know how many lines of context we have.
-                    #
-                    # We reduce the indexes by 1 because the chunk ranges
-                    # in diffs start at 1, and we want a 0-based index.
-                    start = chunk_start - 1 + lines_of_context
-                    chunk_len -= lines_of_context
-
-                    # We then reduce by 1 again, compensating for the
-                    # additional line of context, if any. We must do this
-                    # because the first line after a "@@" section is being
-                    # counted in lines_of_context, but is also the line
-                    # referred to in chunk_start.
-                    if lines_of_context > 0:
-                        start -= 1
-
-                    ranges.append((start, start + chunk_len))
-                    process_changes = False
-                    process_trailing_context = True
-                    lines_of_context = 0
-                    continue
-                else:
-                    lines_of_context += 1
-            elif process_trailing_context:
-                if line.startswith(b' '):
-                    # This may be a line of context after the modifications
-                    # in this chunk. Bump up the counter.
-                    lines_of_context += 1
-                    continue
-                else:
-                    # Reset the lines of trailing context, since we hit
-                    # something other than an equal line.
-                    lines_of_context = 0
-
-            # This was not a change within a chunk, or we weren't processing,
-            # so check to see if this is a chunk header instead.
-            m = CHUNK_RANGE_RE.match(line)
-
-            if m:
-                # It is a chunk header. Start by updating the previous range
-                # to factor in the lines of trailing context.
-                if process_trailing_context and lines_of_context > 0:
-                    last_range = ranges[-1]
-                    ranges[-1] = (last_range[0],
-                                  last_range[1] - lines_of_context)
-
-                # Next, reset the state for the next range, and pull the line
-                # number and length from the header.
-                chunk_start = int(m.group('new_start'))
-                chunk_len = int(m.group('new_len') or '1')
-                process_changes = True
-                process_trailing_context = False
-                lines_of_context = 0
-
-        # We need to adjust the last range, if we're still processing
-        # trailing context.
-        if process_trailing_context and lines_of_context > 0:
-            last_range = ranges[-1]
-            ranges[-1] = (last_range[0],
-                          last_range[1] - lines_of_context)
-
-        return ranges
 
+    If the ranges from :py:func:`get_interdiff_ranges` for either diff are
+    already known, they can be passed as ``orig_ranges`` and ``new_ranges``,
+    and the diffs won't be scanned again.
+    """
     def _is_range_valid(line_range, tag, i1, i2):
         return (line_range is not None and
                 i1 >= line_range[0] and
                 (tag == 'delete' or i1 != i2))
 
-    orig_ranges = _find_range_info(filediff_data)
-    new_ranges = _find_range_info(interfilediff_data)
+    if orig_ranges is None:
+        orig_ranges = get_interdiff_ranges(filediff_data)
+
+    if new_ranges is None:
+        new_ranges = get_interdiff_ranges(interfilediff_data)
 
     orig_range_i = 0
     new_range_i = 0
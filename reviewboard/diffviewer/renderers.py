@@ -9,7 +9,8 @@ from django.utils.translation import ugettext as _, get_language
 from djblets.cache.backend import cache_memoize
 
 from reviewboard.diffviewer.chunk_generator import compute_chunk_last_header
-from reviewboard.diffviewer.diffutils import populate_diff_chunks
+from reviewboard.diffviewer.diffutils import (populate_diff_chunk,
+                                              populate_diff_chunks)
 from reviewboard.diffviewer.errors import UserVisibleError
 
 
@@ -45,6 +46,7 @@ class DiffRenderer(object):
         self.allow_caching = allow_caching
         self.template_name = template_name
         self.num_chunks = 0
+        self._chunk = None
 
         if self.lines_of_context and len(self.lines_of_context) == 1:
             # If we only have one value, then assume it represents before
@@ -82,19 +84,32 @@ class DiffRenderer(object):
         only as often as necessary. render_to_string will call this if it's
         not already in the cache.
         """
-        if not self.diff_file.get('chunks_loaded', False):
-            populate_diff_chunks([self.diff_file], self.highlighting,
-                                 request=request)
+        chunks_loaded = self.diff_file.get('chunks_loaded', False)
 
         if self.chunk_index is not None:
             assert not self.lines_of_context or self.collapse_all
 
-            self.num_chunks = len(self.diff_file['chunks'])
+            if chunks_loaded:
+                self.num_chunks = len(self.diff_file['chunks'])
 
-            if self.chunk_index < 0 or self.chunk_index >= self.num_chunks:
+                if 0 <= self.chunk_index < self.num_chunks:
+                    self._chunk = self.diff_file['chunks'][self.chunk_index]
+            else:
+                # Only load the chunk being rendered, rather than every
+                # chunk in the file.
+                self._chunk = populate_diff_chunk(self.diff_file,
+                                                  self.chunk_index,
+                                                  self.highlighting,
+                                                  request=request)
+                self.num_chunks = self.diff_file['num_chunks']
+
+            if self._chunk is None:
                 raise UserVisibleError(
                     _('Invalid chunk index %s specified.')
                     % self.chunk_index)
+        elif not chunks_loaded:
+            populate_diff_chunks([self.diff_file], self.highlighting,
+                                 request=request)
 
         return render_to_string(self.template_name,
                                 Context(self.make_context()))
@@ -138,8 +153,12 @@ class DiffRenderer(object):
         if self.chunk_index is not None:
             # We're rendering a specific chunk within a file's diff, rather
             # than the whole diff.
-            self.diff_file['chunks'] = \
-                [self.diff_file['chunks'][self.chunk_index]]
+            chunk = self._chunk
+
+            if chunk is None:
+                chunk = self.diff_file['chunks'][self.chunk_index]
+
+            self.diff_file['chunks'] = [chunk]
 
             if self.lines_of_context:
                 # We're rendering a specific range of lines within this chunk,
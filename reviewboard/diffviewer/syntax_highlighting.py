@@ -0,0 +1,215 @@
+"""Shared support for syntax-highlighting source code with Pygments.
+
+Finding the lexer for a filename means going through the filename patterns
+of every lexer Pygments knows about, and guessing a lexer from the content
+of a file runs every candidate lexer's content analysis. Both are done
+often (for each side of every diff and for every text file attachment),
+and nearly always for the same handful of file types, so the results are
+kept in small LRU caches, keyed by the base name of the file.
+
+The HTML formatter is also created once and reused.
+"""
+
+from __future__ import unicode_literals
+
+import fnmatch
+import os
+import threading
+from collections import OrderedDict
+
+from pygments import highlight
+from pygments.formatters import HtmlFormatter
+from pygments.lexers import (ClassNotFound, find_lexer_class,
+                             get_all_lexers)
+from pygments.lexers import get_lexer_for_filename as \
+    _pygments_get_lexer_for_filename
+from pygments.lexers import guess_lexer_for_filename as \
+    _pygments_guess_lexer_for_filename
+
+from reviewboard.diffviewer.diffutils import split_line_endings
+
+
+#: The maximum number of filenames to cache lexer lookups for.
+LEXER_CACHE_SIZE = 500
+
+#: The number of lines before a range to start highlighting from.
+#:
+#: Lexers keep state from one line to the next (such as being inside a
+#: multi-line string or comment). When highlighting only part of a file,
+#: this many lines before each range are highlighted as well and then
+#: thrown away, giving the lexer a chance to get back in sync.
+HIGHLIGHTING_RESYNC_LINES = 50
+
+
+class NoWrapperHtmlFormatter(HtmlFormatter):
+    """An HTML Formatter for Pygments that doesn't wrap items in a div."""
+    def __init__(self, *args, **kwargs):
+        super(NoWrapperHtmlFormatter, self).__init__(*args, **kwargs)
+
+    def _wrap_div(self, inner):
+        """Removes the div wrapper from formatted code.
+
+        This is called by the formatter to wrap the contents of inner.
+        Inner is a list of tuples containing formatted code. If the first item
+        in the tuple is zero, then it's the div wrapper, so we should ignore
+        it.
+        """
+        for tup in inner:
+            if tup[0]:
+                yield tup
+
+
+_lexer_classes = OrderedDict()
+_lexer_candidates = OrderedDict()
+_lexer_cache_lock = threading.Lock()
+_all_lexer_classes = None
+_html_formatter = None
+
+
+def get_html_formatter():
+    """Returns a shared NoWrapperHtmlFormatter for highlighting code."""
+    global _html_formatter
+
+    if _html_formatter is None:
+        _html_formatter = NoWrapperHtmlFormatter()
+
+    return _html_formatter
+
+
+def get_lexer_for_filename(filename, **options):
+    """Returns a lexer for a filename.
+
+    This works like Pygments' :py:func:`get_lexer_for_filename`, but the
+    lexer class found for the filename is cached.
+
+    :py:exc:`pygments.util.ClassNotFound` is raised if there's no lexer for
+    the filename.
+    """
+    def _find_lexer_class():
+        try:
+            return type(_pygments_get_lexer_for_filename(filename))
+        except ClassNotFound:
+            return None
+
+    lexer_cls = _get_cached(_lexer_classes, os.path.basename(filename),
+                            _find_lexer_class)
+
+    if lexer_cls is None:
+        raise ClassNotFound('no lexer for filename %r found' % filename)
+
+    return lexer_cls(**options)
+
+
+def guess_lexer_for_filename(filename, data, **options):
+    """Returns a lexer for a file, based on its filename and content.
+
+    This works like Pygments' :py:func:`guess_lexer_for_filename`. The
+    lexers that could match the filename are cached, and if there's only
+    one, it's used without looking at the content of the file. The content
+    is only analyzed when the filename could belong to more than one lexer.
+
+    :py:exc:`pygments.util.ClassNotFound` is raised if there's no lexer for
+    the filename.
+    """
+    candidates = _get_cached(
+        _lexer_candidates, os.path.basename(filename),
+        lambda: _find_lexer_candidates(os.path.basename(filename)))
+
+    if not candidates:
+        raise ClassNotFound('no lexer for filename %r found' % filename)
+    elif len(candidates) == 1:
+        return candidates[0](**options)
+    else:
+        return _pygments_guess_lexer_for_filename(filename, data, **options)
+
+
+def highlight_line_ranges(lines, lexer, line_ranges,
+                          resync_lines=HIGHLIGHTING_RESYNC_LINES):
+    """Highlights only some ranges of lines from a file.
+
+    ``lines`` is the list of lines in the file, without newlines, and
+    ``line_ranges`` is a list of ``(start, end)`` line index ranges to
+    highlight.
+
+    This returns a list with an entry for each line in the file. Lines
+    within the ranges will contain the highlighted HTML, and all others
+    will be ``None``.
+
+    Each range is highlighted starting ``resync_lines`` lines before it, so
+    that the lexer's state is more likely to be correct by the time the
+    range starts. Ranges that are close together are highlighted together.
+    """
+    formatter = get_html_formatter()
+    result = [None] * len(lines)
+    windows = []
+
+    for start, end in sorted(line_ranges):
+        lex_start = max(0, start - resync_lines)
+
+        if windows and lex_start <= windows[-1][1]:
+            windows[-1][1] = max(windows[-1][1], end)
+            windows[-1][2].append((start, end))
+        else:
+            windows.append([lex_start, end, [(start, end)]])
+
+    for lex_start, lex_end, ranges in windows:
+        markup = split_line_endings(
+            highlight('\n'.join(lines[lex_start:lex_end]) + '\n', lexer,
+                      formatter))
+
+        if len(markup) != lex_end - lex_start:
+            # The lexer found different line endings than we did. Leave
+            # these lines for the caller to handle.
+            continue
+
+        for start, end in ranges:
+            result[start:end] = markup[start - lex_start:end - lex_start]
+
+    return result
+
+
+def _find_lexer_candidates(basename):
+    """Returns the lexer classes that could be used for a filename.
+
+    This matches the filename against the same patterns that Pygments'
+    :py:func:`guess_lexer_for_filename` does.
+    """
+    global _all_lexer_classes
+
+    if _all_lexer_classes is None:
+        _all_lexer_classes = [
+            find_lexer_class(lexer_info[0])
+            for lexer_info in get_all_lexers()
+        ]
+
+    return tuple(
+        lexer_cls
+        for lexer_cls in _all_lexer_classes
+        if lexer_cls is not None and any(
+            fnmatch.fnmatchcase(basename, pattern)
+            for pattern in (list(lexer_cls.filenames) +
+                            list(lexer_cls.alias_filenames))
+        )
+    )
+
+
+def _get_cached(cache, key, func):
+    """Returns a value from an LRU cache, computing it if needed."""
+    with _lexer_cache_lock:
+        try:
+            value = cache.pop(key)
+            cache[key] = value
+
+            return value
+        except KeyError:
+            pass
+
+    value = func()
+
+    with _lexer_cache_lock:
+        cache[key] = value
+
+        while len(cache) > LEXER_CACHE_SIZE:
+            cache.popitem(last=False)
+
+    return value
@@ -9,7 +9,9 @@ from django.utils.safestring import mark_safe
 from django.utils.translation import ugettext as _
 from djblets.util.decorators import basictag
 
-from reviewboard.diffviewer.chunk_generator import DiffChunkGenerator
+from reviewboard.diffviewer.chunk_generator import (DiffChunkGenerator,
+                                                    highlight_chunk_lines)
+from reviewboard.diffviewer.diffutils import compute_chunk_line_changed_regions
 
 
 register = template.Library()
@@ -208,8 +210,10 @@ def diff_lines(index, chunk, standalone, line_fmt, anchor_fmt='',
 
     if change == 'equal':
         is_equal = True
+        highlight_chunk_lines(chunk)
     elif change == 'replace':
         is_replace = True
+        compute_chunk_line_changed_regions(chunk)
     elif change == 'insert':
         is_insert = True
     elif change == 'delete':
@@ -1,34 +1,61 @@
 from __future__ import unicode_literals
 
 import bz2
+import mmap
+import tempfile
+import threading
+import zlib
 
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.http import HttpResponse
 from django.test import RequestFactory
+from django.utils import six
+from django.utils.safestring import SafeText
+from django.utils.six.moves import cPickle as pickle
 from django.utils.six.moves import zip_longest
-from djblets.cache.backend import cache_memoize
+from djblets.cache.backend import cache_memoize, make_cache_key
 from djblets.db.fields import Base64DecodedValue
 from djblets.siteconfig.models import SiteConfiguration
 from djblets.testing.decorators import add_fixtures
 from kgb import SpyAgency
+from pygments import highlight
+from pygments.util import ClassNotFound
 import nose
 
 import reviewboard.diffviewer.diffutils as diffutils
 import reviewboard.diffviewer.parser as diffparser
+import reviewboard.diffviewer.precompute as precompute
+import reviewboard.diffviewer.renderers as renderers
+import reviewboard.diffviewer.syntax_highlighting as syntax_highlighting
 from reviewboard.admin.import_utils import has_module
 from reviewboard.diffviewer.chunk_generator import (DiffChunkGenerator,
-                                                    RawDiffChunkGenerator)
-from reviewboard.diffviewer.errors import UserVisibleError
+                                                    RawDiffChunkGenerator,
+                                                    get_diff_chunk_generator,
+                                                    highlight_chunk_lines)
+from reviewboard.diffviewer.chunk_serializer import SerializedChunks
+from reviewboard.diffviewer.compression import get_compression_codecs
+from reviewboard.diffviewer.differ import DiffCompatVersion, get_differ
+from reviewboard.diffviewer.errors import (ChunkGenerationCancelledError,
+                                           PatchRejectedError,
+                                           UserVisibleError)
 from reviewboard.diffviewer.forms import UploadDiffForm
 from reviewboard.diffviewer.models import (DiffSet, FileDiff,
                                            LegacyFileDiffData,
+                                           RawFileContent,
                                            RawFileDiffData)
 from reviewboard.diffviewer.myersdiff import MyersDiffer
-from reviewboard.diffviewer.opcode_generator import get_diff_opcode_generator
+from reviewboard.diffviewer.opcode_generator import (
+    DiffOpcodeGenerator, get_diff_opcode_generator,
+    get_diff_opcode_generator_class, set_diff_opcode_generator_class)
+from reviewboard.diffviewer.patcher import apply_patch
+from reviewboard.diffviewer.patiencediff import PatienceDiffer
 from reviewboard.diffviewer.renderers import DiffRenderer
 from reviewboard.diffviewer.processors import (filter_interdiff_opcodes,
+                                               get_interdiff_ranges,
                                                post_process_filtered_equals)
 from reviewboard.diffviewer.templatetags.difftags import highlightregion
+from reviewboard.reviews.models import ReviewRequest
 from reviewboard.scmtools.core import PRE_CREATION
 from reviewboard.scmtools.models import Repository, Tool
 from reviewboard.testing import TestCase
@@ -62,6 +89,64 @@ class MyersDifferTest(TestCase):
         self.assertEquals(opcodes, expected)
 
 
+class PatienceDifferTest(TestCase):
+    def test_diff(self):
+        """Testing PatienceDiffer"""
+        self._test_diff(["1", "2", "3"],
+                        ["1", "2", "3"],
+                        [("equal", 0, 3, 0, 3), ])
+
+        self._test_diff(["1", "2", "3"],
+                        [],
+                        [("delete", 0, 3, 0, 0), ])
+
+        self._test_diff("1\n2\n3\n",
+                        "0\n1\n2\n3\n",
+                        [("insert", 0, 0, 0, 2),
+                         ("equal", 0, 6, 2, 8)])
+
+        self._test_diff("1\n2\n3\n7\n",
+                        "1\n2\n4\n5\n6\n7\n",
+                        [("equal", 0, 4, 0, 4),
+                         ("replace", 4, 5, 4, 5),
+                         ("insert", 5, 5, 5, 9),
+                         ("equal", 5, 8, 9, 12)])
+
+    def test_diff_with_unique_line_anchors(self):
+        """Testing PatienceDiffer anchors lines unique to both files"""
+        # "c" is the only line unique to both files that can be matched,
+        # so everything else is treated as changed around it.
+        self._test_diff(["a", "x", "b", "x", "c"],
+                        ["c", "x", "b", "x", "a"],
+                        [("delete", 0, 4, 0, 0),
+                         ("equal", 4, 5, 0, 1),
+                         ("insert", 5, 5, 1, 5)])
+
+    def test_find_anchors(self):
+        """Testing PatienceDiffer._find_anchors"""
+        differ = PatienceDiffer(["a", "b", "x", "c", "x", "d"],
+                                ["b", "a", "x", "c", "d", "x"])
+        differ._gen_diff_data()
+
+        self.assertEqual(
+            [
+                (differ.a_data.real_indexes[a_index],
+                 differ.b_data.real_indexes[b_index])
+                for a_index, b_index in differ._find_anchors()
+            ],
+            [(1, 0), (3, 3), (5, 4)])
+
+    def test_get_differ(self):
+        """Testing get_differ with DiffCompatVersion.PATIENCE_ANCHORS"""
+        differ = get_differ(["1"], ["2"],
+                            compat_version=DiffCompatVersion.PATIENCE_ANCHORS)
+        self.assertIsInstance(differ, PatienceDiffer)
+
+    def _test_diff(self, a, b, expected):
+        opcodes = list(PatienceDiffer(a, b).get_opcodes())
+        self.assertEquals(opcodes, expected)
+
+
 class InterestingLinesTest(TestCase):
     def test_csharp(self):
         """Testing interesting lines scanner with a C# file"""
@@ -368,6 +453,116 @@ class DiffParserTest(TestCase):
         self.assertEqual(files[0].delete_count, 0)
         self.assertEqual(files[0].data, data)
 
+    def test_iter_files(self):
+        """Testing DiffParser.iter_files yields each file once parsed"""
+        data1 = (
+            b'Preamble\n'
+            b'--- README  123\n'
+            b'+++ README  (new)\n'
+            b'@ -1,1 +1,1 @@\n'
+            b'-Line 1\n'
+            b'+Line one\n')
+        data2 = (
+            b'--- NEWS  456\n'
+            b'+++ NEWS  (new)\n'
+            b'@ -1,1 +1,2 @@\n'
+            b' Line 1\n'
+            b'+Line 2')
+
+        files = diffparser.DiffParser(data1 + data2).iter_files()
+
+        f = next(files)
+        self.assertEqual(f.origFile, 'README')
+        self.assertEqual(f.data, data1)
+        self.assertEqual(f.insert_count, 1)
+        self.assertEqual(f.delete_count, 1)
+
+        f = next(files)
+        self.assertEqual(f.origFile, 'NEWS')
+        self.assertEqual(f.data, data2 + b'\n')
+        self.assertEqual(f.insert_count, 1)
+        self.assertEqual(f.delete_count, 0)
+
+        self.assertRaises(StopIteration, next, files)
+
+    def test_parse_with_carriage_returns(self):
+        """Testing DiffParser.parse with carriage returns normalizes the
+        file data's newlines
+        """
+        data = (
+            b'--- README  123\r\n'
+            b'+++ README  (new)\r\n'
+            b'@ -1,1 +1,1 @@\r\n'
+            b'-Line 1\r'
+            b'+Line one\r\r\n')
+        files = diffparser.DiffParser(data).parse()
+
+        self.assertEqual(len(files), 1)
+        self.assertEqual(files[0].data, data.replace(b'\r\r\n', b'\n')
+                                            .replace(b'\r\n', b'\n')
+                                            .replace(b'\r', b'\n'))
+
+    def test_lines(self):
+        """Testing DiffParser.lines matches split_line_endings"""
+        for data in (b'', b'\n', b'a', b'a\n', b'a\n\n', b'a\r\nb\rc',
+                     b'a\r\r\nb\n\x0c\n'):
+            lines = diffparser.DiffParser(data).lines
+
+            self.assertEqual(list(lines),
+                             diffutils.split_line_endings(data) if data
+                             else [])
+            self.assertEqual(len(lines), len(list(lines)))
+
+    def test_with_file(self):
+        """Testing DiffParser with a file memory-maps the diff"""
+        data = (
+            b'--- README  123\n'
+            b'+++ README  (new)\n'
+            b'@ -1,1 +1,1 @@\n'
+            b'-Line 1\n'
+            b'+Line one\n')
+
+        with tempfile.TemporaryFile() as fp:
+            fp.write(data)
+            fp.flush()
+
+            parser = diffparser.DiffParser(fp)
+            self.assertIsInstance(parser.data, mmap.mmap)
+
+            files = parser.parse()
+
+        self.assertEqual(len(files), 1)
+        self.assertEqual(files[0].origFile, 'README')
+        self.assertEqual(files[0].data, data)
+
+    def test_with_file_like_object(self):
+        """Testing DiffParser with a file-like object"""
+        data = (
+            b'--- README  123\n'
+            b'+++ README  (new)\n'
+            b'@ -1,1 +1,1 @@\n'
+            b'-Line 1\n'
+            b'+Line one\n')
+
+        files = diffparser.DiffParser(six.BytesIO(data)).parse()
+
+        self.assertEqual(len(files), 1)
+        self.assertEqual(files[0].data, data)
+
+    def test_with_memoryview(self):
+        """Testing DiffParser with a memoryview"""
+        data = (
+            b'--- README  123\n'
+            b'+++ README  (new)\n'
+            b'@ -1,1 +1,1 @@\n'
+            b'-Line 1\n'
+            b'+Line one\n')
+
+        files = diffparser.DiffParser(memoryview(data)).parse()
+
+        self.assertEqual(len(files), 1)
+        self.assertEqual(files[0].data, data)
+
     def test_patch(self):
         """Testing diffutils.patch"""
         old = (b'int\n'
@@ -968,6 +1163,135 @@ class DiffParserTest(TestCase):
         self.assertEqual(r_moves, expected_r_moves)
 
 
+class PatcherTests(SpyAgency, TestCase):
+    """Unit tests for reviewboard.diffviewer.patcher."""
+
+    def test_apply_patch_with_offset(self):
+        """Testing apply_patch with a hunk at an offset"""
+        old = (b'header 1\n'
+               b'header 2\n'
+               b'int\n'
+               b'main()\n'
+               b'{\n'
+               b'\treturn 1;\n'
+               b'}\n')
+
+        diff = (b'--- foo.c\n'
+                b'+++ foo.c\n'
+                b'@@ -1,5 +1,5 @@\n'
+                b' int\n'
+                b' main()\n'
+                b' {\n'
+                b'-\treturn 1;\n'
+                b'+\treturn 0;\n'
+                b' }\n')
+
+        self.assertEqual(
+            apply_patch(diff, old),
+            b'header 1\n'
+            b'header 2\n'
+            b'int\n'
+            b'main()\n'
+            b'{\n'
+            b'\treturn 0;\n'
+            b'}\n')
+
+    def test_apply_patch_with_fuzz(self):
+        """Testing apply_patch with a hunk requiring fuzz"""
+        old = (b'a\n'
+               b'changed\n'
+               b'c\n'
+               b'd\n'
+               b'e\n'
+               b'f\n'
+               b'g\n')
+
+        diff = (b'--- test\n'
+                b'+++ test\n'
+                b'@@ -1,7 +1,7 @@\n'
+                b' a\n'
+                b' b\n'
+                b' c\n'
+                b'-d\n'
+                b'+D\n'
+                b' e\n'
+                b' f\n'
+                b' g\n')
+
+        self.assertEqual(
+            apply_patch(diff, old),
+            b'a\n'
+            b'changed\n'
+            b'c\n'
+            b'D\n'
+            b'e\n'
+            b'f\n'
+            b'g\n')
+
+    def test_apply_patch_with_no_newline(self):
+        """Testing apply_patch with "No newline at end of file" markers"""
+        diff = (b'--- test\n'
+                b'+++ test\n'
+                b'@@ -1,2 +1,2 @@\n'
+                b' a\n'
+                b'-b\n'
+                b'\\ No newline at end of file\n'
+                b'+b\n')
+
+        self.assertEqual(apply_patch(diff, b'a\nb'), b'a\nb\n')
+
+        with self.assertRaises(PatchRejectedError):
+            apply_patch(diff, b'a\nb\n')
+
+    def test_apply_patch_with_context_diff(self):
+        """Testing apply_patch rejects context diffs"""
+        diff = (b'*** test\n'
+                b'--- test\n'
+                b'***************\n'
+                b'*** 1 ****\n'
+                b'! a\n'
+                b'--- 1 ----\n'
+                b'! b\n')
+
+        with self.assertRaises(PatchRejectedError):
+            apply_patch(diff, b'a\n')
+
+    def test_patch_falls_back_to_patch_tool(self):
+        """Testing diffutils.patch falls back to patch when the in-process
+        patcher rejects the diff
+        """
+        self.spy_on(diffutils._run_patch_tool)
+
+        diff = (b'--- test\n'
+                b'+++ test\n'
+                b'@@ -1,2 +1,2 @@\n'
+                b' a\n'
+                b'-b\n'
+                b'+c\n')
+
+        with self.assertRaises(Exception):
+            diffutils.patch(diff, b'x\ny\n', 'test')
+
+        self.assertTrue(diffutils._run_patch_tool.spy.called)
+
+    def test_patch_uses_in_process_patcher(self):
+        """Testing diffutils.patch doesn't spawn patch when the in-process
+        patcher can apply the diff
+        """
+        self.spy_on(diffutils._run_patch_tool)
+
+        diff = (b'--- test\n'
+                b'+++ test\n'
+                b'@@ -1,2 +1,2 @@\n'
+                b' a\n'
+                b'-b\n'
+                b'+c\n')
+
+        self.assertEqual(diffutils.patch(diff, b'a\nb\n', 'test'),
+                         b'a\nc\n')
+        self.assertFalse(diffutils._run_patch_tool.spy.called)
+
+
 class FileDiffTests(TestCase):
     """Unit tests for FileDiff."""
     fixtures = ['test_scmtools']
@@ -1093,6 +1417,282 @@ class RawFileDiffDataManagerTests(TestCase):
         self.assertEqual(data, bz2.compress(self.large_diff, 9))
         self.assertEqual(compression, RawFileDiffData.COMPRESSION_BZIP2)
 
+    def test_process_diff_data_with_zlib(self):
+        """Testing RawFileDiffDataManager.process_diff_data with
+        diffviewer_diff_compression=zlib
+        """
+        siteconfig = SiteConfiguration.objects.get_current()
+        siteconfig.set('diffviewer_diff_compression', 'zlib')
+        siteconfig.set('diffviewer_diff_compression_level', 1)
+        siteconfig.save()
+
+        try:
+            data, compression = \
+                RawFileDiffData.objects.process_diff_data(self.large_diff)
+        finally:
+            siteconfig.set('diffviewer_diff_compression', 'bzip2')
+            siteconfig.set('diffviewer_diff_compression_level', None)
+            siteconfig.save()
+
+        self.assertEqual(data, zlib.compress(self.large_diff, 1))
+        self.assertEqual(compression, RawFileDiffData.COMPRESSION_ZLIB)
+
+    def test_process_diff_data_with_min_size(self):
+        """Testing RawFileDiffDataManager.process_diff_data with diff
+        smaller than diffviewer_diff_compression_min_size
+        """
+        siteconfig = SiteConfiguration.objects.get_current()
+        siteconfig.set('diffviewer_diff_compression_min_size',
+                       len(self.large_diff) + 1)
+        siteconfig.save()
+
+        try:
+            data, compression = \
+                RawFileDiffData.objects.process_diff_data(self.large_diff)
+        finally:
+            siteconfig.set('diffviewer_diff_compression_min_size', 0)
+            siteconfig.save()
+
+        self.assertEqual(data, self.large_diff)
+        self.assertIsNone(compression)
+
+    def test_process_diff_data_with_unavailable_codec(self):
+        """Testing RawFileDiffDataManager.process_diff_data with unknown
+        diffviewer_diff_compression falls back to bzip2
+        """
+        siteconfig = SiteConfiguration.objects.get_current()
+        siteconfig.set('diffviewer_diff_compression', 'unknown')
+        siteconfig.save()
+
+        try:
+            data, compression = \
+                RawFileDiffData.objects.process_diff_data(self.large_diff)
+        finally:
+            siteconfig.set('diffviewer_diff_compression', 'bzip2')
+            siteconfig.save()
+
+        self.assertEqual(compression, RawFileDiffData.COMPRESSION_BZIP2)
+
+    def test_process_diff_data_with_invalid_level(self):
+        """Testing RawFileDiffDataManager.process_diff_data with
+        diffviewer_diff_compression_level unsupported by the codec uses the
+        codec's default level
+        """
+        siteconfig = SiteConfiguration.objects.get_current()
+        siteconfig.set('diffviewer_diff_compression_level', 0)
+        siteconfig.save()
+
+        try:
+            data, compression = \
+                RawFileDiffData.objects.process_diff_data(self.large_diff)
+        finally:
+            siteconfig.set('diffviewer_diff_compression_level', None)
+            siteconfig.save()
+
+        self.assertEqual(data, bz2.compress(self.large_diff, 9))
+        self.assertEqual(compression, RawFileDiffData.COMPRESSION_BZIP2)
+
+    def test_content_with_codecs(self):
+        """Testing RawFileDiffData.content with each available codec"""
+        for codec in get_compression_codecs():
+            if not codec.is_available():
+                continue
+
+            raw_diff = RawFileDiffData(binary=codec.compress(self.large_diff),
+                                       compression=codec.code)
+            self.assertEqual(raw_diff.content, self.large_diff)
+
+
+class RawFileContentManagerTests(TestCase):
+    """Unit tests for RawFileContentManager."""
+
+    def test_get_or_create_from_data(self):
+        """Testing RawFileContentManager.get_or_create_from_data"""
+        data = b'blah!\n' * 100
+
+        content, is_new = \
+            RawFileContent.objects.get_or_create_from_data(data)
+
+        self.assertTrue(is_new)
+        self.assertEqual(content.compression, RawFileContent.COMPRESSION_ZLIB)
+        self.assertEqual(content.content, data)
+        self.assertEqual(RawFileContent.objects.get_content(
+                             content.binary_hash),
+                         data)
+
+    def test_get_or_create_from_data_with_existing(self):
+        """Testing RawFileContentManager.get_or_create_from_data with
+        content already stored
+        """
+        data = b'blah!\n'
+
+        content1, is_new1 = \
+            RawFileContent.objects.get_or_create_from_data(data)
+        content2, is_new2 = \
+            RawFileContent.objects.get_or_create_from_data(data)
+
+        self.assertTrue(is_new1)
+        self.assertFalse(is_new2)
+        self.assertEqual(content1.pk, content2.pk)
+        self.assertEqual(RawFileContent.objects.count(), 1)
+
+    def test_get_content_with_unknown_hash(self):
+        """Testing RawFileContentManager.get_content with unknown hash"""
+        self.assertIsNone(RawFileContent.objects.get_content('a' * 40))
+
+
+class FileContentStoreTests(SpyAgency, TestCase):
+    """Unit tests for storing original and patched files."""
+    fixtures = ['test_scmtools']
+
+    def setUp(self):
+        super(FileContentStoreTests, self).setUp()
+
+        diff = (
+            b'diff --git a/README b/README\n'
+            b'index 94bdd3e..197009f 100644\n'
+            b'--- README\n'
+            b'+++ README\n'
+            b'@@ -2 +2 @@\n'
+            b'-blah blah\n'
+            b'+blah!\n')
+
+        repository = self.create_repository(tool_name='Test')
+        diffset = DiffSet.objects.create(name='test',
+                                         revision=1,
+                                         repository=repository)
+        self.filediff = FileDiff.objects.create(
+            source_file='README',
+            source_revision='94bdd3e',
+            dest_file='README',
+            dest_detail='197009f',
+            diffset=diffset,
+            diff=diff)
+
+        self.spy_on(Repository.get_file,
+                    call_fake=lambda *args, **kwargs: (
+                        b'Hello, world!\nblah blah\n'))
+
+    def test_get_original_file_stores_content(self):
+        """Testing get_original_file stores the file and records orig_sha1"""
+        data = diffutils.get_original_file(self.filediff, None, ['ascii'])
+
+        self.assertEqual(data, b'Hello, world!\nblah blah\n')
+        self.assertIsNotNone(self.filediff.orig_sha1)
+        self.assertEqual(
+            RawFileContent.objects.get_content(self.filediff.orig_sha1),
+            data)
+
+    def test_get_original_file_uses_stored_content(self):
+        """Testing get_original_file uses stored content instead of the
+        repository
+        """
+        orig = diffutils.get_original_file(self.filediff, None, ['ascii'])
+        self.assertEqual(len(Repository.get_file.spy.calls), 1)
+
+        self.assertEqual(
+            diffutils.get_original_file(self.filediff, None, ['ascii']),
+            orig)
+        self.assertEqual(len(Repository.get_file.spy.calls), 1)
+
+    def test_get_patched_file_uses_stored_content(self):
+        """Testing get_patched_file uses stored content instead of patching
+        """
+        orig = diffutils.get_original_file(self.filediff, None, ['ascii'])
+        patched = diffutils.get_patched_file(orig, self.filediff, None)
+
+        self.assertEqual(patched, b'Hello, world!\nblah!\n')
+        self.assertEqual(
+            RawFileContent.objects.get_content(self.filediff.patched_sha1),
+            patched)
+
+        self.spy_on(diffutils.patch)
+        self.assertEqual(diffutils.get_patched_file(orig, self.filediff, None),
+                         patched)
+        self.assertFalse(diffutils.patch.spy.called)
+
+    def test_get_original_file_with_store_disabled(self):
+        """Testing get_original_file with diffviewer_store_file_contents
+        disabled
+        """
+        siteconfig = SiteConfiguration.objects.get_current()
+        siteconfig.set('diffviewer_store_file_contents', False)
+        siteconfig.save()
+
+        try:
+            diffutils.get_original_file(self.filediff, None, ['ascii'])
+        finally:
+            siteconfig.set('diffviewer_store_file_contents', True)
+            siteconfig.save()
+
+        self.assertIsNotNone(self.filediff.orig_sha1)
+        self.assertEqual(RawFileContent.objects.count(), 0)
+
+    def test_get_interdiff_files_with_shared_original(self):
+        """Testing get_interdiff_files fetches an original file shared by
+        both FileDiffs once
+        """
+        interfilediff = self._create_interfilediff()
+
+        old, new = diffutils.get_interdiff_files(self.filediff, interfilediff,
+                                                 None, ['ascii'])
+
+        self.assertEqual(old, b'Hello, world!\nblah!\n')
+        self.assertEqual(new, b'Hello, world!\nblah blah blah\n')
+        self.assertEqual(len(Repository.get_file.spy.calls), 1)
+        self.assertEqual(interfilediff.orig_sha1, self.filediff.orig_sha1)
+
+    def test_get_interdiff_files_with_stored_patched_files(self):
+        """Testing get_interdiff_files uses stored patched files without
+        loading the original file
+        """
+        interfilediff = self._create_interfilediff()
+        files = diffutils.get_interdiff_files(self.filediff, interfilediff,
+                                              None, ['ascii'])
+
+        self.spy_on(diffutils.get_original_file)
+
+        self.assertEqual(
+            diffutils.get_interdiff_files(self.filediff, interfilediff,
+                                          None, ['ascii']),
+            files)
+        self.assertFalse(diffutils.get_original_file.spy.called)
+        self.assertEqual(len(Repository.get_file.spy.calls), 1)
+
+    def test_get_interdiff_files_with_different_originals(self):
+        """Testing get_interdiff_files with FileDiffs against different
+        revisions of a file
+        """
+        interfilediff = self._create_interfilediff(
+            source_revision='5b50866')
+
+        diffutils.get_interdiff_files(self.filediff, interfilediff, None,
+                                      ['ascii'])
+
+        self.assertEqual(len(Repository.get_file.spy.calls), 2)
+
+    def _create_interfilediff(self, source_revision='94bdd3e'):
+        """Creates a FileDiff in a newer revision of the diff."""
+        diffset = DiffSet.objects.create(
+            name='test',
+            revision=2,
+            repository=self.filediff.diffset.repository)
+
+        return FileDiff.objects.create(
+            source_file='README',
+            source_revision=source_revision,
+            dest_file='README',
+            dest_detail='4f9a8b1',
+            diffset=diffset,
+            diff=(
+                b'diff --git a/README b/README\n'
+                b'index 94bdd3e..4f9a8b1 100644\n'
+                b'--- README\n'
+                b'+++ README\n'
+                b'@@ -2 +2 @@\n'
+                b'-blah blah\n'
+                b'+blah blah blah\n'))
+
 
 class FileDiffMigrationTests(TestCase):
     fixtures = ['test_scmtools']
@@ -1479,6 +2079,40 @@ class DiffSetManagerTests(SpyAgency, TestCase):
             repository, 'diff', diff, None, None, None, '/', None)
 
         self.assertEqual(diffset.files.count(), 1)
+        self.assertEqual(diffset.diffcompat, DiffCompatVersion.DEFAULT)
+
+    def test_creating_with_diff_data_with_patience_anchors(self):
+        """Test creating a DiffSet from diff file data with
+        diffviewer_patience_anchors enabled
+        """
+        diff = (
+            b'diff --git a/README b/README\n'
+            b'index d6613f5..5b50866 100644\n'
+            b'--- README\n'
+            b'+++ README\n'
+            b'@ -1,1 +1,1 @@\n'
+            b'-blah..\n'
+            b'+blah blah\n'
+        )
+
+        repository = self.create_repository(tool_name='Test')
+
+        self.spy_on(repository.get_file_exists,
+                    call_fake=lambda *args, **kwargs: True)
+
+        siteconfig = SiteConfiguration.objects.get_current()
+        siteconfig.set('diffviewer_patience_anchors', True)
+        siteconfig.save()
+
+        try:
+            diffset = DiffSet.objects.create_from_data(
+                repository, 'diff', diff, None, None, None, '/', None)
+        finally:
+            siteconfig.set('diffviewer_patience_anchors', False)
+            siteconfig.save()
+
+        self.assertEqual(diffset.diffcompat,
+                         DiffCompatVersion.PATIENCE_ANCHORS)
 
     def test_creating_with_diff_data_with_basedir_no_slash(self):
         """Test creating a DiffSet from diff file data with basedir without
@@ -1536,60 +2170,267 @@ class DiffSetManagerTests(SpyAgency, TestCase):
         self.assertEqual(filediff.source_file, 'trunk/README')
         self.assertEqual(filediff.dest_file, 'trunk/README')
 
-
-class UploadDiffFormTests(SpyAgency, TestCase):
-    """Unit tests for UploadDiffForm."""
-    fixtures = ['test_scmtools']
-
-    def test_creating_diffsets(self):
-        """Test creating a DiffSet from form data"""
-        diff = (
-            b'diff --git a/README b/README\n'
+    def test_creating_with_diff_data_in_batches(self):
+        """Test creating a DiffSet from diff file data saves FileDiffs in
+        batches
+        """
+        diff = b''.join(
+            b'diff --git a/README%d b/README%d\n'
             b'index d6613f5..5b50866 100644\n'
-            b'--- README\n'
-            b'+++ README\n'
+            b'--- README%d\n'
+            b'+++ README%d\n'
             b'@ -1,1 +1,1 @@\n'
             b'-blah..\n'
             b'+blah blah\n'
+            % (i, i, i, i)
+            for i in range(5)
         )
 
-        diff_file = SimpleUploadedFile('diff', diff,
-                                       content_type='text/x-patch')
-
         repository = self.create_repository(tool_name='Test')
 
         self.spy_on(repository.get_file_exists,
                     call_fake=lambda *args, **kwargs: True)
+        self.spy_on(FileDiff.objects.bulk_create)
 
-        form = UploadDiffForm(
-            repository=repository,
-            data={
-                'basedir': '/',
-                'base_commit_id': '1234',
-            },
-            files={
-                'path': diff_file,
-            })
-        self.assertTrue(form.is_valid())
+        old_batch_size = DiffSet.objects.FILEDIFF_BATCH_SIZE
+        DiffSet.objects.FILEDIFF_BATCH_SIZE = 2
 
-        diffset = form.create(diff_file)
-        self.assertEqual(diffset.files.count(), 1)
-        self.assertEqual(diffset.basedir, '/')
-        self.assertEqual(diffset.base_commit_id, '1234')
+        try:
+            diffset = DiffSet.objects.create_from_data(
+                repository, 'diff', diff, None, None, None, '/', None)
+        finally:
+            DiffSet.objects.FILEDIFF_BATCH_SIZE = old_batch_size
 
-    def test_parent_diff_filtering(self):
-        """Testing UploadDiffForm and filtering parent diff files"""
-        saw_file_exists = {}
+        self.assertEqual(len(FileDiff.objects.bulk_create.spy.calls), 3)
+        self.assertEqual(
+            [filediff.source_file for filediff in diffset.files.all()],
+            ['README0', 'README1', 'README2', 'README3', 'README4'])
 
-        def get_file_exists(repository, filename, revision, *args, **kwargs):
-            saw_file_exists[(filename, revision)] = True
-            return True
+        for filediff in diffset.files.all():
+            self.assertEqual(filediff.get_line_counts()['raw_insert_count'],
+                             1)
+
+    def test_creating_with_parser_overriding_parse(self):
+        """Test creating a DiffSet from diff file data with a parser that
+        only overrides parse()
+        """
+        class CustomDiffParser(diffparser.DiffParser):
+            def parse(self):
+                files = super(CustomDiffParser, self).parse()
+
+                for f in files:
+                    f.insert_count = 42
+
+                return files
 
         diff = (
-            b'diff --git a/README b/README\n'
-            b'index d6613f5..5b50866 100644\n'
-            b'--- README\n'
-            b'+++ README\n'
+            b'--- README  123\n'
+            b'+++ README  (new)\n'
+            b'@ -1,1 +1,1 @@\n'
+            b'-blah..\n'
+            b'+blah blah\n'
+        )
+
+        repository = self.create_repository(tool_name='Test')
+        tool = repository.get_scmtool()
+
+        self.spy_on(repository.get_file_exists,
+                    call_fake=lambda *args, **kwargs: True)
+        self.spy_on(repository.get_scmtool,
+                    call_fake=lambda repository: tool)
+        self.spy_on(tool.get_parser,
+                    call_fake=lambda tool, data: CustomDiffParser(data))
+
+        diffset = DiffSet.objects.create_from_data(
+            repository, 'diff', diff, None, None, None, '/', None)
+
+        filediff = diffset.files.get()
+        self.assertEqual(filediff.diff, diff)
+        self.assertEqual(filediff.get_line_counts()['raw_insert_count'], 42)
+
+    def test_creating_stores_total_line_counts(self):
+        """Test creating a DiffSet from diff file data stores the total
+        line counts
+        """
+        diffset = self._create_diffset_with_files(3)
+
+        self.assertEqual(diffset.extra_data['raw_insert_count'], 3)
+        self.assertEqual(diffset.extra_data['raw_delete_count'], 3)
+
+        diffset = DiffSet.objects.get(pk=diffset.pk)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(diffset.get_total_raw_line_counts(), {
+                'raw_insert_count': 3,
+                'raw_delete_count': 3,
+            })
+
+    def test_update_raw_line_counts(self):
+        """Testing DiffSetManager.update_raw_line_counts with diffsets
+        missing stored totals
+        """
+        diffset1 = self._create_diffset_with_files(2)
+        diffset2 = self._create_diffset_with_files(4)
+
+        DiffSet.objects.filter(pk__in=[diffset1.pk, diffset2.pk]).update(
+            extra_data={})
+
+        # Make one of the FileDiffs fall back on its RawFileDiffData.
+        filediff = diffset2.files.all()[0]
+        filediff.extra_data = {}
+        filediff.save(update_fields=['extra_data'])
+
+        diffsets = list(DiffSet.objects.filter(
+            pk__in=[diffset1.pk, diffset2.pk]).order_by('pk'))
+        DiffSet.objects.update_raw_line_counts(diffsets)
+
+        self.assertEqual(diffsets[0].extra_data, {
+            'raw_insert_count': 2,
+            'raw_delete_count': 2,
+        })
+        self.assertEqual(diffsets[1].extra_data, {
+            'raw_insert_count': 4,
+            'raw_delete_count': 4,
+        })
+
+        diffset = DiffSet.objects.get(pk=diffset2.pk)
+        self.assertEqual(diffset.extra_data['raw_insert_count'], 4)
+        self.assertEqual(diffset.extra_data['raw_delete_count'], 4)
+
+    def test_get_total_raw_line_counts_without_stored_totals(self):
+        """Testing DiffSet.get_total_raw_line_counts without stored totals"""
+        diffset = self._create_diffset_with_files(2)
+
+        DiffSet.objects.filter(pk=diffset.pk).update(extra_data=None)
+        diffset = DiffSet.objects.get(pk=diffset.pk)
+
+        self.assertEqual(diffset.get_total_raw_line_counts(), {
+            'raw_insert_count': 2,
+            'raw_delete_count': 2,
+        })
+
+        diffset = DiffSet.objects.get(pk=diffset.pk)
+        self.assertEqual(diffset.extra_data['raw_insert_count'], 2)
+        self.assertEqual(diffset.extra_data['raw_delete_count'], 2)
+
+    def test_creating_with_diff_data_checks_files_in_batch(self):
+        """Test creating a DiffSet from diff file data checks all files with
+        one get_files_exist call
+        """
+        def get_files_exist(repository, paths_and_revisions, *args,
+                            **kwargs):
+            return [True] * len(paths_and_revisions)
+
+        diff = (
+            b'diff --git a/README b/README\n'
+            b'index d6613f5..5b50866 100644\n'
+            b'--- README\n'
+            b'+++ README\n'
+            b'@ -1,1 +1,1 @@\n'
+            b'-blah..\n'
+            b'+blah blah\n'
+            b'diff --git a/INSTALL b/INSTALL\n'
+            b'index e965047..5b50866 100644\n'
+            b'--- INSTALL\n'
+            b'+++ INSTALL\n'
+            b'@ -1,1 +1,1 @@\n'
+            b'-blah..\n'
+            b'+blah blah\n'
+        )
+
+        repository = self.create_repository(tool_name='Test')
+
+        self.spy_on(repository.get_files_exist, call_fake=get_files_exist)
+        self.spy_on(repository.get_file_exists)
+
+        diffset = DiffSet.objects.create_from_data(
+            repository, 'diff', diff, None, None, None, '/', None)
+
+        self.assertEqual(diffset.files.count(), 2)
+        self.assertEqual(len(repository.get_files_exist.calls), 1)
+        self.assertEqual(
+            sorted(repository.get_files_exist.calls[0].args[0]),
+            [('/INSTALL', 'e965047'), ('/README', 'd6613f5')])
+        self.assertFalse(repository.get_file_exists.called)
+
+    def _create_diffset_with_files(self, num_files):
+        """Creates a DiffSet with files that each change one line."""
+        diff = b''.join(
+            b'diff --git a/README%d b/README%d\n'
+            b'index d6613f5..5b50866 100644\n'
+            b'--- README%d\n'
+            b'+++ README%d\n'
+            b'@ -1,1 +1,1 @@\n'
+            b'-blah..\n'
+            b'+blah blah\n'
+            % (i, i, i, i)
+            for i in range(num_files)
+        )
+
+        repository = self.create_repository(
+            name='Test Repo %d' % Repository.objects.count(),
+            tool_name='Test')
+
+        self.spy_on(repository.get_file_exists,
+                    call_fake=lambda *args, **kwargs: True)
+
+        return DiffSet.objects.create_from_data(
+            repository, 'diff', diff, None, None, None, '/', None)
+
+
+class UploadDiffFormTests(SpyAgency, TestCase):
+    """Unit tests for UploadDiffForm."""
+    fixtures = ['test_scmtools']
+
+    def test_creating_diffsets(self):
+        """Test creating a DiffSet from form data"""
+        diff = (
+            b'diff --git a/README b/README\n'
+            b'index d6613f5..5b50866 100644\n'
+            b'--- README\n'
+            b'+++ README\n'
+            b'@ -1,1 +1,1 @@\n'
+            b'-blah..\n'
+            b'+blah blah\n'
+        )
+
+        diff_file = SimpleUploadedFile('diff', diff,
+                                       content_type='text/x-patch')
+
+        repository = self.create_repository(tool_name='Test')
+
+        self.spy_on(repository.get_file_exists,
+                    call_fake=lambda *args, **kwargs: True)
+
+        form = UploadDiffForm(
+            repository=repository,
+            data={
+                'basedir': '/',
+                'base_commit_id': '1234',
+            },
+            files={
+                'path': diff_file,
+            })
+        self.assertTrue(form.is_valid())
+
+        diffset = form.create(diff_file)
+        self.assertEqual(diffset.files.count(), 1)
+        self.assertEqual(diffset.basedir, '/')
+        self.assertEqual(diffset.base_commit_id, '1234')
+
+    def test_parent_diff_filtering(self):
+        """Testing UploadDiffForm and filtering parent diff files"""
+        saw_file_exists = {}
+
+        def get_file_exists(repository, filename, revision, *args, **kwargs):
+            saw_file_exists[(filename, revision)] = True
+            return True
+
+        diff = (
+            b'diff --git a/README b/README\n'
+            b'index d6613f5..5b50866 100644\n'
+            b'--- README\n'
+            b'+++ README\n'
             b'@ -1,1 +1,1 @@\n'
             b'-blah blah\n'
             b'+blah!\n'
@@ -1704,6 +2545,42 @@ class UploadDiffFormTests(SpyAgency, TestCase):
 class ProcessorsTests(TestCase):
     """Unit tests for diff processors."""
 
+    def test_get_interdiff_ranges(self):
+        """Testing get_interdiff_ranges"""
+        diff = (
+            b'@@ -2,11 +2,6 @@\n'
+            b' #\n #\n #\n-#\n'
+            b'@@ -22,7 +22,8 @@\n'
+            b' #\n #\n #\n+#\n #\n #\n #\n #\n'
+        )
+
+        self.assertEqual(get_interdiff_ranges(diff), [(3, 6), (23, 24)])
+
+    def test_filter_interdiff_opcodes_with_ranges(self):
+        """Testing filter_interdiff_opcodes with precomputed ranges"""
+        opcodes = [
+            ('equal', 0, 5, 0, 5),
+            ('replace', 5, 6, 5, 6),
+            ('equal', 6, 20, 6, 20),
+            ('replace', 20, 21, 20, 21),
+            ('equal', 21, 30, 21, 30),
+        ]
+        orig_diff = (
+            b'@@ -3,7 +3,7 @@\n'
+            b' #\n #\n #\n-#\n'
+        )
+        new_diff = (
+            b'@@ -18,7 +18,7 @@\n'
+            b' #\n #\n #\n-#\n'
+        )
+
+        self.assertEqual(
+            list(filter_interdiff_opcodes(
+                opcodes, None, None,
+                orig_ranges=get_interdiff_ranges(orig_diff),
+                new_ranges=get_interdiff_ranges(new_diff))),
+            list(filter_interdiff_opcodes(opcodes, orig_diff, new_diff)))
+
     def test_filter_interdiff_opcodes(self):
         """Testing filter_interdiff_opcodes"""
         opcodes = [
@@ -2112,7 +2989,374 @@ class ProcessorsTests(TestCase):
             prev_j2 = j2
 
 
-class RawDiffChunkGeneratorTests(TestCase):
+class PopulateDiffChunksTests(SpyAgency, TestCase):
+    """Unit tests for diffutils.populate_diff_chunks."""
+
+    def setUp(self):
+        super(PopulateDiffChunksTests, self).setUp()
+
+        self.siteconfig = SiteConfiguration.objects.get_current()
+        self.siteconfig.set('diffviewer_chunk_generator_threads', 4)
+        self.siteconfig.save()
+
+        self.files = [
+            {
+                'filediff': FileDiff(pk=i),
+                'interfilediff': None,
+                'force_interdiff': False,
+            }
+            for i in range(1, 11)
+        ]
+
+    def tearDown(self):
+        super(PopulateDiffChunksTests, self).tearDown()
+
+        self.siteconfig.set('diffviewer_chunk_generator_threads', 0)
+        self.siteconfig.save()
+
+    def test_with_threads(self):
+        """Testing populate_diff_chunks with threads keeps files in order"""
+        self._spy_on_generator()
+
+        diffutils.populate_diff_chunks(self.files)
+
+        for i, diff_file in enumerate(self.files, start=1):
+            self.assertTrue(diff_file['chunks_loaded'])
+            self.assertEqual(diff_file['num_chunks'], 1)
+            self.assertEqual(diff_file['num_changes'], 1)
+            self.assertEqual(diff_file['changed_chunk_indexes'], [0])
+            self.assertEqual(diff_file['chunks'][0]['lines'], [i])
+
+    def test_with_threads_and_error(self):
+        """Testing populate_diff_chunks with threads retries failed files in
+        the calling thread
+        """
+        attempts = self._spy_on_generator(fail_pk=3)
+
+        with self.assertRaises(ValueError):
+            diffutils.populate_diff_chunks(self.files)
+
+        self.assertEqual(attempts, [3, 3])
+
+    def test_with_threads_and_timeout(self):
+        """Testing populate_diff_chunks with threads cancels timed out files
+        and generates them again with new generators
+        """
+        self.siteconfig.set('diffviewer_chunk_generator_timeout', 0)
+        self.siteconfig.save()
+
+        try:
+            generators = self._spy_on_generator(block_pk=3)
+
+            diffutils.populate_diff_chunks(self.files)
+        finally:
+            self.siteconfig.set('diffviewer_chunk_generator_timeout', 30)
+            self.siteconfig.save()
+
+        self.assertEqual(self.files[2]['chunks'][0]['lines'], [3])
+
+        timed_out_generators = [
+            generator
+            for generator in generators
+            if generator.filediff.pk == 3
+        ]
+        self.assertEqual(len(timed_out_generators), 2)
+        self.assertTrue(timed_out_generators[0].cancelled.is_set())
+        self.assertFalse(timed_out_generators[1].cancelled.is_set())
+
+    def _spy_on_generator(self, fail_pk=None, block_pk=None):
+        attempts = []
+        generators = []
+
+        class FakeGenerator(object):
+            def __init__(self, filediff):
+                # Only the first generator for the file blocks, until it's
+                # cancelled.
+                self.blocks = (
+                    filediff.pk == block_pk and
+                    not any(generator.filediff.pk == block_pk
+                            for generator in generators))
+                self.filediff = filediff
+                self.cancelled = threading.Event()
+                generators.append(self)
+
+            def cancel(self):
+                self.cancelled.set()
+
+            def get_chunks(self):
+                if self.filediff.pk == fail_pk:
+                    attempts.append(fail_pk)
+                    raise ValueError('Oh no')
+
+                if self.blocks:
+                    self.cancelled.wait()
+                    raise ChunkGenerationCancelledError
+
+                yield {
+                    'change': 'replace',
+                    'lines': [self.filediff.pk],
+                    'meta': {},
+                }
+
+        self.spy_on(get_diff_chunk_generator,
+                    call_fake=lambda request, filediff, *args, **kwargs:
+                        FakeGenerator(filediff))
+
+        if block_pk is None:
+            return attempts
+        else:
+            return generators
+
+
+class PrefetchOriginalFilesTests(SpyAgency, TestCase):
+    """Unit tests for diffutils.prefetch_original_files."""
+
+    fixtures = ['test_scmtools']
+
+    def setUp(self):
+        super(PrefetchOriginalFilesTests, self).setUp()
+
+        repository = self.create_repository(tool_name='Test')
+        diffset = self.create_diffset(repository=repository)
+
+        self.filediffs = [
+            self.create_filediff(diffset,
+                                 source_file='/file%d' % i,
+                                 source_revision='abc%d' % i)
+            for i in range(3)
+        ]
+
+    def test_prefetch_original_files(self):
+        """Testing prefetch_original_files fetches the files for generators
+        without cached chunks in one batch
+        """
+        class FakeGenerator(object):
+            def __init__(self, filediff):
+                self.filediff = filediff
+
+            def make_cache_key(self):
+                return 'fake-chunks-%s' % self.filediff.pk
+
+        generators = [
+            FakeGenerator(filediff)
+            for filediff in self.filediffs
+        ]
+        cache_memoize(generators[1].make_cache_key(), lambda: [[]],
+                      large_data=True)
+
+        self.spy_on(Repository.prefetch_files, call_original=False)
+
+        diffutils.prefetch_original_files(generators, None)
+
+        self.assertEqual(len(Repository.prefetch_files.calls), 1)
+        self.assertEqual(Repository.prefetch_files.calls[0].args[0],
+                         [('/file0', 'abc0'), ('/file2', 'abc2')])
+
+    def test_prefetch_original_files_with_single_file(self):
+        """Testing prefetch_original_files doesn't fetch a single file"""
+        class FakeGenerator(object):
+            def __init__(self, filediff):
+                self.filediff = filediff
+
+            def make_cache_key(self):
+                return 'fake-chunks-%s' % self.filediff.pk
+
+        self.spy_on(Repository.prefetch_files, call_original=False)
+
+        diffutils.prefetch_original_files(
+            [FakeGenerator(self.filediffs[0])], None)
+
+        self.assertFalse(Repository.prefetch_files.called)
+
+
+class DiffSetPrecomputeTests(SpyAgency, TestCase):
+    """Unit tests for reviewboard.diffviewer.precompute."""
+
+    fixtures = ['test_users', 'test_scmtools']
+
+    def setUp(self):
+        super(DiffSetPrecomputeTests, self).setUp()
+
+        self.repository = self.create_repository(tool_name='Test')
+        self.review_request = self.create_review_request(
+            repository=self.repository)
+        self.diffset1 = self.create_diffset(self.review_request, revision=1)
+        self.diffset2 = self.create_diffset(self.review_request, revision=2)
+
+        for diffset in (self.diffset1, self.diffset2):
+            for i in range(2):
+                # Each revision needs a different diff, or the files will
+                # be left out of the interdiff.
+                self.create_filediff(
+                    diffset,
+                    source_file='/file%d' % i,
+                    dest_file='/file%d' % i,
+                    diff=self.DEFAULT_FILEDIFF_DATA.replace(
+                        b'everybody', b'revision %d' % diffset.revision))
+
+        self.generated = []
+
+        class FakeGenerator(object):
+            def __init__(generator, filediff, interfilediff, fail=False):
+                generator.filediff = filediff
+                generator.interfilediff = interfilediff
+                generator.fail = fail
+
+            def get_cached_chunks(generator):
+                self.generated.append((generator.filediff.pk,
+                                       generator.interfilediff))
+
+                if generator.fail:
+                    raise ValueError('Oh no')
+
+                return []
+
+        def _get_diff_chunk_generator(request, filediff, interfilediff,
+                                      *args, **kwargs):
+            return FakeGenerator(filediff, interfilediff)
+
+        self.fake_generator_cls = FakeGenerator
+        self.spy_on(get_diff_chunk_generator,
+                    call_fake=_get_diff_chunk_generator)
+
+    def test_precompute_diffset(self):
+        """Testing precompute_diffset"""
+        precompute.precompute_diffset(self.diffset2)
+
+        self.assertEqual(
+            self.generated,
+            [(filediff.pk, None) for filediff in self.diffset2.files.all()])
+        self.assertEqual(
+            precompute.get_diffset_precompute_status(self.diffset2),
+            {
+                'state': 'done',
+                'total_files': 2,
+                'completed_files': 2,
+                'failed_files': 0,
+            })
+
+    def test_precompute_diffset_with_interdiff(self):
+        """Testing precompute_diffset with an interdiff"""
+        precompute.precompute_diffset(self.diffset2, self.diffset1)
+
+        self.assertEqual(len(self.generated), 4)
+        self.assertEqual(
+            self.generated[2:],
+            [
+                (filediff.pk, interfilediff)
+                for filediff, interfilediff in zip(self.diffset1.files.all(),
+                                                   self.diffset2.files.all())
+            ])
+        self.assertEqual(
+            precompute.get_diffset_precompute_status(
+                self.diffset2)['completed_files'],
+            4)
+
+    def test_precompute_diffset_with_errors(self):
+        """Testing precompute_diffset with errors generating files"""
+        def _get_diff_chunk_generator(request, filediff, interfilediff,
+                                      *args, **kwargs):
+            return self.fake_generator_cls(filediff, interfilediff,
+                                           fail=True)
+
+        get_diff_chunk_generator.spy.unspy()
+        self.spy_on(get_diff_chunk_generator,
+                    call_fake=_get_diff_chunk_generator)
+
+        precompute.precompute_diffset(self.diffset2)
+
+        self.assertEqual(len(self.generated), 2)
+        self.assertEqual(
+            precompute.get_diffset_precompute_status(self.diffset2),
+            {
+                'state': 'done',
+                'total_files': 2,
+                'completed_files': 2,
+                'failed_files': 2,
+            })
+
+    def test_run_job_with_newer_revision_queued(self):
+        """Testing DiffSetPrecomputePool.run_job with a newer revision queued
+        cancels the job
+        """
+        pool = precompute.DiffSetPrecomputePool()
+        job1 = precompute.DiffSetPrecomputeJob(
+            self.diffset1, pool.PRIORITY_PUBLISHED)
+        job2 = precompute.DiffSetPrecomputeJob(
+            self.diffset2, pool.PRIORITY_PUBLISHED)
+
+        pool.queue(job1)
+        pool.queue(job2)
+
+        self.assertTrue(job1.is_cancelled())
+        self.assertFalse(job2.is_cancelled())
+
+        pool.run_job(job1)
+
+        self.assertEqual(self.generated, [])
+        self.assertEqual(
+            precompute.get_diffset_precompute_status(self.diffset1)['state'],
+            'cancelled')
+
+    def test_run_job_with_deleted_diffset(self):
+        """Testing DiffSetPrecomputePool.run_job with a deleted DiffSet
+        cancels the job
+        """
+        pool = precompute.DiffSetPrecomputePool()
+        job = precompute.DiffSetPrecomputeJob(
+            self.diffset2, pool.PRIORITY_UPLOADED)
+
+        pool.queue(job)
+
+        # Deleting the DiffSet clears its ID, which the status is looked
+        # up by.
+        diffset = DiffSet.objects.get(pk=self.diffset2.pk)
+        self.diffset2.delete()
+        pool.run_job(job)
+
+        self.assertEqual(self.generated, [])
+        self.assertEqual(
+            precompute.get_diffset_precompute_status(diffset)['state'],
+            'cancelled')
+
+    def test_queue_priority(self):
+        """Testing DiffSetPrecomputePool.queue orders jobs by priority"""
+        pool = precompute.DiffSetPrecomputePool()
+        job1 = precompute.DiffSetPrecomputeJob(
+            self.diffset1, pool.PRIORITY_UPLOADED)
+        job2 = precompute.DiffSetPrecomputeJob(
+            self.diffset2, pool.PRIORITY_PUBLISHED)
+
+        pool.queue(job1)
+        pool.queue(job2)
+
+        self.assertIs(pool._queue.get()[2], job2)
+        self.assertIs(pool._queue.get()[2], job1)
+        self.assertEqual(
+            precompute.get_diffset_precompute_status(self.diffset1)['state'],
+            'queued')
+
+    def test_review_request_published_cb(self):
+        """Testing review_request_published_cb queues the latest revision
+        with an interdiff
+        """
+        self.spy_on(precompute.queue_diffset_precompute, call_original=False)
+
+        precompute.review_request_published_cb(
+            sender=ReviewRequest,
+            user=self.review_request.submitter,
+            review_request=self.review_request,
+            changedesc=None)
+
+        self.assertTrue(precompute.queue_diffset_precompute.spy.called)
+        self.assertEqual(
+            precompute.queue_diffset_precompute.spy.last_call.args,
+            (self.diffset2,
+             precompute.DiffSetPrecomputePool.PRIORITY_PUBLISHED,
+             self.diffset1))
+
+
+class RawDiffChunkGeneratorTests(SpyAgency, TestCase):
     """Unit tests for RawDiffChunkGenerator."""
 
     @property
@@ -2148,6 +3392,237 @@ class RawDiffChunkGeneratorTests(TestCase):
         self.assertEqual(chunks[2]['change'], 'equal')
         self.assertEqual(chunks[3]['change'], 'replace')
 
+    def test_get_chunks_after_cancel(self):
+        """Testing RawDiffChunkGenerator.get_chunks after cancel doesn't
+        cache chunks
+        """
+        generator = RawDiffChunkGenerator(b'a\nb\n', b'a\nc\n',
+                                          'file1', 'file2')
+        generator.cancel()
+
+        with self.assertRaises(ChunkGenerationCancelledError):
+            list(generator.get_chunks(cache_key='test-cancelled-chunks'))
+
+        self.assertNotIn(make_cache_key('test-cancelled-chunks'), cache)
+
+    def test_get_chunks_with_deferred_line_changed_regions(self):
+        """Testing RawDiffChunkGenerator.get_chunks with
+        DEFER_LINE_CHANGED_REGIONS defers computing changed regions
+        """
+        class DeferringChunkGenerator(RawDiffChunkGenerator):
+            DEFER_LINE_CHANGED_REGIONS = True
+
+        generator = DeferringChunkGenerator(b'foo = 1\n', b'foo = 2\n',
+                                            'file1', 'file2')
+        chunks = list(generator.get_chunks())
+
+        self.assertTrue(chunks[0]['meta']['line_changed_regions_deferred'])
+        self.assertIsNone(chunks[0]['lines'][0][3])
+        self.assertIsNone(chunks[0]['lines'][0][6])
+
+    def test_get_chunks_with_deferred_and_custom_line_changed_regions(self):
+        """Testing RawDiffChunkGenerator.get_chunks with
+        DEFER_LINE_CHANGED_REGIONS and an overridden get_line_changed_regions
+        uses the override
+        """
+        class CustomChunkGenerator(RawDiffChunkGenerator):
+            DEFER_LINE_CHANGED_REGIONS = True
+
+            def get_line_changed_regions(self, old_line_num, old_line,
+                                         new_line_num, new_line):
+                return [(0, 1)], [(0, 1)]
+
+        generator = CustomChunkGenerator(b'foo = 1\n', b'foo = 2\n',
+                                         'file1', 'file2')
+        chunks = list(generator.get_chunks())
+
+        self.assertNotIn('line_changed_regions_deferred', chunks[0]['meta'])
+        self.assertEqual(chunks[0]['lines'][0][3], [(0, 1)])
+        self.assertEqual(chunks[0]['lines'][0][6], [(0, 1)])
+
+    def test_get_chunks_with_cache_key(self):
+        """Testing RawDiffChunkGenerator.get_chunks with a cache key stores
+        SerializedChunks
+        """
+        old = b'This is line 1\nAnother line\nLine 3.\n'
+        new = b'This is line 1\nLine 3.\n'
+
+        chunks = list(
+            RawDiffChunkGenerator(old, new, 'file1', 'file2').get_chunks())
+        cached_chunks = list(
+            RawDiffChunkGenerator(old, new, 'file1', 'file2').get_chunks(
+                cache_key='test-chunks'))
+
+        self.assertEqual(cached_chunks, chunks)
+
+        stored = cache_memoize('test-chunks', lambda: None, large_data=True)
+        self.assertIsInstance(stored, SerializedChunks)
+        self.assertEqual(list(stored), chunks)
+
+    def test_get_chunks_with_cache_key_and_old_format(self):
+        """Testing RawDiffChunkGenerator.get_chunks with a cache key and
+        chunks cached in an older format
+        """
+        old = b'This is line 1\nAnother line\nLine 3.\n'
+        new = b'This is line 1\nLine 3.\n'
+
+        cache_memoize('test-chunks', lambda: [{'old': 'chunk'}],
+                      large_data=True)
+
+        generator = RawDiffChunkGenerator(old, new, 'file1', 'file2')
+        chunks = list(generator.get_chunks(cache_key='test-chunks'))
+
+        self.assertEqual(len(chunks), 3)
+        self.assertIsInstance(
+            cache_memoize('test-chunks', lambda: None, large_data=True),
+            SerializedChunks)
+
+    def test_get_serialized_chunk(self):
+        """Testing RawDiffChunkGenerator.get_serialized_chunk"""
+        old = b'This is line 1\nAnother line\nLine 3.\n'
+        new = b'This is line 1\nLine 3.\n'
+
+        chunks = list(
+            RawDiffChunkGenerator(old, new, 'file1', 'file2').get_chunks())
+
+        generator = RawDiffChunkGenerator(old, new, 'file1', 'file2')
+        chunk, summaries = generator.get_serialized_chunk('test-chunks', 1)
+
+        self.assertEqual(chunk, chunks[1])
+        self.assertEqual(len(summaries), 3)
+        self.assertEqual(summaries[1]['change'], 'delete')
+
+        # The summaries are stored once, and not with each chunk.
+        self.assertEqual(
+            cache_memoize('test-chunks-chunk-summaries-v%d'
+                          % SerializedChunks.VERSION,
+                          lambda: None, large_data=True),
+            summaries)
+        self.assertEqual(
+            cache_memoize('test-chunks-chunk-payload-1-v%d'
+                          % SerializedChunks.VERSION,
+                          lambda: None, large_data=True),
+            generator.get_serialized_chunks('test-chunks').payloads[1])
+
+        # The chunk should now be loaded on its own, without the whole file.
+        generator = RawDiffChunkGenerator(old, new, 'file1', 'file2')
+        self.spy_on(generator.get_serialized_chunks)
+
+        self.assertEqual(generator.get_serialized_chunk('test-chunks', 1),
+                         (chunks[1], summaries))
+        self.assertFalse(generator.get_serialized_chunks.called)
+
+    def test_get_serialized_chunk_with_invalid_index(self):
+        """Testing RawDiffChunkGenerator.get_serialized_chunk with an
+        invalid index
+        """
+        old = b'This is line 1\nAnother line\nLine 3.\n'
+        new = b'This is line 1\nLine 3.\n'
+
+        generator = RawDiffChunkGenerator(old, new, 'file1', 'file2')
+
+        for index in (-1, 3):
+            chunk, summaries = generator.get_serialized_chunk('test-chunks',
+                                                              index)
+            self.assertIsNone(chunk)
+            self.assertEqual(len(summaries), 3)
+
+    def test_get_chunks_with_partial_highlighting(self):
+        """Testing RawDiffChunkGenerator.get_chunks with a large file only
+        highlights the lines shown by default
+        """
+        old = ''.join('x%d = %d\n' % (i, i) for i in range(100))
+        new = old.replace('x50 = 50\n', 'x50 = "changed"\n')
+
+        generator = RawDiffChunkGenerator(old, new, 'foo.py', 'foo.py')
+        generator.PARTIAL_HIGHLIGHTING_MIN_LINES = 50
+        chunks = list(generator.get_chunks())
+
+        self.assertEqual(len(chunks), 5)
+        self.assertTrue(chunks[0]['collapsable'])
+        self.assertFalse(chunks[1]['collapsable'])
+        self.assertEqual(chunks[2]['change'], 'replace')
+
+        # Lines in collapsed chunks are only escaped.
+        self.assertEqual(chunks[0]['lines'][0][2], 'x0 = 0')
+        self.assertEqual(chunks[0]['meta']['deferred_highlighting'],
+                         ['foo.py', 'foo.py'])
+        self.assertEqual(chunks[4]['meta']['deferred_highlighting'],
+                         ['foo.py', 'foo.py'])
+
+        for chunk in chunks[1:4]:
+            self.assertNotIn('deferred_highlighting', chunk['meta'])
+
+            for line in chunk['lines']:
+                self.assertIn('<span', line[2])
+                self.assertIn('<span', line[5])
+
+        # Expanding the chunk highlights it.
+        highlight_chunk_lines(chunks[0])
+        self.assertNotIn('deferred_highlighting', chunks[0]['meta'])
+
+        for line in chunks[0]['lines']:
+            self.assertIn('<span', line[2])
+            self.assertIn('<span', line[5])
+
+    def test_highlight_chunk_lines_with_preceding_context(self):
+        """Testing highlight_chunk_lines highlights a collapsed chunk using
+        the lines leading up to it
+        """
+        lines = ['x%d = %d\n' % (i, i) for i in range(200)]
+        lines[8] = 's = """\n'
+        lines[9:40] = ['def f%d(): pass\n' % i for i in range(9, 40)]
+        lines[40] = '"""\n'
+        old = ''.join(lines)
+        new = (old.replace('x3 = 3\n', 'x3 = "changed"\n')
+               .replace('x190 = 190\n', 'x190 = "changed"\n'))
+
+        generator = RawDiffChunkGenerator(old, new, 'foo.py', 'foo.py')
+        generator.PARTIAL_HIGHLIGHTING_MIN_LINES = 50
+        chunks = list(generator.get_chunks())
+
+        # This chunk starts inside the multi-line string.
+        chunk = chunks[3]
+        self.assertTrue(chunk['collapsable'])
+        self.assertEqual(chunk['lines'][0][2], 'def f9(): pass')
+        self.assertEqual(chunk['meta']['deferred_highlighting_context'],
+                         [old.splitlines()[:9], new.splitlines()[:9]])
+
+        highlight_chunk_lines(chunk)
+        self.assertNotIn('deferred_highlighting_context', chunk['meta'])
+
+        for line in chunk['lines'][:31]:
+            self.assertNotIn('<span class="k">def</span>', line[2])
+            self.assertNotIn('<span class="k">def</span>', line[5])
+
+    def test_get_serialized_chunk_with_partial_highlighting(self):
+        """Testing RawDiffChunkGenerator.get_serialized_chunk with a large
+        file highlights and caches collapsed chunks
+        """
+        old = ''.join('x%d = %d\n' % (i, i) for i in range(100))
+        new = old.replace('x50 = 50\n', 'x50 = "changed"\n')
+
+        generator = RawDiffChunkGenerator(old, new, 'foo.py', 'foo.py')
+        generator.PARTIAL_HIGHLIGHTING_MIN_LINES = 50
+
+        chunk = generator.get_serialized_chunk('test-chunks', 0)[0]
+        self.assertNotIn('deferred_highlighting', chunk['meta'])
+
+        for line in chunk['lines']:
+            self.assertIn('<span', line[2])
+            self.assertIn('<span', line[5])
+
+        # The whole file's chunks are still left unhighlighted.
+        chunks = generator.get_serialized_chunks('test-chunks')
+        self.assertEqual(chunks[0]['lines'][0][2], 'x0 = 0')
+
+        # The highlighted chunk is cached.
+        self.spy_on(generator.get_serialized_chunks)
+        chunk = generator.get_serialized_chunk('test-chunks', 0)[0]
+
+        self.assertFalse(generator.get_serialized_chunks.called)
+        self.assertIn('<span', chunk['lines'][0][2])
+
     def test_indent_spaces(self):
         """Testing RawDiffChunkGenerator._serialize_indentation with spaces"""
         self.assertEqual(
@@ -2351,8 +3826,184 @@ class RawDiffChunkGeneratorTests(TestCase):
              '</span>        </span> foo', ''))
 
 
+class SerializedChunksTests(TestCase):
+    """Unit tests for SerializedChunks."""
+
+    def setUp(self):
+        super(SerializedChunksTests, self).setUp()
+
+        self.chunks = [
+            {
+                'index': 0,
+                'change': 'equal',
+                'collapsable': False,
+                'numlines': 2,
+                'meta': {
+                    'whitespace_chunk': False,
+                },
+                'lines': [
+                    [1, 1, 'foo', [], 1, 'foo', [], False],
+                    [2, 2, '<span>bar</span>', [], 2, '<span>bar</span>', [],
+                     False],
+                ],
+            },
+            {
+                'index': 1,
+                'change': 'replace',
+                'collapsable': False,
+                'numlines': 1,
+                'meta': {
+                    'whitespace_chunk': True,
+                    'moved-to': {3: 10},
+                },
+                'lines': [
+                    [3, 3, ' baz', [(0, 1)], 3, 'baz', [], True,
+                     {'to': (10, True)}],
+                ],
+            },
+        ]
+
+    def test_decode(self):
+        """Testing SerializedChunks decodes the original chunks"""
+        chunks = pickle.loads(pickle.dumps(SerializedChunks(self.chunks)))
+
+        self.assertTrue(chunks.is_current())
+        self.assertEqual(len(chunks), 2)
+        self.assertEqual(list(chunks), self.chunks)
+        self.assertEqual(chunks[-1], self.chunks[1])
+        self.assertEqual(chunks[:1], self.chunks[:1])
+        self.assertIsInstance(chunks[0]['lines'][1][2], SafeText)
+
+        with self.assertRaises(IndexError):
+            chunks[2]
+
+    def test_decode_keeps_changes(self):
+        """Testing SerializedChunks keeps changes made to decoded chunks"""
+        chunks = SerializedChunks(self.chunks)
+        chunks[1]['lines'][0][6] = [(0, 3)]
+
+        self.assertEqual(chunks[1]['lines'][0][6], [(0, 3)])
+
+    def test_get_summaries(self):
+        """Testing SerializedChunks.get_summaries"""
+        chunks = SerializedChunks(self.chunks)
+
+        self.assertEqual(
+            chunks.get_summaries(),
+            [
+                {
+                    'index': 0,
+                    'change': 'equal',
+                    'numlines': 2,
+                    'meta': {
+                        'whitespace_chunk': False,
+                    },
+                },
+                {
+                    'index': 1,
+                    'change': 'replace',
+                    'numlines': 1,
+                    'meta': {
+                        'whitespace_chunk': True,
+                    },
+                },
+            ])
+        self.assertEqual(chunks._decoded, {})
+
+
+class SyntaxHighlightingTests(SpyAgency, TestCase):
+    """Unit tests for reviewboard.diffviewer.syntax_highlighting."""
+
+    def test_get_lexer_for_filename(self):
+        """Testing get_lexer_for_filename"""
+        lexer = syntax_highlighting.get_lexer_for_filename('foo/bar.py')
+        self.assertEqual(lexer.name, 'Python')
+
+        self.assertRaises(
+            ClassNotFound,
+            lambda: syntax_highlighting.get_lexer_for_filename('foo.xyzzy'))
+
+    def test_guess_lexer_for_filename_with_one_candidate(self):
+        """Testing guess_lexer_for_filename with one possible lexer doesn't
+        analyze the content
+        """
+        self.spy_on(syntax_highlighting._pygments_guess_lexer_for_filename)
+
+        lexer = syntax_highlighting.guess_lexer_for_filename(
+            'Makefile', 'all:\n\ttrue\n')
+
+        self.assertEqual(lexer.name, 'Makefile')
+        self.assertFalse(
+            syntax_highlighting._pygments_guess_lexer_for_filename.spy.called)
+
+    def test_guess_lexer_for_filename_with_many_candidates(self):
+        """Testing guess_lexer_for_filename with several possible lexers
+        analyzes the content
+        """
+        self.spy_on(syntax_highlighting._pygments_guess_lexer_for_filename)
+
+        lexer = syntax_highlighting.guess_lexer_for_filename(
+            'foo.html', '<p>{% if foo %}{{foo}}{% endif %}</p>\n')
+
+        self.assertEqual(lexer.name, 'HTML+Django/Jinja')
+        self.assertTrue(
+            syntax_highlighting._pygments_guess_lexer_for_filename.spy.called)
+
+    def test_highlight_line_ranges(self):
+        """Testing highlight_line_ranges"""
+        lines = [
+            'def foo():',
+            '    """Docstring',
+            '',
+            '    More docstring."""',
+            '    return 1',
+            '',
+            'x = foo()',
+        ]
+        lexer = syntax_highlighting.get_lexer_for_filename('foo.py',
+                                                           stripnl=False)
+        expected = diffutils.split_line_endings(
+            highlight('\n'.join(lines) + '\n', lexer,
+                      syntax_highlighting.get_html_formatter()))
+
+        result = syntax_highlighting.highlight_line_ranges(
+            lines, lexer, [(3, 5), (6, 7)])
+
+        self.assertEqual(result,
+                         [None, None, None] + expected[3:5] + [None] +
+                         expected[6:7])
+
+        # The lexer shouldn't start in the middle of the docstring.
+        self.assertEqual(result[3], expected[3])
+
+
 class DiffOpcodeGeneratorTests(TestCase):
     """Unit tests for DiffOpcodeGenerator."""
+
+    MOVE_OLD_LINES = [
+        'def foo():\n',
+        '    return "this is the foo function"\n',
+        '\n',
+        'def bar(value):\n',
+        '    value += 1\n',
+        '    return value\n',
+        '\n',
+        'def baz():\n',
+        '    pass\n',
+    ]
+
+    MOVE_NEW_LINES = [
+        'def bar(value):\n',
+        '    value += 1\n',
+        '    return value\n',
+        '\n',
+        'def foo():\n',
+        '    return "this is the foo function"\n',
+        '\n',
+        'def baz():\n',
+        '    pass\n',
+    ]
+
     def setUp(self):
         self.generator = get_diff_opcode_generator(MyersDiffer('', ''))
 
@@ -2486,6 +4137,36 @@ class DiffOpcodeGeneratorTests(TestCase):
                 '\t        foo'),
             (False, 3, 8))
 
+    def test_moves(self):
+        """Testing DiffOpcodeGenerator with moved blocks of code"""
+        groups = list(get_diff_opcode_generator(
+            MyersDiffer(self.MOVE_OLD_LINES, self.MOVE_NEW_LINES,
+                        compat_version=DiffCompatVersion.MYERS_SMS_COST_BAIL)))
+
+        self.assertEqual(
+            [group[:5] for group in groups],
+            [
+                ('delete', 0, 3, 0, 0),
+                ('equal', 3, 6, 0, 3),
+                ('insert', 6, 6, 3, 6),
+                ('equal', 6, 9, 6, 9),
+            ])
+        self.assertEqual(groups[0][-1]['moved-to'], {1: 5, 2: 6})
+        self.assertEqual(groups[2][-1]['moved-from'], {5: 1, 6: 2})
+
+    def test_moves_with_time_budget_exceeded(self):
+        """Testing DiffOpcodeGenerator with moved blocks of code and the
+        move detection time budget exceeded
+        """
+        generator = get_diff_opcode_generator(
+            MyersDiffer(self.MOVE_OLD_LINES, self.MOVE_NEW_LINES,
+                        compat_version=DiffCompatVersion.MYERS_SMS_COST_BAIL))
+        generator.MOVE_TIME_BUDGET_SECS = -1
+
+        for group in generator:
+            self.assertNotIn('moved-to', group[-1])
+            self.assertNotIn('moved-from', group[-1])
+
 
 class DiffChunkGeneratorTests(TestCase):
     """Unit tests for DiffChunkGenerator."""
@@ -2564,6 +4245,36 @@ class DiffChunkGeneratorTests(TestCase):
 
         self.assertEqual(line_counts, self.filediff.get_line_counts())
 
+    def test_get_opcode_generator_with_custom_class(self):
+        """Testing DiffChunkGenerator.get_opcode_generator with a custom
+        opcode generator class taking only a diff and interdiff
+        """
+        class CustomOpcodeGenerator(DiffOpcodeGenerator):
+            def __init__(self, differ, diff=None, interdiff=None):
+                super(CustomOpcodeGenerator, self).__init__(differ, diff,
+                                                            interdiff)
+
+        interdiffset = self.create_diffset(repository=self.repository,
+                                           revision=2)
+        interfilediff = self.create_filediff(
+            diffset=interdiffset,
+            diff=self.DEFAULT_FILEDIFF_DATA.replace(b'everybody',
+                                                    b'everyone'))
+
+        old_generator_cls = get_diff_opcode_generator_class()
+        set_diff_opcode_generator_class(CustomOpcodeGenerator)
+
+        try:
+            generator = DiffChunkGenerator(None, self.filediff,
+                                           interfilediff)
+            opcode_generator = generator.get_opcode_generator()
+        finally:
+            set_diff_opcode_generator_class(old_generator_cls)
+
+        self.assertIsInstance(opcode_generator, CustomOpcodeGenerator)
+        self.assertEqual(opcode_generator.diff_ranges, [(0, 1)])
+        self.assertEqual(opcode_generator.interdiff_ranges, [(0, 1)])
+
 
 class DiffRendererTests(SpyAgency, TestCase):
     """Unit tests for DiffRenderer."""
@@ -2664,6 +4375,46 @@ class DiffRendererTests(SpyAgency, TestCase):
         self.assertFalse(renderer.make_cache_key.called)
         self.assertFalse(cache_memoize.spy.called)
 
+    def test_render_to_string_uncached_with_chunk_index(self):
+        """Testing DiffRenderer.render_to_string_uncached with chunk_index
+        only loads that chunk
+        """
+        diff_file = {
+            'filediff': None,
+            'interfilediff': None,
+            'force_interdiff': False,
+        }
+        chunk = {
+            'lines': [],
+            'meta': {},
+            'change': 'replace',
+        }
+
+        def _populate_diff_chunk(diff_file, chunk_index, *args, **kwargs):
+            diff_file['num_chunks'] = 3
+
+            if chunk_index == 1:
+                return chunk
+            else:
+                return None
+
+        self.spy_on(renderers.populate_diff_chunk,
+                    call_fake=_populate_diff_chunk)
+        self.spy_on(renderers.populate_diff_chunks, call_original=False)
+
+        renderer = DiffRenderer(diff_file, chunk_index=1)
+        self.spy_on(renderer.make_context, call_original=False)
+
+        renderer.render_to_string_uncached(None)
+        self.assertEqual(renderer.num_chunks, 3)
+        self.assertIs(renderer._chunk, chunk)
+        self.assertTrue(renderers.populate_diff_chunk.spy.called)
+        self.assertFalse(renderers.populate_diff_chunks.spy.called)
+
+        renderer = DiffRenderer(diff_file, chunk_index=3)
+        self.assertRaises(UserVisibleError,
+                          lambda: renderer.render_to_string_uncached(None))
+
     def test_make_context_with_chunk_index(self):
         """Testing DiffRenderer.make_context with chunk_index"""
         diff_file = {
@@ -2702,6 +4453,173 @@ class DiffRendererTests(SpyAgency, TestCase):
         self.assertEqual(chunk['change'], 'replace')
 
 
+class GetDiffFilesTests(SpyAgency, TestCase):
+    """Unit tests for get_diff_files and get_diff_file_pairs."""
+    fixtures = ['test_scmtools']
+
+    def setUp(self):
+        super(GetDiffFilesTests, self).setUp()
+
+        self.repository = self.create_repository(tool_name='Test')
+        self.diffset = self.create_diffset(repository=self.repository)
+        self.interdiffset = self.create_diffset(repository=self.repository,
+                                                revision=2)
+
+    def test_get_diff_files_sorted(self):
+        """Testing get_diff_files sorts the files"""
+        self.create_filediff(self.diffset, source_file='/src/foo.c',
+                             dest_file='/src/foo.c')
+        self.create_filediff(self.diffset, source_file='/README',
+                             dest_file='/README')
+        self.create_filediff(self.diffset, source_file='/src/foo.h',
+                             dest_file='/src/foo.h')
+
+        files = diffutils.get_diff_files(self.diffset)
+
+        self.assertEqual(
+            [(f['depot_filename'], f['index']) for f in files],
+            [('/README', 1), ('/src/foo.h', 2), ('/src/foo.c', 0)])
+
+    def test_get_diff_files_with_interdiff(self):
+        """Testing get_diff_files with an interdiff"""
+        filediff1 = self.create_filediff(self.diffset,
+                                         source_file='/changed',
+                                         dest_file='/changed')
+        self.create_filediff(self.diffset, source_file='/unchanged',
+                             dest_file='/unchanged')
+        interfilediff1 = self.create_filediff(
+            self.interdiffset,
+            source_file='/changed',
+            dest_file='/changed',
+            diff=b'diff --git a/changed b/changed\n')
+        self.create_filediff(self.interdiffset, source_file='/unchanged',
+                             dest_file='/unchanged')
+        interfilediff3 = self.create_filediff(self.interdiffset,
+                                              source_file='/new',
+                                              dest_file='/new')
+
+        files = diffutils.get_diff_files(self.diffset,
+                                         interdiffset=self.interdiffset)
+
+        self.assertEqual(len(files), 2)
+        self.assertEqual(files[0]['filediff'], filediff1)
+        self.assertEqual(files[0]['interfilediff'], interfilediff1)
+        self.assertTrue(files[0]['force_interdiff'])
+        self.assertEqual(files[1]['filediff'], interfilediff3)
+        self.assertIsNone(files[1]['interfilediff'])
+        self.assertFalse(files[1]['force_interdiff'])
+
+    def test_get_diff_file_pairs_cached(self):
+        """Testing get_diff_file_pairs caches the list of files"""
+        filediff = self.create_filediff(self.diffset)
+
+        pairs = diffutils.get_diff_file_pairs(self.diffset)
+        self.assertEqual(pairs, [(0, filediff.pk, None, False, False)])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(diffutils.get_diff_file_pairs(self.diffset),
+                             pairs)
+
+    def test_get_diff_files_with_file_pairs(self):
+        """Testing get_diff_files with a subset of the file pairs"""
+        for i in range(5):
+            self.create_filediff(self.diffset,
+                                 source_file='/file%d' % i,
+                                 dest_file='/file%d' % i)
+
+        pairs = diffutils.get_diff_file_pairs(self.diffset)
+        files = diffutils.get_diff_files(self.diffset,
+                                         file_pairs=pairs[2:4])
+
+        self.assertEqual(
+            [(f['depot_filename'], f['index']) for f in files],
+            [('/file2', 2), ('/file3', 3)])
+
+    def test_get_diff_file_pairs_with_unknown_patched_sha1(self):
+        """Testing get_diff_file_pairs with an interdiff doesn't cache the
+        list of files until the patched file SHA1s are known
+        """
+        filediff = self.create_filediff(self.diffset)
+        interfilediff = self.create_filediff(
+            self.interdiffset,
+            diff=self.DEFAULT_FILEDIFF_DATA.replace(b'everybody',
+                                                    b'everyone'))
+        cache_key = make_cache_key('diff-file-pairs-%s-%s'
+                                   % (self.diffset.pk, self.interdiffset.pk))
+
+        self.assertEqual(
+            diffutils.get_diff_file_pairs(self.diffset, self.interdiffset),
+            [(0, filediff.pk, interfilediff.pk, True, False)])
+        self.assertIsNone(cache.get(cache_key))
+
+        for temp_filediff in (filediff, interfilediff):
+            temp_filediff.extra_data['patched_sha1'] = 'abc123'
+            temp_filediff.save(update_fields=['extra_data'])
+
+        self.assertEqual(
+            diffutils.get_diff_file_pairs(self.diffset, self.interdiffset),
+            [])
+        self.assertEqual(cache.get(cache_key), [])
+
+    def test_get_diff_files_with_filediff(self):
+        """Testing get_diff_files with a single FileDiff"""
+        self.spy_on(diffutils.get_diff_file_pairs)
+
+        self.create_filediff(self.diffset, source_file='/file1',
+                             dest_file='/file1')
+        filediff = self.create_filediff(self.diffset, source_file='/file2',
+                                        dest_file='/file2')
+
+        files = diffutils.get_diff_files(self.diffset, filediff)
+
+        self.assertEqual(len(files), 1)
+        self.assertIs(files[0]['filediff'], filediff)
+        self.assertEqual(files[0]['index'], 0)
+
+        # The list of all the files isn't needed for a single file.
+        self.assertFalse(diffutils.get_diff_file_pairs.spy.called)
+
+    def test_get_diff_files_with_filediff_and_interdiff(self):
+        """Testing get_diff_files with a single FileDiff and an interdiff"""
+        self.spy_on(diffutils.get_diff_file_pairs)
+
+        filediff1 = self.create_filediff(self.diffset,
+                                         source_file='/changed',
+                                         dest_file='/changed')
+        filediff2 = self.create_filediff(self.diffset,
+                                         source_file='/unchanged',
+                                         dest_file='/unchanged')
+        interfilediff1 = self.create_filediff(
+            self.interdiffset,
+            source_file='/changed',
+            dest_file='/changed',
+            diff=b'diff --git a/changed b/changed\n')
+        self.create_filediff(self.interdiffset, source_file='/unchanged',
+                             dest_file='/unchanged')
+        interfilediff3 = self.create_filediff(self.interdiffset,
+                                              source_file='/new',
+                                              dest_file='/new')
+
+        files = diffutils.get_diff_files(self.diffset, filediff1,
+                                         self.interdiffset)
+        self.assertEqual(len(files), 1)
+        self.assertIs(files[0]['filediff'], filediff1)
+        self.assertEqual(files[0]['interfilediff'], interfilediff1)
+        self.assertEqual(files[0]['index'], 0)
+
+        files = diffutils.get_diff_files(self.diffset, interfilediff3,
+                                         self.interdiffset)
+        self.assertEqual(len(files), 1)
+        self.assertIs(files[0]['filediff'], interfilediff3)
+        self.assertIsNone(files[0]['interfilediff'])
+
+        self.assertEqual(
+            diffutils.get_diff_files(self.diffset, filediff2,
+                                     self.interdiffset),
+            [])
+        self.assertFalse(diffutils.get_diff_file_pairs.spy.called)
+
+
 class DiffUtilsTests(TestCase):
     """Unit tests for diffutils."""
     def test_get_line_changed_regions(self):
@@ -2727,14 +4645,55 @@ class DiffUtilsTests(TestCase):
         old = '-from reviews.models import ReviewRequest, Person, Group'
         new = '+from .reviews.models import ReviewRequest, Group'
         regions = diffutils.get_line_changed_regions(old, new)
-        deep_equal(regions, ([(0, 1), (6, 6), (43, 51)],
-                             [(0, 1), (6, 7), (44, 44)]))
+        deep_equal(regions, ([(0, 1), (6, 6), (41, 49)],
+                             [(0, 1), (6, 7), (42, 42)]))
 
         old = 'abcdefghijklm'
         new = 'nopqrstuvwxyz'
         regions = diffutils.get_line_changed_regions(old, new)
         deep_equal(regions, (None, None))
 
+    def test_compute_chunk_line_changed_regions(self):
+        """Testing compute_chunk_line_changed_regions"""
+        chunk = {
+            'change': 'replace',
+            'meta': {
+                'line_changed_regions_deferred': True,
+            },
+            'lines': [
+                [1, 1, '<span class="n">foo</span> = &quot;abc&quot;', None,
+                 1, '<span class="n">foo</span> = &quot;abd&quot;', None,
+                 False],
+                [2, 2, 'abcdefghijklm', None,
+                 2, 'nopqrstuvwxyz', None,
+                 False],
+            ],
+        }
+
+        diffutils.compute_chunk_line_changed_regions(chunk)
+
+        self.assertEqual(chunk['lines'][0][3], [(9, 10)])
+        self.assertEqual(chunk['lines'][0][6], [(9, 10)])
+        self.assertEqual(chunk['lines'][1][3], [])
+        self.assertEqual(chunk['lines'][1][6], [])
+
+    def test_compute_chunk_line_changed_regions_not_deferred(self):
+        """Testing compute_chunk_line_changed_regions with regions that
+        weren't deferred
+        """
+        chunk = {
+            'change': 'replace',
+            'meta': {},
+            'lines': [
+                [1, 1, 'foo = 1', None, 1, 'foo = 2', None, False],
+            ],
+        }
+
+        diffutils.compute_chunk_line_changed_regions(chunk)
+
+        self.assertIsNone(chunk['lines'][0][3])
+        self.assertIsNone(chunk['lines'][0][6])
+
     @add_fixtures(['test_users', 'test_scmtools'])
     def test_headers_use_correct_line_insert(self):
         """Testing header generation for chunks with insert chunks above"""
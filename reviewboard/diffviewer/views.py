@@ -15,7 +15,8 @@ from django.views.generic.base import TemplateView, View
 from djblets.siteconfig.models import SiteConfiguration
 from djblets.util.http import encode_etag, etag_if_none_match, set_etag
 
-from reviewboard.diffviewer.diffutils import (get_diff_files,
+from reviewboard.diffviewer.diffutils import (get_diff_file_pairs,
+                                              get_diff_files,
                                               get_enable_highlighting)
 from reviewboard.diffviewer.errors import UserVisibleError
 from reviewboard.diffviewer.models import DiffSet, FileDiff
@@ -130,13 +131,14 @@ class DiffViewerView(TemplateView):
         side-by-side diff, handling pagination, and more. The data is
         collected into a context dictionary and returned for rendering.
         """
-        files = get_diff_files(diffset, None, interdiffset,
-                               request=self.request)
+        file_pairs = get_diff_file_pairs(diffset, interdiffset,
+                                         request=self.request)
 
-        # Break the list of files into pages
+        # Break the list of files into pages. Only the files on the page
+        # being shown need to be loaded.
         siteconfig = SiteConfiguration.objects.get_current()
 
-        paginator = Paginator(files,
+        paginator = Paginator(file_pairs,
                               siteconfig.get('diffviewer_paginate_by'),
                               siteconfig.get('diffviewer_paginate_orphans'))
 
@@ -145,8 +147,8 @@ class DiffViewerView(TemplateView):
         if self.request.GET.get('file', False):
             file_id = int(self.request.GET['file'])
 
-            for i, f in enumerate(files):
-                if f['filediff'].pk == file_id:
+            for i, pair in enumerate(file_pairs):
+                if pair[1] == file_id:
                     page_num = i // paginator.per_page + 1
 
                     if page_num > paginator.num_pages:
@@ -188,7 +190,9 @@ class DiffViewerView(TemplateView):
             'diffset': diffset,
             'interdiffset': interdiffset,
             'diffset_pair': (diffset, interdiffset),
-            'files': page.object_list,
+            'files': get_diff_files(diffset, None, interdiffset,
+                                    request=self.request,
+                                    file_pairs=page.object_list),
             'collapseall': self.collapse_diffs,
         }, **extra_context)
 
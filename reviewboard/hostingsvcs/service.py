@@ -16,6 +16,7 @@ from django.utils.translation import ugettext_lazy as _
 from pkg_resources import iter_entry_points
 
 import reviewboard.hostingsvcs.urls as hostingsvcs_urls
+from reviewboard.scmtools.errors import FileNotFoundError
 from reviewboard.signals import initializing
 
 
@@ -167,6 +168,7 @@ class HostingService(object):
     """
     name = None
     plans = None
+    supports_batched_files = False
     supports_bug_trackers = False
     supports_post_commit = False
     supports_repositories = False
@@ -267,6 +269,46 @@ class HostingService(object):
 
         return repository.get_scmtool().file_exists(path, revision)
 
+    def get_files(self, repository, paths_and_revisions, base_commit_id=None,
+                  *args, **kwargs):
+        """Return the contents of several files.
+
+        ``paths_and_revisions`` is a list of ``(path, revision)`` tuples.
+        This returns a list of file contents in the same order, with
+        ``None`` for any files that don't exist.
+
+        By default, this calls get_file for each file. Subclasses can
+        override this if the service's API can fetch several files at once,
+        and set ``supports_batched_files`` to True.
+        """
+        result = []
+
+        for path, revision in paths_and_revisions:
+            try:
+                result.append(self.get_file(repository, path, revision,
+                                            base_commit_id=base_commit_id))
+            except FileNotFoundError:
+                result.append(None)
+
+        return result
+
+    def get_files_exist(self, repository, paths_and_revisions,
+                        base_commit_id=None, *args, **kwargs):
+        """Return whether several files exist.
+
+        ``paths_and_revisions`` is a list of ``(path, revision)`` tuples.
+        This returns a list of booleans in the same order.
+
+        By default, this calls get_file_exists for each file. Subclasses can
+        override this if the service's API can check several files at once,
+        and set ``supports_batched_files`` to True.
+        """
+        return [
+            self.get_file_exists(repository, path, revision,
+                                 base_commit_id=base_commit_id)
+            for path, revision in paths_and_revisions
+        ]
+
     def get_branches(self, repository):
         """Get a list of all branches in the repositories.
 
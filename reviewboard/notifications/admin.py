@@ -4,7 +4,7 @@ from django.contrib import admin
 from django.utils.translation import ugettext_lazy as _
 
 from reviewboard.notifications.forms import WebHookTargetForm
-from reviewboard.notifications.models import WebHookTarget
+from reviewboard.notifications.models import WebHookDelivery, WebHookTarget
 
 
 class WebHookTargetAdmin(admin.ModelAdmin):
@@ -40,4 +40,14 @@ class WebHookTargetAdmin(admin.ModelAdmin):
     )
 
 
+class WebHookDeliveryAdmin(admin.ModelAdmin):
+    list_display = ('event', 'url', 'status', 'attempts', 'last_latency',
+                    'last_response_code', 'created', 'next_attempt')
+    list_filter = ('status', 'event')
+    raw_id_fields = ('target',)
+    readonly_fields = ('created', 'last_attempt', 'last_latency',
+                       'last_response_code', 'last_error')
+
+
 admin.site.register(WebHookTarget, WebHookTargetAdmin)
+admin.site.register(WebHookDelivery, WebHookDeliveryAdmin)
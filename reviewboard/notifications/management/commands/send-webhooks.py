@@ -0,0 +1,32 @@
+from __future__ import unicode_literals
+
+from django.core.management.base import NoArgsCommand
+from django.utils.translation import ugettext as _
+
+from reviewboard.notifications.models import WebHookDelivery
+from reviewboard.notifications.webhooks import (prune_webhook_deliveries,
+                                                send_due_webhook_deliveries)
+
+
+class Command(NoArgsCommand):
+    help = ('Sends any queued webhook deliveries that are due, prunes old '
+            'deliveries, and reports delivery statistics for the last day')
+
+    def handle_noargs(self, **options):
+        count = send_due_webhook_deliveries()
+        pruned = prune_webhook_deliveries()
+        stats = WebHookDelivery.objects.get_stats()
+
+        self.stdout.write(_('Sent %d webhook deliveries.') % count)
+        self.stdout.write(_('Pruned %d old webhook deliveries.') % pruned)
+        self.stdout.write(
+            _('In the last day: pending: %(pending)d, sending: %(sending)d, '
+              'delivered: %(delivered)d, failed: %(failed)d, '
+              'retried: %(retried)d')
+            % stats)
+
+        if stats['avg_latency'] is not None:
+            self.stdout.write(
+                _('Delivery latency: %(avg_latency)0.3fs average, '
+                  '%(max_latency)0.3fs maximum')
+                % stats)
@@ -1,6 +1,9 @@
 from __future__ import unicode_literals
 
-from django.db.models import Manager, Q
+from datetime import timedelta
+
+from django.db.models import Avg, Count, Manager, Max, Q
+from django.utils import timezone
 
 
 class WebHookTargetManager(Manager):
@@ -29,3 +32,110 @@ class WebHookTargetManager(Manager):
             for target in self.filter(q)
             if event in target.events or self.model.ALL_EVENTS in target.events
         ]
+
+
+class WebHookDeliveryManager(Manager):
+    """Manages WebHookDelivery models.
+
+    This provides utility functions for finding and claiming deliveries that
+    are due to be sent, and for reporting on and pruning past deliveries.
+    """
+
+    #: The default period of time that statistics are reported for.
+    STATS_PERIOD = timedelta(days=1)
+
+    def get_due(self, now=None, limit=100):
+        """Returns the deliveries that are due to be sent.
+
+        This includes deliveries whose claim by a worker has expired, which
+        can happen if a process was stopped while sending.
+        """
+        if now is None:
+            now = timezone.now()
+
+        return list(
+            self.filter(status__in=(self.model.STATUS_PENDING,
+                                    self.model.STATUS_SENDING),
+                        next_attempt__lte=now)
+            .select_related('target')
+            .order_by('next_attempt')[:limit])
+
+    def claim(self, delivery, claim_expiration):
+        """Claims a delivery for sending.
+
+        Only one caller (across all processes) can claim a delivery. The
+        claim lasts until ``claim_expiration``, after which the delivery
+        will be due again.
+
+        Returns whether the delivery was claimed.
+        """
+        claimed = self.filter(
+            pk=delivery.pk,
+            status=delivery.status,
+            next_attempt=delivery.next_attempt,
+        ).update(status=self.model.STATUS_SENDING,
+                 next_attempt=claim_expiration)
+
+        if claimed:
+            delivery.status = self.model.STATUS_SENDING
+            delivery.next_attempt = claim_expiration
+
+        return claimed == 1
+
+    def prune(self, older_than):
+        """Deletes deliveries that are finished and older than a given time.
+
+        Only deliveries that were delivered or have failed are deleted.
+        Deliveries created before ``older_than`` are deleted.
+
+        Returns the number of deliveries deleted.
+        """
+        q = self.filter(status__in=(self.model.STATUS_DELIVERED,
+                                    self.model.STATUS_FAILED),
+                        created__lt=older_than)
+        count = q.count()
+
+        if count:
+            q.delete()
+
+        return count
+
+    def get_stats(self, target=None, since=None):
+        """Returns statistics on recent webhook deliveries.
+
+        The result is a dictionary containing the number of deliveries in
+        each state (``pending``, ``sending``, ``delivered`` and ``failed``),
+        the number of deliveries that needed more than one attempt
+        (``retried``), and the average and maximum latency in seconds of
+        successful deliveries (``avg_latency`` and ``max_latency``).
+
+        Only deliveries created after ``since`` are included. This defaults
+        to the last day (:py:attr:`STATS_PERIOD`). If ``target`` is provided,
+        only deliveries to that target will be included.
+        """
+        if since is None:
+            since = timezone.now() - self.STATS_PERIOD
+
+        q = self.filter(created__gte=since)
+
+        if target is not None:
+            q = q.filter(target=target)
+
+        counts = dict(
+            (item['status'], item['count'])
+            for item in q.values('status').annotate(count=Count('pk'))
+        )
+
+        latencies = q.filter(status=self.model.STATUS_DELIVERED).aggregate(
+            avg_latency=Avg('last_latency'),
+            max_latency=Max('last_latency'))
+
+        return {
+            'pending': counts.get(self.model.STATUS_PENDING, 0),
+            'sending': counts.get(self.model.STATUS_SENDING, 0),
+            'delivered': counts.get(self.model.STATUS_DELIVERED, 0),
+            'failed': counts.get(self.model.STATUS_FAILED, 0),
+            'retried': q.filter(attempts__gt=1).count(),
+            'avg_latency': latencies['avg_latency'],
+            'max_latency': latencies['max_latency'],
+        }
@@ -1,12 +1,14 @@
 from __future__ import unicode_literals
 
 from django.db import models
+from django.utils import timezone
 from django.utils.encoding import python_2_unicode_compatible
 from django.utils.translation import ugettext_lazy as _
 from djblets.db.fields import JSONField
 from multiselectfield import MultiSelectField
 
-from reviewboard.notifications.managers import WebHookTargetManager
+from reviewboard.notifications.managers import (WebHookDeliveryManager,
+                                                WebHookTargetManager)
 from reviewboard.scmtools.models import Repository
 from reviewboard.site.models import LocalSite
 
@@ -128,3 +130,63 @@ class WebHookTarget(models.Model):
 
     class Meta:
         verbose_name = _('webhook')
+
+
+@python_2_unicode_compatible
+class WebHookDelivery(models.Model):
+    """A queued delivery of a webhook event to a target.
+
+    Events are stored here when they're dispatched, and sent to the target
+    in the background. Failed deliveries are retried with an increasing
+    delay until they succeed or run out of attempts.
+
+    This also records the latency and errors of each delivery, for
+    reporting.
+    """
+    STATUS_PENDING = 'P'
+    STATUS_SENDING = 'S'
+    STATUS_DELIVERED = 'D'
+    STATUS_FAILED = 'F'
+
+    STATUS_CHOICES = (
+        (STATUS_PENDING, _('Pending')),
+        (STATUS_SENDING, _('Sending')),
+        (STATUS_DELIVERED, _('Delivered')),
+        (STATUS_FAILED, _('Failed')),
+    )
+
+    target = models.ForeignKey(WebHookTarget, related_name='deliveries')
+    event = models.CharField(_('event'), max_length=64)
+    url = models.URLField('URL')
+    content_type = models.CharField(_('content type'), max_length=40)
+    body = models.TextField(_('body'))
+
+    status = models.CharField(
+        _('status'),
+        max_length=1,
+        choices=STATUS_CHOICES,
+        default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(_('attempts'), default=0)
+    next_attempt = models.DateTimeField(_('next attempt'), db_index=True)
+
+    created = models.DateTimeField(_('created'), default=timezone.now,
+                                   db_index=True)
+    last_attempt = models.DateTimeField(_('last attempt'), null=True,
+                                        blank=True)
+    last_latency = models.FloatField(
+        _('last latency'),
+        null=True,
+        blank=True,
+        help_text=_('The time, in seconds, taken by the last attempt.'))
+    last_response_code = models.IntegerField(_('last response code'),
+                                             null=True, blank=True)
+    last_error = models.TextField(_('last error'), blank=True)
+
+    objects = WebHookDeliveryManager()
+
+    def __str__(self):
+        return 'Delivery of %s to %s' % (self.event, self.url)
+
+    class Meta:
+        verbose_name = _('webhook delivery')
+        verbose_name_plural = _('webhook deliveries')
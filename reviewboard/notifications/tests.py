@@ -1,9 +1,14 @@
 from __future__ import unicode_literals
 
+import threading
+from datetime import timedelta
+
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.core import mail
 from django.template import TemplateSyntaxError
+from django.utils import timezone
+from django.utils.six.moves import BaseHTTPServer
 from django.utils.six.moves.urllib.request import urlopen
 from djblets.siteconfig.models import SiteConfiguration
 from djblets.testing.decorators import add_fixtures
@@ -11,13 +16,17 @@ from kgb import SpyAgency
 
 from reviewboard.accounts.models import Profile, ReviewRequestVisit
 from reviewboard.admin.siteconfig import load_site_config
+from reviewboard.notifications import webhooks
 from reviewboard.notifications.email import (build_email_address,
                                              get_email_address_for_user,
                                              get_email_addresses_for_group)
-from reviewboard.notifications.models import WebHookTarget
+from reviewboard.notifications.models import WebHookDelivery, WebHookTarget
 from reviewboard.notifications.webhooks import (FakeHTTPRequest,
+                                                WebHookDeliveryPool,
                                                 dispatch_webhook_event,
-                                                render_custom_content)
+                                                prune_webhook_deliveries,
+                                                render_custom_content,
+                                                send_due_webhook_deliveries)
 from reviewboard.reviews.models import (Group,
                                         Review,
                                         ReviewRequest,
@@ -658,6 +667,20 @@ class WebHookDispatchTests(SpyAgency, TestCase):
     """Unit tests for dispatching webhooks."""
     ENDPOINT_URL = 'http://example.com/endpoint/'
 
+    def setUp(self):
+        super(WebHookDispatchTests, self).setUp()
+
+        # Send the deliveries before dispatch_webhook_event returns.
+        self.siteconfig = SiteConfiguration.objects.get_current()
+        self.siteconfig.set('webhook_delivery_threads', 0)
+        self.siteconfig.save()
+
+    def tearDown(self):
+        super(WebHookDispatchTests, self).tearDown()
+
+        self.siteconfig.set('webhook_delivery_threads', 2)
+        self.siteconfig.save()
+
     def test_dispatch_custom_payload(self):
         """Test dispatch_webhook_event with custom payload"""
         custom_content = (
@@ -758,7 +781,7 @@ class WebHookDispatchTests(SpyAgency, TestCase):
 
     def _test_dispatch(self, handler, event, payload, expected_content_type,
                        expected_data, expected_sig_header=None):
-        def _urlopen(request):
+        def _urlopen(request, timeout=None):
             self.assertEqual(request.get_full_url(), self.ENDPOINT_URL)
             self.assertEqual(request.headers['X-reviewboard-event'], event)
             self.assertEqual(request.headers['Content-type'],
@@ -776,9 +799,269 @@ class WebHookDispatchTests(SpyAgency, TestCase):
 
         self.spy_on(urlopen, call_fake=_urlopen)
 
+        handler.save()
+
         request = FakeHTTPRequest(None)
         dispatch_webhook_event(request, [handler], event, payload)
 
+        self.assertTrue(urlopen.spy.called)
+
+        delivery = WebHookDelivery.objects.get()
+        self.assertEqual(delivery.status, WebHookDelivery.STATUS_DELIVERED)
+        self.assertEqual(delivery.attempts, 1)
+
+
+class WebHookDeliveryTests(SpyAgency, TestCase):
+    """Unit tests for queuing and sending webhook deliveries."""
+
+    def setUp(self):
+        super(WebHookDeliveryTests, self).setUp()
+
+        self.siteconfig = SiteConfiguration.objects.get_current()
+        self.siteconfig.set('webhook_delivery_threads', 0)
+        self.siteconfig.set('webhook_max_attempts', 2)
+        self.siteconfig.save()
+
+        self.server = WebHookTestServer()
+        self.target = WebHookTarget.objects.create(
+            events='my-event',
+            url=self.server.url,
+            encoding=WebHookTarget.ENCODING_JSON)
+
+    def tearDown(self):
+        super(WebHookDeliveryTests, self).tearDown()
+
+        self.server.stop()
+
+        self.siteconfig.set('webhook_delivery_retention_days', 30)
+        self.siteconfig.set('webhook_delivery_threads', 2)
+        self.siteconfig.set('webhook_max_attempts', 8)
+        self.siteconfig.save()
+
+    def test_delivered(self):
+        """Testing webhook delivery to a target"""
+        dispatch_webhook_event(FakeHTTPRequest(None), [self.target],
+                               'my-event', {'items': [1, 2, 3]})
+
+        self.assertEqual(len(self.server.requests), 1)
+        headers, body = self.server.requests[0]
+        self.assertEqual(headers['X-ReviewBoard-Event'], 'my-event')
+        self.assertEqual(body, b'{"items": [1, 2, 3]}')
+
+        delivery = WebHookDelivery.objects.get()
+        self.assertEqual(delivery.status, WebHookDelivery.STATUS_DELIVERED)
+        self.assertEqual(delivery.attempts, 1)
+        self.assertEqual(delivery.last_response_code, 200)
+        self.assertIsNotNone(delivery.last_latency)
+
+    def test_retry_after_failure(self):
+        """Testing webhook delivery retries failed attempts with backoff"""
+        self.server.response_code = 500
+
+        dispatch_webhook_event(FakeHTTPRequest(None), [self.target],
+                               'my-event', {'items': [1, 2, 3]})
+
+        delivery = WebHookDelivery.objects.get()
+        self.assertEqual(delivery.status, WebHookDelivery.STATUS_PENDING)
+        self.assertEqual(delivery.attempts, 1)
+        self.assertEqual(delivery.last_response_code, 500)
+        self.assertNotEqual(delivery.last_error, '')
+        self.assertTrue(delivery.next_attempt > delivery.last_attempt)
+
+        # The retry isn't due yet.
+        self.assertEqual(send_due_webhook_deliveries(), 0)
+
+        # Make it due, and let it fail for the last time.
+        WebHookDelivery.objects.update(next_attempt=delivery.last_attempt)
+        self.assertEqual(send_due_webhook_deliveries(), 1)
+
+        delivery = WebHookDelivery.objects.get()
+        self.assertEqual(delivery.status, WebHookDelivery.STATUS_FAILED)
+        self.assertEqual(delivery.attempts, 2)
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_get_stats(self):
+        """Testing WebHookDeliveryManager.get_stats"""
+        dispatch_webhook_event(FakeHTTPRequest(None), [self.target],
+                               'my-event', {'items': [1, 2, 3]})
+
+        self.server.response_code = 500
+        dispatch_webhook_event(FakeHTTPRequest(None), [self.target],
+                               'my-event', {'items': [1, 2, 3]})
+
+        stats = WebHookDelivery.objects.get_stats()
+        self.assertEqual(stats['delivered'], 1)
+        self.assertEqual(stats['pending'], 1)
+        self.assertEqual(stats['failed'], 0)
+        self.assertIsNotNone(stats['avg_latency'])
+
+    def test_get_stats_only_recent(self):
+        """Testing WebHookDeliveryManager.get_stats only includes recent
+        deliveries
+        """
+        self._create_delivery(WebHookDelivery.STATUS_DELIVERED, days_ago=2)
+        self._create_delivery(WebHookDelivery.STATUS_FAILED, days_ago=0)
+
+        stats = WebHookDelivery.objects.get_stats()
+        self.assertEqual(stats['delivered'], 0)
+        self.assertEqual(stats['failed'], 1)
+
+        stats = WebHookDelivery.objects.get_stats(
+            since=timezone.now() - timedelta(days=3))
+        self.assertEqual(stats['delivered'], 1)
+        self.assertEqual(stats['failed'], 1)
+
+    def test_prune(self):
+        """Testing prune_webhook_deliveries"""
+        old_delivered = self._create_delivery(
+            WebHookDelivery.STATUS_DELIVERED, days_ago=31)
+        old_failed = self._create_delivery(
+            WebHookDelivery.STATUS_FAILED, days_ago=31)
+        old_pending = self._create_delivery(
+            WebHookDelivery.STATUS_PENDING, days_ago=31)
+        new_delivered = self._create_delivery(
+            WebHookDelivery.STATUS_DELIVERED, days_ago=29)
+
+        self.assertEqual(prune_webhook_deliveries(), 2)
+        self.assertEqual(
+            set(WebHookDelivery.objects.values_list('pk', flat=True)),
+            set([old_pending.pk, new_delivered.pk]))
+        self.assertFalse(WebHookDelivery.objects.filter(
+            pk__in=[old_delivered.pk, old_failed.pk]).exists())
+
+    def test_prune_with_retention_disabled(self):
+        """Testing prune_webhook_deliveries with
+        webhook_delivery_retention_days set to 0
+        """
+        self.siteconfig.set('webhook_delivery_retention_days', 0)
+        self.siteconfig.save()
+
+        self._create_delivery(WebHookDelivery.STATUS_DELIVERED, days_ago=365)
+
+        self.assertEqual(prune_webhook_deliveries(), 0)
+        self.assertEqual(WebHookDelivery.objects.count(), 1)
+
+    def test_dispatch_sends_only_new_deliveries(self):
+        """Testing dispatch_webhook_event without delivery threads only
+        sends the new deliveries
+        """
+        now = timezone.now()
+        other_delivery = WebHookDelivery.objects.create(
+            target=self.target,
+            event='other-event',
+            url=self.target.url,
+            content_type=self.target.encoding,
+            body='{}',
+            created=now,
+            next_attempt=now)
+
+        dispatch_webhook_event(FakeHTTPRequest(None), [self.target],
+                               'my-event', {'items': [1, 2, 3]})
+
+        self.assertEqual(len(self.server.requests), 1)
+        headers, body = self.server.requests[0]
+        self.assertEqual(headers['X-ReviewBoard-Event'], 'my-event')
+
+        other_delivery = WebHookDelivery.objects.get(pk=other_delivery.pk)
+        self.assertEqual(other_delivery.status,
+                         WebHookDelivery.STATUS_PENDING)
+
+    def test_wake_on_commit(self):
+        """Testing WebHookDeliveryPool.wake_on_commit waits for the
+        transaction to finish
+        """
+        pool = WebHookDeliveryPool()
+
+        # Tests run inside a transaction.
+        pool.wake_on_commit()
+        self.assertFalse(pool._wake_event.is_set())
+
+        pool.wake_if_pending()
+        self.assertTrue(pool._wake_event.is_set())
+
+        pool._wake_event.clear()
+        pool.wake_if_pending()
+        self.assertFalse(pool._wake_event.is_set())
+
+    def test_max_concurrent_per_target(self):
+        """Testing webhook delivery skips targets at their concurrency
+        limit
+        """
+        pool = WebHookDeliveryPool()
+
+        self.assertTrue(pool._acquire_target(self.target.pk, 1))
+        self.assertFalse(pool._acquire_target(self.target.pk, 1))
+        pool._release_target(self.target.pk)
+        self.assertTrue(pool._acquire_target(self.target.pk, 1))
+
+    def test_threads_started_on_request_finished(self):
+        """Testing webhook delivery threads are started after the first
+        request is finished
+        """
+        pool = webhooks._delivery_pool
+        old_started = pool._started
+        pool._started = False
+
+        self.spy_on(webhooks.start_webhook_delivery_threads,
+                    call_fake=lambda: setattr(pool, '_started', True))
+
+        try:
+            with self.settings(RUNNING_TEST=False):
+                webhooks.request_finished_cb(sender=None)
+                webhooks.request_finished_cb(sender=None)
+
+            self.assertEqual(
+                len(webhooks.start_webhook_delivery_threads.spy.calls), 1)
+        finally:
+            pool._started = old_started
+
+    def _create_delivery(self, status, days_ago):
+        created = timezone.now() - timedelta(days=days_ago)
+
+        return WebHookDelivery.objects.create(
+            target=self.target,
+            event='my-event',
+            url=self.target.url,
+            content_type=self.target.encoding,
+            body='{}',
+            status=status,
+            created=created,
+            next_attempt=created)
+
+
+class WebHookTestServer(object):
+    """A local HTTP server that records the webhooks sent to it."""
+
+    def __init__(self):
+        self.requests = []
+        self.response_code = 200
+
+        test_server = self
+
+        class RequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers['Content-Length'])
+                test_server.requests.append((self.headers,
+                                             self.rfile.read(length)))
+                self.send_response(test_server.response_code)
+                self.end_headers()
+
+            def log_message(self, *args, **kwargs):
+                pass
+
+        self.httpd = BaseHTTPServer.HTTPServer(('127.0.0.1', 0),
+                                               RequestHandler)
+        self.url = 'http://127.0.0.1:%d/' % self.httpd.server_port
+
+        self.thread = threading.Thread(target=self.httpd.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.thread.join()
+
 
 class WebHookTargetManagerTests(TestCase):
     """Unit tests for WebHookTargetManager."""
@@ -2,9 +2,17 @@ from __future__ import unicode_literals
 
 import hmac
 import logging
+import threading
+import time
+from datetime import timedelta
 
+from django.conf import settings
 from django.contrib.sites.models import Site
+from django.core.signals import request_finished
+from django.db import connection
 from django.http.request import HttpRequest
+from django.utils import six, timezone
+from django.utils.six.moves.urllib.error import HTTPError
 from django.utils.six.moves.urllib.parse import urlencode
 from django.utils.six.moves.urllib.request import Request, urlopen
 from django.template import Context, Lexer, Parser
@@ -13,7 +21,7 @@ from djblets.webapi.encoders import (BasicAPIEncoder, JSONEncoderAdapter,
                                      XMLEncoderAdapter)
 
 from reviewboard import get_package_version
-from reviewboard.notifications.models import WebHookTarget
+from reviewboard.notifications.models import WebHookDelivery, WebHookTarget
 from reviewboard.reviews.models import Review, ReviewRequest
 from reviewboard.reviews.signals import (review_request_closed,
                                          review_request_published,
@@ -91,10 +99,325 @@ def render_custom_content(body, context_data={}):
     return nodes.render(Context(context_data))
 
 
+class WebHookDeliveryPool(object):
+    """Sends queued webhook deliveries.
+
+    Deliveries are sent by a set of background threads, which are started
+    when a web process handles its first request, or when a webhook is first
+    dispatched. They wake up when new deliveries are committed to the
+    database, and periodically to send retries and prune old deliveries.
+
+    The number of deliveries being sent to any one target at a time is
+    limited by the ``webhook_max_concurrent_per_target`` setting. This limit
+    applies per process.
+    """
+
+    #: How often, in seconds, idle workers check for retries that are due.
+    POLL_INTERVAL = 30
+
+    #: The delay, in seconds, before retrying a failed delivery. This is
+    #: doubled after each failed attempt.
+    RETRY_BASE_DELAY = 30
+
+    #: The maximum delay, in seconds, between retries.
+    RETRY_MAX_DELAY = 60 * 60
+
+    #: Extra time, in seconds, past the timeout before a claimed delivery
+    #: is considered abandoned and becomes due again.
+    CLAIM_GRACE_PERIOD = 60
+
+    #: How often, in seconds, old deliveries are pruned.
+    PRUNE_INTERVAL = 60 * 60
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wake_event = threading.Event()
+        self._threads = []
+        self._started = False
+        self._last_prune = None
+        self._active_counts = {}
+        self._local = threading.local()
+
+    def start(self, num_threads):
+        """Starts the worker threads, if not already running."""
+        with self._lock:
+            self._started = True
+            self._threads = [
+                thread
+                for thread in self._threads
+                if thread.is_alive()
+            ]
+
+            while len(self._threads) < num_threads:
+                thread = threading.Thread(target=self._run_worker,
+                                          name='webhook-delivery')
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+
+    @property
+    def started(self):
+        """Whether the worker threads have been started."""
+        return self._started
+
+    def wake(self):
+        """Wakes up the worker threads to send any due deliveries."""
+        self._wake_event.set()
+
+    def wake_on_commit(self):
+        """Wakes up the worker threads once new deliveries are committed.
+
+        The workers use their own database connections, so they can't see
+        deliveries queued inside a transaction until it's committed. If
+        there's a transaction in progress, the workers are woken up when
+        the current request finishes, after the transaction is committed.
+        """
+        if connection.in_atomic_block:
+            self._local.wake_pending = True
+        else:
+            self.wake()
+
+    def wake_if_pending(self):
+        """Wakes up the worker threads if a wake-up was deferred."""
+        if getattr(self._local, 'wake_pending', False):
+            self._local.wake_pending = False
+            self.wake()
+
+    def get_retry_delay(self, attempts):
+        """Returns the delay before retrying after the given attempts."""
+        return min(self.RETRY_BASE_DELAY * 2 ** (attempts - 1),
+                   self.RETRY_MAX_DELAY)
+
+    def send_due_deliveries(self):
+        """Sends all deliveries that are currently due.
+
+        Deliveries to targets that already have the maximum number of
+        deliveries in progress are skipped, and will be picked up on a
+        later pass.
+
+        Returns the number of deliveries attempted.
+        """
+        count = 0
+
+        while True:
+            sent = self.send_deliveries(WebHookDelivery.objects.get_due())
+            count += sent
+
+            if sent == 0:
+                return count
+
+    def send_deliveries(self, deliveries):
+        """Sends the given deliveries.
+
+        Each delivery is only sent if it can be claimed, and if its target
+        doesn't already have the maximum number of deliveries in progress.
+        Failed deliveries are left to be retried by the worker threads.
+
+        Returns the number of deliveries attempted.
+        """
+        siteconfig = SiteConfiguration.objects.get_current()
+        timeout = siteconfig.get('webhook_timeout')
+        max_attempts = siteconfig.get('webhook_max_attempts')
+        max_per_target = siteconfig.get('webhook_max_concurrent_per_target')
+        sent = 0
+
+        for delivery in deliveries:
+            if not self._acquire_target(delivery.target_id, max_per_target):
+                continue
+
+            try:
+                claim_expiration = timezone.now() + timedelta(
+                    seconds=timeout + self.CLAIM_GRACE_PERIOD)
+
+                if WebHookDelivery.objects.claim(delivery, claim_expiration):
+                    self._send(delivery, timeout, max_attempts)
+                    sent += 1
+            finally:
+                self._release_target(delivery.target_id)
+
+        return sent
+
+    def _run_worker(self):
+        """Main loop for a worker thread."""
+        while True:
+            self._wake_event.wait(self.POLL_INTERVAL)
+            self._wake_event.clear()
+
+            try:
+                self.send_due_deliveries()
+                self._prune_if_due()
+            except Exception as e:
+                logging.exception('Unexpected error sending webhooks: %s', e)
+            finally:
+                # Each thread has its own database connection, which
+                # would otherwise be left open.
+                connection.close()
+
+    def _prune_if_due(self):
+        """Prunes old deliveries, if it hasn't been done recently.
+
+        Only one worker thread will prune at a time.
+        """
+        now = time.time()
+
+        with self._lock:
+            if (self._last_prune is not None and
+                now - self._last_prune < self.PRUNE_INTERVAL):
+                return
+
+            self._last_prune = now
+
+        prune_webhook_deliveries()
+
+    def _acquire_target(self, target_id, max_per_target):
+        """Reserves a slot for sending to a target.
+
+        Returns False if the target already has the maximum number of
+        deliveries in progress.
+        """
+        with self._lock:
+            count = self._active_counts.get(target_id, 0)
+
+            if count >= max_per_target:
+                return False
+
+            self._active_counts[target_id] = count + 1
+
+        return True
+
+    def _release_target(self, target_id):
+        """Releases a slot reserved by _acquire_target."""
+        with self._lock:
+            count = self._active_counts[target_id] - 1
+
+            if count:
+                self._active_counts[target_id] = count
+            else:
+                del self._active_counts[target_id]
+
+    def _send(self, delivery, timeout, max_attempts):
+        """Sends a delivery and records the result.
+
+        If the attempt fails, the delivery is scheduled to be retried
+        after a delay, unless it has run out of attempts.
+        """
+        body = delivery.body.encode('utf-8')
+        target = delivery.target
+
+        headers = {
+            'X-ReviewBoard-Event': delivery.event,
+            'Content-Type': delivery.content_type,
+            'Content-Length': len(body),
+            'User-Agent': 'ReviewBoard-WebHook/%s' % get_package_version(),
+        }
+
+        if target.secret:
+            signer = hmac.new(target.secret.encode('utf-8'), body)
+            headers['X-Hub-Signature'] = 'sha1=%s' % signer.hexdigest()
+
+        logging.info('Dispatching webhook for event %s to %s',
+                     delivery.event, delivery.url)
+
+        response_code = None
+        error = ''
+        start_time = time.time()
+
+        try:
+            response = urlopen(Request(delivery.url, body, headers),
+                               timeout=timeout)
+
+            if response is not None:
+                response_code = response.getcode()
+                response.close()
+        except HTTPError as e:
+            response_code = e.code
+            error = six.text_type(e)
+        except Exception as e:
+            error = six.text_type(e) or e.__class__.__name__
+
+        now = timezone.now()
+
+        delivery.attempts += 1
+        delivery.last_attempt = now
+        delivery.last_latency = time.time() - start_time
+        delivery.last_response_code = response_code
+        delivery.last_error = error
+
+        if not error:
+            delivery.status = WebHookDelivery.STATUS_DELIVERED
+        elif delivery.attempts >= max_attempts:
+            logging.error('Giving up on webhook for event %s to %s after '
+                          '%d attempts: %s',
+                          delivery.event, delivery.url, delivery.attempts,
+                          error)
+            delivery.status = WebHookDelivery.STATUS_FAILED
+        else:
+            logging.warning('Failed to send webhook for event %s to %s '
+                            '(attempt %d): %s',
+                            delivery.event, delivery.url, delivery.attempts,
+                            error)
+            delivery.status = WebHookDelivery.STATUS_PENDING
+            delivery.next_attempt = now + timedelta(
+                seconds=self.get_retry_delay(delivery.attempts))
+
+        delivery.save(update_fields=['attempts', 'last_attempt',
+                                     'last_latency', 'last_response_code',
+                                     'last_error', 'status', 'next_attempt'])
+
+
+_delivery_pool = WebHookDeliveryPool()
+
+
+def start_webhook_delivery_threads():
+    """Starts the threads that send queued webhook deliveries.
+
+    The number of threads comes from the ``webhook_delivery_threads``
+    setting. If it's 0, no threads are started, and deliveries are sent
+    when they're dispatched.
+    """
+    siteconfig = SiteConfiguration.objects.get_current()
+    _delivery_pool.start(siteconfig.get('webhook_delivery_threads'))
+
+
+def prune_webhook_deliveries():
+    """Deletes old deliveries that have been delivered or have failed.
+
+    Deliveries older than the number of days in the
+    ``webhook_delivery_retention_days`` setting are deleted. If it's 0,
+    deliveries are kept forever.
+
+    Returns the number of deliveries deleted.
+    """
+    siteconfig = SiteConfiguration.objects.get_current()
+    retention_days = siteconfig.get('webhook_delivery_retention_days')
+
+    if retention_days <= 0:
+        return 0
+
+    return WebHookDelivery.objects.prune(
+        timezone.now() - timedelta(days=retention_days))
+
+
+def send_due_webhook_deliveries():
+    """Sends any queued webhook deliveries that are due.
+
+    This sends the deliveries in the calling thread. Returns the number of
+    deliveries attempted.
+    """
+    return _delivery_pool.send_due_deliveries()
+
+
 def dispatch_webhook_event(request, webhook_targets, event, payload):
-    """Dispatch the given event and payload to the given webhook targets."""
+    """Dispatch the given event and payload to the given webhook targets.
+
+    The payloads are queued as :py:class:`WebHookDelivery` entries, which are
+    sent by background threads. If the ``webhook_delivery_threads`` setting
+    is 0, the new deliveries will instead be sent before this returns.
+    """
     encoder = BasicAPIEncoder()
     bodies = {}
+    now = timezone.now()
+    deliveries = []
 
     for webhook_target in webhook_targets:
         if webhook_target.use_custom_content:
@@ -121,25 +444,36 @@ def dispatch_webhook_event(request, webhook_targets, event, payload):
                                   encoding, webhook_target.pk)
                     continue
 
-                body = body.encode('utf-8')
                 bodies[encoding] = body
             else:
                 body = bodies[encoding]
 
-        headers = {
-            'X-ReviewBoard-Event': event,
-            'Content-Type': webhook_target.encoding,
-            'Content-Length': len(body),
-            'User-Agent': 'ReviewBoard-WebHook/%s' % get_package_version(),
-        }
-
-        if webhook_target.secret:
-            signer = hmac.new(webhook_target.secret.encode('utf-8'), body)
-            headers['X-Hub-Signature'] = 'sha1=%s' % signer.hexdigest()
+        deliveries.append(WebHookDelivery(
+            target=webhook_target,
+            event=event,
+            url=webhook_target.url,
+            content_type=webhook_target.encoding,
+            body=body,
+            created=now,
+            next_attempt=now))
+
+    if deliveries:
+        siteconfig = SiteConfiguration.objects.get_current()
+        num_threads = siteconfig.get('webhook_delivery_threads')
+
+        if num_threads > 0:
+            WebHookDelivery.objects.bulk_create(deliveries)
+
+            # The threads may not have been started yet if the setting was
+            # changed after initialization.
+            _delivery_pool.start(num_threads)
+            _delivery_pool.wake_on_commit()
+        else:
+            # These are saved individually so they have IDs to claim them by.
+            for delivery in deliveries:
+                delivery.save()
 
-        logging.info('Dispatching webhook for event %s to %s',
-                     event, webhook_target.url)
-        urlopen(Request(webhook_target.url, body, headers))
+            _delivery_pool.send_deliveries(deliveries)
 
 
 def _serialize_review(review, request, review_key):
@@ -265,7 +599,18 @@ def reply_published_cb(sender, user, reply, **kwargs):
         dispatch_webhook_event(request, webhook_targets, event, payload)
 
 
+def request_finished_cb(sender, **kwargs):
+    _delivery_pool.wake_if_pending()
+
+    # Only web processes handle requests, so this keeps management commands
+    # (which may run before the tables exist) from starting the threads.
+    if (not _delivery_pool.started and
+        not getattr(settings, 'RUNNING_TEST', False)):
+        start_webhook_delivery_threads()
+
+
 def connect_signals():
+    request_finished.connect(request_finished_cb)
     review_request_closed.connect(review_request_closed_cb,
                                   sender=ReviewRequest)
     review_request_published.connect(review_request_published_cb,
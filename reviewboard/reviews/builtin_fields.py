@@ -33,6 +33,8 @@ class BuiltinFieldMixin(object):
     ReviewRequest or ReviewRequestDraft, rather than working with those
     stored in extra_data.
     """
+    can_cache_change_entry = True
+
     def __init__(self, *args, **kwargs):
         super(BuiltinFieldMixin, self).__init__(*args, **kwargs)
 
@@ -89,6 +91,10 @@ class BuiltinLocalsFieldMixin(BuiltinFieldMixin):
     #: A list of variables needed from the review_detail view's locals().
     locals_vars = []
 
+    # The change entries show the current state of the objects from
+    # locals_vars, so they can't be cached.
+    can_cache_change_entry = False
+
     def __init__(self, review_request_details, locals_vars={},
                  *args, **kwargs):
         super(BuiltinLocalsFieldMixin, self).__init__(
@@ -280,6 +286,9 @@ class BugsField(BuiltinFieldMixin, BaseCommaEditableField):
 
     one_line_per_change_entry = False
 
+    # The bug links depend on the repository's current bug tracker.
+    can_cache_change_entry = False
+
     def load_value(self, review_request_details):
         return review_request_details.get_bug_list()
 
@@ -327,6 +336,10 @@ class DependsOnField(BuiltinFieldMixin, BaseModelListEditableField):
     model = ReviewRequest
     model_name_attr = 'summary'
 
+    # The change entries show the current summary and status of each
+    # review request.
+    can_cache_change_entry = False
+
     def render_change_entry_item_html(self, info, item):
         item = ReviewRequest.objects.get(pk=item[2])
 
@@ -470,9 +483,9 @@ class DiffField(BuiltinLocalsFieldMixin, BaseReviewRequestField):
 
         # Fetch the total number of inserts/deletes. These will be shown
         # alongside the diff revision.
-        counts = diffset.get_total_line_counts()
-        raw_insert_count = counts.get('raw_insert_count', 0)
-        raw_delete_count = counts.get('raw_delete_count', 0)
+        counts = diffset.get_total_raw_line_counts()
+        raw_insert_count = counts['raw_insert_count']
+        raw_delete_count = counts['raw_delete_count']
 
         line_counts = []
 
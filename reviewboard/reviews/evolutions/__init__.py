@@ -32,4 +32,5 @@ SEQUENCE = [
     'review_request_summary_index_manual',
     'split_rich_text',
     'is_default_group',
+    'review_request_last_updated_index',
 ]
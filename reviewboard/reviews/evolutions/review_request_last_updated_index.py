@@ -0,0 +1,8 @@
+from __future__ import unicode_literals
+
+from django_evolution.mutations import ChangeField
+
+
+MUTATIONS = [
+    ChangeField('ReviewRequest', 'last_updated', initial=None, db_index=True),
+]
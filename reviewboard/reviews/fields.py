@@ -1,11 +1,15 @@
 from __future__ import unicode_literals
 
+import hashlib
 import logging
 
+from django.conf import settings
 from django.utils import six
 from django.utils.datastructures import SortedDict
 from django.utils.html import escape, strip_tags
 from django.utils.safestring import mark_safe
+from django.utils.translation import get_language
+from djblets.cache.backend import cache_memoize
 
 from reviewboard.diffviewer.diffutils import get_line_changed_regions
 from reviewboard.diffviewer.myersdiff import MyersDiffer
@@ -18,6 +22,7 @@ from reviewboard.reviews.markdown_utils import (is_rich_text_default_for_user,
 
 _all_fields = {}
 _fieldsets = SortedDict()
+_fields_version = None
 _populated = False
 
 
@@ -73,6 +78,7 @@ class BaseReviewRequestFieldSet(object):
         try:
             cls.field_classes.remove(field_cls)
             del _all_fields[field_id]
+            _reset_fields_version()
         except KeyError:
             logging.error('Failed to unregister unknown review request '
                           'field "%s"',
@@ -115,6 +121,11 @@ class BaseReviewRequestField(object):
     change_entry_renders_inline = True
     model = None
 
+    #: Whether the rendered change entries can be cached and shared between
+    #: users. This must only be set if the change entry HTML depends solely
+    #: on the change description, and not on the request or other state.
+    can_cache_change_entry = False
+
     can_record_change_entry = property(lambda self: self.is_editable)
 
     def __init__(self, review_request_details, request=None):
@@ -696,6 +707,18 @@ def _register_field(field_cls):
             % field_id)
 
     _all_fields[field_id] = field_cls
+    _reset_fields_version()
+
+
+def _reset_fields_version():
+    """Resets the version of the field registry.
+
+    This is called whenever a fieldset or field is added or removed, so that
+    cached change entries rendered with the old fields are no longer used.
+    """
+    global _fields_version
+
+    _fields_version = None
 
 
 def get_review_request_fields():
@@ -773,6 +796,7 @@ def register_review_request_fieldset(fieldset):
                        % fieldset_id)
 
     _fieldsets[fieldset_id] = fieldset
+    _reset_fields_version()
 
     # Set the field_classes to an empty list by default if it doesn't
     # explicitly provide its own, so that entries don't go into
@@ -803,3 +827,168 @@ def unregister_review_request_fieldset(fieldset):
         fieldset.remove_field(field_cls)
 
     del _fieldsets[fieldset_id]
+    _reset_fields_version()
+
+
+def get_review_request_fields_version():
+    """Returns a version identifying the registered fieldsets and fields.
+
+    The version is computed from the IDs and classes of all registered
+    fieldsets and fields, so it's the same across processes that have the
+    same fields registered, and changes when extensions add or remove
+    fields.
+    """
+    global _fields_version
+
+    _populate_defaults()
+
+    if _fields_version is None:
+        parts = []
+
+        for fieldset in six.itervalues(_fieldsets):
+            parts.append(fieldset.fieldset_id)
+
+            for field_cls in fieldset.field_classes:
+                parts.append('%s:%s.%s' % (field_cls.field_id,
+                                           field_cls.__module__,
+                                           field_cls.__name__))
+
+        _fields_version = \
+            hashlib.sha1(';'.join(parts).encode('utf-8')).hexdigest()
+
+    return _fields_version
+
+
+def get_change_entry_field_groups(changedesc, review_request, request=None,
+                                  locals_vars=None):
+    """Returns the rendered fields for a change description's entry.
+
+    The fields are processed in order by fieldset, and put into groups
+    composed of inline vs. full-width field values. Each group is a
+    dictionary with ``inline`` and ``fields`` keys, where ``fields`` is a
+    list of sections returned by
+    :py:meth:`BaseReviewRequestField.get_change_entry_sections_html`.
+
+    The sections for fields that set ``can_cache_change_entry`` are cached
+    for the change description, and are only regenerated when the registered
+    fields change. Other fields, which may depend on ``request`` or other
+    state, are rendered on each call.
+
+    ``locals_vars`` provides the objects that the built-in fields use to
+    avoid extra queries. If not provided, they will be looked up from the
+    review request.
+    """
+    field_classes = _get_change_entry_field_classes(changedesc)
+
+    def _render_cached_sections():
+        return dict(
+            (field_cls.field_id,
+             _render_change_entry_sections(changedesc, field_cls,
+                                           review_request, None, {}))
+            for field_cls in field_classes
+            if field_cls.can_cache_change_entry
+        )
+
+    fields_changed_groups = []
+    cur_field_changed_group = None
+    cached_sections = None
+
+    for field_cls in field_classes:
+        inline = field_cls.change_entry_renders_inline
+
+        if (not cur_field_changed_group or
+            cur_field_changed_group['inline'] != inline):
+            # Begin a new group of fields.
+            cur_field_changed_group = {
+                'inline': inline,
+                'fields': [],
+            }
+            fields_changed_groups.append(cur_field_changed_group)
+
+        if field_cls.can_cache_change_entry:
+            if cached_sections is None:
+                # The change description is always loaded from the database
+                # here, so the timestamp has the precision it's stored with.
+                cached_sections = cache_memoize(
+                    'changedesc-fields-%s-%s-%s-%s-%s'
+                    % (changedesc.pk, changedesc.timestamp.isoformat(),
+                       get_review_request_fields_version(), get_language(),
+                       settings.AJAX_SERIAL),
+                    _render_cached_sections)
+
+            sections = cached_sections[field_cls.field_id]
+        else:
+            if locals_vars is None:
+                locals_vars = _get_change_entry_locals_vars(review_request)
+
+            sections = _render_change_entry_sections(
+                changedesc, field_cls, review_request, request, locals_vars)
+
+        cur_field_changed_group['fields'] += sections
+
+    return fields_changed_groups
+
+
+def can_cache_change_entry(changedesc):
+    """Returns whether a change description's entry can be cached as a whole.
+
+    This is only the case if every field rendered in the entry sets
+    ``can_cache_change_entry``. Otherwise, some of the entry depends on state
+    other than the change description, and must be rendered on each request.
+    """
+    return all(
+        field_cls.can_cache_change_entry
+        for field_cls in _get_change_entry_field_classes(changedesc)
+    )
+
+
+def _get_change_entry_field_classes(changedesc):
+    """Returns the field classes rendered in a change description's entry."""
+    return [
+        field_cls
+        for fieldset in get_review_request_fieldsets(
+            include_main=True,
+            include_change_entries_only=True)
+        for field_cls in fieldset.field_classes
+        if field_cls.field_id in changedesc.fields_changed
+    ]
+
+
+def _get_change_entry_locals_vars(review_request):
+    """Returns the objects used by the built-in fields to render entries.
+
+    These match what the review request page provides to the fields.
+    """
+    def _build_id_map(objects):
+        return dict(
+            (obj.pk, obj)
+            for obj in objects
+        )
+
+    file_attachment_id_map = _build_id_map(
+        review_request.get_file_attachments())
+    file_attachment_id_map.update(_build_id_map(
+        review_request.get_inactive_file_attachments()))
+
+    screenshot_id_map = _build_id_map(review_request.get_screenshots())
+    screenshot_id_map.update(_build_id_map(
+        review_request.get_inactive_screenshots()))
+
+    return {
+        'diffsets_by_id': _build_id_map(review_request.get_diffsets()),
+        'file_attachment_id_map': file_attachment_id_map,
+        'screenshot_id_map': screenshot_id_map,
+    }
+
+
+def _render_change_entry_sections(changedesc, field_cls, review_request,
+                                  request, locals_vars):
+    """Renders the sections of a change description entry for a field."""
+    if hasattr(field_cls, 'locals_vars'):
+        field = field_cls(review_request, request=request,
+                          locals_vars=locals_vars)
+    else:
+        field = field_cls(review_request, request=request)
+
+    return field.get_change_entry_sections_html(
+        changedesc.fields_changed[field_cls.field_id])
@@ -156,7 +156,8 @@ class ReviewRequest(BaseReviewRequestDetails):
     submitter = models.ForeignKey(User, verbose_name=_("submitter"),
                                   related_name="review_requests")
     time_added = models.DateTimeField(_("time added"), default=timezone.now)
-    last_updated = ModificationTimestampField(_("last updated"))
+    last_updated = ModificationTimestampField(_("last updated"),
+                                              db_index=True)
     status = models.CharField(_("status"), max_length=1, choices=STATUSES,
                               db_index=True)
     public = models.BooleanField(_("public"), default=False)
@@ -12,6 +12,7 @@ from django.utils import six
 from django.utils.html import escape, format_html
 from django.utils.safestring import mark_safe
 from django.utils.translation import ugettext_lazy as _
+from djblets.cache.backend import cache_memoize
 from djblets.siteconfig.models import SiteConfiguration
 from djblets.util.decorators import basictag, blocktag
 from djblets.util.humanize import humanize_list
@@ -99,6 +100,23 @@ def ifneatnumber(context, nodelist, rid):
     return s
 
 
+@register.tag
+@blocktag(end_prefix='end_')
+def entry_box_cache(context, nodelist, entry):
+    """Renders a review or change description box, caching the result.
+
+    The rendered HTML is cached under the entry's ``cache_key``, which the
+    review request page builds from everything the box depends on. Entries
+    without a ``cache_key`` are rendered without caching.
+    """
+    cache_key = entry.get('cache_key')
+
+    if not cache_key:
+        return nodelist.render(context)
+
+    return cache_memoize(cache_key, lambda: nodelist.render(context))
+
+
 @register.tag
 @basictag(takes_context=True)
 def file_attachment_comments(context, file_attachment):
@@ -12,16 +12,27 @@ from django.test.client import RequestFactory
 from django.utils import six
 from django.utils.safestring import SafeText
 from djblets.auth.signals import user_registered
+from djblets.extensions.manager import ExtensionManager
+from djblets.extensions.models import RegisteredExtension
 from djblets.siteconfig.models import SiteConfiguration
 from djblets.testing.decorators import add_fixtures
 from kgb import SpyAgency
 
+import reviewboard.reviews.fields as review_fields
 from reviewboard.accounts.models import (Profile,
                                          LocalSiteProfile,
                                          _add_default_groups)
 from reviewboard.attachments.models import FileAttachment
 from reviewboard.changedescs.models import ChangeDescription
+from reviewboard.extensions.base import Extension
+from reviewboard.extensions.hooks import CommentDetailDisplayHook
 from reviewboard.reviews.errors import NotModifiedError, PublishError
+from reviewboard.reviews.fields import (BaseEditableField,
+                                        BaseReviewRequestFieldSet,
+                                        get_change_entry_field_groups,
+                                        get_review_request_fields_version,
+                                        register_review_request_fieldset,
+                                        unregister_review_request_fieldset)
 from reviewboard.reviews.forms import DefaultReviewerForm, GroupForm
 from reviewboard.reviews.markdown_utils import (get_markdown_element_tree,
                                                 iter_markdown_lines,
@@ -36,7 +47,8 @@ from reviewboard.reviews.models import (Comment,
                                         ReviewRequest,
                                         ReviewRequestDraft,
                                         Review,
-                                        Screenshot)
+                                        Screenshot,
+                                        ScreenshotComment)
 from reviewboard.scmtools.core import ChangeSet, Commit
 from reviewboard.scmtools.errors import ChangeNumberInUseError
 from reviewboard.scmtools.models import Repository, Tool
@@ -1271,6 +1283,131 @@ class ViewTests(TestCase):
         self.assertEqual(comments[0].text, comment_text_1)
         self.assertEqual(comments[1].text, comment_text_2)
 
+    def test_review_detail_entry_cache_keys(self):
+        """Testing review_detail view's entry cache keys change when a reply
+        is published
+        """
+        review_request = self.create_review_request(publish=True)
+        review = self.create_review(review_request, publish=True)
+
+        response = self.client.get('/r/%d/' % review_request.pk)
+        self.assertEqual(response.status_code, 200)
+
+        entries = response.context['entries']
+        self.assertEqual(len(entries), 1)
+        old_cache_key = entries[0]['cache_key']
+
+        self.create_reply(
+            review,
+            timestamp=(review.timestamp + timedelta(days=1)),
+            publish=True)
+
+        response = self.client.get('/r/%d/' % review_request.pk)
+        self.assertEqual(response.status_code, 200)
+
+        entries = response.context['entries']
+        self.assertEqual(len(entries), 1)
+        self.assertNotEqual(entries[0]['cache_key'], old_cache_key)
+
+    def test_review_detail_entry_cache_keys_with_user_name(self):
+        """Testing review_detail view's entry cache keys change when a
+        reviewer's name changes
+        """
+        review_request = self.create_review_request(publish=True)
+        review = self.create_review(review_request, publish=True)
+        old_cache_key = self._get_entry_cache_keys(review_request)[0]
+
+        review.user.first_name = 'New'
+        review.user.save()
+
+        self.assertNotEqual(self._get_entry_cache_keys(review_request)[0],
+                            old_cache_key)
+
+    def test_review_detail_entry_cache_keys_with_caption(self):
+        """Testing review_detail view's entry cache keys change when a
+        screenshot caption changes
+        """
+        review_request = self.create_review_request(publish=True)
+        screenshot = self.create_screenshot(review_request)
+        review = self.create_review(review_request)
+        self.create_screenshot_comment(review, screenshot)
+        review.publish()
+        old_cache_key = self._get_entry_cache_keys(review_request)[0]
+
+        screenshot.caption = 'New caption'
+        screenshot.save()
+
+        self.assertNotEqual(self._get_entry_cache_keys(review_request)[0],
+                            old_cache_key)
+
+    def test_review_detail_entry_cache_keys_with_issue_status(self):
+        """Testing review_detail view's entry cache keys change when an
+        issue's status changes
+        """
+        review_request = self.create_review_request(publish=True)
+        screenshot = self.create_screenshot(review_request)
+        review = self.create_review(review_request)
+        comment = self.create_screenshot_comment(review, screenshot,
+                                                 issue_opened=True)
+        review.publish()
+        old_cache_key = self._get_entry_cache_keys(review_request)[0]
+
+        # Change the status without touching any timestamps.
+        ScreenshotComment.objects.filter(pk=comment.pk).update(
+            issue_status=ScreenshotComment.RESOLVED)
+
+        self.assertNotEqual(self._get_entry_cache_keys(review_request)[0],
+                            old_cache_key)
+
+    def test_review_detail_entry_cache_keys_with_hooks(self):
+        """Testing review_detail view's entry cache keys change when a
+        CommentDetailDisplayHook is registered
+        """
+        class TestExtension(Extension):
+            registration = RegisteredExtension()
+
+        review_request = self.create_review_request(publish=True)
+        self.create_review(review_request, publish=True)
+        old_cache_key = self._get_entry_cache_keys(review_request)[0]
+
+        extension = TestExtension(extension_manager=ExtensionManager(''))
+
+        try:
+            CommentDetailDisplayHook(extension)
+
+            self.assertNotEqual(
+                self._get_entry_cache_keys(review_request)[0],
+                old_cache_key)
+        finally:
+            extension.shutdown()
+
+    def test_review_detail_entry_cache_keys_with_uncached_fields(self):
+        """Testing review_detail view doesn't cache change description boxes
+        with fields that can't be cached
+        """
+        review_request = self.create_review_request(publish=True)
+
+        for field_id, old_value, new_value in (('summary', 'a', 'b'),
+                                               ('bugs_closed', [], ['123'])):
+            changedesc = ChangeDescription.objects.create(public=True)
+            changedesc.record_field_change(field_id, old_value, new_value)
+            changedesc.save()
+            review_request.changedescs.add(changedesc)
+
+        cache_keys = self._get_entry_cache_keys(review_request)
+        self.assertEqual(len(cache_keys), 2)
+        self.assertTrue(cache_keys[0].startswith('changedesc-entry-'))
+        self.assertIsNone(cache_keys[1])
+
+    def _get_entry_cache_keys(self, review_request):
+        response = self.client.get('/r/%d/' % review_request.pk)
+        self.assertEqual(response.status_code, 200)
+
+        return [
+            entry.get('cache_key')
+            for entry in response.context['entries']
+        ]
+
     def test_review_detail_sitewide_login(self):
         """Testing review_detail view with site-wide login enabled"""
         self.siteconfig.set("auth_require_sitewide_login", True)
@@ -1651,6 +1788,96 @@ class FieldTests(TestCase):
         self.assertNotEqual(review_request.commit_id, None)
 
 
+class ChangeEntryFieldGroupsTests(SpyAgency, TestCase):
+    """Unit tests for rendering and caching change entry fields."""
+
+    fixtures = ['test_users']
+
+    def test_fields_version_with_registration(self):
+        """Testing get_review_request_fields_version changes when fields
+        are registered and unregistered
+        """
+        class TestField(BaseEditableField):
+            field_id = 'test_change_entry_field'
+
+        class TestFieldSet(BaseReviewRequestFieldSet):
+            fieldset_id = 'test_change_entry_fieldset'
+            field_classes = [TestField]
+
+        old_version = get_review_request_fields_version()
+
+        register_review_request_fieldset(TestFieldSet)
+
+        try:
+            self.assertNotEqual(get_review_request_fields_version(),
+                                old_version)
+        finally:
+            unregister_review_request_fieldset(TestFieldSet)
+
+        self.assertEqual(get_review_request_fields_version(), old_version)
+
+    def test_cached_fields(self):
+        """Testing get_change_entry_field_groups caches fields that allow it
+        """
+        review_request = self.create_review_request(publish=True)
+        draft = ReviewRequestDraft.create(review_request)
+        draft.summary = 'New summary'
+        draft.publish()
+
+        changedesc = review_request.changedescs.get()
+        get_change_entry_field_groups(changedesc, review_request)
+
+        render_sections = review_fields._render_change_entry_sections
+        self.spy_on(render_sections)
+
+        groups = get_change_entry_field_groups(changedesc, review_request)
+
+        self.assertFalse(render_sections.spy.called)
+        self.assertEqual(len(groups), 1)
+        self.assertEqual(len(groups[0]['fields']), 1)
+        self.assertEqual(groups[0]['fields'][0]['title'], 'Summary')
+
+    def test_uncached_fields_with_request(self):
+        """Testing get_change_entry_field_groups renders fields that don't
+        allow caching for each request
+        """
+        class TestField(BaseEditableField):
+            field_id = 'test_change_entry_field'
+            label = 'Test'
+
+            def render_change_entry_html(self, info):
+                return self.request.user.username
+
+        class TestFieldSet(BaseReviewRequestFieldSet):
+            fieldset_id = 'test_change_entry_fieldset'
+            field_classes = [TestField]
+
+        review_request = self.create_review_request(publish=True)
+        changedesc = ChangeDescription.objects.create(public=True)
+        changedesc.record_field_change('test_change_entry_field', 'a', 'b')
+        changedesc.save()
+        review_request.changedescs.add(changedesc)
+
+        changedesc = review_request.changedescs.get()
+        request_factory = RequestFactory()
+
+        register_review_request_fieldset(TestFieldSet)
+
+        try:
+            for username in ('doc', 'grumpy'):
+                request = request_factory.get('/')
+                request.user = User.objects.get(username=username)
+
+                groups = get_change_entry_field_groups(
+                    changedesc, review_request, request=request)
+
+                self.assertEqual(len(groups), 1)
+                self.assertEqual(groups[0]['fields'][0]['rendered_html'],
+                                 username)
+        finally:
+            unregister_review_request_fieldset(TestFieldSet)
+
+
 class PostCommitTests(SpyAgency, TestCase):
     fixtures = ['test_users', 'test_scmtools']
 
@@ -2006,6 +2233,36 @@ class IfNeatNumberTagTests(TestCase):
         self.assertEqual(t.render(Context({})), expected)
 
 
+class EntryBoxCacheTagTests(TestCase):
+    """Unit tests for the entry_box_cache template tag."""
+
+    def test_with_cache_key(self):
+        """Testing the entry_box_cache tag with a cache key"""
+        t = Template(
+            '{% load reviewtags %}'
+            '{% entry_box_cache entry %}{{text}}{% end_entry_box_cache %}')
+
+        entry = {
+            'cache_key': 'test-entry-box-cache',
+        }
+
+        self.assertEqual(t.render(Context({'entry': entry, 'text': 'one'})),
+                         'one')
+        self.assertEqual(t.render(Context({'entry': entry, 'text': 'two'})),
+                         'one')
+
+    def test_without_cache_key(self):
+        """Testing the entry_box_cache tag without a cache key"""
+        t = Template(
+            '{% load reviewtags %}'
+            '{% entry_box_cache entry %}{{text}}{% end_entry_box_cache %}')
+
+        self.assertEqual(t.render(Context({'entry': {}, 'text': 'one'})),
+                         'one')
+        self.assertEqual(t.render(Context({'entry': {}, 'text': 'two'})),
+                         'two')
+
+
 class ReviewRequestCounterTests(SpyAgency, TestCase):
     fixtures = ['test_scmtools']
 
@@ -7,13 +7,13 @@ from django.template.loader import render_to_string
 from django.utils.safestring import mark_safe
 from djblets.cache.backend import cache_memoize
 from pygments import highlight
-from pygments.lexers import (ClassNotFound, guess_lexer_for_filename,
-                             TextLexer)
+from pygments.lexers import ClassNotFound, TextLexer
 
 from reviewboard.attachments.models import FileAttachment
-from reviewboard.diffviewer.chunk_generator import (NoWrapperHtmlFormatter,
-                                                    RawDiffChunkGenerator)
+from reviewboard.diffviewer.chunk_generator import RawDiffChunkGenerator
 from reviewboard.diffviewer.diffutils import get_chunks_in_range
+from reviewboard.diffviewer.syntax_highlighting import (
+    get_html_formatter, guess_lexer_for_filename)
 from reviewboard.reviews.ui.base import FileAttachmentReviewUI
 
 
@@ -154,7 +154,7 @@ class TextBasedReviewUI(FileAttachmentReviewUI):
         data = self.get_text()
 
         lexer = self.get_source_lexer(self.obj.filename, data)
-        lines = highlight(data, lexer, NoWrapperHtmlFormatter()).splitlines()
+        lines = highlight(data, lexer, get_html_formatter()).splitlines()
 
         return [
             '<pre>%s</pre>' % line
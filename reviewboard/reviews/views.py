@@ -1,7 +1,9 @@
 from __future__ import unicode_literals
 
+import hashlib
 import logging
 import time
+from functools import partial
 
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
@@ -24,7 +26,7 @@ from django.utils.html import escape
 from django.utils.http import http_date
 from django.utils.safestring import mark_safe
 from django.utils.timezone import utc
-from django.utils.translation import ugettext_lazy as _
+from django.utils.translation import get_language, ugettext_lazy as _
 from djblets.siteconfig.models import SiteConfiguration
 from djblets.util.dates import get_latest_timestamp
 from djblets.util.decorators import augment_method_from
@@ -46,6 +48,8 @@ from reviewboard.diffviewer.diffutils import (convert_to_unicode,
 from reviewboard.diffviewer.models import DiffSet
 from reviewboard.diffviewer.views import (DiffFragmentView, DiffViewerView,
                                           exception_traceback_string)
+from reviewboard.extensions.hooks import (CommentDetailDisplayHook,
+                                          TemplateHook)
 from reviewboard.hostingsvcs.bugtracker import BugTracker
 from reviewboard.reviews.ui.screenshot import LegacyScreenshotReviewUI
 from reviewboard.reviews.context import (comment_counts,
@@ -53,7 +57,9 @@ from reviewboard.reviews.context import (comment_counts,
                                          has_comments_in_diffsets_excluding,
                                          interdiffs_with_comments,
                                          make_review_request_context)
-from reviewboard.reviews.fields import get_review_request_fieldsets
+from reviewboard.reviews.fields import (can_cache_change_entry,
+                                        get_change_entry_field_groups,
+                                        get_review_request_fields_version)
 from reviewboard.reviews.markdown_utils import is_rich_text_default_for_user
 from reviewboard.reviews.models import (BaseComment, Comment,
                                         FileAttachmentComment,
@@ -323,6 +329,39 @@ def _get_latest_file_attachments(file_attachments):
     ]
 
 
+def _get_user_display_key(user):
+    """Returns a string identifying how a user is shown in an entry box."""
+    return '%s:%s' % (user.pk, user.get_full_name() or user.username)
+
+
+def _make_entry_box_digest(parts):
+    """Returns a short digest of the given parts for an entry box key."""
+    return hashlib.sha1(
+        '\n'.join(parts).encode('utf-8')).hexdigest()
+
+
+def _get_entry_box_hooks_version():
+    """Returns a version identifying what extensions render into entry boxes.
+
+    This covers the template hooks and comment detail hooks in review boxes,
+    and the review request fields rendered in change description boxes.
+    """
+    parts = [get_review_request_fields_version()]
+
+    for hook in (TemplateHook.by_name('review-summary-header-pre') +
+                 TemplateHook.by_name('review-summary-header-post') +
+                 CommentDetailDisplayHook.hooks):
+        extension_cls = hook.extension.__class__
+        hook_cls = hook.__class__
+
+        parts.append('%s.%s:%s.%s' % (extension_cls.__module__,
+                                      extension_cls.__name__,
+                                      hook_cls.__module__,
+                                      hook_cls.__name__))
+
+    return _make_entry_box_digest(parts)
+
+
 @check_login_required
 @check_local_site_access
 def review_detail(request,
@@ -533,6 +572,9 @@ def review_detail(request,
                 'collapsed': state == 'collapsed',
                 'issue_open_count': 0,
                 'has_issues': False,
+                'last_updated': review.timestamp,
+                'has_draft_reply': False,
+                'cache_key_parts': [_get_user_display_key(review.user)],
             }
             reviews_entry_map[review.pk] = entry
             entries.append(entry)
@@ -543,6 +585,21 @@ def review_detail(request,
         for reply_id, replies in six.iteritems(reply_list):
             setattr(reviews_id_map[reply_id], key, replies)
 
+    # Track the latest reply to each review, including the user's own draft
+    # replies, so that the review's cached box is re-rendered when a reply
+    # changes.
+    for review in six.itervalues(reviews_id_map):
+        reply_entry = reviews_entry_map.get(review.base_reply_to_id)
+
+        if reply_entry:
+            reply_entry['last_updated'] = max(reply_entry['last_updated'],
+                                              review.timestamp)
+            reply_entry['cache_key_parts'].append(
+                _get_user_display_key(review.user))
+
+            if not review.public:
+                reply_entry['has_draft_reply'] = True
+
     # Get all the file attachments and screenshots and build a couple maps,
     # so we can easily associate those objects in comments.
     #
@@ -648,6 +705,21 @@ def review_detail(request,
 
             uncollapse = False
 
+            # Anything shown in a review's box may invalidate its cached
+            # rendering. Comments (and their issue statuses) can change
+            # without the review's timestamp being updated.
+            if parent_review.is_reply():
+                box_entry = reviews_entry_map.get(
+                    parent_review.base_reply_to_id)
+            else:
+                box_entry = reviews_entry_map.get(obj.review_id)
+
+            if box_entry:
+                box_entry['last_updated'] = max(box_entry['last_updated'],
+                                                comment.timestamp)
+                box_entry['cache_key_parts'].append(
+                    '%s:%s' % (comment.pk, comment.issue_status))
+
             if parent_review.is_reply():
                 # This is a reply to a comment. Add it to the list of replies.
                 assert obj.review_id not in reviews_entry_map
@@ -689,43 +761,11 @@ def review_detail(request,
     # Sort all the reviews and ChangeDescriptions into a single list, for
     # display.
     for changedesc in changedescs:
-        # Process the list of fields, in order by fieldset. These will be
-        # put into groups composed of inline vs. full-width field values,
-        # for render into the box.
-        fields_changed_groups = []
-        cur_field_changed_group = None
-
-        fieldsets = get_review_request_fieldsets(
-            include_main=True,
-            include_change_entries_only=True)
-
-        for fieldset in fieldsets:
-            for field_cls in fieldset.field_classes:
-                field_id = field_cls.field_id
-
-                if field_id not in changedesc.fields_changed:
-                    continue
-
-                inline = field_cls.change_entry_renders_inline
-
-                if (not cur_field_changed_group or
-                    cur_field_changed_group['inline'] != inline):
-                    # Begin a new group of fields.
-                    cur_field_changed_group = {
-                        'inline': inline,
-                        'fields': [],
-                    }
-                    fields_changed_groups.append(cur_field_changed_group)
-
-                if hasattr(field_cls, 'locals_vars'):
-                    field = field_cls(review_request, request=request,
-                                      locals_vars=locals())
-                else:
-                    field = field_cls(review_request, request=request)
-
-                cur_field_changed_group['fields'] += \
-                    field.get_change_entry_sections_html(
-                        changedesc.fields_changed[field_id])
+        # The fields are only rendered if the box isn't already in the cache.
+        fields_changed_groups = partial(get_change_entry_field_groups,
+                                        changedesc, review_request,
+                                        request=request,
+                                        locals_vars=locals())
 
         # See if the review request has had a status change.
         status_change = changedesc.fields_changed.get('status')
@@ -755,13 +795,78 @@ def review_detail(request,
 
     entries.sort(key=lambda item: item['timestamp'])
 
+    siteconfig = SiteConfiguration.objects.get_current()
+
+    # Each entry box is cached separately, so that a new review or reply
+    # only requires re-rendering the boxes that changed. The keys contain
+    # everything the boxes depend on that differs between viewers.
+    if request.user.is_authenticated():
+        can_edit_review_request = review_request.is_mutable_by(request.user)
+    else:
+        can_edit_review_request = False
+
+    #
+    # Captions are shown in both kinds of boxes and can be changed without
+    # touching any entry, so they're part of every key, along with the
+    # extension hooks and fields that render into the boxes.
+    captions_key = _make_entry_box_digest(
+        '%s:%s:%s:%s' % (obj.__class__.__name__, obj.pk, obj.caption,
+                         obj.draft_caption)
+        for obj in (file_attachments + inactive_file_attachments +
+                    screenshots + inactive_screenshots))
+
+    viewer_key = '%s:%s:%s:%s:%s:%s:%s:%s:%s' % (
+        request.user.is_authenticated(),
+        is_rich_text_default_for_user(request.user),
+        draft_timestamp and draft_timestamp.isoformat(),
+        siteconfig.get('integration_gravatars'),
+        timezone.get_current_timezone_name(),
+        get_language(),
+        captions_key,
+        _get_entry_box_hooks_version(),
+        settings.AJAX_SERIAL)
+
+    for i, entry in enumerate(entries):
+        is_last = (i == len(entries) - 1)
+
+        if 'review' in entry:
+            review = entry['review']
+
+            if entry['has_draft_reply']:
+                # Draft replies are only shown to their owner.
+                reply_owner_id = request.user.pk
+            else:
+                reply_owner_id = None
+
+            entry['cache_key'] = 'review-entry-%s-%s-%s-%s-%s-%s-%s-%s' % (
+                review.pk,
+                entry['last_updated'].isoformat(),
+                _make_entry_box_digest(entry['cache_key_parts']),
+                entry['collapsed'],
+                is_last,
+                (can_edit_review_request or
+                 review.user_id == request.user.pk),
+                reply_owner_id,
+                viewer_key)
+        elif can_cache_change_entry(entry['changedesc']):
+            # Boxes with fields that can't be cached (such as those showing
+            # the current state of other objects) are rendered each time,
+            # instead.
+            changedesc = entry['changedesc']
+
+            entry['cache_key'] = 'changedesc-entry-%s-%s-%s-%s-%s-%s' % (
+                changedesc.pk,
+                changedesc.timestamp.isoformat(),
+                entry['collapsed'],
+                is_last,
+                review_request.submitter_id,
+                viewer_key)
+
     close_description, close_description_rich_text = \
         review_request.get_close_description()
 
     latest_file_attachments = _get_latest_file_attachments(file_attachments)
 
-    siteconfig = SiteConfiguration.objects.get_current()
-
     context_data = make_review_request_context(request, review_request, {
         'blocks': blocks,
         'draft': draft,
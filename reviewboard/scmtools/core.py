@@ -127,6 +127,7 @@ PRE_CREATION = Revision("PRE-CREATION")
 
 class SCMTool(object):
     name = None
+    supports_batched_files = False
     supports_pending_changesets = False
     supports_post_commit = False
     supports_raw_file_urls = False
@@ -169,6 +170,60 @@ class SCMTool(object):
         except FileNotFoundError:
             return False
 
+    def get_files(self, paths_and_revisions, base_commit_id=None, **kwargs):
+        """Return the contents of several files.
+
+        ``paths_and_revisions`` is a list of ``(path, revision)`` tuples.
+        This returns a list of file contents in the same order, with
+        ``None`` for any files that don't exist.
+
+        By default, this calls get_file for each file. Subclasses can
+        override this to fetch all the files in one operation, and set
+        ``supports_batched_files`` to True.
+        """
+        if inspect.getargspec(self.get_file).keywords is None:
+            warnings.warn('SCMTool.get_file() must take keyword '
+                          'arguments, signature for %s is deprecated.'
+                          % self.name, DeprecationWarning)
+            get_file_kwargs = {}
+        else:
+            get_file_kwargs = {'base_commit_id': base_commit_id}
+
+        result = []
+
+        for path, revision in paths_and_revisions:
+            try:
+                result.append(self.get_file(path, revision,
+                                            **get_file_kwargs))
+            except FileNotFoundError:
+                result.append(None)
+
+        return result
+
+    def get_files_exist(self, paths_and_revisions, base_commit_id=None,
+                        **kwargs):
+        """Return whether several files exist.
+
+        ``paths_and_revisions`` is a list of ``(path, revision)`` tuples.
+        This returns a list of booleans in the same order.
+
+        By default, this calls file_exists for each file. Subclasses can
+        override this to check all the files in one operation, and set
+        ``supports_batched_files`` to True.
+        """
+        if inspect.getargspec(self.file_exists).keywords is None:
+            warnings.warn('SCMTool.file_exists() must take keyword '
+                          'arguments, signature for %s is deprecated.'
+                          % self.name, DeprecationWarning)
+            file_exists_kwargs = {}
+        else:
+            file_exists_kwargs = {'base_commit_id': base_commit_id}
+
+        return [
+            self.file_exists(path, revision, **file_exists_kwargs)
+            for path, revision in paths_and_revisions
+        ]
+
     def parse_diff_revision(self, file_str, revision_str, moved=False,
                             copied=False, **kwargs):
         raise NotImplementedError
@@ -232,12 +287,18 @@ class SCMTool(object):
         return patch
 
     @classmethod
-    def popen(cls, command, local_site_name=None):
+    def popen(cls, command, local_site_name=None, stdin=None,
+              stderr=subprocess.PIPE):
         """Launches an application, capturing output.
 
         This wraps subprocess.Popen to provide some common parameters and
         to pass environment variables that may be needed by rbssh, if
         indirectly invoked.
+
+        If ``stdin`` is ``subprocess.PIPE``, data can be written to the
+        application's standard input. Long-running applications whose error
+        output won't be read should pass a file for ``stderr``, so that
+        they don't block once the pipe fills up.
         """
         env = os.environ.copy()
 
@@ -248,7 +309,8 @@ class SCMTool(object):
 
         return subprocess.Popen(command,
                                 env=env,
-                                stderr=subprocess.PIPE,
+                                stdin=stdin,
+                                stderr=stderr,
                                 stdout=subprocess.PIPE,
                                 close_fds=(os.name != 'nt'))
 
@@ -328,6 +390,27 @@ class SCMClient(object):
         self.username = username
         self.password = password
 
+    def get_files(self, paths_and_revisions):
+        """Return the contents of several files.
+
+        ``paths_and_revisions`` is a list of ``(path, revision)`` tuples.
+        This returns a list of file contents in the same order, with
+        ``None`` for any files that don't exist.
+
+        By default, this calls the client's get_file for each file.
+        Subclasses can override this to fetch all the files in one
+        operation.
+        """
+        result = []
+
+        for path, revision in paths_and_revisions:
+            try:
+                result.append(self.get_file(path, revision))
+            except FileNotFoundError:
+                result.append(None)
+
+        return result
+
     def get_file_http(self, url, path, revision):
         logging.info('Fetching file from %s' % url)
 
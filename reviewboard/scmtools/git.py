@@ -4,8 +4,12 @@ import logging
 import os
 import re
 import platform
+import subprocess
+import threading
+import time
 
 from django.utils import six
+from django.utils.six.moves import range
 from django.utils.six.moves.urllib.parse import (quote as urlquote,
                                                  urlsplit as urlsplit,
                                                  urlunsplit as urlunsplit)
@@ -60,6 +64,7 @@ class GitTool(SCMTool):
     you do not have a bare repositry).
     """
     name = "Git"
+    supports_batched_files = True
     supports_raw_file_urls = True
     field_help_text = {
         'path': _('For local Git repositories, this should be the path to a '
@@ -100,6 +105,32 @@ class GitTool(SCMTool):
         except (FileNotFoundError, InvalidRevisionFormatError):
             return False
 
+    def get_files(self, paths_and_revisions, **kwargs):
+        to_fetch = [
+            (path, revision)
+            for path, revision in paths_and_revisions
+            if revision != PRE_CREATION
+        ]
+        fetched = iter(self.client.get_files(to_fetch))
+
+        return [
+            ("" if revision == PRE_CREATION else next(fetched))
+            for path, revision in paths_and_revisions
+        ]
+
+    def get_files_exist(self, paths_and_revisions, **kwargs):
+        to_check = [
+            (path, revision)
+            for path, revision in paths_and_revisions
+            if revision != PRE_CREATION
+        ]
+        checked = iter(self.client.get_files_exist(to_check))
+
+        return [
+            (revision != PRE_CREATION and next(checked))
+            for path, revision in paths_and_revisions
+        ]
+
     def parse_diff_revision(self, file_str, revision_str, moved=False,
                             copied=False, *args, **kwargs):
         revision = revision_str
@@ -216,14 +247,17 @@ class GitDiffParser(DiffParser):
 
         return headers, linenum
 
-    def parse(self):
+    def iter_files(self):
         """
-        Parses the diff, returning a list of File objects representing each
-        file in the diff.
+        Parses the diff, yielding a File object for each file in the diff as
+        soon as it's been fully parsed.
         """
-        self.files = []
         i = 0
-        preamble = b''
+        found_file = False
+
+        # The lines since the last diff that weren't part of a diff, which
+        # become part of the next file's diff.
+        preamble_start = 0
 
         while i < len(self.lines):
             next_i, file_info, new_diff = self._parse_diff(i)
@@ -231,26 +265,26 @@ class GitDiffParser(DiffParser):
             if file_info:
                 self._ensure_file_has_required_fields(file_info)
 
-                if preamble:
-                    file_info.data = preamble + file_info.data
-                    preamble = b''
+                if preamble_start < i:
+                    file_info.prepend_data_lines(self.lines, preamble_start,
+                                                 i)
 
-                self.files.append(file_info)
-            elif new_diff:
-                # We found a diff, but it was empty and has no file entry.
-                # Reset the preamble.
-                preamble = b''
-            else:
-                preamble += self.lines[i] + b'\n'
+                found_file = True
+                yield file_info
+
+            if new_diff:
+                # Reset the preamble, whether or not the diff had a file
+                # entry.
+                preamble_start = next_i
 
             i = next_i
 
-        if not self.files and preamble.strip() != b'':
+        if not found_file and any(
+                self.lines[j].strip()
+                for j in range(preamble_start, len(self.lines))):
             # This is probably not an actual git diff file.
             raise DiffParserError('This does not appear to be a git diff', 0)
 
-        return self.files
-
     def _parse_diff(self, linenum):
         """Parses out one file from a Git diff
 
@@ -275,7 +309,7 @@ class GitDiffParser(DiffParser):
         diff_git_line = self.lines[linenum]
 
         file_info = File()
-        file_info.data = diff_git_line + b'\n'
+        file_info.append_data_lines(self.lines, linenum, linenum + 1)
         file_info.binary = False
 
         linenum += 1
@@ -292,14 +326,14 @@ class GitDiffParser(DiffParser):
         headers, linenum = self._parse_extended_headers(linenum)
 
         if self._is_new_file(headers):
-            file_info.data += headers[b'new file mode'][1]
+            file_info.append_data(headers[b'new file mode'][1])
             file_info.origInfo = PRE_CREATION
         elif self._is_deleted_file(headers):
-            file_info.data += headers[b'deleted file mode'][1]
+            file_info.append_data(headers[b'deleted file mode'][1])
             file_info.deleted = True
         elif self._is_mode_change(headers):
-            file_info.data += headers[b'old mode'][1]
-            file_info.data += headers[b'new mode'][1]
+            file_info.append_data(headers[b'old mode'][1])
+            file_info.append_data(headers[b'new mode'][1])
 
         if self._is_moved_file(headers):
             file_info.origFile = headers[b'rename from'][0]
@@ -307,20 +341,20 @@ class GitDiffParser(DiffParser):
             file_info.moved = True
 
             if b'similarity index' in headers:
-                file_info.data += headers[b'similarity index'][1]
+                file_info.append_data(headers[b'similarity index'][1])
 
-            file_info.data += headers[b'rename from'][1]
-            file_info.data += headers[b'rename to'][1]
+            file_info.append_data(headers[b'rename from'][1])
+            file_info.append_data(headers[b'rename to'][1])
         elif self._is_copied_file(headers):
             file_info.origFile = headers[b'copy from'][0]
             file_info.newFile = headers[b'copy to'][0]
             file_info.copied = True
 
             if b'similarity index' in headers:
-                file_info.data += headers[b'similarity index'][1]
+                file_info.append_data(headers[b'similarity index'][1])
 
-            file_info.data += headers[b'copy from'][1]
-            file_info.data += headers[b'copy to'][1]
+            file_info.append_data(headers[b'copy from'][1])
+            file_info.append_data(headers[b'copy to'][1])
 
         # Assume by default that the change is empty. If we find content
         # later, we'll clear this.
@@ -335,7 +369,7 @@ class GitDiffParser(DiffParser):
             if self.pre_creation_regexp.match(file_info.origInfo):
                 file_info.origInfo = PRE_CREATION
 
-            file_info.data += headers[b'index'][1]
+            file_info.append_data(headers[b'index'][1])
 
         # Get the changes
         while linenum < len(self.lines):
@@ -343,7 +377,7 @@ class GitDiffParser(DiffParser):
                 break
             elif self._is_binary_patch(linenum):
                 file_info.binary = True
-                file_info.data += self.lines[linenum] + b"\n"
+                file_info.append_data_lines(self.lines, linenum, linenum + 1)
                 empty_change = False
                 linenum += 1
                 break
@@ -384,8 +418,7 @@ class GitDiffParser(DiffParser):
                 else:
                     file_info.newFile = new_filename
 
-                file_info.data += orig_line + b'\n'
-                file_info.data += new_line + b'\n'
+                file_info.append_data_lines(self.lines, linenum, linenum + 2)
                 linenum += 2
             else:
                 empty_change = False
@@ -492,6 +525,213 @@ class GitDiffParser(DiffParser):
                 setattr(file_info, attr, b'')
 
 
+class GitCatFileWorker(object):
+    """A long-lived git-cat-file(1) process running in batch mode.
+
+    The process reads object names from its standard input and writes
+    their information (and contents, for "--batch") to its standard output,
+    so a single process can be used for any number of lookups without
+    paying the cost of starting git and opening the repository each time.
+    """
+
+    def __init__(self, client, option):
+        self.option = option
+
+        # Nothing reads the error output of the process, so it's discarded
+        # rather than being left to fill up a pipe and block the process.
+        with open(os.devnull, 'wb') as devnull:
+            self.process = client._run_git(
+                ['--git-dir=%s' % client.git_dir, 'cat-file', option],
+                stdin=subprocess.PIPE,
+                stderr=devnull)
+
+        self.last_used = time.time()
+
+    def is_alive(self):
+        """Returns whether the process is still running."""
+        return self.process.poll() is None
+
+    def lookup(self, obj):
+        """Looks up an object.
+
+        This returns a tuple of (type, contents). The type is None if the
+        object doesn't exist or is ambiguous. The contents are None when
+        using "--batch-check".
+
+        IOError or ValueError will be raised if the process can no longer
+        be communicated with.
+        """
+        obj = obj.encode('utf-8')
+
+        if b'\n' in obj:
+            # This would break the line-based protocol, and can't be a
+            # valid object name anyway.
+            return None, None
+
+        self.last_used = time.time()
+        self.process.stdin.write(obj + b'\n')
+        self.process.stdin.flush()
+
+        header = self.process.stdout.readline()
+
+        if not header.endswith(b'\n'):
+            raise IOError('Unexpected end of output from git cat-file')
+
+        info = header[:-1].rsplit(b' ', 2)
+
+        if info[-1] in (b'missing', b'ambiguous'):
+            return None, None
+        elif len(info) != 3:
+            raise ValueError('Unexpected output from git cat-file: %r'
+                             % header)
+
+        obj_type = info[1].decode('utf-8')
+        contents = None
+
+        if self.option == '--batch':
+            size = int(info[2])
+            data = self.process.stdout.read(size + 1)
+
+            if len(data) != size + 1:
+                raise IOError('Unexpected end of output from git cat-file')
+
+            if obj_type == 'blob':
+                contents = data[:-1]
+
+        return obj_type, contents
+
+    def close(self):
+        """Shuts down the process."""
+        try:
+            self.process.stdin.close()
+            self.process.wait()
+        except (IOError, OSError):
+            pass
+
+
+class GitCatFileWorkerPool(object):
+    """A pool of long-lived git-cat-file(1) processes.
+
+    Idle workers are kept for each repository and mode, up to
+    :py:attr:`MAX_IDLE_WORKERS`, and reused for later lookups. Workers that
+    have been idle for longer than :py:attr:`IDLE_TIMEOUT` seconds, or whose
+    processes have exited, are shut down instead of being reused.
+
+    Each time a worker is acquired, the idle workers for every repository
+    are checked for expiration, so that workers for repositories that are
+    no longer being accessed don't stay around.
+    """
+
+    #: The maximum number of idle workers kept per repository and mode.
+    MAX_IDLE_WORKERS = 4
+
+    #: The number of seconds a worker can be idle before it's shut down.
+    IDLE_TIMEOUT = 5 * 60
+
+    def __init__(self):
+        self._idle_workers = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, client, option, obj):
+        """Looks up an object using a worker from the pool.
+
+        See :py:meth:`GitCatFileWorker.lookup` for the return value. If the
+        worker fails, it's discarded and the lookup is retried once with a
+        new worker before raising SCMError.
+        """
+        for attempt in range(2):
+            worker = self._acquire(client, option)
+
+            try:
+                result = worker.lookup(obj)
+            except (IOError, OSError, ValueError) as e:
+                logging.warning('git cat-file %s worker for %s failed: %s',
+                                option, client.git_dir, e)
+                worker.close()
+                continue
+
+            self._release(client, worker)
+
+            return result
+
+        raise SCMError(_('Unable to communicate with git cat-file for '
+                         'local Git repository %s') % client.git_dir)
+
+    def close_all(self):
+        """Shuts down all idle workers."""
+        with self._lock:
+            workers = [
+                worker
+                for idle_workers in six.itervalues(self._idle_workers)
+                for worker in idle_workers
+            ]
+            self._idle_workers = {}
+
+        for worker in workers:
+            worker.close()
+
+    def _get_key(self, client, option):
+        return client.git_dir, option, client.local_site_name
+
+    def _acquire(self, client, option):
+        key = self._get_key(client, option)
+        expired = []
+        worker = None
+
+        with self._lock:
+            now = time.time()
+
+            for idle_key, idle_workers in list(
+                    six.iteritems(self._idle_workers)):
+                active_workers = []
+
+                for candidate in idle_workers:
+                    if now - candidate.last_used > self.IDLE_TIMEOUT:
+                        expired.append(candidate)
+                    else:
+                        active_workers.append(candidate)
+
+                if active_workers:
+                    self._idle_workers[idle_key] = active_workers
+                else:
+                    del self._idle_workers[idle_key]
+
+            idle_workers = self._idle_workers.get(key, [])
+
+            while idle_workers:
+                candidate = idle_workers.pop()
+
+                if candidate.is_alive():
+                    worker = candidate
+                    break
+                else:
+                    expired.append(candidate)
+
+        for expired_worker in expired:
+            expired_worker.close()
+
+        if worker is None:
+            worker = GitCatFileWorker(client, option)
+
+        return worker
+
+    def _release(self, client, worker):
+        key = self._get_key(client, worker.option)
+
+        with self._lock:
+            idle_workers = self._idle_workers.setdefault(key, [])
+
+            if len(idle_workers) < self.MAX_IDLE_WORKERS:
+                idle_workers.append(worker)
+                worker = None
+
+        if worker is not None:
+            worker.close()
+
+
+_cat_file_worker_pool = GitCatFileWorkerPool()
+
+
 class GitClient(SCMClient):
     FULL_SHA1_LENGTH = 40
 
@@ -595,15 +835,55 @@ class GitClient(SCMClient):
             contents = self._cat_file(path, revision, "-t")
             return contents and contents.strip() == "blob"
 
+    def get_files(self, paths_and_revisions):
+        """Return the contents of several files.
+
+        For local repositories, this runs a single ``git cat-file --batch``
+        for all the files. Files that don't exist are returned as ``None``.
+        """
+        if self.raw_file_url:
+            return super(GitClient, self).get_files(paths_and_revisions)
+
+        return [
+            contents
+            for obj_type, contents in self._cat_file_batch(
+                paths_and_revisions, '--batch')
+        ]
+
+    def get_files_exist(self, paths_and_revisions):
+        """Return whether several files exist.
+
+        For local repositories, this runs a single
+        ``git cat-file --batch-check`` for all the files.
+        """
+        if self.raw_file_url:
+            result = []
+
+            for path, revision in paths_and_revisions:
+                try:
+                    result.append(self.get_file_exists(path, revision))
+                except (FileNotFoundError, InvalidRevisionFormatError):
+                    result.append(False)
+
+            return result
+
+        return [
+            obj_type == 'blob'
+            for obj_type, contents in self._cat_file_batch(
+                paths_and_revisions, '--batch-check')
+        ]
+
     def validate_sha1_format(self, path, sha1):
         """Validates that a SHA1 is of the right length for this repository."""
         if self.raw_file_url and len(sha1) != self.FULL_SHA1_LENGTH:
             raise ShortSHA1Error(path, sha1)
 
-    def _run_git(self, args):
+    def _run_git(self, args, stdin=None, stderr=subprocess.PIPE):
         """Runs a git command, returning a subprocess.Popen."""
         return SCMTool.popen(['git'] + args,
-                             local_site_name=self.local_site_name)
+                             local_site_name=self.local_site_name,
+                             stdin=stdin,
+                             stderr=stderr)
 
     def _build_raw_url(self, path, revision):
         url = self.raw_file_url
@@ -613,30 +893,55 @@ class GitClient(SCMClient):
 
     def _cat_file(self, path, revision, option):
         """
-        Call git-cat-file(1) to get content or type information for a
+        Use git-cat-file(1) to get content or type information for a
         repository object.
 
-        If called with just "commit", gets the content of a blob (or
+        If called with just "blob", gets the content of a blob (or
         raises an exception if the commit is not a blob).
 
-        Otherwise, "option" can be used to pass a switch to git-cat-file,
-        e.g. to test or existence or get the type of "commit".
+        Otherwise, "option" can be "-t" to get the type of the object,
+        e.g. to test for existence.
+
+        Lookups go through a pool of long-lived git-cat-file processes.
         """
         commit = self._resolve_head(revision, path)
 
-        p = self._run_git(['--git-dir=%s' % self.git_dir, 'cat-file',
-                           option, commit])
-        contents = p.stdout.read()
-        errmsg = six.text_type(p.stderr.read())
-        failure = p.wait()
+        if option == "blob":
+            obj_type, contents = _cat_file_worker_pool.lookup(
+                self, '--batch', commit)
+        else:
+            assert option == "-t"
+            obj_type, contents = _cat_file_worker_pool.lookup(
+                self, '--batch-check', commit)
 
-        if failure:
-            if errmsg.startswith("fatal: Not a valid object name"):
-                raise FileNotFoundError(commit)
-            else:
-                raise SCMError(errmsg)
+        if obj_type is None:
+            raise FileNotFoundError(commit)
+
+        if option == "blob":
+            if obj_type != "blob":
+                raise SCMError('%s is a %s, not a blob' % (commit, obj_type))
+
+            return contents
+        else:
+            return obj_type
+
+    def _cat_file_batch(self, paths_and_revisions, option):
+        """
+        Use git-cat-file(1) to get information on several repository
+        objects at once.
 
-        return contents
+        "option" is either "--batch" or "--batch-check". This returns a
+        list of (type, contents) tuples in the same order as the files.
+        The type is None for objects that don't exist, and the contents are
+        None for anything but blobs, or when using "--batch-check".
+
+        Lookups go through a pool of long-lived git-cat-file processes.
+        """
+        return [
+            _cat_file_worker_pool.lookup(
+                self, option, self._resolve_head(revision, path))
+            for path, revision in paths_and_revisions
+        ]
 
     def _resolve_head(self, revision, path):
         if revision == HEAD:
@@ -1,6 +1,9 @@
 from __future__ import unicode_literals
 
 import logging
+import os
+import shutil
+import tempfile
 
 from django.utils import six
 from django.utils.six.moves.urllib.parse import quote as urllib_quote
@@ -14,6 +17,7 @@ from reviewboard.scmtools.core import \
 
 class HgTool(SCMTool):
     name = "Mercurial"
+    supports_batched_files = True
     dependencies = {
         'modules': ['mercurial'],
     }
@@ -44,6 +48,33 @@ class HgTool(SCMTool):
             six.text_type(revision),
             base_commit_id=base_commit_id)
 
+    def get_files(self, paths_and_revisions, base_commit_id=None, **kwargs):
+        if not isinstance(self.client, HgClient):
+            return super(HgTool, self).get_files(
+                paths_and_revisions, base_commit_id=base_commit_id, **kwargs)
+
+        if base_commit_id is not None:
+            base_commit_id = six.text_type(base_commit_id)
+
+        # Files at the same revision can be fetched with a single hg cat.
+        paths_by_revision = {}
+
+        for i, (path, revision) in enumerate(paths_and_revisions):
+            paths_by_revision.setdefault(revision, []).append((i, path))
+
+        result = [None] * len(paths_and_revisions)
+
+        for revision, indexed_paths in six.iteritems(paths_by_revision):
+            contents = self.client.cat_files(
+                [path for i, path in indexed_paths],
+                six.text_type(revision),
+                base_commit_id=base_commit_id)
+
+            for (i, path), data in zip(indexed_paths, contents):
+                result[i] = data
+
+        return result
+
     def parse_diff_revision(self, file_str, revision_str, *args, **kwargs):
         revision = revision_str
         if file_str == "/dev/null":
@@ -165,8 +196,8 @@ class HgDiffParser(DiffParser):
 class HgGitDiffParser(GitDiffParser):
     """Parser for git diffs which understands mercurial headers."""
 
-    def parse(self):
-        """Parse the diff returning a list of File objects.
+    def iter_files(self):
+        """Parse the diff, yielding File objects.
 
         This will first parse special mercurial headers if they exist
         and then use the GitDiffParser functionality to parse the
@@ -186,7 +217,8 @@ class HgGitDiffParser(GitDiffParser):
             elif line.startswith(b"# Parent") and len(split_line) == 3:
                 self.base_commit_id = split_line[2]
 
-        return super(HgGitDiffParser, self).parse()
+        for file_info in super(HgGitDiffParser, self).iter_files():
+            yield file_info
 
     def get_orig_commit_id(self):
         """Return base commit, either parsed from the header or None."""
@@ -262,6 +294,53 @@ class HgClient(SCMClient):
 
         raise FileNotFoundError(path, rev)
 
+    def cat_files(self, paths, rev='tip', base_commit_id=None):
+        """Return the contents of several files at a revision.
+
+        This runs a single ``hg cat``, writing the files to a temporary
+        directory. Files that don't exist are returned as ``None``.
+        """
+        if rev != PRE_CREATION and base_commit_id is not None:
+            rev = base_commit_id
+
+        if rev == HEAD:
+            rev = "tip"
+        elif rev == PRE_CREATION:
+            return [None] * len(paths)
+
+        paths_to_fetch = [path for path in paths if path]
+
+        if not paths_to_fetch:
+            return [None] * len(paths)
+
+        tempdir = tempfile.mkdtemp(prefix='reviewboard-hg.')
+
+        try:
+            # hg cat will skip any files that don't exist in this revision
+            # (and exit with a failure), so we just look at which files were
+            # written.
+            p = self._run_hg(['cat', '--rev', rev,
+                              '--output', os.path.join(tempdir, '%p')] +
+                             paths_to_fetch)
+            p.communicate()
+
+            result = []
+
+            for path in paths:
+                filename = os.path.normpath(os.path.join(tempdir, path))
+
+                if (path and
+                    filename.startswith(tempdir + os.sep) and
+                    os.path.isfile(filename)):
+                    with open(filename, 'rb') as fp:
+                        result.append(fp.read())
+                else:
+                    result.append(None)
+
+            return result
+        finally:
+            shutil.rmtree(tempdir)
+
     def _calculate_default_args(self):
         self.default_args = [
             '--noninteractive',
@@ -25,6 +25,7 @@ from reviewboard.hostingsvcs.models import HostingServiceAccount
 from reviewboard.hostingsvcs.service import get_hosting_service
 from reviewboard.scmtools.crypto_utils import (decrypt_password,
                                                encrypt_password)
+from reviewboard.scmtools.errors import FileNotFoundError
 from reviewboard.scmtools.managers import RepositoryManager, ToolManager
 from reviewboard.scmtools.signals import (checked_file_exists,
                                           checking_file_exists,
@@ -382,6 +383,112 @@ class Repository(models.Model):
 
         return exists
 
+    def get_files(self, paths_and_revisions, base_commit_id=None,
+                  request=None):
+        """Returns several files from the repository.
+
+        ``paths_and_revisions`` is a list of ``(path, revision)`` tuples.
+        This returns a list of file contents in the same order, with
+        ``None`` for any files that don't exist.
+
+        If the repository (or its hosting service) can fetch several files
+        at once, the files that aren't already in the cache are fetched in
+        one batch, and then cached just like files fetched through get_file.
+        Otherwise, this calls get_file for each file.
+        """
+        if not self._supports_batched_files():
+            return [
+                self._get_file_or_none(path, revision, base_commit_id,
+                                       request)
+                for path, revision in paths_and_revisions
+            ]
+
+        cached, fetched = self._fetch_uncached_files(paths_and_revisions,
+                                                     base_commit_id, request)
+        result = [None] * len(paths_and_revisions)
+
+        for i in cached:
+            path, revision = paths_and_revisions[i]
+            result[i] = self.get_file(path, revision, base_commit_id, request)
+
+        for i, data in six.iteritems(fetched):
+            result[i] = data
+
+        return result
+
+    def prefetch_files(self, paths_and_revisions, base_commit_id=None,
+                       request=None):
+        """Fetches several files from the repository into the cache.
+
+        ``paths_and_revisions`` is a list of ``(path, revision)`` tuples.
+        Any of the files that aren't already in the cache are fetched in one
+        batch and cached, so that later calls to get_file won't need to go
+        to the repository. Files that are already cached aren't loaded.
+
+        This does nothing if the repository (or its hosting service) can't
+        fetch several files at once, since there's nothing to gain from
+        fetching them early.
+        """
+        if self._supports_batched_files():
+            self._fetch_uncached_files(paths_and_revisions, base_commit_id,
+                                       request)
+
+    def get_files_exist(self, paths_and_revisions, base_commit_id=None,
+                        request=None):
+        """Returns whether several files exist in the repository.
+
+        ``paths_and_revisions`` is a list of ``(path, revision)`` tuples.
+        This returns a list of booleans in the same order.
+
+        If the repository (or its hosting service) can check several files
+        at once, the files that aren't already known to exist are checked in
+        one batch, and the results are cached just like with
+        get_file_exists. Otherwise, this calls get_file_exists for each file.
+        """
+        if not self._supports_batched_files():
+            return [
+                self.get_file_exists(path, revision, base_commit_id, request)
+                for path, revision in paths_and_revisions
+            ]
+
+        exists_keys = []
+        file_keys = []
+
+        for path, revision in paths_and_revisions:
+            exists_keys.append(make_cache_key(
+                self._make_file_exists_cache_key(path, revision,
+                                                 base_commit_id)))
+            file_keys.append(make_cache_key(
+                self._make_file_cache_key(path, revision, base_commit_id)))
+
+        cached = cache.get_many(exists_keys + file_keys)
+        result = [False] * len(paths_and_revisions)
+        unchecked = []
+
+        for i, (exists_key, file_key) in enumerate(zip(exists_keys,
+                                                       file_keys)):
+            if cached.get(exists_key) == '1' or file_key in cached:
+                result[i] = True
+            else:
+                unchecked.append(i)
+
+        if unchecked:
+            checked = self._get_files_exist_uncached(
+                [paths_and_revisions[i] for i in unchecked],
+                base_commit_id, request)
+
+            for i, exists in zip(unchecked, checked):
+                result[i] = exists
+
+                if exists:
+                    path, revision = paths_and_revisions[i]
+                    cache_memoize(
+                        self._make_file_exists_cache_key(path, revision,
+                                                         base_commit_id),
+                        lambda: '1')
+
+        return result
+
     def get_branches(self):
         """Returns a list of branches."""
         hosting_service = self.hosting_service
@@ -611,6 +718,160 @@ class Repository(models.Model):
 
         return exists
 
+    def _get_file_or_none(self, path, revision, base_commit_id, request):
+        """Internal function for fetching a file that may not exist.
+
+        This works like get_file, but returns None if the file doesn't
+        exist, as get_files does.
+        """
+        try:
+            return self.get_file(path, revision, base_commit_id, request)
+        except FileNotFoundError:
+            return None
+
+    def _supports_batched_files(self):
+        """Internal function for checking for batched file operations.
+
+        This returns whether the hosting service or SCMTool backing the
+        repository can fetch or check several files in one operation. If
+        not, the files are handled one at a time through get_file and
+        get_file_exists instead, using their per-file caching.
+        """
+        hosting_service = self.hosting_service
+
+        if hosting_service:
+            return hosting_service.supports_batched_files
+        else:
+            return self.get_scmtool().supports_batched_files
+
+    def _fetch_uncached_files(self, paths_and_revisions, base_commit_id,
+                              request):
+        """Internal function for fetching the files that aren't cached.
+
+        The files that aren't already in the cache are fetched in one batch
+        and cached. The cache is checked in one request, without loading
+        the contents of any cached files.
+
+        This returns a tuple of the indexes of the files that were already
+        cached, and a dictionary mapping the indexes of the fetched files to
+        their contents.
+        """
+        keys = [
+            make_cache_key(self._make_file_cache_key(path, revision,
+                                                     base_commit_id))
+            for path, revision in paths_and_revisions
+        ]
+        cached_keys = cache.get_many(keys)
+        cached = []
+        uncached = []
+
+        for i, key in enumerate(keys):
+            if key in cached_keys:
+                cached.append(i)
+            else:
+                uncached.append(i)
+
+        fetched = {}
+
+        if uncached:
+            result = self._get_files_uncached(
+                [paths_and_revisions[i] for i in uncached],
+                base_commit_id, request)
+
+            for i, data in zip(uncached, result):
+                fetched[i] = data
+
+                if data is not None:
+                    path, revision = paths_and_revisions[i]
+                    cache_memoize(
+                        self._make_file_cache_key(path, revision,
+                                                  base_commit_id),
+                        lambda: [data],
+                        large_data=True)
+
+        return cached, fetched
+
+    def _get_files_uncached(self, paths_and_revisions, base_commit_id,
+                            request):
+        """Internal function for fetching several uncached files.
+
+        This is called by get_files for the files that aren't already in
+        the cache. The fetching_file and fetched_file signals are sent for
+        each file, as with get_file.
+        """
+        for path, revision in paths_and_revisions:
+            fetching_file.send(sender=self,
+                               path=path,
+                               revision=revision,
+                               base_commit_id=base_commit_id,
+                               request=request)
+
+        log_timer = log_timed("Fetching %d files from %s"
+                              % (len(paths_and_revisions), self),
+                              request=request)
+
+        hosting_service = self.hosting_service
+
+        if hosting_service:
+            result = hosting_service.get_files(
+                self,
+                paths_and_revisions,
+                base_commit_id=base_commit_id)
+        else:
+            result = self.get_scmtool().get_files(
+                paths_and_revisions,
+                base_commit_id=base_commit_id)
+
+        log_timer.done()
+
+        for (path, revision), data in zip(paths_and_revisions, result):
+            if data is not None:
+                fetched_file.send(sender=self,
+                                  path=path,
+                                  revision=revision,
+                                  base_commit_id=base_commit_id,
+                                  request=request,
+                                  data=data)
+
+        return result
+
+    def _get_files_exist_uncached(self, paths_and_revisions, base_commit_id,
+                                  request):
+        """Internal function for checking that several files exist.
+
+        This is called by get_files_exist for the files that aren't already
+        known to exist. The checking_file_exists and checked_file_exists
+        signals are sent for each file, as with get_file_exists.
+        """
+        for path, revision in paths_and_revisions:
+            checking_file_exists.send(sender=self,
+                                      path=path,
+                                      revision=revision,
+                                      base_commit_id=base_commit_id,
+                                      request=request)
+
+        hosting_service = self.hosting_service
+
+        if hosting_service:
+            result = hosting_service.get_files_exist(
+                self,
+                paths_and_revisions,
+                base_commit_id=base_commit_id)
+        else:
+            result = self.get_scmtool().get_files_exist(
+                paths_and_revisions,
+                base_commit_id=base_commit_id)
+
+        for (path, revision), exists in zip(paths_and_revisions, result):
+            checked_file_exists.send(sender=self,
+                                     path=path,
+                                     revision=revision,
+                                     base_commit_id=base_commit_id,
+                                     request=request,
+                                     exists=exists)
+
+        return result
+
     def get_encoding_list(self):
         """Returns a list of candidate text encodings for files"""
         encodings = []
@@ -208,15 +208,17 @@ class PerforceClient(object):
     def get_info(self):
         return self._run_worker(self.p4.run_info)
 
+    def _get_depot_path(self, path, revision):
+        if revision == HEAD:
+            return path
+        else:
+            return '%s#%s' % (path, revision)
+
     def _get_file(self, path, revision):
         if revision == PRE_CREATION:
             return ''
-        elif revision == HEAD:
-            depot_path = path
-        else:
-            depot_path = '%s#%s' % (path, revision)
 
-        res = self.p4.run_print('-q', depot_path)
+        res = self.p4.run_print('-q', self._get_depot_path(path, revision))
         if res:
             return res[-1]
 
@@ -226,6 +228,70 @@ class PerforceClient(object):
         """
         return self._run_worker(lambda: self._get_file(path, revision))
 
+    def _get_files(self, paths_and_revisions):
+        to_fetch = [
+            (path, revision)
+            for path, revision in paths_and_revisions
+            if revision != PRE_CREATION
+        ]
+
+        if not to_fetch:
+            return [''] * len(paths_and_revisions)
+
+        res = self.p4.run_print('-q', *[
+            self._get_depot_path(path, revision)
+            for path, revision in to_fetch
+        ])
+
+        # The results alternate between a dictionary describing each file
+        # and its contents. Files that don't exist are left out, so we match
+        # up each dictionary with the files we asked for, in order.
+        printed = []
+
+        for item in res:
+            if isinstance(item, dict):
+                printed.append((item.get('depotFile'), item.get('rev'), []))
+            elif printed:
+                printed[-1][2].append(item)
+
+        if not printed:
+            return [
+                self._get_file(path, revision)
+                for path, revision in paths_and_revisions
+            ]
+
+        printed = iter(printed)
+        next_printed = next(printed, None)
+        result = []
+
+        for path, revision in paths_and_revisions:
+            if revision == PRE_CREATION:
+                result.append('')
+            elif (next_printed is not None and
+                  next_printed[0] == path and
+                  (revision == HEAD or
+                   next_printed[1] == six.text_type(revision))):
+                contents = next_printed[2]
+
+                if contents:
+                    result.append(contents[0][:0].join(contents))
+                else:
+                    result.append('')
+
+                next_printed = next(printed, None)
+            else:
+                result.append(None)
+
+        return result
+
+    def get_files(self, paths_and_revisions):
+        """
+        Get the contents of several files, using a single 'p4 print'.
+
+        Files that don't exist are returned as None.
+        """
+        return self._run_worker(lambda: self._get_files(paths_and_revisions))
+
     def _get_files_at_revision(self, revision_str):
         return self.p4.run_files(revision_str)
 
@@ -240,6 +306,7 @@ class PerforceClient(object):
 
 class PerforceTool(SCMTool):
     name = "Perforce"
+    supports_batched_files = True
     supports_ticket_auth = True
     supports_pending_changesets = True
     field_help_text = {
@@ -324,6 +391,9 @@ class PerforceTool(SCMTool):
     def get_file(self, path, revision=HEAD, **kwargs):
         return self.client.get_file(path, revision)
 
+    def get_files(self, paths_and_revisions, **kwargs):
+        return self.client.get_files(paths_and_revisions)
+
     def parse_diff_revision(self, file_str, revision_str, *args, **kwargs):
         # Perforce has this lovely idiosyncracy that diffs show revision #1
         # both for pre-creation and when there's an actual revision.
@@ -2,6 +2,7 @@
 from __future__ import unicode_literals
 
 import os
+import time
 from errno import ECONNREFUSED
 from hashlib import md5
 from socket import error as SocketError
@@ -31,7 +32,8 @@ from reviewboard.scmtools.errors import (SCMError, FileNotFoundError,
                                          RepositoryNotFoundError,
                                          AuthenticationError)
 from reviewboard.scmtools.forms import RepositoryForm
-from reviewboard.scmtools.git import ShortSHA1Error, GitClient
+from reviewboard.scmtools.git import (ShortSHA1Error, GitClient,
+                                      _cat_file_worker_pool)
 from reviewboard.scmtools.hg import HgDiffParser, HgGitDiffParser
 from reviewboard.scmtools.models import Repository, Tool
 from reviewboard.scmtools.perforce import STunnelProxy, STUNNEL_SERVER
@@ -157,7 +159,7 @@ class CoreTests(TestCase):
         self.assertTrue(len(cs.files) == 0)
 
 
-class RepositoryTests(TestCase):
+class RepositoryTests(SpyAgency, TestCase):
     fixtures = ['test_scmtools']
 
     def setUp(self):
@@ -173,6 +175,8 @@ class RepositoryTests(TestCase):
         self.scmtool_cls = self.repository.get_scmtool().__class__
         self.old_get_file = self.scmtool_cls.get_file
         self.old_file_exists = self.scmtool_cls.file_exists
+        self.old_get_files = self.scmtool_cls.get_files
+        self.old_get_files_exist = self.scmtool_cls.get_files_exist
 
     def tearDown(self):
         super(RepositoryTests, self).tearDown()
@@ -181,6 +185,8 @@ class RepositoryTests(TestCase):
 
         self.scmtool_cls.get_file = self.old_get_file
         self.scmtool_cls.file_exists = self.old_file_exists
+        self.scmtool_cls.get_files = self.old_get_files
+        self.scmtool_cls.get_files_exist = self.old_get_files_exist
 
     def test_archive(self):
         """Testing Repository.archive"""
@@ -260,6 +266,128 @@ class RepositoryTests(TestCase):
         self.assertEqual(found_signals[1],
                          ('fetched_file', path, revision, request))
 
+    def test_get_files(self):
+        """Testing Repository.get_files"""
+        self.assertEqual(
+            self.repository.get_files([('readme', 'e965047'),
+                                       ('readme', 'fffffff'),
+                                       ('readme', 'd6613f5')]),
+            [b'Hello\n', None, b'Hello there\n'])
+
+    def test_get_files_caching(self):
+        """Testing Repository.get_files caches results and uses
+        get_file's cached results
+        """
+        def get_files(self, paths_and_revisions, **kwargs):
+            fetched.append(paths_and_revisions)
+            return [b'file data'] * len(paths_and_revisions)
+
+        fetched = []
+
+        self.scmtool_cls.get_files = get_files
+
+        self.repository.get_file('readme', 'e965047')
+        data1 = self.repository.get_files([('readme', 'e965047'),
+                                           ('readme', 'd6613f5')])
+        data2 = self.repository.get_files([('readme', 'e965047'),
+                                           ('readme', 'd6613f5')])
+
+        self.assertEqual(data1, [b'Hello\n', b'file data'])
+        self.assertEqual(data1, data2)
+        self.assertEqual(fetched, [[('readme', 'd6613f5')]])
+        self.assertEqual(self.repository.get_file('readme', 'd6613f5'),
+                         b'file data')
+
+    def test_get_files_signals(self):
+        """Testing Repository.get_files emits signals"""
+        def on_fetching_file(sender, path, revision, request, **kwargs):
+            found_signals.append(('fetching_file', path, revision, request))
+
+        def on_fetched_file(sender, path, revision, request, **kwargs):
+            found_signals.append(('fetched_file', path, revision, request))
+
+        found_signals = []
+
+        fetching_file.connect(on_fetching_file, sender=self.repository)
+        fetched_file.connect(on_fetched_file, sender=self.repository)
+
+        request = {}
+
+        self.repository.get_files([('readme', 'e965047'),
+                                   ('readme', 'fffffff')],
+                                  request=request)
+
+        self.assertEqual(found_signals, [
+            ('fetching_file', 'readme', 'e965047', request),
+            ('fetching_file', 'readme', 'fffffff', request),
+            ('fetched_file', 'readme', 'e965047', request),
+        ])
+
+    def test_get_files_exist_caching(self):
+        """Testing Repository.get_files_exist caches results when files
+        exist
+        """
+        def get_files_exist(self, paths_and_revisions, **kwargs):
+            checked.append(paths_and_revisions)
+            return [
+                revision != 'fffffff'
+                for path, revision in paths_and_revisions
+            ]
+
+        checked = []
+
+        self.scmtool_cls.get_files_exist = get_files_exist
+
+        paths_and_revisions = [('readme', 'e965047'), ('readme', 'fffffff')]
+        exists1 = self.repository.get_files_exist(paths_and_revisions)
+        exists2 = self.repository.get_files_exist(paths_and_revisions)
+
+        self.assertEqual(exists1, [True, False])
+        self.assertEqual(exists1, exists2)
+        self.assertEqual(checked, [
+            paths_and_revisions,
+            [('readme', 'fffffff')],
+        ])
+        self.assertTrue(self.repository.get_file_exists('readme', 'e965047'))
+
+    def test_get_files_exist_without_batching(self):
+        """Testing Repository.get_files_exist with an SCMTool that doesn't
+        support batching uses get_file_exists
+        """
+        repository = self.create_repository(tool_name='Test')
+
+        self.spy_on(repository.get_file_exists,
+                    call_fake=lambda *args, **kwargs: True)
+        self.spy_on(repository._get_files_exist_uncached)
+
+        self.assertEqual(
+            repository.get_files_exist([('readme', 'e965047'),
+                                        ('readme', 'd6613f5')]),
+            [True, True])
+        self.assertEqual(len(repository.get_file_exists.calls), 2)
+        self.assertFalse(repository._get_files_exist_uncached.called)
+
+    def test_prefetch_files(self):
+        """Testing Repository.prefetch_files fetches only uncached files"""
+        def get_files(self, paths_and_revisions, **kwargs):
+            fetched.append(paths_and_revisions)
+            return [b'file data'] * len(paths_and_revisions)
+
+        fetched = []
+
+        self.scmtool_cls.get_files = get_files
+
+        self.repository.get_file('readme', 'e965047')
+        self.spy_on(self.repository.get_file)
+
+        self.repository.prefetch_files([('readme', 'e965047'),
+                                        ('readme', 'd6613f5')])
+
+        self.assertEqual(fetched, [[('readme', 'd6613f5')]])
+        self.assertFalse(self.repository.get_file.called)
+        self.assertEqual(self.repository.get_file('readme', 'd6613f5'),
+                         b'file data')
+
     def test_get_file_exists_caching_when_exists(self):
         """Testing Repository.get_file_exists caches result when exists"""
         def file_exists(self, path, revision, **kwargs):
@@ -1855,6 +1983,15 @@ class MercurialTests(SCMTestCase):
         self.assertRaises(FileNotFoundError,
                           lambda: self.tool.get_file('hello', PRE_CREATION))
 
+    def test_get_files(self):
+        """Testing HgTool.get_files"""
+        rev = Revision('661e5dd3c493')
+
+        self.assertEqual(
+            self.tool.get_files([('doc/readme', rev),
+                                 ('doc/readme2', rev)]),
+            [b'Hello\n\ngoodbye\n', None])
+
     def test_get_file_base_commit_id_override(self):
         """Testing base_commit_id overrides revision in HgTool.get_file"""
         base_commit_id = Revision('661e5dd3c493')
@@ -1930,6 +2067,13 @@ class GitTests(SpyAgency, SCMTestCase):
         except ImportError:
             raise nose.SkipTest('git binary not found')
 
+        _cat_file_worker_pool.close_all()
+
+    def tearDown(self):
+        super(GitTests, self).tearDown()
+
+        _cat_file_worker_pool.close_all()
+
     def _read_fixture(self, filename):
         filename = os.path.join(os.path.dirname(__file__),
                                 'testdata', filename)
@@ -2688,6 +2832,123 @@ class GitTests(SpyAgency, SCMTestCase):
         self.assertRaises(FileNotFoundError,
                           lambda: self.tool.get_file("readme", "0000000"))
 
+    def test_get_files(self):
+        """Testing GitTool.get_files"""
+        self.spy_on(self.tool.client._run_git)
+
+        self.assertEqual(
+            self.tool.get_files([('readme', 'e965047'),
+                                 ('readme', PRE_CREATION),
+                                 ('readme', 'fffffff'),
+                                 ('readme', 'a62df6c'),
+                                 ('readme', HEAD)]),
+            [b'Hello\n', b'', None, None, b'Hello there\n'])
+        self.assertEqual(len(self.tool.client._run_git.calls), 1)
+
+    def test_get_files_exist(self):
+        """Testing GitTool.get_files_exist"""
+        self.spy_on(self.tool.client._run_git)
+
+        self.assertEqual(
+            self.tool.get_files_exist([('readme', 'e965047'),
+                                       ('readme', PRE_CREATION),
+                                       ('readme', 'fffffff'),
+                                       ('readme2', 'ccffbb4'),
+                                       ('readme', 'd6613f5')]),
+            [True, False, False, False, True])
+        self.assertEqual(len(self.tool.client._run_git.calls), 1)
+
+    def test_get_file_reuses_cat_file_worker(self):
+        """Testing GitTool.get_file reuses git cat-file workers"""
+        self.spy_on(self.tool.client._run_git)
+
+        self.assertEqual(self.tool.get_file('readme', 'e965047'), b'Hello\n')
+        self.assertEqual(self.tool.get_file('readme', 'd6613f5'),
+                         b'Hello there\n')
+        self.assertTrue(self.tool.file_exists('readme', 'e965047'))
+        self.assertTrue(self.tool.file_exists('readme', 'd6613f5'))
+
+        # One worker for --batch, and one for --batch-check.
+        self.assertEqual(len(self.tool.client._run_git.calls), 2)
+
+    def test_get_file_restarts_dead_cat_file_worker(self):
+        """Testing GitTool.get_file replaces git cat-file workers that
+        have exited
+        """
+        self.tool.get_file('readme', 'e965047')
+
+        all_idle_workers = _cat_file_worker_pool._idle_workers
+
+        for idle_workers in six.itervalues(all_idle_workers):
+            for worker in idle_workers:
+                worker.process.kill()
+                worker.process.wait()
+
+        self.assertEqual(self.tool.get_file('readme', 'd6613f5'),
+                         b'Hello there\n')
+
+    def test_get_file_with_failed_cat_file_worker(self):
+        """Testing GitTool.get_file retries with a new git cat-file worker
+        when the worker fails
+        """
+        class BrokenWorker(object):
+            option = '--batch'
+            last_used = time.time()
+            closed = False
+
+            def is_alive(self):
+                return True
+
+            def lookup(self, obj):
+                raise IOError('Broken pipe')
+
+            def close(self):
+                self.closed = True
+
+        client = self.tool.client
+        broken_worker = BrokenWorker()
+        _cat_file_worker_pool._idle_workers[
+            (client.git_dir, '--batch', client.local_site_name)] = \
+            [broken_worker]
+
+        self.assertEqual(self.tool.get_file('readme', 'e965047'), b'Hello\n')
+        self.assertTrue(broken_worker.closed)
+
+    def test_get_file_expires_idle_cat_file_workers(self):
+        """Testing GitTool.get_file shuts down expired git cat-file workers
+        for other repositories
+        """
+        class IdleWorker(object):
+            option = '--batch'
+            last_used = (time.time() -
+                         _cat_file_worker_pool.IDLE_TIMEOUT - 1)
+            closed = False
+
+            def is_alive(self):
+                return True
+
+            def close(self):
+                self.closed = True
+
+        idle_worker = IdleWorker()
+        other_key = ('/other.git', '--batch', None)
+        _cat_file_worker_pool._idle_workers[other_key] = [idle_worker]
+
+        self.assertEqual(self.tool.get_file('readme', 'e965047'), b'Hello\n')
+        self.assertTrue(idle_worker.closed)
+        self.assertNotIn(other_key, _cat_file_worker_pool._idle_workers)
+
+    def test_cat_file_worker_discards_stderr(self):
+        """Testing GitTool.get_file doesn't pipe the error output of
+        git cat-file workers
+        """
+        self.spy_on(self.tool.client._run_git)
+
+        self.tool.get_file('readme', 'e965047')
+
+        stderr = self.tool.client._run_git.last_call.kwargs['stderr']
+        self.assertEqual(stderr.name, os.devnull)
+
     def test_parse_diff_revision_with_remote_and_short_SHA1_error(self):
         """Testing GitTool.parse_diff_revision with remote files and short
         SHA1 error
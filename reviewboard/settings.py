@@ -171,6 +171,7 @@ RB_BUILTIN_APPS = [
     'reviewboard.reviews',
     'reviewboard.scmtools',
     'reviewboard.site',
+    'reviewboard.ssh',
     'reviewboard.webapi',
 ]
 
@@ -1,6 +1,7 @@
 from __future__ import unicode_literals
 
 import logging
+import threading
 
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
@@ -10,6 +11,14 @@ import paramiko
 from reviewboard.ssh.errors import UnsupportedSSHKeyError
 
 
+# The keys loaded from each storage backend and namespace, shared by all
+# SSHClients in the process. Each is stored along with the storage's
+# version at the time it was loaded, and is reused as long as the version
+# doesn't change.
+_cached_keys = {}
+_cached_keys_lock = threading.Lock()
+
+
 class SSHHostKeys(paramiko.HostKeys):
     """Manages known lists of host keys.
 
@@ -22,16 +31,32 @@ class SSHHostKeys(paramiko.HostKeys):
         self.storage = storage
 
     def load(self, filename):
-        """Loads all known host keys from the storage backend."""
-        self._entries = []
+        """Loads all known host keys from the storage backend.
+
+        The parsed keys are shared with other clients using the same
+        storage, until the keys in the storage change.
+        """
+        entries = _get_cached_keys(self.storage, 'host_keys',
+                                   self._read_entries)
+
+        # paramiko modifies entries when adding keys, so each client needs
+        # its own copies.
+        self._entries = [
+            HostKeyEntry(list(entry.hostnames), entry.key)
+            for entry in entries
+        ]
 
-        lines = self.storage.read_host_keys()
+    def _read_entries(self):
+        """Reads and parses the host keys from the storage backend."""
+        entries = []
 
-        for line in lines:
+        for line in self.storage.read_host_keys():
             entry = HostKeyEntry.from_line(line)
 
             if entry is not None:
-                self._entries.append(entry)
+                entries.append(entry)
+
+        return entries
 
     def save(self, filename):
         pass
@@ -47,7 +72,9 @@ class SSHClient(paramiko.SSHClient):
     same capabilities.
 
     Key access goes through an SSHStorage backend. The storage backend knows
-    how to look up keys and write them.
+    how to look up keys and write them. Keys that were already loaded by
+    another client in the process are reused if the storage reports they
+    haven't changed.
 
     The default backend works with the site directory's data/.ssh directory,
     and supports namespaced directories for LocalSites.
@@ -106,7 +133,8 @@ class SSHClient(paramiko.SSHClient):
         fp = None
 
         try:
-            key = self.storage.read_user_key()
+            key = _get_cached_keys(self.storage, 'user_key',
+                                   self.storage.read_user_key)
         except paramiko.SSHException as e:
             logging.error('SSH: Unknown error accessing user key: %s' % e)
         except paramiko.PasswordRequiredException as e:
@@ -130,6 +158,8 @@ class SSHClient(paramiko.SSHClient):
         except Exception as e:
             logging.error('Unable to delete SSH key file: %s' % e)
             raise
+        finally:
+            _clear_cached_keys(self.storage)
 
     def get_public_key(self, key):
         """Returns the public key portion of an SSH key.
@@ -227,14 +257,20 @@ class SSHClient(paramiko.SSHClient):
 
     def add_host_key(self, hostname, key):
         """Adds a host key to the known hosts file."""
-        self.storage.add_host_key(hostname, key)
+        try:
+            self.storage.add_host_key(hostname, key)
+        finally:
+            _clear_cached_keys(self.storage)
 
     def replace_host_key(self, hostname, old_key, new_key):
         """Replaces a host key in the known hosts file with another.
 
         This is used for replacing host keys that have changed.
         """
-        self.storage.replace_host_key(hostname, old_key, new_key)
+        try:
+            self.storage.replace_host_key(hostname, old_key, new_key)
+        finally:
+            _clear_cached_keys(self.storage)
 
     def _write_user_key(self, key):
         """Convenience function to write a user key and check for errors.
@@ -253,3 +289,47 @@ class SSHClient(paramiko.SSHClient):
             logging.error('Unknown error writing SSH user key: %s' % e,
                           exc_info=1)
             raise
+        finally:
+            _clear_cached_keys(self.storage)
+
+
+def _get_cached_keys(storage, name, load_func):
+    """Returns keys of the given type from a storage backend.
+
+    If the keys were already loaded by ``load_func`` for this storage
+    backend and namespace, and the storage's version hasn't changed since,
+    the loaded keys are returned. Otherwise, they're loaded and cached.
+    """
+    version = storage.get_version()
+
+    if version is None:
+        return load_func()
+
+    cache_key = (type(storage), storage.namespace, name)
+
+    with _cached_keys_lock:
+        cached = _cached_keys.get(cache_key)
+
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    # The version was fetched before loading, so if the keys change while
+    # they're being loaded, they'll just be loaded again next time.
+    keys = load_func()
+
+    with _cached_keys_lock:
+        _cached_keys[cache_key] = (version, keys)
+
+    return keys
+
+
+def _clear_cached_keys(storage):
+    """Forgets all keys cached for a storage backend and namespace.
+
+    This is called after writing keys, in case the storage's version
+    can't tell (such as when a file was changed twice within the
+    resolution of its modification time).
+    """
+    with _cached_keys_lock:
+        for name in ('host_keys', 'user_key'):
+            _cached_keys.pop((type(storage), storage.namespace, name), None)
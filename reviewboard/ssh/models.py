@@ -0,0 +1,49 @@
+from __future__ import unicode_literals
+
+from django.db import models
+from django.utils.encoding import python_2_unicode_compatible
+from django.utils.translation import ugettext_lazy as _
+
+
+@python_2_unicode_compatible
+class SSHKeyStore(models.Model):
+    """The SSH keys stored in the database for a namespace.
+
+    This is used by :py:class:`reviewboard.ssh.storage.DBSSHStorage`. There
+    is one key store for each LocalSite with keys, and one (with a blank
+    namespace) for the main site.
+
+    The version is incremented whenever any key in the store changes, so
+    that processes caching the keys know to load them again.
+    """
+    namespace = models.CharField(_('namespace'), max_length=255, blank=True,
+                                 unique=True)
+    version = models.PositiveIntegerField(_('version'), default=0)
+
+    # The user's private key, in PEM format.
+    user_key = models.TextField(_('user key'), blank=True)
+    user_key_type = models.CharField(_('user key type'), max_length=32,
+                                     blank=True)
+
+    def __str__(self):
+        return self.namespace or _('(default)')
+
+    class Meta:
+        verbose_name = _('SSH key store')
+        verbose_name_plural = _('SSH key stores')
+
+
+@python_2_unicode_compatible
+class SSHHostKey(models.Model):
+    """A known SSH host key stored in the database."""
+    keystore = models.ForeignKey(SSHKeyStore, related_name='host_keys')
+    hostname = models.CharField(_('hostname'), max_length=255)
+    key_type = models.CharField(_('key type'), max_length=32)
+    key_base64 = models.TextField(_('key'))
+
+    def __str__(self):
+        return '%s %s' % (self.hostname, self.key_type)
+
+    class Meta:
+        verbose_name = _('SSH host key')
+        verbose_name_plural = _('SSH host keys')
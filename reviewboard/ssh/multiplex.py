@@ -0,0 +1,456 @@
+"""Sharing one SSH connection between many rbssh invocations.
+
+Every rbssh invocation normally connects to the server, exchanges keys and
+authenticates before it can run its command. Fetching from a repository
+can mean running many commands against the same server in a row, and this
+setup can take longer than the commands themselves.
+
+When a control directory is configured, rbssh instead looks for a control
+master for the server: a background process holding an authenticated
+connection, listening on a UNIX socket in that directory. Each rbssh
+invocation then asks the master to open a new session on the existing
+connection, and relays its standard input and output over the socket.
+If there's no master, one is started, and it exits once it's been idle
+for a while.
+
+Data is sent over the socket in frames. Each frame is a one-byte type and
+a four-byte length, followed by the payload.
+
+The socket paths are predictable, so the control directory must be owned
+by the user and only accessible to them (mode 0700), and the process
+listening on a socket must belong to the user. If either isn't the case,
+rbssh connects directly instead.
+"""
+
+from __future__ import unicode_literals
+
+import errno
+import hashlib
+import json
+import logging
+import os
+import select
+import socket
+import stat
+import struct
+import sys
+import threading
+import time
+
+
+#: The size of the buffers used when relaying data.
+BUFFER_SIZE = 64 * 1024
+
+#: The default number of seconds a master stays around when idle.
+DEFAULT_PERSIST_SECS = 60
+
+FRAME_REQUEST = 1
+FRAME_STDIN = 2
+FRAME_STDIN_EOF = 3
+FRAME_STDOUT = 4
+FRAME_STDERR = 5
+FRAME_EXIT_STATUS = 6
+FRAME_ERROR = 7
+
+_FRAME_HEADER = struct.Struct(str('!BI'))
+_EXIT_STATUS = struct.Struct(str('!i'))
+
+# The socket option for getting the credentials of the process on the other
+# end of a UNIX socket. Python 2 doesn't define this, so the Linux value is
+# used there. On other platforms, the owner of the socket is checked
+# instead.
+_SO_PEERCRED = getattr(socket, 'SO_PEERCRED',
+                       sys.platform.startswith('linux') and 17 or None)
+_PEERCRED = struct.Struct(str('3i'))
+
+
+class ControlSocketClosedError(Exception):
+    """The other end of a control socket was closed."""
+
+
+def get_control_path(control_dir, username, hostname, port, namespace=None):
+    """Returns the path of the control socket for a connection.
+
+    The name is a hash of the connection details, since UNIX socket paths
+    are limited in length.
+    """
+    key = '%s@%s:%s/%s' % (username, hostname, port, namespace or '')
+
+    return os.path.join(
+        control_dir,
+        'rbssh-%s' % hashlib.sha1(key.encode('utf-8')).hexdigest()[:20])
+
+
+def ensure_control_dir(control_dir):
+    """Creates the control directory, if it doesn't already exist.
+
+    This returns whether the directory can be used. An existing directory
+    must pass the checks in :py:func:`is_control_dir_secure`.
+    """
+    try:
+        os.makedirs(control_dir, 0o700)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            logging.debug('!!! Unable to create %s: %s', control_dir, e)
+            return False
+
+    return is_control_dir_secure(control_dir)
+
+
+def is_control_dir_secure(control_dir):
+    """Returns whether a control directory is safe to use.
+
+    The directory must be a real directory (not a symlink) owned by the
+    current user, with no permissions for anyone else, so that nobody else
+    can place a socket at the path of a control socket.
+    """
+    try:
+        st = os.lstat(control_dir)
+    except OSError as e:
+        logging.debug('!!! Unable to check %s: %s', control_dir, e)
+        return False
+
+    if (not stat.S_ISDIR(st.st_mode) or
+        st.st_uid != os.getuid() or
+        stat.S_IMODE(st.st_mode) & 0o077):
+        logging.warning('Not using SSH control directory %s. It must be '
+                        'a directory owned by the current user with mode '
+                        '0700.',
+                        control_dir)
+        return False
+
+    return True
+
+
+def is_trusted_peer(sock, control_path):
+    """Returns whether a control socket is served by the current user.
+
+    Where supported, this checks the credentials of the process on the
+    other end of the socket. Otherwise, it checks the owner of the socket.
+    """
+    if _SO_PEERCRED is not None:
+        try:
+            pid, uid, gid = _PEERCRED.unpack(
+                sock.getsockopt(socket.SOL_SOCKET, _SO_PEERCRED,
+                                _PEERCRED.size))
+        except socket.error as e:
+            logging.debug('!!! Unable to check the owner of %s: %s',
+                          control_path, e)
+            return False
+    else:
+        try:
+            st = os.lstat(control_path)
+        except OSError as e:
+            logging.debug('!!! Unable to check the owner of %s: %s',
+                          control_path, e)
+            return False
+
+        if not stat.S_ISSOCK(st.st_mode):
+            return False
+
+        uid = st.st_uid
+
+    return uid == os.getuid()
+
+
+def send_frame(sock, frame_type, payload=b''):
+    """Sends a frame over a control socket."""
+    sock.sendall(_FRAME_HEADER.pack(frame_type, len(payload)) + payload)
+
+
+def recv_frame(sock):
+    """Receives a frame from a control socket.
+
+    This returns a tuple of the frame type and payload.
+    ControlSocketClosedError is raised if the socket was closed.
+    """
+    frame_type, length = _FRAME_HEADER.unpack(
+        _recv_exactly(sock, _FRAME_HEADER.size))
+
+    return frame_type, _recv_exactly(sock, length)
+
+
+def write_fd(fd, data):
+    """Writes all of the data to a file descriptor.
+
+    This works with blocking and non-blocking file descriptors. Standard
+    output may share its file description with a non-blocking standard
+    input.
+    """
+    data = memoryview(data)
+
+    while data:
+        try:
+            data = data[os.write(fd, data):]
+        except OSError as e:
+            if e.errno != errno.EAGAIN:
+                raise
+
+            select.select([], [fd], [])
+
+
+def run_session(control_path, command=None, subsystem=None, stdin_fd=0,
+                stdout_fd=1, stderr_fd=2):
+    """Runs a session through a control master.
+
+    The session runs either ``command`` or ``subsystem``, with its input
+    read from ``stdin_fd`` and its output written to ``stdout_fd`` and
+    ``stderr_fd``.
+
+    This returns the exit status of the session. If there's no master
+    listening on ``control_path``, the master can't be trusted (see
+    :py:func:`is_control_dir_secure` and :py:func:`is_trusted_peer`), or
+    it couldn't open a session, this returns ``None`` without having read
+    or written anything, and the caller should connect directly instead.
+    """
+    if not is_control_dir_secure(os.path.dirname(control_path)):
+        return None
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+    try:
+        sock.connect(control_path)
+    except socket.error as e:
+        logging.debug('!!! No control master at %s: %s', control_path, e)
+        sock.close()
+        return None
+
+    try:
+        if not is_trusted_peer(sock, control_path):
+            logging.warning('Not using SSH control master at %s, which '
+                            'belongs to another user.',
+                            control_path)
+            return None
+
+        send_frame(sock, FRAME_REQUEST, json.dumps({
+            'command': command,
+            'subsystem': subsystem,
+        }).encode('utf-8'))
+
+        # Wait for the master to open the session before reading anything
+        # from stdin, so that we can still fall back on connecting
+        # directly.
+        frame_type, payload = recv_frame(sock)
+
+        if frame_type == FRAME_ERROR:
+            logging.debug('!!! Control master could not open a session: %s',
+                          payload)
+            return None
+
+        read_fds = [sock, stdin_fd]
+
+        while True:
+            rl, wl, el = select.select(read_fds, [], [])
+
+            if stdin_fd in rl:
+                try:
+                    data = os.read(stdin_fd, BUFFER_SIZE)
+                except OSError as e:
+                    if e.errno == errno.EAGAIN:
+                        continue
+
+                    data = None
+
+                if data:
+                    send_frame(sock, FRAME_STDIN, data)
+                else:
+                    send_frame(sock, FRAME_STDIN_EOF)
+                    read_fds.remove(stdin_fd)
+
+            if sock in rl:
+                frame_type, payload = recv_frame(sock)
+
+                if frame_type == FRAME_STDOUT:
+                    write_fd(stdout_fd, payload)
+                elif frame_type == FRAME_STDERR:
+                    write_fd(stderr_fd, payload)
+                elif frame_type == FRAME_EXIT_STATUS:
+                    return _EXIT_STATUS.unpack(payload)[0]
+    except (ControlSocketClosedError, socket.error) as e:
+        logging.error('Lost the connection to the SSH control master: %s', e)
+        return 255
+    finally:
+        sock.close()
+
+
+class ControlMaster(object):
+    """Serves sessions on an SSH connection over a control socket.
+
+    Each connection to the socket gets its own session on the transport,
+    handled in its own thread. The master stops when the transport is
+    closed, or when there have been no sessions for ``persist`` seconds.
+    """
+
+    def __init__(self, transport, control_path,
+                 persist=DEFAULT_PERSIST_SECS):
+        self.transport = transport
+        self.control_path = control_path
+        self.persist = persist
+
+        self._listener = None
+        self._lock = threading.Lock()
+        self._active_sessions = 0
+        self._last_active = time.time()
+
+    def listen(self):
+        """Starts listening on the control socket.
+
+        This returns whether the master is listening. It won't be if
+        another master is already listening on the socket.
+        """
+        if os.path.exists(self.control_path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+            try:
+                probe.connect(self.control_path)
+                return False
+            except socket.error:
+                # This was left behind by a master that has since exited.
+                os.unlink(self.control_path)
+            finally:
+                probe.close()
+
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        old_umask = os.umask(0o177)
+
+        try:
+            listener.bind(self.control_path)
+        except socket.error as e:
+            logging.debug('!!! Could not listen on %s: %s',
+                          self.control_path, e)
+            listener.close()
+            return False
+        finally:
+            os.umask(old_umask)
+
+        listener.listen(16)
+        self._listener = listener
+
+        return True
+
+    def serve(self):
+        """Serves sessions until the master stops.
+
+        This will start listening first, if needed. If another master is
+        already listening on the socket, this returns immediately.
+        """
+        if self._listener is None and not self.listen():
+            return
+
+        listener = self._listener
+
+        try:
+            while self.transport.is_active() and not self._is_expired():
+                rl, wl, el = select.select([listener], [], [], 1)
+
+                if listener in rl:
+                    conn, addr = listener.accept()
+
+                    with self._lock:
+                        self._active_sessions += 1
+
+                    thread = threading.Thread(target=self._run_session,
+                                              args=(conn,))
+                    thread.daemon = True
+                    thread.start()
+        finally:
+            # Remove the socket before closing it, so that new clients
+            # fall back on connecting directly instead of failing.
+            try:
+                os.unlink(self.control_path)
+            except OSError:
+                pass
+
+            listener.close()
+            self._listener = None
+
+    def _is_expired(self):
+        """Returns whether the master has been idle for too long."""
+        with self._lock:
+            return (self._active_sessions == 0 and
+                    time.time() - self._last_active > self.persist)
+
+    def _run_session(self, conn):
+        """Runs a session for a client connected to the socket."""
+        try:
+            self._relay_session(conn)
+        except Exception as e:
+            logging.debug('!!! Control session failed: %s', e)
+        finally:
+            conn.close()
+
+            with self._lock:
+                self._active_sessions -= 1
+                self._last_active = time.time()
+
+    def _relay_session(self, conn):
+        """Opens a session and relays data between it and the client."""
+        frame_type, payload = recv_frame(conn)
+        assert frame_type == FRAME_REQUEST
+        request = json.loads(payload.decode('utf-8'))
+
+        try:
+            channel = self.transport.open_session()
+
+            if request['subsystem']:
+                channel.invoke_subsystem(request['subsystem'])
+            else:
+                channel.exec_command(request['command'])
+        except Exception as e:
+            send_frame(conn, FRAME_ERROR, ('%s' % e).encode('utf-8'))
+            return
+
+        send_frame(conn, FRAME_REQUEST)
+        read_fds = [conn, channel]
+
+        try:
+            while True:
+                rl, wl, el = select.select(read_fds, [], [])
+
+                if conn in rl:
+                    frame_type, payload = recv_frame(conn)
+
+                    if frame_type == FRAME_STDIN:
+                        channel.sendall(payload)
+                    elif frame_type == FRAME_STDIN_EOF:
+                        channel.shutdown_write()
+                        read_fds.remove(conn)
+
+                if channel in rl:
+                    if channel.recv_ready():
+                        data = channel.recv(BUFFER_SIZE)
+
+                        if data:
+                            send_frame(conn, FRAME_STDOUT, data)
+
+                    if channel.recv_stderr_ready():
+                        data = channel.recv_stderr(BUFFER_SIZE)
+
+                        if data:
+                            send_frame(conn, FRAME_STDERR, data)
+
+                    if ((channel.closed or channel.exit_status_ready()) and
+                        not channel.recv_ready() and
+                        not channel.recv_stderr_ready()):
+                        break
+
+            send_frame(conn, FRAME_EXIT_STATUS,
+                       _EXIT_STATUS.pack(channel.recv_exit_status()))
+        finally:
+            channel.close()
+
+
+def _recv_exactly(sock, length):
+    """Receives exactly ``length`` bytes from a socket."""
+    chunks = []
+
+    while length > 0:
+        data = sock.recv(min(length, BUFFER_SIZE))
+
+        if not data:
+            raise ControlSocketClosedError()
+
+        chunks.append(data)
+        length -= len(data)
+
+    return b''.join(chunks)
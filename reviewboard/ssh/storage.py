@@ -3,6 +3,8 @@ from __future__ import unicode_literals
 import logging
 import os
 
+from django.db.models import F
+from django.utils import six
 from django.utils.translation import ugettext_lazy as _
 import paramiko
 
@@ -13,6 +15,19 @@ class SSHStorage(object):
     def __init__(self, namespace=None):
         self.namespace = namespace
 
+    def get_version(self):
+        """Returns a value representing the current state of the keys.
+
+        This must change whenever the user key or host keys change, even if
+        they were changed by another process. It's used to decide whether
+        keys that were already loaded and parsed in this process can be
+        reused, and should be much cheaper than reading the keys.
+
+        If this returns None (the default), keys are read from storage
+        every time they're needed.
+        """
+        return None
+
     def read_user_key(self):
         """Reads the user key.
 
@@ -86,6 +101,29 @@ class FileSSHStorage(SSHStorage):
 
     _ssh_dir = None
 
+    def get_version(self):
+        """Returns a value representing the current state of the key files.
+
+        This is based on the path, modification time and size of the host
+        keys file and each possible user key file.
+        """
+        paths = [self.get_host_keys_filename()]
+
+        for cls, filename in self.DEFAULT_KEY_FILES:
+            for sshdir in self.SSH_DIRS:
+                paths.append(os.path.join(self.get_ssh_dir(sshdir), filename))
+
+        version = []
+
+        for path in paths:
+            try:
+                stat = os.stat(path)
+                version.append((path, stat.st_mtime, stat.st_size))
+            except OSError:
+                version.append((path, None, None))
+
+        return tuple(version)
+
     def get_user_key_info(self):
         for cls, filename in self.DEFAULT_KEY_FILES:
             # Paramiko looks in ~/.ssh and ~/ssh, depending on the platform,
@@ -265,3 +303,127 @@ class FileSSHStorage(SSHStorage):
                 raise MakeSSHDirError(sshdir)
 
         return sshdir
+
+
+class DBSSHStorage(SSHStorage):
+    """Stores SSH keys in the database.
+
+    This lets all servers in a multi-server deployment share the same keys
+    without a shared filesystem. Each namespace has its own
+    :py:class:`reviewboard.ssh.models.SSHKeyStore`.
+
+    Like the key files used by :py:class:`FileSSHStorage`, the user key is
+    stored unencrypted.
+
+    To use this, set ``RBSSH_STORAGE_BACKEND`` in settings_local.py to
+    ``'reviewboard.ssh.storage.DBSSHStorage'``.
+    """
+    KEY_TYPES = {
+        'ssh-rsa': paramiko.RSAKey,
+        'ssh-dss': paramiko.DSSKey,
+    }
+
+    def get_version(self):
+        """Returns the version of the key store.
+
+        This costs a single query.
+        """
+        keystore = self._get_keystore()
+
+        if keystore is None:
+            return 0
+        else:
+            return keystore.version
+
+    def read_user_key(self):
+        keystore = self._get_keystore()
+
+        if keystore is None or not keystore.user_key:
+            return None
+
+        cls = self.KEY_TYPES.get(keystore.user_key_type)
+
+        if cls is None:
+            raise UnsupportedSSHKeyError()
+
+        return cls.from_private_key(six.StringIO(keystore.user_key))
+
+    def write_user_key(self, key):
+        if not isinstance(key, tuple(six.itervalues(self.KEY_TYPES))):
+            raise UnsupportedSSHKeyError()
+
+        fp = six.StringIO()
+        key.write_private_key(fp)
+
+        keystore = self._get_keystore(create=True)
+        keystore.user_key = fp.getvalue()
+        keystore.user_key_type = key.get_name()
+        keystore.save(update_fields=('user_key', 'user_key_type'))
+        self._increment_version(keystore)
+
+    def delete_user_key(self):
+        keystore = self._get_keystore()
+
+        if keystore is not None and keystore.user_key:
+            keystore.user_key = ''
+            keystore.user_key_type = ''
+            keystore.save(update_fields=('user_key', 'user_key_type'))
+            self._increment_version(keystore)
+
+    def read_authorized_keys(self):
+        # Authorized keys are only meaningful for the local filesystem.
+        return []
+
+    def read_host_keys(self):
+        keystore = self._get_keystore()
+
+        if keystore is None:
+            return []
+
+        return [
+            '%s %s %s' % (host_key.hostname, host_key.key_type,
+                          host_key.key_base64)
+            for host_key in keystore.host_keys.order_by('pk')
+        ]
+
+    def add_host_key(self, hostname, key):
+        keystore = self._get_keystore(create=True)
+        keystore.host_keys.create(hostname=hostname,
+                                  key_type=key.get_name(),
+                                  key_base64=key.get_base64())
+        self._increment_version(keystore)
+
+    def replace_host_key(self, hostname, old_key, new_key):
+        keystore = self._get_keystore()
+
+        if keystore is None:
+            self.add_host_key(hostname, new_key)
+            return
+
+        keystore.host_keys.filter(key_base64=old_key.get_base64()).update(
+            key_type=new_key.get_name(),
+            key_base64=new_key.get_base64())
+        self._increment_version(keystore)
+
+    def _get_keystore(self, create=False):
+        """Returns the key store for the namespace.
+
+        If there isn't one, this creates it if ``create`` is set, and
+        otherwise returns None.
+        """
+        from reviewboard.ssh.models import SSHKeyStore
+
+        namespace = self.namespace or ''
+
+        if create:
+            return SSHKeyStore.objects.get_or_create(namespace=namespace)[0]
+
+        try:
+            return SSHKeyStore.objects.get(namespace=namespace)
+        except SSHKeyStore.DoesNotExist:
+            return None
+
+    def _increment_version(self, keystore):
+        """Marks the keys in a key store as changed."""
+        keystore.__class__.objects.filter(pk=keystore.pk).update(
+            version=F('version') + 1)
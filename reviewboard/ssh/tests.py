@@ -2,13 +2,23 @@ from __future__ import unicode_literals
 
 import os
 import shutil
+import socket
 import tempfile
+import threading
 
 import paramiko
+from kgb import SpyAgency
 
+from reviewboard.ssh import client as ssh_client
+from reviewboard.ssh import multiplex
 from reviewboard.ssh.client import SSHClient
 from reviewboard.ssh.errors import UnsupportedSSHKeyError
-from reviewboard.ssh.storage import FileSSHStorage
+from reviewboard.ssh.multiplex import (FRAME_STDIN, FRAME_STDOUT,
+                                       ensure_control_dir, get_control_path,
+                                       is_control_dir_secure,
+                                       is_trusted_peer, recv_frame,
+                                       run_session, send_frame)
+from reviewboard.ssh.storage import DBSSHStorage, FileSSHStorage
 from reviewboard.testing.testcase import TestCase
 
 
@@ -20,6 +30,7 @@ class SSHTestCase(TestCase):
         self.tempdir = None
         os.environ['RBSSH_ALLOW_AGENT'] = '0'
         FileSSHStorage._ssh_dir = None
+        ssh_client._cached_keys.clear()
 
         if not hasattr(SSHTestCase, 'key1'):
             SSHTestCase.key1 = paramiko.RSAKey.generate(1024)
@@ -144,6 +155,19 @@ class FileSSHStorageTests(SSHTestCase):
         self.assertEqual(len(lines), 1)
         self.assertEqual(lines[0], 'host1 ssh-dss %s\n' % self.key2_b64)
 
+    def test_get_version(self):
+        """Testing FileSSHStorage.get_version"""
+        storage = FileSSHStorage()
+        version = storage.get_version()
+        self.assertEqual(storage.get_version(), version)
+
+        storage.add_host_key('host1', self.key1)
+        self.assertNotEqual(storage.get_version(), version)
+        version = storage.get_version()
+
+        storage.write_user_key(self.key1)
+        self.assertNotEqual(storage.get_version(), version)
+
 
 class SSHClientTests(SSHTestCase):
     """Unit tests for SSHClient."""
@@ -239,3 +263,244 @@ class SSHClientTests(SSHTestCase):
     def test_import_user_key_with_localsite(self):
         """Testing SSHClient.import_user_key with localsite"""
         self.test_import_user_key('site-1')
+
+    def test_load_host_keys_cached(self):
+        """Testing SSHClient reusing host keys loaded by another client"""
+        self._set_home(self.tempdir)
+        SSHClient().add_host_key('example.com', self.key1)
+
+        client1 = SSHClient()
+        client2 = SSHClient()
+        entries1 = client1.get_host_keys()._entries
+        entries2 = client2.get_host_keys()._entries
+
+        self.assertEqual(len(entries1), 1)
+        self.assertEqual(len(entries2), 1)
+        self.assertIsNot(entries1[0], entries2[0])
+        self.assertIs(entries1[0].key, entries2[0].key)
+
+    def test_load_host_keys_cached_after_change(self):
+        """Testing SSHClient loading host keys again after they change"""
+        self._set_home(self.tempdir)
+        client = SSHClient()
+        client.add_host_key('example.com', self.key1)
+        self.assertEqual(len(SSHClient().get_host_keys()), 1)
+
+        # Write the file directly, as another process would.
+        with open(client.storage.get_host_keys_filename(), 'a') as fp:
+            fp.write('example.org ssh-dss %s\n' % self.key2_b64)
+
+        self.assertEqual(len(SSHClient().get_host_keys()), 2)
+
+
+class DBSSHStorageTests(SSHTestCase):
+    """Unit tests for DBSSHStorage."""
+    def test_user_key(self):
+        """Testing DBSSHStorage user key storage"""
+        storage = DBSSHStorage()
+        self.assertIsNone(storage.read_user_key())
+
+        storage.write_user_key(self.key1)
+        self.assertEqual(storage.read_user_key(), self.key1)
+
+        storage.delete_user_key()
+        self.assertIsNone(storage.read_user_key())
+
+    def test_write_user_key_unsupported(self):
+        """Testing DBSSHStorage.write_user_key with unsupported key type"""
+        storage = DBSSHStorage()
+        self.assertRaises(UnsupportedSSHKeyError,
+                          lambda: storage.write_user_key(123))
+
+    def test_host_keys(self):
+        """Testing DBSSHStorage host key storage"""
+        storage = DBSSHStorage()
+        self.assertEqual(storage.read_host_keys(), [])
+
+        storage.add_host_key('host1', self.key1)
+        storage.add_host_key('host2', self.key1)
+        storage.replace_host_key('host2', self.key1, self.key2)
+
+        self.assertEqual(storage.read_host_keys(), [
+            'host1 ssh-dss %s' % self.key2_b64,
+            'host2 ssh-dss %s' % self.key2_b64,
+        ])
+
+    def test_namespaces(self):
+        """Testing DBSSHStorage keeping namespaces separate"""
+        DBSSHStorage().add_host_key('host1', self.key1)
+        DBSSHStorage(namespace='site-1').write_user_key(self.key2)
+
+        self.assertEqual(DBSSHStorage().read_host_keys(),
+                         ['host1 ssh-rsa %s' % self.key1_b64])
+        self.assertIsNone(DBSSHStorage().read_user_key())
+        self.assertEqual(DBSSHStorage(namespace='site-1').read_host_keys(),
+                         [])
+        self.assertEqual(DBSSHStorage(namespace='site-1').read_user_key(),
+                         self.key2)
+
+    def test_get_version(self):
+        """Testing DBSSHStorage.get_version"""
+        storage = DBSSHStorage()
+        self.assertEqual(storage.get_version(), 0)
+
+        storage.add_host_key('host1', self.key1)
+        self.assertEqual(storage.get_version(), 1)
+
+        storage.write_user_key(self.key1)
+        self.assertEqual(storage.get_version(), 2)
+
+        with self.assertNumQueries(1):
+            storage.get_version()
+
+    def test_client(self):
+        """Testing SSHClient with DBSSHStorage"""
+        with self.settings(
+                RBSSH_STORAGE_BACKEND='reviewboard.ssh.storage.DBSSHStorage'):
+            client = SSHClient()
+            client.add_host_key('example.com', self.key1)
+            client.import_user_key(self.key2)
+
+            client = SSHClient()
+            self.assertEqual(client.get_user_key(), self.key2)
+            self.assertEqual(len(client.get_host_keys()), 1)
+
+            # Loading the keys again only needs to check the version.
+            with self.assertNumQueries(2):
+                client = SSHClient()
+                self.assertEqual(client.get_user_key(), self.key2)
+
+
+class MultiplexTests(SpyAgency, TestCase):
+    """Unit tests for reviewboard.ssh.multiplex."""
+    def test_get_control_path(self):
+        """Testing get_control_path"""
+        path1 = get_control_path('/tmp/rb', 'user', 'example.com', 22)
+        path2 = get_control_path('/tmp/rb', 'user', 'example.com', 22,
+                                 'site-1')
+
+        self.assertTrue(path1.startswith('/tmp/rb/rbssh-'))
+        self.assertNotEqual(path1, path2)
+        self.assertEqual(
+            path1, get_control_path('/tmp/rb', 'user', 'example.com', 22))
+
+    def test_send_recv_frame(self):
+        """Testing send_frame and recv_frame"""
+        sock1, sock2 = socket.socketpair()
+        data = b'x' * (256 * 1024)
+
+        try:
+            send_frame(sock1, FRAME_STDOUT, b'')
+            send_frame(sock1, FRAME_STDIN, b'abc')
+            self.assertEqual(recv_frame(sock2), (FRAME_STDOUT, b''))
+            self.assertEqual(recv_frame(sock2), (FRAME_STDIN, b'abc'))
+
+            # Frames larger than the socket buffers need to arrive whole.
+            thread = threading.Thread(target=send_frame,
+                                      args=(sock2, FRAME_STDOUT, data))
+            thread.start()
+            self.assertEqual(recv_frame(sock1), (FRAME_STDOUT, data))
+            thread.join()
+        finally:
+            sock1.close()
+            sock2.close()
+
+    def test_run_session_without_master(self):
+        """Testing run_session without a control master"""
+        tempdir = tempfile.mkdtemp(prefix='rb-tests-control-')
+
+        try:
+            control_path = get_control_path(tempdir, 'user', 'example.com',
+                                            22)
+            self.assertIsNone(run_session(control_path, command='ls'))
+        finally:
+            shutil.rmtree(tempdir)
+
+    def test_run_session_with_untrusted_master(self):
+        """Testing run_session with a control master belonging to another
+        user
+        """
+        self.spy_on(multiplex.is_trusted_peer,
+                    call_fake=lambda sock, control_path: False)
+
+        tempdir = tempfile.mkdtemp(prefix='rb-tests-control-')
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+        try:
+            control_path = get_control_path(tempdir, 'user', 'example.com',
+                                            22)
+            listener.bind(control_path)
+            listener.listen(1)
+
+            self.assertIsNone(run_session(control_path, command='ls'))
+            self.assertTrue(multiplex.is_trusted_peer.spy.called)
+
+            # Nothing was sent to the master.
+            conn = listener.accept()[0]
+
+            try:
+                self.assertEqual(conn.recv(1024), b'')
+            finally:
+                conn.close()
+        finally:
+            listener.close()
+            shutil.rmtree(tempdir)
+
+    def test_is_trusted_peer(self):
+        """Testing is_trusted_peer with a socket owned by the current user"""
+        sock1, sock2 = socket.socketpair()
+
+        try:
+            self.assertTrue(is_trusted_peer(sock1, None))
+        finally:
+            sock1.close()
+            sock2.close()
+
+    def test_is_control_dir_secure(self):
+        """Testing is_control_dir_secure"""
+        tempdir = tempfile.mkdtemp(prefix='rb-tests-control-')
+
+        try:
+            self.assertTrue(is_control_dir_secure(tempdir))
+
+            os.chmod(tempdir, 0o755)
+            self.assertFalse(is_control_dir_secure(tempdir))
+
+            os.chmod(tempdir, 0o700)
+            link_path = os.path.join(tempdir, 'link')
+            os.symlink(tempdir, link_path)
+            self.assertFalse(is_control_dir_secure(link_path))
+        finally:
+            shutil.rmtree(tempdir)
+
+    def test_ensure_control_dir(self):
+        """Testing ensure_control_dir"""
+        tempdir = tempfile.mkdtemp(prefix='rb-tests-control-')
+
+        try:
+            control_dir = os.path.join(tempdir, 'control')
+            self.assertTrue(ensure_control_dir(control_dir))
+            self.assertTrue(os.path.isdir(control_dir))
+
+            # Existing directories are checked.
+            os.chmod(control_dir, 0o777)
+            self.assertFalse(ensure_control_dir(control_dir))
+        finally:
+            shutil.rmtree(tempdir)
+
+    def test_run_session_with_insecure_control_dir(self):
+        """Testing run_session with a control directory that others can
+        write to
+        """
+        self.spy_on(multiplex.is_trusted_peer)
+
+        tempdir = tempfile.mkdtemp(prefix='rb-tests-control-')
+        os.chmod(tempdir, 0o777)
+
+        try:
+            control_path = get_control_path(tempdir, 'user', 'example.com',
+                                            22)
+            self.assertIsNone(run_session(control_path, command='ls'))
+            self.assertFalse(multiplex.is_trusted_peer.spy.called)
+        finally:
+            shutil.rmtree(tempdir)
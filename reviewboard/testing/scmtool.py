@@ -9,6 +9,7 @@ from reviewboard.scmtools.git import GitTool
 
 class TestTool(GitTool):
     name = 'Test'
+    supports_batched_files = False
     supports_post_commit = True
 
     def get_repository_info(self):
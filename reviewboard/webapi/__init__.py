@@ -0,0 +1,13 @@
+from __future__ import unicode_literals
+
+from reviewboard.signals import initializing
+
+
+def _connect_signals(**kwargs):
+    """Connects the Web API's signal handlers once Django is loaded."""
+    from reviewboard.webapi import auth_backends
+
+    auth_backends.connect_signals()
+
+
+initializing.connect(_connect_signals)
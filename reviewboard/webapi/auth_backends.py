@@ -1,11 +1,19 @@
 from __future__ import unicode_literals
 
+import copy
 import logging
 
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from djblets.cache.backend import make_cache_key
 from djblets.webapi.auth import WebAPIAuthBackend
 
+from reviewboard.accounts.auth_cache import (AUTH_CACHE_EXPIRATION,
+                                             get_cached_user_auth_data,
+                                             invalidate_user_auth_cache)
 from reviewboard.accounts.backends import AuthBackend
 from reviewboard.webapi.models import WebAPIToken
+from reviewboard.webapi.policy import CompiledWebAPIPolicy
 
 
 class TokenAuthBackend(AuthBackend):
@@ -20,11 +28,9 @@ class TokenAuthBackend(AuthBackend):
         # Find the WebAPIToken matching the token parameter passed in.
         # Once we have it, we'll need to perform some additional checks on
         # the user.
-        q = WebAPIToken.objects.filter(token=token).select_related('user')
+        webapi_token = get_webapi_token(token)
 
-        try:
-            webapi_token = q.get()
-        except WebAPIToken.DoesNotExist:
+        if webapi_token is None:
             return None
 
         user = webapi_token.user
@@ -82,3 +88,99 @@ class WebAPITokenAuthBackend(WebAPIAuthBackend):
             request._webapi_token = webapi_token
 
         return result
+
+
+def get_webapi_token(token):
+    """Returns the WebAPIToken for a token string, with its user.
+
+    The token is loaded from the authentication cache, if possible. This
+    returns None if the token doesn't exist.
+    """
+    # The owner is needed to find the token in the user's cached data.
+    owner_key = _make_owner_cache_key(token)
+    user_id = cache.get(owner_key)
+
+    if user_id is None:
+        user_ids = list(WebAPIToken.objects.filter(token=token)
+                        .values_list('user', flat=True)[:1])
+
+        if not user_ids:
+            return None
+
+        user_id = user_ids[0]
+        cache.set(owner_key, user_id, AUTH_CACHE_EXPIRATION)
+
+    return _get_cached_webapi_token(user_id, 'webapi-token-%s' % token,
+                                    token=token)
+
+
+def get_webapi_token_for_user(user, token_id):
+    """Returns a user's WebAPIToken with the given ID.
+
+    The token is loaded from the authentication cache, if possible. This
+    returns None if the user doesn't own a token with that ID.
+    """
+    if not user.is_authenticated():
+        return None
+
+    return _get_cached_webapi_token(user.pk, 'webapi-token-id-%s' % token_id,
+                                    pk=token_id)
+
+
+def get_compiled_token_policy(webapi_token):
+    """Returns the compiled resources policy for a WebAPIToken.
+
+    This returns None if the token's policy doesn't restrict any resources.
+    """
+    resources_policy = (webapi_token.policy or {}).get('resources')
+
+    if not resources_policy:
+        return None
+
+    return get_cached_user_auth_data(
+        webapi_token.user_id,
+        'webapi-token-policy-%s' % webapi_token.pk,
+        lambda: CompiledWebAPIPolicy(resources_policy))
+
+
+def _get_cached_webapi_token(user_id, name, **query):
+    """Returns a copy of a user's WebAPIToken from the cache.
+
+    ``query`` identifies the token among the user's tokens.
+    """
+    def _load_token():
+        try:
+            return (WebAPIToken.objects
+                    .select_related('user')
+                    .get(user=user_id, **query))
+        except WebAPIToken.DoesNotExist:
+            return None
+
+    webapi_token = get_cached_user_auth_data(user_id, name, _load_token)
+
+    if webapi_token is None:
+        return None
+
+    # The cached token and user may be shared with other requests, and the
+    # caller will modify them.
+    user = copy.copy(webapi_token.user)
+    webapi_token = copy.copy(webapi_token)
+    webapi_token.user = user
+
+    return webapi_token
+
+
+def _on_webapi_token_changed(sender, instance, **kwargs):
+    """Invalidates the cached data for a WebAPIToken when it changes."""
+    cache.delete(_make_owner_cache_key(instance.token))
+    invalidate_user_auth_cache(instance.user_id)
+
+
+def connect_signals():
+    post_save.connect(_on_webapi_token_changed, sender=WebAPIToken)
+    post_delete.connect(_on_webapi_token_changed, sender=WebAPIToken)
+
+
+def _make_owner_cache_key(token):
+    """Returns the cache key for the ID of a token's owner."""
+    return make_cache_key('webapi-token-owner-%s' % token)
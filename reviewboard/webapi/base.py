@@ -1,22 +1,32 @@
 from __future__ import unicode_literals
 
+import copy
+import hashlib
+
 from django.contrib import auth
+from django.core.cache import cache
 from django.db.models import Q
 from django.utils import six
 from django.utils.encoding import force_unicode
 from django.utils.six.moves.urllib.parse import quote as urllib_quote
+from djblets.cache.backend import make_cache_key
 from djblets.util.decorators import augment_method_from
 from djblets.webapi.decorators import (SPECIAL_PARAMS,
                                        webapi_login_required,
                                        webapi_request_fields)
-from djblets.webapi.errors import NOT_LOGGED_IN, PERMISSION_DENIED
+from djblets.webapi.errors import (INVALID_FORM_DATA, NOT_LOGGED_IN,
+                                   PERMISSION_DENIED)
 from djblets.webapi.resources import WebAPIResource as DjbletsWebAPIResource
 
 from reviewboard.site.models import LocalSite
 from reviewboard.site.urlresolvers import local_site_reverse
+from reviewboard.webapi.auth_backends import (get_compiled_token_policy,
+                                              get_webapi_token_for_user)
 from reviewboard.webapi.decorators import (webapi_check_local_site,
                                            webapi_check_login_required)
-from reviewboard.webapi.models import WebAPIToken
+from reviewboard.webapi.pagination import (CursorWebAPIResponsePaginated,
+                                           decode_cursor)
+from reviewboard.webapi.policy import CompiledWebAPIPolicy
 
 
 CUSTOM_MIMETYPE_BASE = 'application/vnd.reviewboard.org'
@@ -31,6 +41,16 @@ class WebAPIResource(DjbletsWebAPIResource):
 
     api_token_access_allowed = True
 
+    #: The field to order results by for ``?cursor=`` pagination.
+    #:
+    #: If None, the resource only supports ``?start=`` pagination. This
+    #: should be ``pk`` or an indexed field (preferably one that increases
+    #: when objects change), and the list's queryset must not be sliced.
+    cursor_pagination_field = None
+
+    #: How long, in seconds, to cache counts for ``?approximate-counts=1``.
+    approximate_count_expiration = 60
+
     @property
     def policy_id(self):
         """Returns the ID used for access policies.
@@ -48,14 +68,13 @@ class WebAPIResource(DjbletsWebAPIResource):
             if not self.api_token_access_allowed:
                 return PERMISSION_DENIED
 
-            policy = webapi_token.policy
-            resources_policy = policy.get('resources')
+            policy = get_compiled_token_policy(webapi_token)
 
-            if resources_policy:
+            if policy is not None:
                 resource_id = kwargs.get(self.uri_object_key)
 
-                if not self.is_resource_method_allowed(resources_policy,
-                                                       method, resource_id):
+                if not policy.is_method_allowed(self.policy_id, method,
+                                                resource_id):
                     # The token's policies disallow access to this resource.
                     return PERMISSION_DENIED
 
@@ -89,6 +108,14 @@ class WebAPIResource(DjbletsWebAPIResource):
                                'returned with the number of results, instead '
                                'of the results themselves.',
             },
+            'approximate-counts': {
+                'type': bool,
+                'description': 'If specified along with ``counts-only``, '
+                               'the count may be up to a minute old. This '
+                               'is much cheaper for large lists, and is '
+                               'useful for clients that poll for counts.',
+                'added_in': '2.5',
+            },
         }, **DjbletsWebAPIResource.get_list.optional_fields),
         required=DjbletsWebAPIResource.get_list.required_fields,
         allow_unknown=True
@@ -102,11 +129,34 @@ class WebAPIResource(DjbletsWebAPIResource):
         If ``?counts-only=1`` is passed on the URL, then this will return
         only a ``count`` field with the number of entries, instead of the
         serialized objects.
+
+        If ``?approximate-counts=1`` is passed as well, the count is cached
+        for a short time, so that clients polling for counts don't need to
+        count large lists on every request.
         """
         if self.model and request.GET.get('counts-only', False):
+            def _get_count():
+                return self.get_queryset(request, is_list=True,
+                                         *args, **kwargs).count()
+
+            if request.GET.get('approximate-counts', False):
+                # The count depends on the user's access and the full
+                # query, so both are part of the key.
+                query_hash = hashlib.sha1(
+                    request.get_full_path().encode('utf-8')).hexdigest()
+                cache_key = make_cache_key(
+                    'webapi-list-count-%s-%s' % (request.user.pk, query_hash))
+                count = cache.get(cache_key)
+
+                if count is None:
+                    count = _get_count()
+                    cache.set(cache_key, count,
+                              self.approximate_count_expiration)
+            else:
+                count = _get_count()
+
             return 200, {
-                'count': self.get_queryset(request, is_list=True,
-                                           *args, **kwargs).count()
+                'count': count,
             }
         else:
             return self._get_list_impl(request, *args, **kwargs)
@@ -123,9 +173,46 @@ class WebAPIResource(DjbletsWebAPIResource):
         This by default calls the parent WebAPIResource.get_list, but this
         can be overridden by subclasses to provide a more custom
         implementation while still retaining the ?counts-only=1 functionality.
+
+        If the resource has a ``cursor_pagination_field`` and ``?cursor=``
+        is passed, the results are paginated using cursors instead.
         """
+        if (self.cursor_pagination_field is not None and
+            'cursor' in request.GET):
+            return self._get_cursor_list(request, *args, **kwargs)
+
         return super(WebAPIResource, self).get_list(request, *args, **kwargs)
 
+    def _get_cursor_list(self, request, *args, **kwargs):
+        """Returns the list of results, paginated using cursors."""
+        if not self.has_list_access_permissions(request, *args, **kwargs):
+            return self._no_access_error(request.user)
+
+        try:
+            after = decode_cursor(request.GET['cursor'], self.model,
+                                  self.cursor_pagination_field)
+        except ValueError:
+            return INVALID_FORM_DATA, {
+                'fields': {
+                    'cursor': 'This is not a valid cursor.',
+                },
+            }
+
+        return CursorWebAPIResponsePaginated(
+            request,
+            queryset=self._get_queryset(request, is_list=True,
+                                        *args, **kwargs),
+            cursor_field=self.cursor_pagination_field,
+            after=after,
+            results_key=self.list_result_key,
+            serialize_object_func=lambda obj: self.serialize_object(
+                obj, request=request, *args, **kwargs),
+            extra_data={
+                'links': self.get_links(self.list_child_resources,
+                                        request=request, *args, **kwargs),
+            },
+            **self.build_response_args(request))
+
     def get_href(self, obj, request, *args, **kwargs):
         """Returns the URL for this object.
 
@@ -184,6 +271,67 @@ class WebAPIResource(DjbletsWebAPIResource):
 
         return q
 
+    def get_serialized_fields(self, request):
+        """Returns the names of the fields a request needs serialized.
+
+        This plans serialization around ``?only-fields=`` and
+        ``?only-links=``. A field is needed if it will be included in the
+        payload, or if it refers to another resource and may be included
+        as a link. If neither argument is passed, all fields are needed.
+
+        Fields that aren't needed are skipped when serializing objects
+        (see :py:meth:`serialize_object`), so their serializers are never
+        called. get_queryset() implementations can check this to skip
+        database queries for those fields.
+
+        The result is cached on the request.
+        """
+        if request is None:
+            return frozenset(six.iterkeys(self.fields))
+
+        if not hasattr(request, '_webapi_serialized_fields'):
+            request._webapi_serialized_fields = {}
+
+        try:
+            return request._webapi_serialized_fields[self]
+        except KeyError:
+            pass
+
+        only_fields = self.get_only_fields(request)
+
+        if only_fields is None:
+            fields = frozenset(six.iterkeys(self.fields))
+        else:
+            only_links = self.get_only_links(request)
+            fields = set(only_fields)
+
+            if only_links != []:
+                fields.update(
+                    field
+                    for field, field_info in six.iteritems(self.fields)
+                    if ((only_links is None or field in only_links) and
+                        self._is_link_field(field_info))
+                )
+
+            fields = frozenset(fields.intersection(six.iterkeys(self.fields)))
+
+        request._webapi_serialized_fields[self] = fields
+
+        return fields
+
+    def serialize_object(self, obj, *args, **kwargs):
+        """Serializes the object into a Python dictionary.
+
+        This is a specialization of the Djblets
+        WebAPIResource.serialize_object(), which skips any fields that the
+        request doesn't need (see :py:meth:`get_serialized_fields`), rather
+        than serializing them and throwing the results away.
+        """
+        resource = self._get_serializing_resource(kwargs.get('request'))
+
+        return super(WebAPIResource, resource).serialize_object(
+            obj, *args, **kwargs)
+
     def can_import_extra_data_field(self, obj, field):
         """Returns whether a particular field in extra_data can be imported.
 
@@ -205,63 +353,38 @@ class WebAPIResource(DjbletsWebAPIResource):
 
         If no policies apply to this, then the default is to allow.
         """
-        # First check the resource policy. For this, we'll want to look in
-        # both the resource ID and the '*' wildcard.
-        resource_policy = resources_policy.get(self.policy_id)
+        return CompiledWebAPIPolicy(resources_policy).is_method_allowed(
+            self.policy_id, method, resource_id)
 
-        if resource_policy:
-            permission = self._check_resource_policy(
-                resource_policy, method, [resource_id, '*'])
+    def _get_serializing_resource(self, request):
+        """Returns the resource used to serialize objects for a request.
 
-            if permission is not None:
-                return permission
-
-        # Nothing was found there. Now check in the global policy. Note that
-        # there isn't a sub-key of 'resources.*', so we'll check based on
-        # resources_policy.
-        if '*' in resources_policy:
-            permission = self._check_resource_policy(
-                resources_policy, method, ['*'])
+        Djblets serializes every field in :py:attr:`fields`. If the request
+        doesn't need all of them, this returns a copy of the resource with
+        only the fields it needs. The copy is cached on the request.
+        """
+        serialized_fields = self.get_serialized_fields(request)
 
-            if permission is not None:
-                return permission
+        if len(serialized_fields) == len(self.fields):
+            return self
 
-        return True
+        if not hasattr(request, '_webapi_serializing_resources'):
+            request._webapi_serializing_resources = {}
 
-    def _check_resource_policy(self, policy, method, keys):
-        """Checks the policy for a specific resource and method.
+        try:
+            return request._webapi_serializing_resources[self]
+        except KeyError:
+            pass
 
-        This will grab the resource policy for the given policy ID,
-        and see if a given method can be performed on that resource,
-        without factoring in any global policy rules.
+        resource = copy.copy(self)
+        resource.fields = dict(
+            (field, field_info)
+            for field, field_info in six.iteritems(self.fields)
+            if field in serialized_fields
+        )
+        request._webapi_serializing_resources[self] = resource
 
-        If the method is allowed and restrict_ids is True, this will then
-        check if the resource should be blocked based on the ID.
-
-        In case of a conflict, blocked policies always trump allowed
-        policies.
-        """
-        for key in keys:
-            sub_policy = policy.get(key)
-
-            if sub_policy:
-                # We first want to check the specific values, to see if they've
-                # been singled out. If not found, we'll check the wildcards.
-                #
-                # Blocked values always take precedence over allowed values.
-                allowed = sub_policy.get('allow', [])
-                blocked = sub_policy.get('block', [])
-
-                if method in blocked:
-                    return False
-                elif method in allowed:
-                    return True
-                elif '*' in blocked:
-                    return False
-                elif '*' in allowed:
-                    return True
-
-        return None
+        return resource
 
     def _get_api_token_for_request(self, request):
         webapi_token = getattr(request, '_webapi_token', None)
@@ -270,10 +393,10 @@ class WebAPIResource(DjbletsWebAPIResource):
             webapi_token_id = request.session.get('webapi_token_id')
 
             if webapi_token_id:
-                try:
-                    webapi_token = WebAPIToken.objects.get(pk=webapi_token_id,
-                                                           user=request.user)
-                except WebAPIToken.DoesNotExist:
+                webapi_token = get_webapi_token_for_user(request.user,
+                                                         webapi_token_id)
+
+                if webapi_token is None:
                     # This token is no longer valid. Log the user out.
                     auth.logout(request)
 
@@ -300,17 +423,15 @@ class WebAPIResource(DjbletsWebAPIResource):
             webapi_token = self._get_api_token_for_request(request)
 
             if webapi_token:
-                resources_policy = webapi_token.policy.get('resources', {})
-                resource_policy = resources_policy.get(self.policy_id)
+                policy = get_compiled_token_policy(webapi_token)
 
-                if resource_policy:
+                if policy is not None:
                     resource_ids = [
                         resource_id
-                        for resource_id in six.iterkeys(resource_policy)
-                        if (resource_id != '*' and
-                            not self._check_resource_policy(
-                                resources_policy, self.policy_id, 'GET',
-                                resource_id, True))
+                        for resource_id in policy.get_resource_ids(
+                            self.policy_id)
+                        if not policy.is_method_allowed(
+                            self.policy_id, 'GET', resource_id)
                     ]
 
                     if resource_ids:
@@ -320,6 +441,19 @@ class WebAPIResource(DjbletsWebAPIResource):
 
         return queryset
 
+    def _is_link_field(self, field_info):
+        """Returns whether a field may be serialized as a link.
+
+        Fields referring to a single resource are serialized as links,
+        unless they're expanded. Fields referring to lists of resources are
+        not.
+        """
+        field_type = field_info.get('type')
+
+        return (isinstance(field_type, six.string_types) or
+                (isinstance(field_type, type) and
+                 issubclass(field_type, DjbletsWebAPIResource)))
+
     def _get_resource_url(self, name, local_site_name=None, request=None,
                           **kwargs):
         return local_site_reverse(
@@ -76,10 +76,20 @@ class MarkdownFieldsMixin(object):
             for extra_text_type in self._get_extra_text_types(obj, **kwargs)
         ])
 
+        serialized_fields = self.get_serialized_fields(request)
+
         for field, field_info in six.iteritems(self.fields):
             if not field_info.get('supports_text_types'):
                 continue
 
+            # Looking up the text type may require a database query, and
+            # converting the text can be expensive, so skip any text fields
+            # that the client hasn't asked for.
+            if (field not in serialized_fields and
+                self._get_text_type_field_name(field) not in
+                serialized_fields):
+                continue
+
             get_func = getattr(self, 'get_is_%s_rich_text' % field, None)
 
             if six.callable(get_func):
@@ -0,0 +1,162 @@
+"""Cursor-based pagination for lists of resources.
+
+The standard ``?start=`` pagination uses an offset into the list, which the
+database has to count its way through for every page. Deep pages on large
+lists get slower and slower, and results shift between pages when objects
+are added while paging.
+
+Resources that set
+:py:attr:`reviewboard.webapi.base.WebAPIResource.cursor_pagination_field`
+also support ``?cursor=``. Results are ordered by that field and then by
+ID, and each page's ``next`` link holds an opaque cursor encoding the
+position of the last result on the page. The next page is fetched by
+filtering for results after that position, which an index can serve
+directly. Since the ordering is ascending, objects added (or, for
+timestamp fields, updated) while paging appear at the end of the list,
+instead of shifting results between pages.
+"""
+
+from __future__ import unicode_literals
+
+import base64
+import json
+from datetime import datetime
+
+from django.db.models import DateTimeField, Q
+from django.utils import six
+from django.utils.dateparse import parse_datetime
+from djblets.webapi.responses import WebAPIResponsePaginated
+
+
+#: Request fields for the list resources supporting cursor pagination.
+CURSOR_REQUEST_FIELDS = {
+    'cursor': {
+        'type': six.text_type,
+        'description': 'Pages through the results using cursors rather '
+                       'than ``start``. Pass an empty value for the first '
+                       'page, and then follow the ``next`` links. These '
+                       'stay valid as new results are added, and deep '
+                       'pages are as fast as the first. ``prev`` links '
+                       'and ``total_results`` are not provided.',
+        'added_in': '2.5',
+    },
+}
+
+
+class CursorWebAPIResponsePaginated(WebAPIResponsePaginated):
+    """Provides paginated responses using cursors.
+
+    This is a specialization of WebAPIResponsePaginated that fetches the
+    results following the position in ``after`` (as returned by
+    :py:func:`decode_cursor`), rather than an offset. Only ``next`` links
+    are provided, and the total number of results isn't counted.
+    """
+    def __init__(self, request, queryset, cursor_field, after=None,
+                 *args, **kwargs):
+        self.cursor_field = cursor_field
+        self.after = after
+        self._has_next = False
+        self._next_cursor = None
+
+        super(CursorWebAPIResponsePaginated, self).__init__(
+            request, queryset=queryset, *args, **kwargs)
+
+    def has_prev(self):
+        return False
+
+    def has_next(self):
+        return self._has_next
+
+    def get_next_index(self):
+        return self._next_cursor
+
+    def get_results(self):
+        queryset = self.queryset
+
+        if self.after is not None:
+            value, pk = self.after
+
+            if self.cursor_field == 'pk':
+                queryset = queryset.filter(pk__gt=pk)
+            else:
+                queryset = queryset.filter(
+                    Q(**{'%s__gt' % self.cursor_field: value}) |
+                    Q(**{self.cursor_field: value, 'pk__gt': pk}))
+
+        if self.cursor_field == 'pk':
+            queryset = queryset.order_by('pk')
+        else:
+            queryset = queryset.order_by(self.cursor_field, 'pk')
+
+        # Fetch one more than needed, to find out if there's a next page.
+        results = list(queryset[:self.max_results + 1])
+
+        if len(results) > self.max_results:
+            results = results[:self.max_results]
+            self._has_next = True
+
+        if results:
+            self._next_cursor = encode_cursor(results[-1], self.cursor_field)
+
+        return results
+
+    def get_total_results(self):
+        return None
+
+    def build_pagination_url(self, full_path, start, max_results,
+                             query_parameters):
+        params = self.request.GET.copy()
+        params.pop('start', None)
+        params['cursor'] = start
+        params['max-results'] = max_results
+
+        return '%s?%s' % (full_path, params.urlencode())
+
+
+def encode_cursor(obj, cursor_field):
+    """Returns an opaque cursor for the position of an object in a list."""
+    if cursor_field == 'pk':
+        value = None
+    else:
+        value = getattr(obj, cursor_field)
+
+        if isinstance(value, datetime):
+            value = value.isoformat()
+
+    data = json.dumps([value, obj.pk]).encode('utf-8')
+
+    return base64.urlsafe_b64encode(data).decode('ascii')
+
+
+def decode_cursor(cursor, model, cursor_field):
+    """Returns the position encoded in a cursor.
+
+    This is a tuple of the value of ``cursor_field`` and the ID, to pass
+    as ``after`` to :py:class:`CursorWebAPIResponsePaginated`. An empty
+    cursor (for the first page) returns None.
+
+    ValueError is raised if the cursor is invalid.
+    """
+    if not cursor:
+        return None
+
+    try:
+        value, pk = json.loads(
+            base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+    except (TypeError, ValueError, UnicodeError):
+        raise ValueError('Invalid cursor')
+
+    if not isinstance(pk, six.integer_types):
+        raise ValueError('Invalid cursor')
+
+    if (cursor_field != 'pk' and
+        isinstance(model._meta.get_field(cursor_field), DateTimeField)):
+        if not isinstance(value, six.string_types):
+            raise ValueError('Invalid cursor')
+
+        value = parse_datetime(value)
+
+        if value is None:
+            raise ValueError('Invalid cursor')
+
+    return value, pk
@@ -0,0 +1,102 @@
+from __future__ import unicode_literals
+
+from django.utils import six
+
+
+class CompiledWebAPIPolicy(object):
+    """The resources section of a WebAPIToken policy, ready for lookups.
+
+    The ``allow`` and ``block`` lists of each section are turned into sets
+    up front, along with the result for methods not listed explicitly, so
+    that checking a method doesn't need to walk the policy.
+
+    The rules are the same as for
+    :py:meth:`reviewboard.webapi.base.WebAPIResource.
+    is_resource_method_allowed`.
+    """
+
+    def __init__(self, resources_policy):
+        self._resource_rules = {}
+        self._global_rule = None
+
+        for policy_id, resource_policy in six.iteritems(resources_policy):
+            if policy_id == '*':
+                if resource_policy:
+                    self._global_rule = self._compile_rule(resource_policy)
+            elif resource_policy:
+                self._resource_rules[policy_id] = dict(
+                    (key, self._compile_rule(rule))
+                    for key, rule in six.iteritems(resource_policy)
+                    if rule
+                )
+
+    def is_method_allowed(self, policy_id, method, resource_id):
+        """Returns whether a method can be performed on a resource.
+
+        The resource's own rules for ``resource_id`` are checked first,
+        then its ``*`` rules, and then the global rules. If none of them
+        mention the method, it's allowed.
+        """
+        rules = self._resource_rules.get(policy_id)
+
+        if rules:
+            for key in (resource_id, '*'):
+                rule = rules.get(key)
+
+                if rule is not None:
+                    permission = self._check_rule(rule, method)
+
+                    if permission is not None:
+                        return permission
+
+        if self._global_rule is not None:
+            permission = self._check_rule(self._global_rule, method)
+
+            if permission is not None:
+                return permission
+
+        return True
+
+    def get_resource_ids(self, policy_id):
+        """Returns the IDs of the resources with their own rules.
+
+        These are the IDs under the resource's section of the policy,
+        other than ``*``.
+        """
+        return [
+            resource_id
+            for resource_id in six.iterkeys(
+                self._resource_rules.get(policy_id, {}))
+            if resource_id != '*'
+        ]
+
+    def _compile_rule(self, rule):
+        """Compiles a section with allow and block lists.
+
+        This returns a tuple of the blocked methods, the allowed methods,
+        and the result for any other method (which is None if the section
+        doesn't decide).
+        """
+        blocked = frozenset(rule.get('block', []))
+        allowed = frozenset(rule.get('allow', []))
+
+        # Blocked methods always take precedence over allowed methods.
+        if '*' in blocked:
+            default = False
+        elif '*' in allowed:
+            default = True
+        else:
+            default = None
+
+        return blocked, allowed, default
+
+    def _check_rule(self, rule, method):
+        """Returns the result of a compiled rule for a method."""
+        blocked, allowed, default = rule
+
+        if method in blocked:
+            return False
+        elif method in allowed:
+            return True
+        else:
+            return default
@@ -9,6 +9,7 @@ from djblets.webapi.decorators import webapi_request_fields
 from reviewboard.reviews.models import Comment
 from reviewboard.webapi.base import WebAPIResource
 from reviewboard.webapi.decorators import webapi_check_local_site
+from reviewboard.webapi.pagination import CURSOR_REQUEST_FIELDS
 from reviewboard.webapi.resources import resources
 from reviewboard.webapi.resources.base_comment import BaseCommentResource
 
@@ -42,6 +43,7 @@ class BaseDiffCommentResource(BaseCommentResource):
     }, **BaseCommentResource.fields)
 
     uri_object_key = 'comment_id'
+    cursor_pagination_field = 'pk'
 
     allowed_methods = ('GET',)
 
@@ -100,7 +102,7 @@ class BaseDiffCommentResource(BaseCommentResource):
         return obj.review.get().user
 
     @webapi_request_fields(
-        optional={
+        optional=dict({
             'interdiff-revision': {
                 'type': int,
                 'description': 'The second revision in an interdiff revision '
@@ -117,7 +119,7 @@ class BaseDiffCommentResource(BaseCommentResource):
                 'description': 'Comma-separated list of fields to order by',
                 'added_in': '1.7.10'
             },
-        },
+        }, **CURSOR_REQUEST_FIELDS),
         allow_unknown=True
     )
     @augment_method_from(BaseCommentResource)
@@ -155,7 +155,12 @@ class BaseReviewResource(MarkdownFieldsMixin, WebAPIResource):
             # We don't want to show drafts in the list.
             q = q & Q(public=True)
 
-        return self.model.objects.filter(q)
+        queryset = self.model.objects.filter(q)
+
+        if 'user' in self.get_serialized_fields(request):
+            queryset = queryset.select_related('user')
+
+        return queryset
 
     def get_base_reply_to_field(self):
         raise NotImplementedError
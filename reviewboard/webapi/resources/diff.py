@@ -15,6 +15,7 @@ from djblets.webapi.errors import (DOES_NOT_EXIST, INVALID_ATTRIBUTE,
 
 from reviewboard.diffviewer.errors import DiffTooBigError, EmptyDiffError
 from reviewboard.diffviewer.models import DiffSet
+from reviewboard.diffviewer.precompute import get_diffset_precompute_status
 from reviewboard.reviews.forms import UploadDiffForm
 from reviewboard.reviews.models import ReviewRequest, ReviewRequestDraft
 from reviewboard.scmtools.errors import FileNotFoundError
@@ -84,6 +85,18 @@ class DiffResource(WebAPIResource):
                            'diff was uploaded.',
             'added_in': '1.7.13',
         },
+        'precompute_status': {
+            'type': dict,
+            'description': 'The progress of generating the diff data for '
+                           'the files in the diff ahead of time. This '
+                           'contains the ``state`` (``queued``, ``running``, '
+                           '``done``, ``cancelled`` or ``failed``), and the '
+                           '``total_files``, ``completed_files`` and '
+                           '``failed_files`` counts. This will be null if '
+                           'the diff data isn\'t being generated ahead of '
+                           'time.',
+            'added_in': '2.5',
+        },
     }
     item_child_resources = [
         resources.filediff,
@@ -100,6 +113,12 @@ class DiffResource(WebAPIResource):
         {'item': 'text/x-patch'},
     ]
 
+    def serialize_precompute_status_field(self, diffset, **kwargs):
+        if diffset.pk is None:
+            return None
+
+        return get_diffset_precompute_status(diffset)
+
     def get_queryset(self, request, *args, **kwargs):
         try:
             review_request = \
@@ -14,8 +14,11 @@ from djblets.webapi.errors import (DOES_NOT_EXIST, NOT_LOGGED_IN,
 from djblets.webapi.responses import WebAPIResponse
 
 from reviewboard.attachments.models import FileAttachment
-from reviewboard.diffviewer.diffutils import (get_diff_files,
-                                              populate_diff_chunks)
+from reviewboard.diffviewer.chunk_generator import highlight_chunk_lines
+from reviewboard.diffviewer.diffutils import (
+    compute_chunk_line_changed_regions,
+    get_diff_files,
+    populate_diff_chunks)
 from reviewboard.diffviewer.models import FileDiff
 from reviewboard.webapi.base import CUSTOM_MIMETYPE_BASE, WebAPIResource
 from reviewboard.webapi.decorators import (webapi_check_login_required,
@@ -421,10 +424,14 @@ class FileDiffResource(WebAPIResource):
         assert len(files) == 1
         f = files[0]
 
+        for chunk in f['chunks']:
+            compute_chunk_line_changed_regions(chunk)
+            highlight_chunk_lines(chunk)
+
         payload = {
             'diff_data': {
                 'binary': f['binary'],
-                'chunks': f['chunks'],
+                'chunks': list(f['chunks']),
                 'num_changes': f['num_changes'],
                 'changed_chunk_indexes': f['changed_chunk_indexes'],
                 'new_file': f['newfile'],
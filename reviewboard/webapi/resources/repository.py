@@ -33,6 +33,7 @@ from reviewboard.webapi.errors import (BAD_HOST_KEY,
                                        SERVER_CONFIG_ERROR,
                                        UNVERIFIED_HOST_CERT,
                                        UNVERIFIED_HOST_KEY)
+from reviewboard.webapi.pagination import CURSOR_REQUEST_FIELDS
 from reviewboard.webapi.resources import resources
 
 
@@ -89,6 +90,7 @@ class RepositoryResource(WebAPIResource):
         }
     }
     uri_object_key = 'repository_id'
+    cursor_pagination_field = 'pk'
     item_child_resources = [
         resources.diff_file_attachment,
         resources.repository_branches,
@@ -201,7 +203,8 @@ class RepositoryResource(WebAPIResource):
                                'all repositories.',
                 'added_in': '2.0',
             },
-        }, **WebAPIResource.get_list.optional_fields),
+        }, **dict(CURSOR_REQUEST_FIELDS,
+                  **WebAPIResource.get_list.optional_fields)),
         required=WebAPIResource.get_list.required_fields,
         allow_unknown=True
     )
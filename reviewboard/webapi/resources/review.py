@@ -1,8 +1,10 @@
 from __future__ import unicode_literals
 
 from djblets.util.decorators import augment_method_from
+from djblets.webapi.decorators import webapi_request_fields
 
 from reviewboard.webapi.decorators import webapi_check_local_site
+from reviewboard.webapi.pagination import CURSOR_REQUEST_FIELDS
 from reviewboard.webapi.resources import resources
 from reviewboard.webapi.resources.base_review import BaseReviewResource
 
@@ -24,6 +26,7 @@ class ReviewResource(BaseReviewResource):
     """
     uri_object_key = 'review_id'
     model_parent_key = 'review_request'
+    cursor_pagination_field = 'pk'
 
     item_child_resources = [
         resources.review_diff_comment,
@@ -37,6 +40,10 @@ class ReviewResource(BaseReviewResource):
     ]
 
     @webapi_check_local_site
+    @webapi_request_fields(
+        optional=CURSOR_REQUEST_FIELDS,
+        allow_unknown=True
+    )
     @augment_method_from(BaseReviewResource)
     def get_list(self, *args, **kwargs):
         """Returns the list of all public reviews on a review request."""
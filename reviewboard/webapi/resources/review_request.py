@@ -53,6 +53,7 @@ from reviewboard.webapi.errors import (CHANGE_NUMBER_IN_USE,
                                        REPO_AUTHENTICATION_ERROR,
                                        REPO_INFO_ERROR)
 from reviewboard.webapi.mixins import MarkdownFieldsMixin
+from reviewboard.webapi.pagination import CURSOR_REQUEST_FIELDS
 from reviewboard.webapi.resources import resources
 from reviewboard.webapi.resources.repository import RepositoryResource
 from reviewboard.webapi.resources.review_group import ReviewGroupResource
@@ -78,6 +79,7 @@ class ReviewRequestResource(MarkdownFieldsMixin, WebAPIResource):
     """
     model = ReviewRequest
     name = 'review_request'
+    cursor_pagination_field = 'last_updated'
 
     fields = {
         'id': {
@@ -433,7 +435,26 @@ class ReviewRequestResource(MarkdownFieldsMixin, WebAPIResource):
         else:
             queryset = self.model.objects.filter(local_site=local_site)
 
-        return queryset.prefetch_related('changedescs')
+        # Only fetch the related objects needed for the fields being
+        # serialized.
+        serialized_fields = self.get_serialized_fields(request)
+        select_related = [
+            field
+            for field in ('submitter', 'repository')
+            if field in serialized_fields
+        ]
+
+        if 'url' in serialized_fields or 'absolute_url' in serialized_fields:
+            select_related.append('local_site')
+
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+
+        if ('close_description' in serialized_fields or
+            'close_description_text_type' in serialized_fields):
+            queryset = queryset.prefetch_related('changedescs')
+
+        return queryset
 
     def has_access_permissions(self, request, review_request, *args, **kwargs):
         return review_request.is_accessible_by(request.user)
@@ -934,7 +955,7 @@ class ReviewRequestResource(MarkdownFieldsMixin, WebAPIResource):
 
     @webapi_check_local_site
     @webapi_request_fields(
-        optional={
+        optional=dict({
             'changenum': {
                 'type': int,
                 'description': 'The change number the review requests must '
@@ -1159,7 +1180,7 @@ class ReviewRequestResource(MarkdownFieldsMixin, WebAPIResource):
                                'review requests must have in the reviewer '
                                'list specifically.',
             }
-        },
+        }, **CURSOR_REQUEST_FIELDS),
         allow_unknown=True
     )
     @augment_method_from(WebAPIResource)
@@ -1171,6 +1192,9 @@ class ReviewRequestResource(MarkdownFieldsMixin, WebAPIResource):
 
         The resulting list can be filtered down through the many
         request parameters.
+
+        When paging with ``cursor``, the review requests are returned in
+        the order they were last updated, oldest first.
         """
         pass
 
@@ -18,6 +18,7 @@ from reviewboard.site.urlresolvers import local_site_reverse
 from reviewboard.webapi.base import WebAPIResource
 from reviewboard.webapi.decorators import webapi_check_local_site
 from reviewboard.webapi.errors import USER_QUERY_ERROR
+from reviewboard.webapi.pagination import CURSOR_REQUEST_FIELDS
 from reviewboard.webapi.resources import resources
 
 
@@ -45,6 +46,8 @@ class UserResource(WebAPIResource, DjbletsUserResource):
 
     hidden_fields = ('email', 'first_name', 'last_name', 'fullname')
 
+    cursor_pagination_field = 'pk'
+
     def get_queryset(self, request, local_site_name=None, *args, **kwargs):
         search_q = request.GET.get('q', None)
 
@@ -126,7 +129,7 @@ class UserResource(WebAPIResource, DjbletsUserResource):
     @webapi_response_errors(NOT_LOGGED_IN, PERMISSION_DENIED, DOES_NOT_EXIST,
                             USER_QUERY_ERROR)
     @webapi_request_fields(
-        optional={
+        optional=dict({
             'q': {
                 'type': six.text_type,
                 'description': 'The string that the username (or the first '
@@ -139,7 +142,7 @@ class UserResource(WebAPIResource, DjbletsUserResource):
                 'description': 'Specifies whether ``q`` should also match '
                                'the beginning of the first name or last name.',
             },
-        },
+        }, **CURSOR_REQUEST_FIELDS),
         allow_unknown=True
     )
     def get_list(self, *args, **kwargs):
@@ -0,0 +1,130 @@
+from __future__ import unicode_literals
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from kgb import SpyAgency
+
+from reviewboard.testing import TestCase
+from reviewboard.webapi.auth_backends import (TokenAuthBackend,
+                                              get_compiled_token_policy,
+                                              get_webapi_token,
+                                              get_webapi_token_for_user)
+
+
+class TokenAuthCacheTests(SpyAgency, TestCase):
+    """Testing the caching of WebAPITokens used for authentication."""
+    fixtures = ['test_users']
+
+    def setUp(self):
+        super(TokenAuthCacheTests, self).setUp()
+
+        self.user = User.objects.get(username='doc')
+        self.webapi_token = self.create_webapi_token(
+            self.user,
+            policy={
+                'resources': {
+                    '*': {
+                        'allow': ['GET'],
+                        'block': ['*'],
+                    },
+                },
+            })
+
+    def test_get_webapi_token(self):
+        """Testing get_webapi_token"""
+        webapi_token = get_webapi_token(self.webapi_token.token)
+        self.assertEqual(webapi_token, self.webapi_token)
+        self.assertEqual(webapi_token.user, self.user)
+
+        with self.assertNumQueries(0):
+            webapi_token = get_webapi_token(self.webapi_token.token)
+            self.assertEqual(webapi_token, self.webapi_token)
+            self.assertEqual(webapi_token.user.username, 'doc')
+
+    def test_get_webapi_token_with_invalid_token(self):
+        """Testing get_webapi_token with an invalid token"""
+        self.assertIsNone(get_webapi_token('abc123'))
+
+    def test_get_webapi_token_returns_copies(self):
+        """Testing get_webapi_token returns a new copy each time"""
+        webapi_token1 = get_webapi_token(self.webapi_token.token)
+        webapi_token1.user.first_name = 'Changed'
+
+        webapi_token2 = get_webapi_token(self.webapi_token.token)
+        self.assertIsNot(webapi_token1, webapi_token2)
+        self.assertIsNot(webapi_token1.user, webapi_token2.user)
+        self.assertNotEqual(webapi_token2.user.first_name, 'Changed')
+
+    def test_get_webapi_token_after_change(self):
+        """Testing get_webapi_token after the token changes"""
+        get_webapi_token(self.webapi_token.token)
+
+        self.webapi_token.note = 'New note'
+        self.webapi_token.save()
+        self.assertEqual(get_webapi_token(self.webapi_token.token).note,
+                         'New note')
+
+        self.webapi_token.delete()
+        self.assertIsNone(get_webapi_token(self.webapi_token.token))
+
+    def test_get_webapi_token_for_user(self):
+        """Testing get_webapi_token_for_user"""
+        other_user = User.objects.get(username='grumpy')
+
+        self.assertEqual(
+            get_webapi_token_for_user(self.user, self.webapi_token.pk),
+            self.webapi_token)
+        self.assertIsNone(
+            get_webapi_token_for_user(other_user, self.webapi_token.pk))
+
+    def test_get_compiled_token_policy(self):
+        """Testing get_compiled_token_policy"""
+        policy = get_compiled_token_policy(self.webapi_token)
+        self.assertTrue(policy.is_method_allowed('review', 'GET', None))
+        self.assertFalse(policy.is_method_allowed('review', 'POST', None))
+        self.assertIs(get_compiled_token_policy(self.webapi_token), policy)
+
+        self.webapi_token.policy = {}
+        self.webapi_token.save()
+        self.assertIsNone(get_compiled_token_policy(self.webapi_token))
+
+    def test_authenticate(self):
+        """Testing TokenAuthBackend.authenticate with cached tokens"""
+        backend = TokenAuthBackend()
+        user = backend.authenticate(token=self.webapi_token.token)
+        self.assertEqual(user, self.user)
+        self.assertEqual(user._webapi_token, self.webapi_token)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                backend.authenticate(token=self.webapi_token.token),
+                self.user)
+
+    def test_authenticate_inactive_user(self):
+        """Testing TokenAuthBackend.authenticate with a disabled user"""
+        backend = TokenAuthBackend()
+        self.assertIsNotNone(
+            backend.authenticate(token=self.webapi_token.token))
+
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertIsNone(backend.authenticate(token=self.webapi_token.token))
+
+    def test_authenticate_with_deleted_token_without_cache(self):
+        """Testing TokenAuthBackend.authenticate with a deleted token when
+        the cache isn't storing data
+        """
+        self.spy_on(cache.get,
+                    call_fake=lambda cache, key, *args, **kwargs: None)
+
+        backend = TokenAuthBackend()
+        token = self.webapi_token.token
+        token_id = self.webapi_token.pk
+        self.assertEqual(backend.authenticate(token=token), self.user)
+        self.assertEqual(get_webapi_token_for_user(self.user, token_id),
+                         self.webapi_token)
+
+        self.webapi_token.delete()
+        self.assertIsNone(backend.authenticate(token=token))
+        self.assertIsNone(get_webapi_token_for_user(self.user, token_id))
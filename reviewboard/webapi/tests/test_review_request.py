@@ -6,7 +6,8 @@ from django.db.models import Q
 from django.utils import six
 from djblets.db.query import get_object_or_none
 from djblets.testing.decorators import add_fixtures
-from djblets.webapi.errors import DOES_NOT_EXIST, PERMISSION_DENIED
+from djblets.webapi.errors import (DOES_NOT_EXIST, INVALID_FORM_DATA,
+                                   PERMISSION_DENIED)
 from kgb import SpyAgency
 
 from reviewboard.accounts.backends import AuthBackend
@@ -147,6 +148,130 @@ class ResourceListTests(SpyAgency, ExtraDataListMixin, BaseWebAPITestCase):
         self.assertEqual(rsp['stat'], 'ok')
         self.assertEqual(rsp['count'], 2)
 
+    def test_get_with_counts_only_and_approximate_counts(self):
+        """Testing the GET review-requests/?counts-only=1&approximate-counts=1
+        API
+        """
+        self.create_review_request(publish=True)
+        self.create_review_request(publish=True)
+
+        query = {
+            'counts-only': 1,
+            'approximate-counts': 1,
+        }
+
+        rsp = self.api_get(get_review_request_list_url(), query,
+                           expected_mimetype=review_request_list_mimetype)
+        self.assertEqual(rsp['stat'], 'ok')
+        self.assertEqual(rsp['count'], 2)
+
+        # The cached count should be returned until it expires.
+        self.create_review_request(publish=True)
+
+        rsp = self.api_get(get_review_request_list_url(), query,
+                           expected_mimetype=review_request_list_mimetype)
+        self.assertEqual(rsp['stat'], 'ok')
+        self.assertEqual(rsp['count'], 2)
+
+        rsp = self.api_get(get_review_request_list_url(), {
+            'counts-only': 1,
+        }, expected_mimetype=review_request_list_mimetype)
+        self.assertEqual(rsp['stat'], 'ok')
+        self.assertEqual(rsp['count'], 3)
+
+    def test_get_with_cursor(self):
+        """Testing the GET review-requests/?cursor= API"""
+        review_requests = [
+            self.create_review_request(publish=True)
+            for i in range(3)
+        ]
+
+        rsp = self.api_get(get_review_request_list_url(), {
+            'cursor': '',
+            'max-results': 2,
+        }, expected_mimetype=review_request_list_mimetype)
+        self.assertEqual(rsp['stat'], 'ok')
+        self.assertEqual(
+            [item['id'] for item in rsp['review_requests']],
+            [review_request.pk for review_request in review_requests[:2]])
+        self.assertNotIn('prev', rsp['links'])
+        self.assertIn('next', rsp['links'])
+
+        # Review requests updated after the first page was fetched should
+        # show up at the end, without shifting the rest.
+        review_requests[0].save()
+        review_requests.append(review_requests[0])
+
+        rsp = self.api_get(rsp['links']['next']['href'],
+                           expected_mimetype=review_request_list_mimetype)
+        self.assertEqual(rsp['stat'], 'ok')
+        self.assertEqual(
+            [item['id'] for item in rsp['review_requests']],
+            [review_request.pk for review_request in review_requests[2:]])
+        self.assertNotIn('next', rsp['links'])
+
+    def test_get_with_invalid_cursor(self):
+        """Testing the GET review-requests/?cursor= API with an invalid
+        cursor
+        """
+        rsp = self.api_get(get_review_request_list_url(), {
+            'cursor': 'abc',
+        }, expected_status=400)
+        self.assertEqual(rsp['stat'], 'fail')
+        self.assertEqual(rsp['err']['code'], INVALID_FORM_DATA.code)
+        self.assertIn('cursor', rsp['fields'])
+
+    def test_get_with_only_fields(self):
+        """Testing the GET review-requests/?only-fields= API"""
+        review_request = self.create_review_request(publish=True)
+        review_request.close(ReviewRequest.SUBMITTED,
+                             description='Closed')
+
+        self.spy_on(ReviewRequest._calculate_approval)
+        self.spy_on(ReviewRequest.get_close_description)
+        self.spy_on(resources.review_request.serialize_absolute_url_field)
+
+        rsp = self.api_get(get_review_request_list_url(), {
+            'only-fields': 'id,summary',
+            'status': 'all',
+        }, expected_mimetype=review_request_list_mimetype)
+        self.assertEqual(rsp['stat'], 'ok')
+        self.assertEqual(len(rsp['review_requests']), 1)
+
+        item_rsp = rsp['review_requests'][0]
+        self.assertEqual(set(item_rsp.keys()),
+                         set(['id', 'summary', 'links']))
+        self.assertEqual(item_rsp['id'], review_request.display_id)
+        self.assertIn('submitter', item_rsp['links'])
+
+        self.assertFalse(ReviewRequest._calculate_approval.called)
+        self.assertFalse(ReviewRequest.get_close_description.called)
+        self.assertFalse(
+            resources.review_request.serialize_absolute_url_field.called)
+
+    def test_get_with_only_fields_and_text_fields(self):
+        """Testing the GET review-requests/?only-fields= API
+        with text fields
+        """
+        review_request = self.create_review_request(publish=True)
+        review_request.close(ReviewRequest.SUBMITTED,
+                             description='Closed')
+
+        rsp = self.api_get(get_review_request_list_url(), {
+            'only-fields': 'close_description,description',
+            'only-links': '',
+            'status': 'all',
+        }, expected_mimetype=review_request_list_mimetype)
+        self.assertEqual(rsp['stat'], 'ok')
+
+        item_rsp = rsp['review_requests'][0]
+        self.assertEqual(item_rsp, {
+            'close_description': 'Closed',
+            'close_description_text_type': 'plain',
+            'description': review_request.description,
+            'description_text_type': 'plain',
+        })
+
     def test_get_with_to_groups(self):
         """Testing the GET review-requests/?to-groups= API"""
         group = self.create_review_group(name='devgroup')
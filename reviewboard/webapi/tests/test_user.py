@@ -56,6 +56,26 @@ class ResourceListTests(SpyAgency, BaseWebAPITestCase):
         self.assertEqual(rsp['stat'], 'ok')
         self.assertEqual(len(rsp['users']), 1)  # grumpy
 
+    def test_get_with_cursor(self):
+        """Testing the GET users/?cursor= API"""
+        users = list(User.objects.filter(is_active=True).order_by('pk'))
+        self.assertTrue(len(users) > 2)
+
+        rsp = self.api_get(get_user_list_url(), {
+            'cursor': '',
+            'max-results': 2,
+        }, expected_mimetype=user_list_mimetype)
+        self.assertEqual(rsp['stat'], 'ok')
+        self.assertEqual([item['id'] for item in rsp['users']],
+                         [user.pk for user in users[:2]])
+        self.assertNotIn('prev', rsp['links'])
+
+        rsp = self.api_get(rsp['links']['next']['href'],
+                           expected_mimetype=user_list_mimetype)
+        self.assertEqual(rsp['stat'], 'ok')
+        self.assertEqual([item['id'] for item in rsp['users']],
+                         [user.pk for user in users[2:4]])
+
     def test_query_users_auth_backend(self):
         """Testing the GET users/?q= API
         with AuthBackend.query_users failure